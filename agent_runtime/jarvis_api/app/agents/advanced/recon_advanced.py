@@ -8,6 +8,8 @@ import subprocess
 import json
 from datetime import datetime
 
+from app.services.event_stream import EventChannel, run_tool_streamed
+
 class ReconAgentAdvanced:
     """Agente de reconocimiento multi-herramienta."""
     
@@ -18,7 +20,8 @@ class ReconAgentAdvanced:
     async def run_full_discovery(
         self,
         target: str,
-        options: Dict[str, Any] = None
+        options: Dict[str, Any] = None,
+        events: Optional[EventChannel] = None
     ) -> Dict[str, Any]:
         """
         Ejecuta descubrimiento completo de un objetivo.
@@ -30,6 +33,7 @@ class ReconAgentAdvanced:
                 - aggressive: Modo agresivo (más ruidoso)
                 - os_detection: Detectar OS
                 - service_version: Detectar versiones
+            events: Canal de streaming (plan, tool_start, tool_output, reflect)
         
         Returns:
             Diccionario con resultados completos
@@ -42,32 +46,59 @@ class ReconAgentAdvanced:
             "phases": {}
         }
         
+        if events:
+            phases = ["port_scan", "services"] + (["os"] if options.get("os_detection") else []) + ["banners"]
+            await events.emit("plan", agent="recon-advanced", target=target, phases=phases)
+        
         # Fase 1: Port Discovery
-        results["phases"]["port_scan"] = await self._port_discovery(target, options)
+        results["phases"]["port_scan"] = await self._port_discovery(target, options, events)
+        await self._reflect(events, "port_scan", results)
         
         # Fase 2: Service Detection
         if results["phases"]["port_scan"].get("open_ports"):
             results["phases"]["services"] = await self._service_detection(
                 target,
-                results["phases"]["port_scan"]["open_ports"]
+                results["phases"]["port_scan"]["open_ports"],
+                events
             )
+            await self._reflect(events, "services", results)
         
         # Fase 3: OS Detection (opcional)
         if options.get("os_detection", False):
-            results["phases"]["os"] = await self._os_detection(target)
+            results["phases"]["os"] = await self._os_detection(target, events)
+            await self._reflect(events, "os", results)
         
         # Fase 4: Banner Grabbing
         results["phases"]["banners"] = await self._banner_grabbing(
             target,
-            results["phases"]["port_scan"].get("open_ports", [])
+            results["phases"]["port_scan"].get("open_ports", []),
+            events
         )
+        await self._reflect(events, "banners", results)
         
         return results
     
+    @staticmethod
+    async def _reflect(events: Optional[EventChannel], phase: str, results: Dict[str, Any]):
+        if events:
+            await events.emit("reflect", agent="recon-advanced", phase=phase, result=results["phases"].get(phase))
+    
+    async def _run_tool(
+        self,
+        cmd: List[str],
+        timeout: Optional[float],
+        events: Optional[EventChannel] = None
+    ) -> subprocess.CompletedProcess:
+        """subprocess.run, o ejecución en streaming si hay canal de eventos."""
+        if events is not None:
+            return await run_tool_streamed(cmd, events, timeout=timeout)
+        return subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+    
     async def _port_discovery(
         self,
         target: str,
-        options: Dict
+        options: Dict,
+        events: Optional[EventChannel] = None
     ) -> Dict[str, Any]:
         """Descubrimiento de puertos con Nmap."""
         ports = options.get("ports", "1-1000")
@@ -90,12 +121,7 @@ class ReconAgentAdvanced:
             if self.ssh_client:
                 result = await self._execute_remote(cmd)
             else:
-                result = subprocess.run(
-                    cmd,
-                    capture_output=True,
-                    text=True,
-                    timeout=300
-                )
+                result = await self._run_tool(cmd, 300, events)
             
             # Parsear resultados
             return self._parse_nmap_output(result.stdout)
@@ -108,7 +134,8 @@ class ReconAgentAdvanced:
     async def _service_detection(
         self,
         target: str,
-        ports: List[int]
+        ports: List[int],
+        events: Optional[EventChannel] = None
     ) -> Dict[str, Any]:
         """Detección de servicios en puertos abiertos."""
         services = {}
@@ -123,12 +150,7 @@ class ReconAgentAdvanced:
             ]
             
             try:
-                result = subprocess.run(
-                    cmd,
-                    capture_output=True,
-                    text=True,
-                    timeout=60
-                )
+                result = await self._run_tool(cmd, 60, events)
                 
                 services[str(port)] = self._parse_service_info(result.stdout)
             
@@ -137,17 +159,12 @@ class ReconAgentAdvanced:
         
         return services
     
-    async def _os_detection(self, target: str) -> Dict[str, Any]:
+    async def _os_detection(self, target: str, events: Optional[EventChannel] = None) -> Dict[str, Any]:
         """Detección de sistema operativo."""
         cmd = ["nmap", "-O", target]
         
         try:
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=120
-            )
+            result = await self._run_tool(cmd, 120, events)
             
             return self._parse_os_info(result.stdout)
         
@@ -157,7 +174,8 @@ class ReconAgentAdvanced:
     async def _banner_grabbing(
         self,
         target: str,
-        ports: List[int]
+        ports: List[int],
+        events: Optional[EventChannel] = None
     ) -> Dict[str, str]:
         """Banner grabbing de servicios."""
         banners = {}
@@ -166,18 +184,13 @@ class ReconAgentAdvanced:
             try:
                 # Usar netcat para banner grabbing
                 cmd = ["nc", "-v", "-w", "3", target, str(port)]
-                result = subprocess.run(
-                    cmd,
-                    capture_output=True,
-                    text=True,
-                    timeout=5
-                )
+                result = await self._run_tool(cmd, 5, events)
                 
                 banner = result.stdout + result.stderr
                 if banner.strip():
                     banners[str(port)] = banner.strip()
             
-            except:
+            except Exception:  # no capturar CancelledError: cancela el stream
                 continue
         
         return banners
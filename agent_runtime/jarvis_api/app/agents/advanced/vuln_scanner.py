@@ -17,7 +17,8 @@ class VulnScannerAgent:
     async def scan_target(
         self,
         target: str,
-        services: Dict[str, Any]
+        services: Dict[str, Any],
+        events=None
     ) -> List[Dict[str, Any]]:
         """
         Escanea objetivo buscando vulnerabilidades.
@@ -25,6 +26,7 @@ class VulnScannerAgent:
         Args:
             target: IP/dominio objetivo
             services: Servicios detectados (de ReconAgent)
+            events: Canal de streaming opcional (EventChannel)
         
         Returns:
             Lista de vulnerabilidades encontradas
@@ -33,12 +35,16 @@ class VulnScannerAgent:
         
         # Escanear cada servicio
         for port, service_info in services.items():
+            if events:
+                await events.emit("tool_start", tool="vuln-scanner", port=port, service=service_info)
             vulns = await self._scan_service(
                 target,
                 port,
                 service_info
             )
             vulnerabilities.extend(vulns)
+            if events:
+                await events.emit("reflect", agent="vuln-scanner", port=port, vulnerabilities=len(vulns))
         
         return vulnerabilities
     
@@ -210,7 +216,7 @@ Proporciona:
 
 Respuesta concisa en 3 puntos."""
 
-        response = self.ollama.chat(
+        response = await self.ollama.achat(
             messages=[{"role": "user", "content": prompt}]
         )
         
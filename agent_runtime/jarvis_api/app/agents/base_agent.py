@@ -3,7 +3,6 @@ Base Agent Framework for Autonomous AI Agents
 Provides LLM integration, tool execution, memory, and decision-making patterns.
 """
 
-import asyncio
 import logging
 from abc import ABC, abstractmethod
 from typing import Dict, Any, List, Optional, Callable
@@ -150,15 +149,12 @@ Respond in JSON format:
 """
         
         try:
-            response = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: self.ollama.chat(
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    model="llama3.1:8b-instruct-q4_K_M"
-                )
+            response = await self.ollama.achat(
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                model="llama3.1:8b-instruct-q4_K_M"
             )
             
             if "error" in response:
@@ -258,15 +254,12 @@ Keep your reflection concise and actionable.
 """
         
         try:
-            response = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: self.ollama.chat(
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    model="llama3.1:8b-instruct-q4_K_M"
-                )
+            response = await self.ollama.achat(
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                model="llama3.1:8b-instruct-q4_K_M"
             )
             
             reflection = response.get("message", {}).get("content", "Unable to reflect on results.")
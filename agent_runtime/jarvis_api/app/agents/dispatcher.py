@@ -3,8 +3,10 @@ Agent Dispatcher
 Routes requests from Jarvis Prime to appropriate agents
 """
 
+import asyncio
 import logging
 import uuid
+from contextlib import asynccontextmanager
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 
@@ -66,6 +68,20 @@ class AgentDispatcher:
     def __init__(self):
         self.registry = registry
         self.logger = logging.getLogger("dispatcher")
+        self._agent_slots: Dict[str, asyncio.Semaphore] = {}
+
+    @asynccontextmanager
+    async def agent_slot(self, agent_code: str):
+        """Per-agent-type concurrency limit (WORKFLOW_AGENT_CONCURRENCY)"""
+        from .workflows.dag import AGENT_CONCURRENCY, DEFAULT_AGENT_CONCURRENCY
+
+        slot = self._agent_slots.get(agent_code)
+        if slot is None:
+            slot = self._agent_slots[agent_code] = asyncio.Semaphore(
+                AGENT_CONCURRENCY.get(agent_code, DEFAULT_AGENT_CONCURRENCY)
+            )
+        async with slot:
+            yield
     
     async def dispatch_to_agent(
         self,
@@ -136,11 +152,27 @@ class AgentDispatcher:
         Args:
             agents: List of (agent_code, intent, params) tuples
             context: Shared context
-            parallel: Whether to run in parallel (not implemented yet)
+            parallel: Run all calls concurrently (independent DAG nodes).
+                In sequential mode each agent sees the previous results
+                in the shared context as "{agent_code}_result".
         
         Returns:
             DispatchResult with all responses
         """
+        if parallel:
+            from .workflows.dag import WorkflowNode
+
+            nodes = [
+                WorkflowNode(id=f"{i}:{agent_code}", agent_code=agent_code, intent=intent, params=params)
+                for i, (agent_code, intent, params) in enumerate(agents)
+            ]
+            run = await self.execute_dag("parallel_dispatch", nodes, context)
+            result = DispatchResult(workflow_id=run.run_id, details={"wall_time_ms": run.wall_time_ms})
+            # Original order, not completion order
+            for node in nodes:
+                result.add_response(run.responses[node.id])
+            return result
+
         result = DispatchResult()
         shared_context = context or {}
         
@@ -167,7 +199,7 @@ class AgentDispatcher:
         """
         Execute a predefined workflow
         
-        Workflows are sequences of agent calls
+        Workflows are graphs of agent calls (see workflows/dag.py)
         """
         from .workflows import get_workflow
         
@@ -182,6 +214,21 @@ class AgentDispatcher:
         self.logger.info(f"[Dispatcher] Executing workflow: {workflow_name}")
         
         return await workflow.execute(self, params)
+
+    async def execute_dag(
+        self,
+        workflow_name: str,
+        nodes: List,
+        context: Dict[str, Any] = None,
+        fail_fast: bool = False
+    ):
+        """
+        Run a graph of WorkflowNode: ready nodes run concurrently, dependents
+        receive their inputs through bindings. Returns the DagRun.
+        """
+        from .workflows.dag import DagExecutor
+
+        return await DagExecutor(self, fail_fast=fail_fast).run(workflow_name, nodes, context)
     
     def get_available_agents(self) -> List[Dict]:
         """Get list of all available agents"""
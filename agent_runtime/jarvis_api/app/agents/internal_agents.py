@@ -153,7 +153,7 @@ class LearningAgent:
         
         Genera lista de 3-5 recomendaciones específicas."""
         
-        response = self.ollama.chat(
+        response = await self.ollama.achat(
             messages=[{"role": "user", "content": prompt}]
         )
         
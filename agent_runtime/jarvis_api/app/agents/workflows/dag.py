@@ -0,0 +1,308 @@
+"""
+DAG Workflow Execution
+Workflows as graphs of agent calls with explicit dependencies and
+output-to-input bindings. Ready nodes run concurrently, limited per agent
+type, so wall time follows the critical path instead of the sum of steps.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from app.agents.protocol import AgentResponse, ResponseStatus
+
+from .base import BaseWorkflow
+
+logger = logging.getLogger(__name__)
+
+WORKFLOW_TRACE_DIR = os.getenv("WORKFLOW_TRACE_DIR", "/opt/deco/agent_runtime/logs/workflows")
+WORKFLOW_NODE_TIMEOUT = float(os.getenv("WORKFLOW_NODE_TIMEOUT", "900"))
+DEFAULT_AGENT_CONCURRENCY = int(os.getenv("WORKFLOW_AGENT_CONCURRENCY_DEFAULT", "4"))
+
+
+def _parse_concurrency(spec: str) -> Dict[str, int]:
+    """"A-SCAN=2,A-REPORT=1" -> {"A-SCAN": 2, "A-REPORT": 1}"""
+    limits = {}
+    for part in spec.split(","):
+        if "=" in part:
+            code, value = part.split("=", 1)
+            limits[code.strip()] = int(value)
+    return limits
+
+
+# Max concurrent calls per agent type, across all running workflows
+AGENT_CONCURRENCY = _parse_concurrency(os.getenv("WORKFLOW_AGENT_CONCURRENCY", "A-SCAN=2,A-VULN=4,A-REPORT=2,A-PENTEST=1"))
+
+# Binding: "node_id.path.to.value" into the node's response.dict(), or a
+# callable receiving {node_id: AgentResponse} of the completed nodes
+Binding = Union[str, Callable[[Dict[str, AgentResponse]], Any]]
+
+
+@dataclass
+class WorkflowNode:
+    """A single agent call in a workflow graph"""
+    id: str
+    agent_code: str
+    intent: str
+    params: Dict[str, Any] = field(default_factory=dict)
+    depends_on: List[str] = field(default_factory=list)
+    bindings: Dict[str, Binding] = field(default_factory=dict)
+    timeout: float = WORKFLOW_NODE_TIMEOUT
+    # Run even if a dependency failed (the binding then sees the failed response)
+    run_on_failure: bool = False
+    # Evaluated once the dependencies are done: False skips the node
+    condition: Optional[Callable[[Dict[str, AgentResponse]], bool]] = None
+
+
+class WorkflowDefinitionError(ValueError):
+    pass
+
+
+def validate_graph(nodes: List[WorkflowNode]):
+    """Unknown dependencies, duplicate ids and cycles"""
+    ids = [n.id for n in nodes]
+    if len(ids) != len(set(ids)):
+        raise WorkflowDefinitionError("Duplicate node ids in workflow")
+    known = set(ids)
+    for node in nodes:
+        missing = [d for d in node.depends_on if d not in known]
+        if missing:
+            raise WorkflowDefinitionError(f"Node '{node.id}' depends on unknown nodes: {missing}")
+
+    # Kahn: every node must be reachable in topological order
+    indegree = {n.id: len(set(n.depends_on)) for n in nodes}
+    dependents: Dict[str, List[str]] = {n.id: [] for n in nodes}
+    for node in nodes:
+        for dep in set(node.depends_on):
+            dependents[dep].append(node.id)
+    queue = [i for i, d in indegree.items() if d == 0]
+    visited = 0
+    while queue:
+        current = queue.pop()
+        visited += 1
+        for child in dependents[current]:
+            indegree[child] -= 1
+            if indegree[child] == 0:
+                queue.append(child)
+    if visited != len(nodes):
+        raise WorkflowDefinitionError("Workflow graph has a cycle")
+
+
+def resolve_path(responses: Dict[str, AgentResponse], ref: str) -> Any:
+    """"scan.details.hosts" -> responses["scan"].dict()["details"]["hosts"]"""
+    node_id, _, path = ref.partition(".")
+    value: Any = responses[node_id].dict()
+    for key in filter(None, path.split(".")):
+        if isinstance(value, dict):
+            value = value.get(key)
+        elif isinstance(value, list) and key.isdigit():
+            value = value[int(key)] if int(key) < len(value) else None
+        else:
+            return None
+    return value
+
+
+def _is_success(response: AgentResponse) -> bool:
+    return response.status in (ResponseStatus.SUCCESS, ResponseStatus.PARTIAL)
+
+
+def _synthetic_response(node: WorkflowNode, status: ResponseStatus, summary: str, error: str) -> AgentResponse:
+    return AgentResponse(
+        request_id=str(uuid.uuid4()),
+        agent_code=node.agent_code,
+        status=status,
+        summary=summary,
+        errors=[error],
+    )
+
+
+class DagRun:
+    """State and trace of one workflow execution"""
+
+    def __init__(self, workflow_name: str, nodes: List[WorkflowNode]):
+        self.run_id = f"{workflow_name}-{datetime.now().strftime('%Y%m%d_%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self.workflow_name = workflow_name
+        self.nodes = {n.id: n for n in nodes}
+        self.responses: Dict[str, AgentResponse] = {}
+        self.completion_order: List[str] = []
+        self.trace: List[Dict[str, Any]] = []
+        self.started = time.monotonic()
+        self.wall_time_ms = 0
+
+    def record(self, node: WorkflowNode, status: str, started: Optional[float], error: Optional[str] = None):
+        finished = time.monotonic()
+        self.trace.append({
+            "node": node.id,
+            "agent": node.agent_code,
+            "intent": node.intent,
+            "depends_on": node.depends_on,
+            "status": status,
+            "start_offset_ms": int((started - self.started) * 1000) if started else None,
+            "duration_ms": int((finished - started) * 1000) if started else 0,
+            "error": error,
+        })
+
+    def succeeded(self, node_id: str) -> bool:
+        response = self.responses.get(node_id)
+        return response is not None and _is_success(response)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "run_id": self.run_id,
+            "workflow": self.workflow_name,
+            "wall_time_ms": self.wall_time_ms,
+            "sum_of_steps_ms": sum(t["duration_ms"] for t in self.trace),
+            "trace": self.trace,
+        }
+
+
+class DagExecutor:
+    """Runs a workflow graph on an AgentDispatcher"""
+
+    def __init__(self, dispatcher, fail_fast: bool = False):
+        self.dispatcher = dispatcher
+        # fail_fast: the first failure cancels every running and pending node
+        self.fail_fast = fail_fast
+
+    async def run(
+        self,
+        workflow_name: str,
+        nodes: List[WorkflowNode],
+        context: Optional[Dict[str, Any]] = None,
+    ) -> DagRun:
+        validate_graph(nodes)
+        run = DagRun(workflow_name, nodes)
+        pending = dict(run.nodes)
+        running: Dict[asyncio.Task, WorkflowNode] = {}
+        aborted = False
+
+        try:
+            while pending or running:
+                for node in list(pending.values()):
+                    if not all(dep in run.responses for dep in node.depends_on):
+                        continue
+                    del pending[node.id]
+                    failed_deps = [d for d in node.depends_on if not run.succeeded(d)]
+                    reason = None
+                    if aborted:
+                        reason = "workflow aborted"
+                    elif failed_deps and not node.run_on_failure:
+                        # Failure propagates to every dependent node
+                        reason = f"dependency failed: {', '.join(failed_deps)}"
+                    elif node.condition and not node.condition(run.responses):
+                        reason = "condition not met"
+                    if reason:
+                        run.responses[node.id] = _synthetic_response(
+                            node, ResponseStatus.FAILED, f"Skipped {node.id}: {reason}", reason
+                        )
+                        run.completion_order.append(node.id)
+                        run.record(node, "skipped", None, reason)
+                        continue
+                    task = asyncio.create_task(self._run_node(run, node, context or {}))
+                    running[task] = node
+
+                if not running:
+                    continue
+
+                done, _ = await asyncio.wait(running.keys(), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    node = running.pop(task)
+                    response = task.result()
+                    run.responses[node.id] = response
+                    run.completion_order.append(node.id)
+                    if self.fail_fast and not _is_success(response) and not aborted:
+                        aborted = True
+                        for other in running:
+                            other.cancel()
+        except asyncio.CancelledError:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running.keys(), return_exceptions=True)
+            raise
+        finally:
+            run.wall_time_ms = int((time.monotonic() - run.started) * 1000)
+
+        await asyncio.to_thread(self._persist, run)
+        return run
+
+    async def _run_node(self, run: DagRun, node: WorkflowNode, context: Dict[str, Any]) -> AgentResponse:
+        params = dict(node.params)
+        try:
+            for name, binding in node.bindings.items():
+                params[name] = binding(run.responses) if callable(binding) else resolve_path(run.responses, binding)
+        except Exception as e:
+            run.record(node, "failed", None, f"binding error: {e}")
+            return _synthetic_response(node, ResponseStatus.FAILED, f"Binding error in {node.id}: {e}", str(e))
+
+        started = None
+        try:
+            async with self.dispatcher.agent_slot(node.agent_code):
+                started = time.monotonic()
+                response = await asyncio.wait_for(
+                    self.dispatcher.dispatch_to_agent(node.agent_code, node.intent, params, context),
+                    timeout=node.timeout,
+                )
+        except asyncio.TimeoutError:
+            run.record(node, "timeout", started, f"timeout after {node.timeout}s")
+            return _synthetic_response(
+                node, ResponseStatus.TIMEOUT, f"{node.agent_code} excedió el tiempo límite ({node.timeout}s)", "timeout"
+            )
+        except asyncio.CancelledError:
+            run.record(node, "cancelled", started, "cancelled")
+            return _synthetic_response(node, ResponseStatus.FAILED, f"{node.id} cancelado", "cancelled")
+
+        run.record(node, response.status.value, started, "; ".join(response.errors) or None)
+        return response
+
+    @staticmethod
+    def _persist(run: DagRun):
+        try:
+            trace_dir = Path(WORKFLOW_TRACE_DIR)
+            trace_dir.mkdir(parents=True, exist_ok=True)
+            with open(trace_dir / f"{run.run_id}.json", "w") as f:
+                json.dump(run.to_dict(), f, indent=2, default=str)
+        except Exception as e:
+            logger.error(f"[Workflows] Could not persist trace for {run.run_id}: {e}")
+
+
+class DagWorkflow(BaseWorkflow):
+    """Workflow defined as a graph: subclasses implement build() and summarize()"""
+
+    fail_fast: bool = False
+
+    def build(self, params: Dict[str, Any]) -> List[WorkflowNode]:
+        raise NotImplementedError
+
+    def summarize(self, run: DagRun, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Returns DispatchResult fields: success, summary, artifacts"""
+        failed = [n for n in run.completion_order if not run.succeeded(n)]
+        return {
+            "success": not failed,
+            "summary": f"Workflow {self.name} completed" + (f" with failures in: {', '.join(failed)}" if failed else ""),
+            "artifacts": [a for n in run.completion_order for a in run.responses[n].artifacts],
+        }
+
+    async def execute(self, dispatcher, params: Dict[str, Any]):
+        from app.agents.dispatcher import DispatchResult
+
+        run = await dispatcher.execute_dag(self.name, self.build(params), fail_fast=self.fail_fast)
+        outcome = self.summarize(run, params)
+        logger.info(
+            f"[Workflows] {self.name} finished in {run.wall_time_ms}ms "
+            f"(sum of steps {run.to_dict()['sum_of_steps_ms']}ms)"
+        )
+        return DispatchResult(
+            workflow_id=run.run_id,
+            success=outcome["success"],
+            responses=[run.responses[n] for n in run.completion_order],
+            summary=outcome["summary"],
+            details={"wall_time_ms": run.wall_time_ms, "trace": run.trace},
+            artifacts=outcome.get("artifacts", []),
+        )
@@ -1,147 +1,168 @@
 """
 Standard Workflows Definitions
-Defines the core workflows for Jarvis 3.0
+Defines the core workflows for Jarvis 3.0 as dependency graphs
 """
 
 from typing import Dict, Any, List
-from .base import BaseWorkflow, register_workflow
-from app.agents.dispatcher import dispatcher, DispatchResult
+from .base import register_workflow
+from .dag import DagRun, DagWorkflow, WorkflowNode
 from app.agents.protocol import ResponseStatus
 
-class NetworkAuditWorkflow(BaseWorkflow):
+class NetworkAuditWorkflow(DagWorkflow):
     name = "network_audit"
-    description = "Complete network audit: Scan -> Vuln Analysis -> Report"
+    description = "Complete network audit: Scan -> Vuln Analysis -> Report (targets in parallel)"
     agents_involved = ["A-SCAN", "A-VULN", "A-REPORT"]
-    
-    async def execute(self, dispatcher, params: Dict[str, Any]) -> DispatchResult:
-        target = params.get("target")
-        if not target:
+
+    @staticmethod
+    def _targets(params: Dict[str, Any]) -> List[str]:
+        targets = params.get("targets") or ([params["target"]] if params.get("target") else [])
+        if not targets:
             raise ValueError("Target required for network audit")
-            
-        results = []
-        
-        # 1. Scan
-        scan_resp = await dispatcher.dispatch_to_agent(
-            "A-SCAN", 
-            "scan_target", 
-            {"target": target, "profile": params.get("profile", "standard")}
-        )
-        results.append(scan_resp)
-        
-        if scan_resp.status != ResponseStatus.SUCCESS:
-            return DispatchResult(
-                workflow_id=self.name,
-                success=False,
-                responses=results,
-                summary=f"Audit failed at scan stage: {scan_resp.summary}"
-            )
-            
-        # 2. Vuln Analysis
-        vuln_resp = await dispatcher.dispatch_to_agent(
-            "A-VULN",
-            "analyze_scan",
-            {"scan_results": scan_resp.details}
-        )
-        results.append(vuln_resp)
-        
-        # 3. Report
-        report_resp = await dispatcher.dispatch_to_agent(
-            "A-REPORT",
-            "generate_report",
-            {
-                "type": "audit",
-                "data": {
-                    "scan": scan_resp.details,
-                    "vulns": vuln_resp.details
-                },
-                "title": f"Network Audit Report: {target}"
+        return targets
+
+    def build(self, params: Dict[str, Any]) -> List[WorkflowNode]:
+        targets = self._targets(params)
+        nodes = []
+        for i, target in enumerate(targets):
+            # 1. Scan / 2. Vuln Analysis: one independent branch per target
+            nodes.append(WorkflowNode(
+                id=f"scan_{i}",
+                agent_code="A-SCAN",
+                intent="scan_target",
+                params={"target": target, "profile": params.get("profile", "standard")},
+            ))
+            nodes.append(WorkflowNode(
+                id=f"vuln_{i}",
+                agent_code="A-VULN",
+                intent="analyze_scan",
+                depends_on=[f"scan_{i}"],
+                bindings={"scan_results": f"scan_{i}.details"},
+            ))
+
+        # 3. Report: joins every branch that got through the scan
+        def report_data(responses):
+            data = {}
+            for i, target in enumerate(targets):
+                if responses[f"scan_{i}"].status != ResponseStatus.SUCCESS:
+                    continue
+                data[target] = {"scan": responses[f"scan_{i}"].details, "vulns": responses[f"vuln_{i}"].details}
+            if len(targets) == 1:
+                return data.get(targets[0], {})
+            return data
+
+        nodes.append(WorkflowNode(
+            id="report",
+            agent_code="A-REPORT",
+            intent="generate_report",
+            params={"type": "audit", "title": f"Network Audit Report: {', '.join(targets)}"},
+            depends_on=[f"vuln_{i}" for i in range(len(targets))],
+            bindings={"data": report_data},
+            # A failed target must not block the report of the others
+            run_on_failure=True,
+            condition=lambda responses: any(
+                responses[f"scan_{i}"].status == ResponseStatus.SUCCESS for i in range(len(targets))
+            ),
+        ))
+        return nodes
+
+    def summarize(self, run: DagRun, params: Dict[str, Any]) -> Dict[str, Any]:
+        targets = self._targets(params)
+        scans = [run.responses[f"scan_{i}"] for i in range(len(targets))]
+        failed = [t for t, scan in zip(targets, scans) if scan.status != ResponseStatus.SUCCESS]
+        report = run.responses["report"]
+
+        if len(failed) == len(targets):
+            return {
+                "success": False,
+                "summary": f"Audit failed at scan stage: {'; '.join(s.summary for s in scans)}",
             }
+
+        vulns = sum(
+            len(run.responses[f"vuln_{i}"].details.get("vulnerabilities", []))
+            for i, target in enumerate(targets) if target not in failed
         )
-        results.append(report_resp)
-        
-        return DispatchResult(
-            workflow_id=self.name,
-            success=True,
-            responses=results,
-            summary=f"Network audit completed for {target}. Found {len(vuln_resp.details.get('vulnerabilities', []))} vulnerabilities.",
-            artifacts=report_resp.artifacts
-        )
+        summary = f"Network audit completed for {', '.join(t for t in targets if t not in failed)}. Found {vulns} vulnerabilities."
+        if failed:
+            summary += f" Scan failed for: {', '.join(failed)}."
+        return {"success": not failed, "summary": summary, "artifacts": report.artifacts}
 
-class PentestWorkflow(BaseWorkflow):
+class PentestWorkflow(DagWorkflow):
     name = "pentest_attack"
     description = "Authorized Pentest: Scan -> Exploit -> Report"
     agents_involved = ["A-SCAN", "A-PENTEST", "A-REPORT"]
-    
-    async def execute(self, dispatcher, params: Dict[str, Any]) -> DispatchResult:
+
+    def build(self, params: Dict[str, Any]) -> List[WorkflowNode]:
         target = params.get("target")
-        
-        # 1. Scan
-        scan_resp = await dispatcher.dispatch_to_agent("A-SCAN", "quick_scan", {"target": target})
-        
-        # 2. Exploit (Simulated)
-        exploit_resp = await dispatcher.dispatch_to_agent(
-            "A-PENTEST", 
-            "exploit_target", 
-            {
-                "target": target, 
-                "exploit_module": "exploit/multi/http/tomcat_mgr_upload",
-                "force_auth_dev": True # For demo purposes
-            }
-        )
-        
-        # 3. Report
-        report_resp = await dispatcher.dispatch_to_agent(
-            "A-REPORT",
-            "generate_report",
-            {
-                "type": "pentest",
-                "data": {"exploit_result": exploit_resp.details},
-                "title": f"Pentest Report: {target}"
-            }
-        )
-        
-        return DispatchResult(
-            workflow_id=self.name,
-            success=exploit_resp.status == ResponseStatus.SUCCESS,
-            responses=[scan_resp, exploit_resp, report_resp],
-            summary=f"Pentest execution finished. Exploit status: {exploit_resp.status}",
-            artifacts=report_resp.artifacts
-        )
+        return [
+            # 1. Scan
+            WorkflowNode(id="scan", agent_code="A-SCAN", intent="quick_scan", params={"target": target}),
+            # 2. Exploit (Simulated) - runs whatever the scan returned
+            WorkflowNode(
+                id="exploit",
+                agent_code="A-PENTEST",
+                intent="exploit_target",
+                params={
+                    "target": target,
+                    "exploit_module": "exploit/multi/http/tomcat_mgr_upload",
+                    "force_auth_dev": True # For demo purposes
+                },
+                depends_on=["scan"],
+                run_on_failure=True,
+            ),
+            # 3. Report
+            WorkflowNode(
+                id="report",
+                agent_code="A-REPORT",
+                intent="generate_report",
+                params={"type": "pentest", "title": f"Pentest Report: {target}"},
+                depends_on=["exploit"],
+                bindings={"data": lambda responses: {"exploit_result": responses["exploit"].details}},
+                run_on_failure=True,
+            ),
+        ]
+
+    def summarize(self, run: DagRun, params: Dict[str, Any]) -> Dict[str, Any]:
+        exploit_resp = run.responses["exploit"]
+        return {
+            "success": exploit_resp.status == ResponseStatus.SUCCESS,
+            "summary": f"Pentest execution finished. Exploit status: {exploit_resp.status}",
+            "artifacts": run.responses["report"].artifacts,
+        }
 
-class RemediationWorkflow(BaseWorkflow):
+class RemediationWorkflow(DagWorkflow):
     name = "remediation_plan"
     description = "Generate remediation plan from vulnerabilities"
     agents_involved = ["A-VULN", "A-DEFENSE", "A-REPORT"]
-    
-    async def execute(self, dispatcher, params: Dict[str, Any]) -> DispatchResult:
+
+    def build(self, params: Dict[str, Any]) -> List[WorkflowNode]:
         # 1. Get Vulns (Mock or from params)
         vulns = params.get("vulnerabilities", [{"id": "CVE-2023-1234", "severity": "HIGH"}])
-        
-        # 2. Create Plan
-        plan_resp = await dispatcher.dispatch_to_agent(
-            "A-DEFENSE",
-            "create_remediation_plan",
-            {"vulnerabilities": vulns}
-        )
-        
-        # 3. Report
-        report_resp = await dispatcher.dispatch_to_agent(
-            "A-REPORT",
-            "generate_report",
-            {
-                "type": "remediation",
-                "data": plan_resp.details,
-                "title": "Remediation Plan"
-            }
-        )
-        
-        return DispatchResult(
-            workflow_id=self.name,
-            success=True,
-            responses=[plan_resp, report_resp],
-            summary="Remediation plan generated successfully",
-            artifacts=report_resp.artifacts
-        )
+        return [
+            # 2. Create Plan
+            WorkflowNode(
+                id="plan",
+                agent_code="A-DEFENSE",
+                intent="create_remediation_plan",
+                params={"vulnerabilities": vulns},
+            ),
+            # 3. Report
+            WorkflowNode(
+                id="report",
+                agent_code="A-REPORT",
+                intent="generate_report",
+                params={"type": "remediation", "title": "Remediation Plan"},
+                depends_on=["plan"],
+                bindings={"data": "plan.details"},
+                run_on_failure=True,
+            ),
+        ]
+
+    def summarize(self, run: DagRun, params: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "success": True,
+            "summary": "Remediation plan generated successfully",
+            "artifacts": run.responses["report"].artifacts,
+        }
 
 # Register all
 register_workflow(NetworkAuditWorkflow())
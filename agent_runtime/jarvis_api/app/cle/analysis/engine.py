@@ -7,13 +7,12 @@ import logging
 import json
 from typing import List, Dict, Optional
 from pathlib import Path
-import asyncio
 from datetime import datetime
 import uuid
 
 from app.cle.models import ImprovementProposal, ProposalType, ImpactLevel, EffortLevel, ProposalStatus
 from app.cle.config import GAP_ANALYSIS_PROMPT, PROPOSAL_SCORING, PROPOSALS_DIR
-from app.services.ollama_client import JarvisOllamaClient
+from app.services.ollama_client import JarvisOllamaClient, PRIORITY_BACKGROUND
 from app.cle.qdrant_manager import CLEQdrantManager
 from app.routes.catalog import MOCK_ACTIONS, MOCK_SERVICES
 
@@ -54,13 +53,10 @@ class GapAnalyzer:
             logger.info("[Gap Analyzer] Analyzing gaps...")
             
             # Call LLM
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: self.ollama.chat(
-                    messages=[{"role": "user", "content": prompt}],
-                    model="llama3.1:8b-instruct-q4_K_M"
-                )
+            response = await self.ollama.achat(
+                messages=[{"role": "user", "content": prompt}],
+                model="llama3.1:8b-instruct-q4_K_M",
+                priority=PRIORITY_BACKGROUND,
             )
             
             if "error" in response:
@@ -3,6 +3,7 @@ JARVIS Continuous Learning Engine (CLE)
 Configuration and Constants
 """
 
+import os
 from typing import List, Dict
 from datetime import timedelta
 
@@ -103,6 +104,46 @@ MAX_WEB_ARTICLES_PER_CYCLE = 20
 MAX_GITHUB_REPOS_PER_CYCLE = 10
 MAX_YOUTUBE_VIDEOS_PER_CYCLE = 5
 
+# ============================================================================
+# CRAWLING
+# ============================================================================
+
+# Persistent crawl state (ETag / Last-Modified / SimHash per URL)
+CRAWL_FRONTIER_PATH = os.getenv("CLE_FRONTIER_PATH", "/opt/deco/agent_runtime/data/cle_frontier.sqlite3")
+
+# Per-domain politeness: token bucket of CRAWL_DOMAIN_RATE requests/s
+# (0.5 = one request every 2 seconds per domain, different domains in parallel)
+CRAWL_DOMAIN_RATE = float(os.getenv("CLE_CRAWL_DOMAIN_RATE", "0.5"))
+CRAWL_DOMAIN_BURST = int(os.getenv("CLE_CRAWL_DOMAIN_BURST", "1"))
+
+# Max pages fetched concurrently across all domains
+CRAWL_CONCURRENCY = int(os.getenv("CLE_CRAWL_CONCURRENCY", "8"))
+
+# SimHash bits that may differ for a page to count as unchanged
+CRAWL_SIMHASH_DISTANCE = int(os.getenv("CLE_CRAWL_SIMHASH_DISTANCE", "3"))
+
+# ============================================================================
+# INGESTION
+# ============================================================================
+
+# Concurrent workers per stage of IngestionPipeline.process_batch
+INGESTION_SUMMARIZE_WORKERS = int(os.getenv("CLE_SUMMARIZE_WORKERS", "3"))
+INGESTION_EMBED_WORKERS = int(os.getenv("CLE_EMBED_WORKERS", "1"))
+
+# Near-duplicate detection before summarization (MinHash + LSH)
+DEDUP_INDEX_PATH = os.getenv("CLE_DEDUP_PATH", "/opt/deco/agent_runtime/data/cle_dedup.sqlite3")
+DEDUP_THRESHOLD = float(os.getenv("CLE_DEDUP_THRESHOLD", "0.8"))  # estimated Jaccard
+DEDUP_NUM_PERM = 128
+DEDUP_BANDS = 16  # 16 bands x 8 rows: candidates from ~0.7 similarity
+DEDUP_MIN_WORDS = 50  # shorter texts are not deduplicated
+
+# Items embedded per request batch
+INGESTION_EMBED_BATCH = int(os.getenv("CLE_EMBED_BATCH", "8"))
+
+# Max Ollama calls in flight from ingestion, shared by both stages
+# (on top of the global OLLAMA_MAX_CONCURRENCY limit; ingestion runs at background priority)
+INGESTION_OLLAMA_BUDGET = int(os.getenv("CLE_OLLAMA_BUDGET", "2"))
+
 # ============================================================================
 # PATHS
 # ============================================================================
@@ -0,0 +1,172 @@
+"""
+Crawl Frontier for CLE
+Persistent per-URL crawl state so unchanged pages are not re-ingested
+every cycle:
+- ETag / Last-Modified for conditional GETs (304 -> unchanged)
+- SimHash of the extracted text (near-identical content -> unchanged)
+- Per-domain token bucket politeness instead of a global sleep
+"""
+
+import asyncio
+import hashlib
+import logging
+import re
+import time
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from app.cle.config import CRAWL_DOMAIN_BURST, CRAWL_DOMAIN_RATE, CRAWL_FRONTIER_PATH
+from app.services.sqlite_store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """64-bit SimHash over word shingles"""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < shingle_size:
+        shingles = [" ".join(words)] if words else []
+    else:
+        shingles = [" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+
+    weights = [0] * 64
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def domain_of(url: str) -> str:
+    return urlparse(url).netloc.lower().replace("www.", "")
+
+
+class CrawlFrontier(SQLiteStore):
+    """SQLite-backed crawl state keyed by URL"""
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS frontier (
+            url TEXT PRIMARY KEY,
+            domain TEXT NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            simhash TEXT,
+            last_fetched REAL,
+            last_changed REAL,
+            fetch_count INTEGER NOT NULL DEFAULT 0,
+            unchanged_count INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+    )
+
+    def __init__(self, path: str = CRAWL_FRONTIER_PATH):
+        super().__init__(path)
+
+    def get(self, url: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, simhash, last_fetched, last_changed FROM frontier WHERE url = ?", (url,)
+            ).fetchone()
+        if not row:
+            return None
+        return {
+            "etag": row[0],
+            "last_modified": row[1],
+            "simhash": int(row[2], 16) if row[2] else None,
+            "last_fetched": row[3],
+            "last_changed": row[4],
+        }
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        state = self.get(url)
+        headers = {}
+        if state and state["etag"]:
+            headers["If-None-Match"] = state["etag"]
+        if state and state["last_modified"]:
+            headers["If-Modified-Since"] = state["last_modified"]
+        return headers
+
+    def record_changed(self, url: str, etag: Optional[str], last_modified: Optional[str], fingerprint: int):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO frontier (url, domain, etag, last_modified, simhash, last_fetched, last_changed, fetch_count)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+                ON CONFLICT(url) DO UPDATE SET
+                    etag = excluded.etag,
+                    last_modified = excluded.last_modified,
+                    simhash = excluded.simhash,
+                    last_fetched = excluded.last_fetched,
+                    last_changed = excluded.last_changed,
+                    fetch_count = frontier.fetch_count + 1
+                """,
+                (url, domain_of(url), etag, last_modified, f"{fingerprint:016x}", now, now),
+            )
+
+    def record_unchanged(self, url: str, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        """304 or same SimHash: refresh validators, keep the fingerprint"""
+        with self._lock:
+            self._conn.execute(
+                """
+                UPDATE frontier SET
+                    etag = COALESCE(?, etag),
+                    last_modified = COALESCE(?, last_modified),
+                    last_fetched = ?,
+                    fetch_count = fetch_count + 1,
+                    unchanged_count = unchanged_count + 1
+                WHERE url = ?
+                """,
+                (etag, last_modified, time.time(), url),
+            )
+
+    def invalidate(self, urls):
+        """Forget validators and fingerprint (e.g. ingestion failed): next cycle fetches in full"""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE frontier SET etag = NULL, last_modified = NULL, simhash = NULL WHERE url = ?",
+                [(u,) for u in urls],
+            )
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            total, unchanged = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(unchanged_count), 0) FROM frontier"
+            ).fetchone()
+        return {"urls": total, "unchanged_fetches": unchanged}
+
+
+class DomainRateLimiter:
+    """Async token bucket per domain (CRAWL_DOMAIN_RATE requests/s, CRAWL_DOMAIN_BURST burst)"""
+
+    def __init__(self, rate: float = CRAWL_DOMAIN_RATE, burst: int = CRAWL_DOMAIN_BURST):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._buckets: Dict[str, list] = {}  # domain -> [tokens, last refill]
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def acquire(self, url: str):
+        domain = domain_of(url)
+        lock = self._locks.setdefault(domain, asyncio.Lock())
+        async with lock:
+            bucket = self._buckets.setdefault(domain, [float(self.burst), time.monotonic()])
+            while True:
+                now = time.monotonic()
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+                if bucket[0] >= 1:
+                    bucket[0] -= 1
+                    return
+                await asyncio.sleep((1 - bucket[0]) / self.rate)
@@ -3,6 +3,8 @@ Web Crawler for CLE
 Discovers and extracts cybersecurity content from allowed domains
 """
 
+import asyncio
+import httpx
 import requests
 from bs4 import BeautifulSoup
 from typing import List, Dict, Optional
@@ -12,8 +14,10 @@ import time
 from datetime import datetime
 import hashlib
 
-from app.cle.config import ALLOWED_DOMAINS, BLOCKED_KEYWORDS
+from app.cle.config import ALLOWED_DOMAINS, BLOCKED_KEYWORDS, CRAWL_CONCURRENCY, CRAWL_SIMHASH_DISTANCE
+from app.cle.discovery.frontier import CrawlFrontier, DomainRateLimiter, domain_of, hamming_distance, simhash
 from app.cle.models import KnowledgeArticle, SourceType
+from app.services.sqlite_store import open_store
 
 logger = logging.getLogger(__name__)
 
@@ -21,13 +25,20 @@ logger = logging.getLogger(__name__)
 class WebCrawler:
     """Crawls cybersecurity websites for learning content"""
     
-    def __init__(self, user_agent: str = "JarvisCLE/1.0 (Educational Bot)"):
-        self.session = requests.Session()
-        self.session.headers.update({
+    def __init__(self, user_agent: str = "JarvisCLE/1.0 (Educational Bot)", frontier: Optional[CrawlFrontier] = None):
+        self.headers = {
             "User-Agent": user_agent,
             "Accept": "text/html,application/xhtml+xml",
-        })
-        self.crawl_delay = 2  # Polite crawling: 2 seconds between requests
+        }
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.crawl_delay = 2  # Polite crawling: 2 seconds between requests to the same domain
+        self._last_request: Dict[str, float] = {}
+        self.frontier = frontier or self._open_frontier()
+    
+    @staticmethod
+    def _open_frontier() -> Optional[CrawlFrontier]:
+        return open_store(CrawlFrontier, "Crawl frontier unavailable, every URL will be fetched in full")
         
     def is_allowed_domain(self, url: str) -> bool:
         """Check if URL domain is in whitelist"""
@@ -53,13 +64,17 @@ class WebCrawler:
             return None
         
         try:
+            # Polite crawling: only wait if this domain was hit less than crawl_delay ago
+            domain = domain_of(url)
+            wait = self._last_request.get(domain, 0) + self.crawl_delay - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self._last_request[domain] = time.monotonic()
+            
             logger.info(f"Fetching: {url}")
             response = self.session.get(url, timeout=10)
             response.raise_for_status()
             
-            # Polite crawling delay
-            time.sleep(self.crawl_delay)
-            
             return response.text
             
         except requests.RequestException as e:
@@ -143,6 +158,9 @@ class WebCrawler:
             logger.warning(f"Content contains blocked keywords: {url}")
             return None
         
+        return self._build_article(url, extracted)
+    
+    def _build_article(self, url: str, extracted: Dict[str, str]) -> KnowledgeArticle:
         # Generate ID
         article_id = hashlib.md5(url.encode()).hexdigest()
         
@@ -151,6 +169,7 @@ class WebCrawler:
             id=article_id,
             source_type=SourceType.WEB,
             source_url=url,
+            crawl_url=url,
             title=extracted["title"],
             content=extracted["content"],
             summary="",  # Will be filled by summarization service
@@ -164,6 +183,86 @@ class WebCrawler:
         logger.info(f"Successfully crawled: {extracted['title']}")
         return article
     
+    async def crawl_urls(self, urls: List[str]) -> List[KnowledgeArticle]:
+        """
+        Incremental crawl of many URLs.
+        
+        Fetches concurrently (CRAWL_CONCURRENCY) with a per-domain token
+        bucket, sends conditional GETs using the frontier's ETag/Last-Modified
+        and drops pages whose extracted text has the same SimHash as last
+        cycle. Only new or changed pages are returned.
+        """
+        limiter = DomainRateLimiter()
+        semaphore = asyncio.Semaphore(max(1, CRAWL_CONCURRENCY))
+        counts = {"new": 0, "changed": 0, "unchanged": 0, "failed": 0}
+        
+        async def _crawl(client: httpx.AsyncClient, url: str) -> Optional[KnowledgeArticle]:
+            # Domain token before the global slot: URLs throttled by their own
+            # domain must not hold slots that other domains could use
+            if self._is_crawlable(url):
+                await limiter.acquire(url)
+            async with semaphore:
+                article, outcome = await self._crawl_incremental(client, url)
+            counts[outcome] += 1
+            return article
+        
+        async with httpx.AsyncClient(headers=self.headers, timeout=10, follow_redirects=True) as client:
+            results = await asyncio.gather(*(_crawl(client, url) for url in dict.fromkeys(urls)))
+        
+        logger.info(
+            f"[Crawler] {len(results)} URLs: {counts['new']} new, {counts['changed']} changed, "
+            f"{counts['unchanged']} unchanged, {counts['failed']} failed"
+        )
+        return [article for article in results if article]
+    
+    def _is_crawlable(self, url: str) -> bool:
+        return url.startswith("http") and self.is_allowed_domain(url)
+    
+    async def _crawl_incremental(self, client: httpx.AsyncClient, url: str):
+        """
+        Returns (article or None, outcome: new | changed | unchanged | failed).
+        The caller has already taken the domain's rate-limit token.
+        """
+        if not self._is_crawlable(url):
+            logger.warning(f"Domain not allowed: {url}")
+            return None, "failed"
+        
+        state = self.frontier.get(url) if self.frontier else None
+        headers = self.frontier.conditional_headers(url) if self.frontier else {}
+        
+        try:
+            logger.info(f"Fetching: {url}{' (conditional)' if headers else ''}")
+            response = await client.get(url, headers=headers)
+            if response.status_code == 304:
+                self.frontier.record_unchanged(url)
+                return None, "unchanged"
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.error(f"Error fetching {url}: {e}")
+            return None, "failed"
+        
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        
+        # HTML parsing is CPU-bound: keep it off the event loop
+        extracted = await asyncio.to_thread(self.extract_main_content, response.text, url)
+        if not extracted:
+            logger.warning(f"Could not extract content from {url}")
+            return None, "failed"
+        
+        fingerprint = simhash(extracted["content"])
+        if state and state["simhash"] is not None and hamming_distance(fingerprint, state["simhash"]) <= CRAWL_SIMHASH_DISTANCE:
+            self.frontier.record_unchanged(url, etag, last_modified)
+            return None, "unchanged"
+        
+        if self.contains_blocked_keywords(extracted["content"]):
+            logger.warning(f"Content contains blocked keywords: {url}")
+            return None, "failed"
+        
+        if self.frontier:
+            self.frontier.record_changed(url, etag, last_modified, fingerprint)
+        return self._build_article(url, extracted), ("changed" if state else "new")
+    
     def _extract_tags(self, url: str) -> List[str]:
         """Extract tags from URL domain"""
         domain = urlparse(url).netloc.lower()
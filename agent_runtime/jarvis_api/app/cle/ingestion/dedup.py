@@ -0,0 +1,197 @@
+"""
+CLE Near-Duplicate Detection
+MinHash signatures over word shingles plus a persistent LSH index, so the
+same advisory syndicated across several sites is summarized and embedded once.
+Skipped copies are recorded as provenance links to the canonical item.
+"""
+
+import hashlib
+import logging
+import random
+import re
+import time
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from app.cle.config import DEDUP_BANDS, DEDUP_INDEX_PATH, DEDUP_MIN_WORDS, DEDUP_NUM_PERM, DEDUP_THRESHOLD
+from app.services.sqlite_store import SQLiteStore, open_store
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+class MinHasher:
+    """MinHash with universal hashing (a*x + b mod p) over 32-bit shingle hashes"""
+
+    def __init__(self, num_perm: int = DEDUP_NUM_PERM, shingle_size: int = 5, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = random.Random(seed)
+        self._perms = [(rng.randint(1, _MERSENNE_PRIME - 1), rng.randint(0, _MERSENNE_PRIME - 1)) for _ in range(num_perm)]
+
+    def shingles(self, text: str) -> set:
+        words = _WORD_RE.findall(text.lower())
+        size = self.shingle_size
+        if len(words) <= size:
+            return {" ".join(words)} if words else set()
+        return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+    def signature(self, text: str) -> Optional[List[int]]:
+        shingles = self.shingles(text)
+        if not shingles:
+            return None
+        hashes = [
+            int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "big")
+            for s in shingles
+        ]
+        return [
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self._perms
+        ]
+
+
+def estimated_jaccard(sig_a: List[int], sig_b: List[int]) -> float:
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+
+class DedupIndex(SQLiteStore):
+    """Persistent LSH index (SQLite): signatures, band buckets and provenance links"""
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS signatures (
+            item_id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            source_url TEXT,
+            signature BLOB NOT NULL,
+            created_at REAL NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS lsh_buckets (
+            kind TEXT NOT NULL,
+            band INTEGER NOT NULL,
+            bucket TEXT NOT NULL,
+            item_id TEXT NOT NULL,
+            PRIMARY KEY (kind, band, bucket, item_id)
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_lsh_item ON lsh_buckets (item_id)",
+        """
+        CREATE TABLE IF NOT EXISTS provenance (
+            duplicate_id TEXT NOT NULL,
+            duplicate_url TEXT,
+            canonical_id TEXT NOT NULL,
+            similarity REAL NOT NULL,
+            seen_at REAL NOT NULL,
+            PRIMARY KEY (duplicate_id, canonical_id)
+        )
+        """,
+    )
+
+    def __init__(
+        self,
+        path: str = DEDUP_INDEX_PATH,
+        threshold: float = DEDUP_THRESHOLD,
+        num_perm: int = DEDUP_NUM_PERM,
+        bands: int = DEDUP_BANDS,
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm)
+        super().__init__(path)
+
+    def _buckets(self, signature: List[int]) -> List[Tuple[int, str]]:
+        buckets = []
+        for band in range(self.bands):
+            chunk = signature[band * self.rows:(band + 1) * self.rows]
+            digest = hashlib.md5(array("I", chunk).tobytes()).hexdigest()[:16]
+            buckets.append((band, digest))
+        return buckets
+
+    def find_duplicate(self, kind: str, item_id: str, signature: List[int]) -> Optional[Tuple[str, float]]:
+        """Best indexed item of the same kind with estimated Jaccard >= threshold (itself excluded)"""
+        with self._lock:
+            candidates = set()
+            for band, bucket in self._buckets(signature):
+                for (candidate,) in self._conn.execute(
+                    "SELECT item_id FROM lsh_buckets WHERE kind = ? AND band = ? AND bucket = ?", (kind, band, bucket)
+                ):
+                    if candidate != item_id:
+                        candidates.add(candidate)
+            best = None
+            for candidate in candidates:
+                row = self._conn.execute("SELECT signature FROM signatures WHERE item_id = ?", (candidate,)).fetchone()
+                if not row:
+                    continue
+                stored = array("I")
+                stored.frombytes(row[0])
+                similarity = estimated_jaccard(signature, stored.tolist())
+                if similarity >= self.threshold and (best is None or similarity > best[1]):
+                    best = (candidate, similarity)
+        return best
+
+    def add(self, kind: str, item_id: str, source_url: str, signature: List[int]):
+        """Index (or re-index, if the content changed) an item"""
+        with self._lock, self._transaction():
+            self._conn.execute("DELETE FROM lsh_buckets WHERE item_id = ?", (item_id,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO signatures (item_id, kind, source_url, signature, created_at) VALUES (?, ?, ?, ?, ?)",
+                (item_id, kind, source_url, array("I", signature).tobytes(), time.time()),
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO lsh_buckets (kind, band, bucket, item_id) VALUES (?, ?, ?, ?)",
+                [(kind, band, bucket, item_id) for band, bucket in self._buckets(signature)],
+            )
+
+    def record_duplicate(self, duplicate_id: str, duplicate_url: str, canonical_id: str, similarity: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO provenance (duplicate_id, duplicate_url, canonical_id, similarity, seen_at) VALUES (?, ?, ?, ?, ?)",
+                (duplicate_id, duplicate_url, canonical_id, similarity, time.time()),
+            )
+
+    def provenance(self, canonical_id: str) -> List[Dict]:
+        """Copies of a canonical item seen elsewhere"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT duplicate_url, similarity, seen_at FROM provenance WHERE canonical_id = ? ORDER BY seen_at",
+                (canonical_id,),
+            ).fetchall()
+        return [{"url": url, "similarity": round(sim, 3), "seen_at": seen} for url, sim, seen in rows]
+
+    def remove(self, item_ids: List[str]):
+        """Drop items whose ingestion failed so a later copy is not skipped against them"""
+        with self._lock:
+            self._conn.executemany("DELETE FROM lsh_buckets WHERE item_id = ?", [(i,) for i in item_ids])
+            self._conn.executemany("DELETE FROM signatures WHERE item_id = ?", [(i,) for i in item_ids])
+            # Their copies were never ingested either: no provenance to keep
+            self._conn.executemany("DELETE FROM provenance WHERE canonical_id = ?", [(i,) for i in item_ids])
+
+    def dedup(self, kind: str, item_id: str, source_url: str, text: str) -> Optional[Tuple[str, float]]:
+        """
+        Check and index in one step.
+        Returns (canonical_id, similarity) if the item is a near-duplicate, else None
+        (the item is then indexed as a new canonical).
+        """
+        if len(_WORD_RE.findall(text)) < DEDUP_MIN_WORDS:
+            return None
+        signature = self.hasher.signature(text)
+        if signature is None:
+            return None
+        match = self.find_duplicate(kind, item_id, signature)
+        if match:
+            self.record_duplicate(item_id, source_url, *match)
+            return match
+        self.add(kind, item_id, source_url, signature)
+        return None
+
+
+def open_dedup_index() -> Optional[DedupIndex]:
+    return open_store(DedupIndex, "[Dedup] Index unavailable, near-duplicate detection disabled")
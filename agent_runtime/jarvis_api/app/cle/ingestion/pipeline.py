@@ -3,15 +3,25 @@ CLE Ingestion Pipeline - Phase 3
 Text processing, summarization, and RAG insertion
 """
 
+import asyncio
 import logging
 import json
-from typing import Dict, List, Optional
-import asyncio
+import time
+from typing import Callable, Dict, List, Optional, Tuple
 
 from app.cle.models import KnowledgeArticle, KnowledgeGitHub, KnowledgeYouTube
-from app.cle.config import SUMMARIZATION_PROMPT
-from app.services.ollama_client import JarvisOllamaClient
+from app.cle.config import (
+    INGESTION_EMBED_BATCH,
+    INGESTION_EMBED_WORKERS,
+    INGESTION_OLLAMA_BUDGET,
+    INGESTION_SUMMARIZE_WORKERS,
+    SUMMARIZATION_PROMPT,
+)
+from app.services.embedding_service import EmbeddingService
+from app.services.ollama_client import JarvisOllamaClient, PRIORITY_BACKGROUND
+from app.services.semantic_cache import invalidate_knowledge
 from app.cle.qdrant_manager import CLEQdrantManager
+from app.cle.ingestion.dedup import DedupIndex, open_dedup_index
 
 logger = logging.getLogger(__name__)
 
@@ -38,14 +48,11 @@ class ContentSummarizer:
             
             logger.info(f"[Summarizer] Processing {source_type}...")
             
-            # Call LLM
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: self.ollama.chat(
-                    messages=[{"role": "user", "content": prompt}],
-                    model="llama3.1:8b-instruct-q4_K_M"
-                )
+            # Call LLM (prioridad baja: el chat interactivo pasa primero)
+            response = await self.ollama.achat(
+                messages=[{"role": "user", "content": prompt}],
+                model="llama3.1:8b-instruct-q4_K_M",
+                priority=PRIORITY_BACKGROUND,
             )
             
             if "error" in response:
@@ -80,31 +87,41 @@ class ContentSummarizer:
 
 
 class EmbeddingGenerator:
-    """Generates embeddings for knowledge items"""
+    """Generates embeddings for knowledge items (cached by content hash)"""
     
     def __init__(self, ollama_client: Optional[JarvisOllamaClient] = None):
         self.ollama = ollama_client or JarvisOllamaClient()
+        self.service = EmbeddingService(self.ollama)
     
     async def generate_embedding(self, text: str) -> Optional[List[float]]:
         """Generate embedding vector for text"""
+        return (await self.generate_embeddings([text]))[0]
+    
+    async def generate_embeddings(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Generate embedding vectors for a batch of texts (same order, None on failure)"""
         try:
             # Truncate text for embedding
-            truncated_text = text[:2000] if len(text) > 2000 else text
+            truncated = [text[:2000] for text in texts]
             
-            loop = asyncio.get_event_loop()
-            embedding = await loop.run_in_executor(
-                None,
-                lambda: self.ollama.generate_embedding(truncated_text)
-            )
+            embeddings = await self.service.embed_many(truncated, priority=PRIORITY_BACKGROUND)
             
-            if not embedding:
-                raise Exception("Empty embedding returned")
+            failed = sum(1 for e in embeddings if not e)
+            if failed:
+                logger.error(f"[Embedding] {failed}/{len(texts)} embeddings failed")
             
-            return embedding
+            return embeddings
             
         except Exception as e:
-            logger.error(f"[Embedding] Error generating embedding: {e}")
-            return None
+            logger.error(f"[Embedding] Error generating embeddings: {e}")
+            return [None] * len(texts)
+
+
+# kind -> (result key prefix, content attribute, summarizer source type)
+_KINDS = {
+    "article": ("articles", "content", "article"),
+    "repo": ("repos", "readme_content", "github"),
+    "video": ("videos", "transcript", "youtube"),
+}
 
 
 class IngestionPipeline:
@@ -113,120 +130,144 @@ class IngestionPipeline:
     def __init__(
         self,
         ollama_client: Optional[JarvisOllamaClient] = None,
-        qdrant_manager: Optional[CLEQdrantManager] = None
+        qdrant_manager: Optional[CLEQdrantManager] = None,
+        dedup_index: Optional[DedupIndex] = None
     ):
         self.summarizer = ContentSummarizer(ollama_client)
         self.embedding_generator = EmbeddingGenerator(ollama_client)
         self.qdrant = qdrant_manager or CLEQdrantManager()
+        self.dedup_index = dedup_index or open_dedup_index()
+        # Ids skipped as near-duplicates in the last process_batch (only those
+        # whose canonical item is indexed: the others must be crawled again)
+        self.last_duplicates: List[str] = []
     
-    async def process_article(self, article: KnowledgeArticle) -> bool:
-        """
-        Process a web article: summarize, embed, store
-        
-        Returns:
-            True if successful, False otherwise
-        """
+    # ------------------------------------------------------------------
+    # Per-item steps
+    # ------------------------------------------------------------------
+    
+    @staticmethod
+    def _label(kind: str, item) -> str:
+        return item.repo_name if kind == "repo" else item.title
+    
+    async def _summarize_item(self, kind: str, item):
+        """Step 1: summary, concepts and use cases (one LLM call)"""
+        _, content_attr, source_type = _KINDS[kind]
+        summary_data = await self.summarizer.summarize(getattr(item, content_attr), source_type)
+        item.summary = summary_data["summary"]
+        item.concepts = summary_data["concepts"]
+        item.use_cases_jarvis = summary_data["jarvis_use_cases"]
+    
+    @staticmethod
+    def _embedding_text(kind: str, item) -> str:
+        """Step 2 input: title + summary + concepts"""
+        concepts = ' '.join(item.concepts)
+        if kind == "repo":
+            return f"{item.repo_name}\n{item.description}\n\n{item.summary}\n\n{concepts}"
+        if kind == "video":
+            return f"{item.title}\n{item.channel}\n\n{item.summary}\n\n{concepts}"
+        return f"{item.title}\n\n{item.summary}\n\n{concepts}"
+    
+    def _store(self, kind: str, item):
+        """Step 3: queue the point in Qdrant"""
+        if kind == "repo":
+            self.qdrant.store_github_repo(item)
+        elif kind == "video":
+            self.qdrant.store_youtube_video(item)
+        else:
+            self.qdrant.store_article(item)
+    
+    async def _process_item(self, kind: str, item) -> bool:
+        """Summarize, embed and store a single item"""
+        label = self._label(kind, item)
         try:
-            logger.info(f"[Ingestion] Processing article: {article.title}")
-            
-            # Step 1: Summarize
-            summary_data = await self.summarizer.summarize(article.content, "article")
-            article.summary = summary_data["summary"]
-            article.concepts = summary_data["concepts"]
-            article.use_cases_jarvis = summary_data["jarvis_use_cases"]
+            logger.info(f"[Ingestion] Processing {kind}: {label}")
             
-            # Step 2: Generate embedding
-            # Combine title + summary for embedding
-            text_for_embedding = f"{article.title}\n\n{article.summary}\n\n{' '.join(article.concepts)}"
-            embedding = await self.embedding_generator.generate_embedding(text_for_embedding)
+            await self._summarize_item(kind, item)
             
+            embedding = await self.embedding_generator.generate_embedding(self._embedding_text(kind, item))
             if not embedding:
-                logger.error(f"[Ingestion] Failed to generate embedding for article: {article.title}")
+                logger.error(f"[Ingestion] Failed to generate embedding for {kind}: {label}")
                 return False
+            item.embedding = embedding
             
-            article.embedding = embedding
-            
-            # Step 3: Store in Qdrant
-            self.qdrant.store_article(article)
+            self._store(kind, item)
+            if item.id in self.qdrant.flush():
+                logger.error(f"[Ingestion] Failed to store {kind}: {label}")
+                item.embedding = None
+                return False
             
-            logger.info(f"[Ingestion] Successfully processed article: {article.title}")
+            logger.info(f"[Ingestion] Successfully processed {kind}: {label}")
             return True
             
         except Exception as e:
-            logger.error(f"[Ingestion] Error processing article: {e}")
+            logger.error(f"[Ingestion] Error processing {kind}: {e}")
             return False
     
+    async def process_article(self, article: KnowledgeArticle) -> bool:
+        """
+        Process a web article: summarize, embed, store
+        
+        Returns:
+            True if successful, False otherwise
+        """
+        return await self._process_item("article", article)
+    
     async def process_github_repo(self, repo: KnowledgeGitHub) -> bool:
         """Process a GitHub repository: summarize, embed, store"""
-        try:
-            logger.info(f"[Ingestion] Processing repo: {repo.repo_name}")
-            
-            # Summarize
-            summary_data = await self.summarizer.summarize(repo.readme_content, "github")
-            repo.summary = summary_data["summary"]
-            repo.concepts = summary_data["concepts"]
-            repo.use_cases_jarvis = summary_data["jarvis_use_cases"]
-            
-            # Generate embedding
-            text_for_embedding = f"{repo.repo_name}\n{repo.description}\n\n{repo.summary}\n\n{' '.join(repo.concepts)}"
-            embedding = await self.embedding_generator.generate_embedding(text_for_embedding)
-            
-            if not embedding:
-                logger.error(f"[Ingestion] Failed to generate embedding for repo: {repo.repo_name}")
-                return False
-            
-            repo.embedding = embedding
-            
-            # Store
-            self.qdrant.store_github_repo(repo)
-            
-            logger.info(f"[Ingestion] Successfully processed repo: {repo.repo_name}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"[Ingestion] Error processing repo: {e}")
-            return False
+        return await self._process_item("repo", repo)
     
     async def process_youtube_video(self, video: KnowledgeYouTube) -> bool:
         """Process a YouTube video: summarize, embed, store"""
-        try:
-            logger.info(f"[Ingestion] Processing video: {video.title}")
-            
-            # Summarize
-            summary_data = await self.summarizer.summarize(video.transcript, "youtube")
-            video.summary = summary_data["summary"]
-            video.concepts = summary_data["concepts"]
-            video.use_cases_jarvis = summary_data["jarvis_use_cases"]
-            
-            # Generate embedding
-            text_for_embedding = f"{video.title}\n{video.channel}\n\n{video.summary}\n\n{' '.join(video.concepts)}"
-            embedding = await self.embedding_generator.generate_embedding(text_for_embedding)
-            
-            if not embedding:
-                logger.error(f"[Ingestion] Failed to generate embedding for video: {video.title}")
-                return False
-            
-            video.embedding = embedding
-            
-            # Store
-            self.qdrant.store_youtube_video(video)
-            
-            logger.info(f"[Ingestion] Successfully processed video: {video.title}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"[Ingestion] Error processing video: {e}")
-            return False
+        return await self._process_item("video", video)
+    
+    # ------------------------------------------------------------------
+    # Batch
+    # ------------------------------------------------------------------
+    
+    def _drop_duplicates(self, items: List[tuple]) -> Tuple[List[tuple], Dict[str, str]]:
+        """
+        Dedup stage: keep the first copy of near-identical content (indexed items included)
+        
+        Returns the kept items and duplicate id -> canonical id.
+        """
+        if not self.dedup_index:
+            return items, {}
+        kept, duplicates = [], {}
+        for kind, item in items:
+            content = getattr(item, _KINDS[kind][1]) or ""
+            try:
+                match = self.dedup_index.dedup(kind, item.id, str(getattr(item, "source_url", "")), content)
+            except Exception as e:
+                logger.error(f"[Dedup] Error checking {kind} {self._label(kind, item)}: {e}")
+                match = None
+            if match:
+                logger.info(
+                    f"[Dedup] Skipping {kind} {self._label(kind, item)}: "
+                    f"near-duplicate of {match[0]} (similarity {match[1]:.2f})"
+                )
+                duplicates[item.id] = match[0]
+            else:
+                kept.append((kind, item))
+        return kept, duplicates
     
     async def process_batch(
         self,
         articles: List[KnowledgeArticle] = None,
         repos: List[KnowledgeGitHub] = None,
-        videos: List[KnowledgeYouTube] = None
+        videos: List[KnowledgeYouTube] = None,
+        progress_callback: Optional[Callable[[int, int, Dict[str, int]], None]] = None,
     ) -> Dict[str, int]:
         """
         Process a batch of knowledge items
         
+        Near-duplicates of already indexed content are dropped first (no LLM
+        call), then two stages connected by queues:
+        - summarize: INGESTION_SUMMARIZE_WORKERS concurrent LLM calls
+        - embed + store: INGESTION_EMBED_WORKERS workers, up to
+          INGESTION_EMBED_BATCH items per embedding request
+        Both stages share INGESTION_OLLAMA_BUDGET Ollama slots. A failed item
+        is counted and does not stop the rest of the batch.
+        
         Returns:
             Dict with counts of successful/failed items
         """
@@ -237,33 +278,145 @@ class IngestionPipeline:
             "repos_failed": 0,
             "videos_success": 0,
             "videos_failed": 0,
+            "duplicates_skipped": 0,
         }
         
-        # Process articles
-        if articles:
-            for article in articles:
-                success = await self.process_article(article)
-                if success:
-                    results["articles_success"] += 1
-                else:
-                    results["articles_failed"] += 1
+        items = (
+            [("article", a) for a in articles or []]
+            + [("repo", r) for r in repos or []]
+            + [("video", v) for v in videos or []]
+        )
+        
+        # MinHash/LSH is CPU-bound: keep it off the event loop
+        items, duplicates = await asyncio.to_thread(self._drop_duplicates, items)
+        self.last_duplicates = list(duplicates)
+        results["duplicates_skipped"] = len(duplicates)
+        
+        total = len(items)
+        if not total:
+            return results
+        
+        budget = asyncio.Semaphore(max(1, INGESTION_OLLAMA_BUDGET))
+        to_summarize: asyncio.Queue = asyncio.Queue()
+        to_embed: asyncio.Queue = asyncio.Queue(maxsize=max(1, INGESTION_EMBED_BATCH) * 2)
+        for entry in items:
+            to_summarize.put_nowait(entry)
+        
+        done = 0
+        started = time.monotonic()
+        
+        def finish(kind: str, item, ok: bool):
+            nonlocal done
+            prefix = _KINDS[kind][0]
+            results[f"{prefix}_success" if ok else f"{prefix}_failed"] += 1
+            done += 1
+            logger.info(
+                f"[Ingestion] Progress {done}/{total} ({kind} {'ok' if ok else 'failed'}: {self._label(kind, item)})"
+            )
+            if progress_callback:
+                try:
+                    progress_callback(done, total, dict(results))
+                except Exception as e:
+                    logger.error(f"[Ingestion] Progress callback error: {e}")
+        
+        async def summarize_worker():
+            while True:
+                try:
+                    kind, item = to_summarize.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    async with budget:
+                        await self._summarize_item(kind, item)
+                except Exception as e:
+                    logger.error(f"[Ingestion] Error summarizing {kind} {self._label(kind, item)}: {e}")
+                    finish(kind, item, False)
+                    continue
+                await to_embed.put((kind, item))
+        
+        async def embed_worker():
+            stopping = False
+            while not stopping:
+                entry = await to_embed.get()
+                if entry is None:
+                    return
+                batch = [entry]
+                while len(batch) < INGESTION_EMBED_BATCH:
+                    try:
+                        entry = to_embed.get_nowait()
+                    except asyncio.QueueEmpty:
+                        break
+                    if entry is None:
+                        stopping = True
+                        break
+                    batch.append(entry)
+                
+                try:
+                    async with budget:
+                        embeddings = await self.embedding_generator.generate_embeddings(
+                            [self._embedding_text(kind, item) for kind, item in batch]
+                        )
+                except Exception as e:
+                    logger.error(f"[Ingestion] Error embedding batch of {len(batch)}: {e}")
+                    embeddings = [None] * len(batch)
+                
+                for (kind, item), embedding in zip(batch, embeddings):
+                    if not embedding:
+                        logger.error(f"[Ingestion] Failed to generate embedding for {kind}: {self._label(kind, item)}")
+                        finish(kind, item, False)
+                        continue
+                    item.embedding = embedding
+                    try:
+                        self._store(kind, item)
+                        finish(kind, item, True)
+                    except Exception as e:
+                        logger.error(f"[Ingestion] Error storing {kind} {self._label(kind, item)}: {e}")
+                        finish(kind, item, False)
+        
+        summarizers = [asyncio.create_task(summarize_worker()) for _ in range(max(1, min(INGESTION_SUMMARIZE_WORKERS, total)))]
+        embedders = [asyncio.create_task(embed_worker()) for _ in range(max(1, INGESTION_EMBED_WORKERS))]
+        try:
+            await asyncio.gather(*summarizers)
+            # One stop marker per embed worker, after all summaries are queued
+            for _ in embedders:
+                await to_embed.put(None)
+            await asyncio.gather(*embedders)
+        finally:
+            for task in summarizers + embedders:
+                if not task.done():
+                    task.cancel()
+            # Send the buffered Qdrant points of this batch
+            failed_store = self.qdrant.flush()
+        
+        # Queued points that Qdrant rejected were never stored: count them as
+        # failed and drop the embedding so the frontier and dedup bookkeeping
+        # below handles them like any other failed item
+        for kind, item in items:
+            if item.embedding and item.id in failed_store:
+                logger.error(f"[Ingestion] Failed to store {kind}: {self._label(kind, item)}")
+                item.embedding = None
+                prefix = _KINDS[kind][0]
+                results[f"{prefix}_success"] -= 1
+                results[f"{prefix}_failed"] += 1
+        
+        logger.info(f"[Ingestion] Batch of {total} items done in {time.monotonic() - started:.1f}s: {results}")
         
-        # Process repos
-        if repos:
-            for repo in repos:
-                success = await self.process_github_repo(repo)
-                if success:
-                    results["repos_success"] += 1
-                else:
-                    results["repos_failed"] += 1
+        # Failed items must not shadow a later copy of the same content
+        failed_ids = {item.id for _, item in items if not item.embedding}
+        if self.dedup_index and failed_ids:
+            try:
+                self.dedup_index.remove(list(failed_ids))
+            except Exception as e:
+                logger.error(f"[Dedup] Error removing failed items: {e}")
+            # Copies skipped against a canonical that failed in this batch were
+            # never ingested: leave them out so their pages are fetched again
+            orphaned = {d for d, canonical in duplicates.items() if canonical in failed_ids}
+            if orphaned:
+                logger.info(f"[Dedup] {len(orphaned)} duplicates of failed items will be retried next cycle")
+                self.last_duplicates = [d for d in self.last_duplicates if d not in orphaned]
         
-        # Process videos
-        if videos:
-            for video in videos:
-                success = await self.process_youtube_video(video)
-                if success:
-                    results["videos_success"] += 1
-                else:
-                    results["videos_failed"] += 1
+        # New knowledge: cached answers may be outdated
+        if results["articles_success"] or results["repos_success"] or results["videos_success"]:
+            invalidate_knowledge()
         
         return results
@@ -57,6 +57,7 @@ class KnowledgeArticle(BaseModel):
     id: str
     source_type: Literal[SourceType.WEB] = SourceType.WEB
     source_url: HttpUrl
+    crawl_url: Optional[str] = None  # URL as crawled (frontier key); source_url is normalized
     title: str
     content: str
     summary: str
@@ -4,16 +4,41 @@ Handles creation and management of CLE knowledge collections
 """
 
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
-from typing import List, Dict, Any
+from qdrant_client.models import FieldCondition, Filter, MatchAny, MatchValue, PointStruct
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Set
 import uuid
 import logging
 
 from app.cle.config import CLE_COLLECTIONS
 from app.cle.models import KnowledgeArticle, KnowledgeGitHub, KnowledgeYouTube, SourceType
+from app.services.document_store import hydrate_payloads
+from app.services.vector_schema import search_params
+from app.services.vector_writer import QdrantBulkWriter
 
 logger = logging.getLogger(__name__)
 
+# Reciprocal-rank fusion constant (standard value from Cormack et al.)
+RRF_K = 60
+
+# Shared pool for the per-collection queries of a federated search
+_search_executor = ThreadPoolExecutor(max_workers=len(CLE_COLLECTIONS) * 2, thread_name_prefix="cle-search")
+
+
+def build_filter(filters: Optional[Dict[str, Any]]) -> Optional[Filter]:
+    """{"field": value | [values]} -> Qdrant Filter (all conditions must match)"""
+    if not filters:
+        return None
+    conditions = []
+    for field, value in filters.items():
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple, set)):
+            conditions.append(FieldCondition(key=field, match=MatchAny(any=list(value))))
+        else:
+            conditions.append(FieldCondition(key=field, match=MatchValue(value=value)))
+    return Filter(must=conditions) if conditions else None
+
 
 class CLEQdrantManager:
     """Manages Qdrant collections for CLE knowledge base"""
@@ -21,6 +46,7 @@ class CLEQdrantManager:
     def __init__(self, host: str = "localhost", port: int = 6333):
         self.client = QdrantClient(host=host, port=port)
         self.vector_size = 4096  # Llama 3.1 embeddings
+        self.writer = QdrantBulkWriter(self.client, vector_size=self.vector_size)
     
     def setup_collections(self):
         """Create all CLE collections if they don't exist"""
@@ -32,23 +58,9 @@ class CLEQdrantManager:
                 logger.error(f"[CLE] Error setting up collection '{collection_name}': {e}")
     
     def _ensure_collection(self, collection_name: str, vector_size: int):
-        """Create collection if it doesn't exist"""
+        """Create collection if it doesn't exist (cached after the first check)"""
         try:
-            collections = self.client.get_collections().collections
-            exists = any(c.name == collection_name for c in collections)
-            
-            if not exists:
-                self.client.create_collection(
-                    collection_name=collection_name,
-                    vectors_config=VectorParams(
-                        size=vector_size,
-                        distance=Distance.COSINE
-                    )
-                )
-                logger.info(f"[CLE Qdrant] Created collection: {collection_name}")
-            else:
-                logger.debug(f"[CLE Qdrant] Collection exists: {collection_name}")
-                
+            self.writer.ensure_collection(collection_name, vector_size)
         except Exception as e:
             logger.error(f"[CLE Qdrant] Error ensuring collection '{collection_name}': {e}")
             raise
@@ -65,7 +77,7 @@ class CLEQdrantManager:
                 "source_type": article.source_type.value,
                 "source_url": str(article.source_url),
                 "title": article.title,
-                "content": article.content[:2000],  # Truncate for payload
+                "content": article.content,  # Moved to the document store by the writer
                 "summary": article.summary,
                 "concepts": article.concepts,
                 "use_cases_jarvis": article.use_cases_jarvis,
@@ -75,11 +87,8 @@ class CLEQdrantManager:
             }
         )
         
-        self.client.upsert(
-            collection_name="cle_articles",
-            points=[point]
-        )
-        logger.info(f"[CLE] Stored article: {article.title}")
+        self.writer.add("cle_articles", [point])
+        logger.info(f"[CLE] Queued article: {article.title}")
     
     def store_github_repo(self, repo: KnowledgeGitHub):
         """Store a GitHub repo in Qdrant"""
@@ -97,7 +106,7 @@ class CLEQdrantManager:
                 "stars": repo.stars,
                 "language": repo.language,
                 "topics": repo.topics,
-                "readme_content": repo.readme_content[:2000],
+                "readme_content": repo.readme_content,
                 "summary": repo.summary,
                 "concepts": repo.concepts,
                 "use_cases_jarvis": repo.use_cases_jarvis,
@@ -107,11 +116,8 @@ class CLEQdrantManager:
             }
         )
         
-        self.client.upsert(
-            collection_name="cle_github",
-            points=[point]
-        )
-        logger.info(f"[CLE] Stored GitHub repo: {repo.repo_name}")
+        self.writer.add("cle_github", [point])
+        logger.info(f"[CLE] Queued GitHub repo: {repo.repo_name}")
     
     def store_youtube_video(self, video: KnowledgeYouTube):
         """Store a YouTube video transcript in Qdrant"""
@@ -128,7 +134,7 @@ class CLEQdrantManager:
                 "title": video.title,
                 "channel": video.channel,
                 "duration": video.duration,
-                "transcript": video.transcript[:2000],
+                "transcript": video.transcript,
                 "summary": video.summary,
                 "concepts": video.concepts,
                 "use_cases_jarvis": video.use_cases_jarvis,
@@ -138,44 +144,81 @@ class CLEQdrantManager:
             }
         )
         
-        self.client.upsert(
-            collection_name="cle_youtube",
-            points=[point]
-        )
-        logger.info(f"[CLE] Stored YouTube video: {video.title}")
+        self.writer.add("cle_youtube", [point])
+        logger.info(f"[CLE] Queued YouTube video: {video.title}")
+    
+    def flush(self) -> Set[str]:
+        """Send buffered points to Qdrant; returns the ids whose upsert failed"""
+        return self.writer.flush()
     
     def search_knowledge(
         self,
         query_vector: List[float],
         collection_name: str = None,
-        limit: int = 10
+        limit: int = 10,
+        filters: Optional[Dict[str, Any]] = None,
+        score_threshold: Optional[float] = None,
+        fusion: str = "rrf",
     ) -> List[Dict[str, Any]]:
-        """Search CLE knowledge base"""
+        """
+        Federated search over the CLE collections.
+
+        The per-collection queries run concurrently, so latency is close to a
+        single-collection query. Results are merged with reciprocal-rank fusion
+        (cosine scores are not comparable across collections); fusion="score"
+        keeps the previous raw-score ordering.
+
+        filters: payload conditions, e.g. {"source_type": "github", "tags": ["recon", "osint"]}
+        (a list matches any of the values).
+        """
         # If no collection specified, search all
         collections_to_search = [collection_name] if collection_name else list(CLE_COLLECTIONS.keys())
-        
-        all_results = []
-        for coll in collections_to_search:
+        query_filter = build_filter(filters)
+        params = search_params(self.writer.quantization)
+
+        def _search(coll: str):
+            return self.client.search(
+                collection_name=coll,
+                query_vector=query_vector,
+                query_filter=query_filter,
+                limit=limit,
+                score_threshold=score_threshold,
+                search_params=params,
+            )
+
+        ranked: Dict[str, List[Any]] = {}
+        if len(collections_to_search) == 1:
+            futures = {collections_to_search[0]: None}
+        else:
+            futures = {coll: _search_executor.submit(_search, coll) for coll in collections_to_search}
+        for coll, future in futures.items():
             try:
-                results = self.client.search(
-                    collection_name=coll,
-                    query_vector=query_vector,
-                    limit=limit
-                )
-                all_results.extend([
-                    {
-                        "collection": coll,
-                        "score": r.score,
-                        "payload": r.payload
-                    }
-                    for r in results
-                ])
+                ranked[coll] = future.result() if future is not None else _search(coll)
             except Exception as e:
                 logger.error(f"[CLE] Error searching collection '{coll}': {e}")
-        
-        # Sort by relevance score
-        all_results.sort(key=lambda x: x["score"], reverse=True)
-        return all_results[:limit]
+
+        all_results = []
+        for coll, results in ranked.items():
+            for rank, r in enumerate(results, start=1):
+                all_results.append({
+                    "collection": coll,
+                    "score": r.score,
+                    "rrf_score": 1.0 / (RRF_K + rank),
+                    "payload": r.payload or {},
+                })
+
+        if fusion == "rrf":
+            # Same rank in several collections: raw score breaks the tie
+            all_results.sort(key=lambda x: (x["rrf_score"], x["score"]), reverse=True)
+        else:
+            all_results.sort(key=lambda x: x["score"], reverse=True)
+        top = all_results[:limit]
+
+        # Only the returned hits are hydrated (one document-store lookup)
+        payloads = hydrate_payloads(self.writer.documents, [r["payload"] for r in top])
+        for result, payload in zip(top, payloads):
+            result["payload"] = payload
+        return top
     
     def get_total_knowledge_count(self) -> Dict[str, int]:
         """Get count of items in each collection"""
@@ -112,16 +112,13 @@ class LearningCycleOrchestrator:
             "discovery_results": []
         }
         
-        # Web crawling
+        # Web crawling (incremental: unchanged pages never reach ingestion)
         if web_urls:
             logger.info(f"[Discovery] Crawling {len(web_urls)} URLs")
-            for url in web_urls[:MAX_WEB_ARTICLES_PER_CYCLE]:
-                try:
-                    article = self.web_crawler.crawl_url(url)
-                    if article:
-                        results["articles"].append(article)
-                except Exception as e:
-                    logger.error(f"[Discovery] Error crawling {url}: {e}")
+            try:
+                results["articles"] = await self.web_crawler.crawl_urls(web_urls[:MAX_WEB_ARTICLES_PER_CYCLE])
+            except Exception as e:
+                logger.error(f"[Discovery] Error crawling URLs: {e}")
         
         # GitHub exploration
         logger.info("[Discovery] Exploring GitHub repositories")
@@ -160,6 +157,16 @@ class LearningCycleOrchestrator:
         
         logger.info(f"[Ingestion] Processed: {ingestion_results}")
         
+        # Pages that failed ingestion must be fetched in full next cycle. The
+        # frontier is keyed by the URL as crawled (source_url is normalized)
+        duplicates = set(self.ingestion_pipeline.last_duplicates)
+        failed_urls = [
+            a.crawl_url or str(a.source_url) for a in discovery_results["articles"]
+            if not a.embedding and a.id not in duplicates
+        ]
+        if failed_urls and self.web_crawler.frontier:
+            self.web_crawler.frontier.invalidate(failed_urls)
+        
         # Return original items (now with summaries and embeddings)
         return discovery_results
     
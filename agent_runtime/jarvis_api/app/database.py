@@ -5,7 +5,7 @@ from sqlalchemy.orm import sessionmaker
 from app.models.chat import Base
 from app.models.ai_benchmarks import AIAgentVersion, AIAgentBenchmark
 from app.models.alerts import SystemAlert
-from app.risk.risk_model import RiskScore
+from app.risk.risk_model import RiskScore, RiskHistory
 from app.models.actions import ProposedAction
 from app.models.jarvis_console import JarvisConsoleMessage
 
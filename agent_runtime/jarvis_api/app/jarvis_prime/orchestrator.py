@@ -4,8 +4,14 @@ The central intelligence that coordinates all agents
 """
 
 import logging
-from typing import Dict, Optional, Any, List
-from app.services.ollama_client import JarvisOllamaClient
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from app.services.ollama_client import JarvisOllamaClient, PRIORITY_INTERACTIVE
+from app.services.embedding_service import EmbeddingService
+from app.services.semantic_cache import get_semantic_cache
+from app.services.intent_router import TIER_RULES, IntentRouter, open_intent_log
+from app.services.conversation_memory import ConversationMemory, MemoryConflictError
+from app.services.event_stream import EventChannel
 from app.agents.dispatcher import dispatcher, DispatchResult
 from app.agents.protocol import AgentResponse
 from app.jarvis_prime.prompts import build_system_prompt
@@ -13,6 +19,16 @@ from app.tools.web_search import web_search
 
 logger = logging.getLogger(__name__)
 
+# Agent results (risk, alerts) go stale quickly: short TTL
+PRIME_CACHE_TTL = float(os.getenv("PRIME_CACHE_TTL", "300"))
+# Read-only (agent, action) pairs whose answers may be replayed. Scans, workflows,
+# remediation and anything else with side effects always run again.
+CACHEABLE_AGENT_ACTIONS = {
+    ("A-VULN", "check_cve"),
+    ("A-WEB", "search"),
+    ("A-RAG", "query"),
+}
+
 
 class JarvisPrime:
     """
@@ -29,7 +45,10 @@ class JarvisPrime:
     def __init__(self):
         self.llm = JarvisOllamaClient()
         self.dispatcher = dispatcher
-        self.conversation_memory: Dict[str, list] = {}
+        self.memory = ConversationMemory(self.llm)
+        self.embedder = EmbeddingService(self.llm)
+        self.response_cache = get_semantic_cache("jarvis_prime", ttl=PRIME_CACHE_TTL)
+        self.intent_router = IntentRouter(log=open_intent_log())
         self.logger = logging.getLogger("jarvis.prime")
     
     async def process_user_request(
@@ -39,61 +58,160 @@ class JarvisPrime:
         context: Optional[Dict[str, Any]] = None,
         history: Optional[List[Dict[str, str]]] = None,
         use_web_search: bool = False,
+        events: Optional[EventChannel] = None,
     ) -> Dict:
         """
         Main entry point for user requests
+
+        With events, progress is streamed as it happens: plan (intent),
+        tool_start / reflect around agent runs, token chunks for
+        conversational answers, and done with the final response.
         """
         self.logger.info(f"[Jarvis Prime] Processing: {user_input[:50]}...")
 
         context = context or {}
-        conversation_history = history if history is not None else self.conversation_memory.get(user_id, [])
+        # Chat routes pass their own (already persisted) history and conversation
+        conversation_id = context.get("conversation_id")
+        conversation_id = str(conversation_id) if conversation_id else None
+        if history is not None:
+            conversation_history = history
+        else:
+            conversation_history = await self.memory.recent(user_id, conversation_id)
+        remember = dict(session=user_id, conversation_id=conversation_id, persist=history is None)
 
-        # Initialize memory slot if needed
-        if history is None and user_id not in self.conversation_memory:
-            self.conversation_memory[user_id] = []
+        # Cheap intent tiers first: the cache is only consulted for intents whose
+        # answers are reusable (never mid-conversation, never for actions)
+        routed = self.intent_router.route(user_input)
 
-        intent_analysis = await self._analyze_intent(user_input, conversation_history)
+        # Semantic cache: exact normalized text first, then embedding similarity (per tenant)
+        tenant = str(context.get("tenant_id") or context.get("user_id") or user_id)
+        use_cache = not context.get("no_cache") and not use_web_search
+        question_embedding = None
+        if use_cache and routed is not None and self._cacheable_intent(routed, conversation_history, user_input):
+            cached = self.response_cache.lookup_exact(tenant, user_input)
+            # Greetings and other whole-message rules only repeat verbatim: no embedding
+            greeting = routed["router_tier"] == TIER_RULES and routed["intent_type"] == "conversation"
+            if cached is None and not greeting:
+                question_embedding = await self.embedder.embed(user_input, priority=PRIORITY_INTERACTIVE)
+                cached = self.response_cache.lookup_similar(tenant, user_input, question_embedding)
+            if cached is not None:
+                self.logger.info(f"[Jarvis Prime] Cache hit: {user_input[:50]}")
+                response = {**cached, "cached": True}
+                await self._remember_turn(user_input, response["message"], remember)
+                if events:
+                    await events.emit("done", response=response)
+                return response
+
+        intent_analysis = await self._analyze_intent(user_input, routed)
+        if events:
+            await events.emit("plan", intent=intent_analysis)
 
         if intent_analysis.get("workflow"):
+            if events:
+                await events.emit("tool_start", workflow=intent_analysis["workflow"])
             result = await self.dispatcher.execute_workflow(
                 intent_analysis["workflow"], intent_analysis.get("params", {})
             )
         elif intent_analysis.get("agents"):
+            if events:
+                await events.emit("tool_start", agents=intent_analysis["agents"])
             result = await self._execute_agent_chain(
                 intent_analysis["agents"], intent_analysis.get("params", {}), context
             )
         else:
+            prompt_history = await self.memory.build_context(
+                user_id, history=conversation_history, conversation_id=conversation_id
+            )
             result = await self._general_conversation(
                 user_input=user_input,
-                history=conversation_history,
+                history=prompt_history,
                 use_web_search=use_web_search or context.get("use_web_search", False),
+                on_token=(lambda piece: events.emit("token", content=piece)) if events else None,
             )
 
+        if events and isinstance(result, DispatchResult):
+            await events.emit("reflect", success=result.success, summary=result.summary, agents_used=result.agents_used)
+
         response = await self.synthesize_response(result, user_input)
+        response["intent_tier"] = intent_analysis.get("router_tier")
 
-        updated_history = conversation_history + [
-            {"role": "user", "content": user_input},
-            {"role": "assistant", "content": response["message"]},
-        ]
-        self.conversation_memory[user_id] = updated_history[-20:]
+        if use_cache and self._is_cacheable(intent_analysis, result, response, conversation_history, user_input):
+            self.response_cache.store(tenant, user_input, response, question_embedding)
+
+        await self._remember_turn(user_input, response["message"], remember)
+        if events:
+            await events.emit("done", response=response)
         return response
+
+    async def _remember_turn(self, user_input: str, reply: str, remember: Dict[str, Any]):
+        """The answer is already computed: a memory conflict must not turn it into an error."""
+        try:
+            await self.memory.append(user_input=user_input, reply=reply, **remember)
+        except MemoryConflictError as e:
+            self.logger.warning(f"[Jarvis Prime] Turn not saved to memory: {e}")
+
+    @staticmethod
+    def _cacheable_intent(intent_analysis: Dict, history: list, user_input: str) -> bool:
+        """
+        Only answers that do not depend on the conversation are reused:
+        read-only agent lookups (CACHEABLE_AGENT_ACTIONS), and plain
+        conversation without prior turns. Workflows never.
+        """
+        if intent_analysis.get("workflow"):
+            return False
+        if intent_analysis.get("agents"):
+            # Same intent _execute_agent_chain dispatches to every agent
+            action = intent_analysis.get("params", {}).get("action", "execute")
+            return all((code, action) in CACHEABLE_AGENT_ACTIONS for code in intent_analysis["agents"])
+        prior_turns = [
+            m for m in history
+            if not (m.get("role") == "user" and m.get("content") == user_input)
+        ]
+        return not prior_turns
+
+    @classmethod
+    def _is_cacheable(cls, intent_analysis: Dict, result: Any, response: Dict, history: list, user_input: str) -> bool:
+        """Reusable intent (_cacheable_intent) with a successful answer and no web search."""
+        if not response.get("success"):
+            return False
+        if not cls._cacheable_intent(intent_analysis, history, user_input):
+            return False
+        if intent_analysis.get("agents"):
+            return True
+        if not isinstance(result, dict) or result.get("used_web_search"):
+            return False
+        return not result.get("message", "").startswith("Lo siento, tuve un error")
     
     async def _analyze_intent(
         self,
         user_input: str,
-        conversation_history: list
+        routed: Optional[Dict]
     ) -> Dict:
         """
-        Analyze user intent using LLM
+        Analyze user intent: routed is the result of the compiled rules and
+        the local classifier (IntentRouter.route); when neither was confident
+        enough (None) the message goes to the LLM
         
         Returns:
             {
                 "intent_type": "workflow" | "agents" | "conversation",
                 "workflow": "network_audit" (if applicable),
                 "agents": [(code, intent, params)] (if applicable),
-                "params": {...}
+                "params": {...},
+                "router_tier": "rules" | "classifier" | "llm"
             }
         """
+        if routed is not None:
+            self.logger.info(f"[Intent] ({routed['router_tier']}, {routed['confidence']}) {routed}")
+            return routed
+
+        analysis = await self._llm_intent(user_input)
+        if analysis.get("router_tier") == "llm":
+            self.intent_router.record_llm(user_input, analysis)
+        return analysis
+
+    async def _llm_intent(self, user_input: str) -> Dict:
+        """Full LLM intent analysis (slow tier)"""
         prompt = f"""
 Analiza esta petición del usuario y determina qué agentes de Jarvis necesita:
 
@@ -108,7 +226,7 @@ AGENTES DISPONIBLES:
 - A-RAG: Base de conocimientos y análisis de documentos (store, query)
 
 WORKFLOWS DISPONIBLES:
-- network_audit: Auditoría completa de red (A-SCAN → A-VULN → A-REPORT)
+- network_audit: Auditoría completa de red (A-SCAN → A-VULN → A-REPORT; params "target" o "targets" en paralelo)
 
 Responde en JSON:
 {{
@@ -122,7 +240,7 @@ RESPONDE SOLO CON JSON.
 """
         
         try:
-            response = self.llm.chat(messages=[
+            response = await self.llm.achat(priority=PRIORITY_INTERACTIVE, messages=[
                 {"role": "system", "content": "Eres el analizador de intenciones de Jarvis. Responde solo con JSON válido."},
                 {"role": "user", "content": prompt}
             ])
@@ -139,7 +257,7 @@ RESPONDE SOLO CON JSON.
             analysis = json.loads(content)
             self.logger.info(f"[Intent] {analysis}")
             
-            return analysis
+            return {**analysis, "router_tier": "llm"}
             
         except Exception as e:
             self.logger.error(f"[Intent] Error: {e}")
@@ -168,8 +286,12 @@ RESPONDE SOLO CON JSON.
         user_input: str,
         history: list,
         use_web_search: bool = False,
+        on_token: Optional[Callable[[str], Awaitable[Any]]] = None,
     ) -> Dict:
-        """Handle general conversation without agents and optionally enrich with web search."""
+        """
+        Handle general conversation without agents and optionally enrich with web search.
+        With on_token the answer is streamed from Ollama chunk by chunk.
+        """
         try:
             search_results = []
             if use_web_search or self._should_use_web_search(user_input):
@@ -187,7 +309,7 @@ RESPONDE SOLO CON JSON.
 
             system_prompt = build_system_prompt(enable_web_search=bool(search_results) or use_web_search)
             messages = [{"role": "system", "content": system_prompt}]
-            messages.extend(history[-10:])  # keep short context
+            messages.extend(history)  # summary + recent turns, already within the token budget
 
             user_payload = user_input
             if context_block:
@@ -195,11 +317,21 @@ RESPONDE SOLO CON JSON.
 
             messages.append({"role": "user", "content": user_payload})
 
-            response = self.llm.chat(messages=messages)
+            if on_token is None:
+                response = await self.llm.achat(messages=messages, priority=PRIORITY_INTERACTIVE)
+                content = response["message"]["content"]
+            else:
+                parts = []
+                async for chunk in self.llm.achat_stream(messages=messages, priority=PRIORITY_INTERACTIVE):
+                    piece = chunk.get("message", {}).get("content", "")
+                    if piece:
+                        parts.append(piece)
+                        await on_token(piece)
+                content = "".join(parts)
 
             return {
                 "type": "conversation",
-                "message": response["message"]["content"],
+                "message": content,
                 "used_web_search": bool(search_results),
             }
         except Exception as e:
@@ -255,7 +387,7 @@ Genera una respuesta amigable y profesional resumiendo los resultados.
 Sé conciso pero informativo.
 """
                 
-                llm_response = self.llm.chat(messages=[
+                llm_response = await self.llm.achat(priority=PRIORITY_INTERACTIVE, messages=[
                     {"role": "system", "content": "Eres Jarvis. Resume los resultados de forma clara y amigable. IMPORTANTE: Responde SIEMPRE en ESPAÑOL."},
                     {"role": "user", "content": synthesis_prompt}
                 ])
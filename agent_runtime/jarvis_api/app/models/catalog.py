@@ -39,6 +39,8 @@ class ServiceActionLink(BaseModel):
     action_id: str
     order: int
     role: str  # e.g., "initial_recon", "deep_scan"
+    # Órdenes de las etapas de las que depende; None = todas las anteriores (secuencial)
+    depends_on: Optional[List[int]] = None
 
 class Service(BaseModel):
     id: str
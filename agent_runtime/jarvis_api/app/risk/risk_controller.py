@@ -25,6 +25,11 @@ class RiskScoreRead(BaseModel):
     class Config:
         orm_mode = True
 
+class RiskHistoryPoint(BaseModel):
+    score: float
+    category: str
+    recorded_at: datetime
+
 @router.get("/summary", response_model=RiskScoreRead)
 def get_global_risk(db: Session = Depends(get_db)):
     service = RiskService(db)
@@ -54,9 +59,16 @@ def get_agent_risks(db: Session = Depends(get_db)):
     all_risks = service.get_all_risks()
     return [r for r in all_risks if r.agent_key]
 
+@router.get("/history", response_model=List[RiskHistoryPoint])
+def get_risk_history(entity_type: str = "global", entity_id: str = "global", days: int = 14, db: Session = Depends(get_db)):
+    """Recorded risk points for one entity (one per recalculation)."""
+    service = RiskService(db)
+    return service.get_risk_history(entity_type, entity_id, days)
+
 @router.post("/recalculate")
 def recalculate_risks(db: Session = Depends(get_db)):
-    """Force recalculation of global risk"""
+    """Force recalculation of global, client, asset and agent risk in one batch"""
     service = RiskService(db)
-    risk = service.calculate_and_save_risk('global', 'global')
-    return {"status": "recalculated", "score": risk.score_actual}
+    updated = service.recalculate_all()
+    risk = service.get_risk_score(id="global")
+    return {"status": "recalculated", "score": risk.score_actual if risk else 0.0, "updated": updated}
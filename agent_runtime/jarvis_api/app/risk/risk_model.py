@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float, DateTime, JSON, ForeignKey
+from sqlalchemy import Column, String, Integer, Float, DateTime, JSON, ForeignKey, Index
 from sqlalchemy.sql import func
 from app.database import Base
 import uuid
@@ -30,3 +30,18 @@ class RiskScore(Base):
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
+
+
+class RiskHistory(Base):
+    """One point per entity and history step (the last recalculation wins): the time series behind trend and predictions."""
+    __tablename__ = "risk_history"
+    __table_args__ = (Index("ux_risk_history_entity_bucket", "entity_type", "entity_id", "bucket_start", unique=True),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    entity_type = Column(String, nullable=False)  # global, client, asset, agent
+    entity_id = Column(String, nullable=False)
+    score = Column(Float, nullable=False)
+    category = Column(String, nullable=False)
+    recorded_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    # Start of the RISK_HISTORY_STEP_HOURS step the point belongs to (upsert key)
+    bucket_start = Column(DateTime(timezone=True), nullable=False)
@@ -62,3 +62,12 @@ class RiskPredictor:
         elif score >= 30:
             return "medium"
         return "low"
+
+    @staticmethod
+    def calculate_risk_categories(scores: np.ndarray) -> np.ndarray:
+        """Vectorized calculate_risk_category (same thresholds)."""
+        return np.select(
+            [scores >= 80, scores >= 60, scores >= 30],
+            ["critical", "high", "medium"],
+            default="low",
+        )
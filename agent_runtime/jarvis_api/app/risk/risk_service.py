@@ -1,12 +1,49 @@
+from sqlalchemy import case, func
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
-from app.risk.risk_model import RiskScore
+from app.risk.risk_model import RiskScore, RiskHistory
 from app.risk.risk_predictor import RiskPredictor
 from app.models.alerts import SystemAlert
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
 import logging
+import os
+import uuid
 
 logger = logging.getLogger(__name__)
 
+ENTITY_TYPES = ("global", "client", "asset", "agent")
+# RiskScore column that identifies each entity type (global uses id="global")
+RISK_ENTITY_FIELDS = {"client": "client_id", "asset": "asset_id", "agent": "agent_key"}
+# Position of each entity column in the aggregate rows
+AGGREGATE_KEY_INDEX = {"client": 0, "asset": 1, "agent": 2}
+
+# Alerts are created as "open"; "new" kept for older rows
+ACTIVE_ALERT_STATUSES = ("new", "open", "acknowledged")
+SEVERITIES = ("critical", "high", "medium", "low")
+SEVERITY_WEIGHTS = np.array([40.0, 20.0, 10.0, 2.0])
+# Recency weight of an alert by age: <24h counts fully, <7d half, older a quarter
+RECENCY_WEIGHTS = ((timedelta(hours=24), 1.0), (timedelta(days=7), 0.5))
+RECENCY_WEIGHT_OLD = 0.25
+
+# History: one point per entity and step, upserted by every recalculation in the step
+# (1 step = 24h, so risk_24h/72h/7d are 1/3/7 steps ahead). Entities that stay at
+# zero write no points; missing steps carry the previous value.
+RISK_HISTORY_STEP_HOURS = int(os.getenv("RISK_HISTORY_STEP_HOURS", "24"))
+RISK_HISTORY_DAYS = int(os.getenv("RISK_HISTORY_DAYS", "14"))
+RISK_HISTORY_RETENTION_DAYS = int(os.getenv("RISK_HISTORY_RETENTION_DAYS", "90"))
+
+# (client_id, asset_id, agent_key, severity, count, recency_weighted_count)
+AggregateRow = Tuple[Optional[str], Optional[str], Optional[str], str, int, float]
+
+
+def _bucket_start(moment: datetime) -> datetime:
+    """Start of the RISK_HISTORY_STEP_HOURS step containing moment."""
+    step = RISK_HISTORY_STEP_HOURS * 3600
+    return datetime.fromtimestamp(moment.timestamp() // step * step, tz=timezone.utc)
+
+
 class RiskService:
     def __init__(self, db: Session):
         self.db = db
@@ -22,95 +59,217 @@ class RiskService:
             query = query.filter(RiskScore.asset_id == asset_id)
         if agent_key:
             query = query.filter(RiskScore.agent_key == agent_key)
-            
+
         return query.first()
 
     def calculate_and_save_risk(self, entity_type: str, entity_id: str):
         """
-        Calculates risk for an entity and saves it.
+        Calculates risk for one entity and saves it (same engine as recalculate_all).
         entity_type: 'client', 'asset', 'agent', 'global'
         """
-        # 1. Gather Data (Alerts, etc.)
-        score = self._calculate_base_score(entity_type, entity_id)
-        
-        # 2. Get History (Mocked for now, or retrieve past scores)
-        # In a real system, we would query a history table. 
-        # Here we just use the current score and some noise/logic to simulate history for prediction
-        # or fetch the previous score to build a tiny history.
-        
-        current_risk_entry = self.get_risk_score(**{f"{entity_type}_id" if entity_type != 'agent' and entity_type != 'global' else "agent_key" if entity_type == 'agent' else "id": entity_id if entity_type != 'global' else None})
-        
-        history = []
-        if current_risk_entry:
-            # Simple simulation: assume previous score was history
-            history = [current_risk_entry.score_actual]
-        
-        history.append(score)
-        
-        # 3. Predict
-        trend = self.predictor.calculate_trend(history)
-        risk_24h = self.predictor.predict_future_risk(history, 1) # 1 step = 24h roughly in this abstract model
-        risk_72h = self.predictor.predict_future_risk(history, 3)
-        risk_7d = self.predictor.predict_future_risk(history, 7)
-        
-        category = self.predictor.calculate_risk_category(score)
-        
-        # 4. Save/Update
-        if not current_risk_entry:
-            if entity_type == 'global':
-                 current_risk_entry = RiskScore(id="global", score_actual=score)
-                 self.db.add(current_risk_entry)
-            else:
-                kwargs = {}
-                if entity_type == 'client': kwargs['client_id'] = entity_id
-                elif entity_type == 'asset': kwargs['asset_id'] = entity_id
-                elif entity_type == 'agent': kwargs['agent_key'] = entity_id
-                current_risk_entry = RiskScore(**kwargs, score_actual=score)
-                self.db.add(current_risk_entry)
-        
-        current_risk_entry.score_actual = score
-        current_risk_entry.trend = trend
-        current_risk_entry.risk_24h = risk_24h
-        current_risk_entry.risk_72h = risk_72h
-        current_risk_entry.risk_7d = risk_7d
-        current_risk_entry.category = category
-        current_risk_entry.updated_at = datetime.now()
-        
+        now = datetime.now(timezone.utc)
+        key = "global" if entity_type == "global" else entity_id
+        rows = self._aggregate_alerts(now, entity_type, key)
+        self._apply_scores(entity_type, rows, now, only=key)
         self.db.commit()
-        self.db.refresh(current_risk_entry)
-        return current_risk_entry
+        return self._risk_rows(entity_type, key).get(key)
 
-    def _calculate_base_score(self, entity_type: str, entity_id: str) -> float:
+    def recalculate_all(self, entity_types: Sequence[str] = ENTITY_TYPES) -> Dict[str, int]:
         """
-        Calculates a base risk score (0-100) based on active alerts.
+        Recalculates every entity of the given types in one pass: one grouped
+        query for the alert aggregates, vectorized scoring, bulk upsert of the
+        risk rows plus the history point upserts, and a single commit.
+        Entities that still have a score but no active alerts drop to zero.
         """
-        base_score = 0.0
-        
-        # Fetch active alerts
-        query = self.db.query(SystemAlert).filter(SystemAlert.status.in_(["new", "acknowledged"]))
-        
-        if entity_type == 'client':
-            query = query.filter(SystemAlert.client_id == entity_id)
-        elif entity_type == 'asset':
-            query = query.filter(SystemAlert.asset_id == entity_id)
-        elif entity_type == 'agent':
-            query = query.filter(SystemAlert.agent_key == entity_id)
+        now = datetime.now(timezone.utc)
+        rows = self._aggregate_alerts(now)
+        updated = {entity_type: self._apply_scores(entity_type, rows, now) for entity_type in entity_types}
+        self._purge_history(now)
+        self.db.commit()
+        logger.info(f"Risk recalculated: {updated}")
+        return updated
+
+    def _aggregate_alerts(self, now: datetime, entity_type: str = None, entity_id: str = None) -> List[AggregateRow]:
+        """Active alert counts and recency-weighted counts per entity and severity."""
+        recency = case(
+            *[(SystemAlert.created_at >= now - age, weight) for age, weight in RECENCY_WEIGHTS],
+            else_=RECENCY_WEIGHT_OLD,
+        )
+        query = self.db.query(
+            SystemAlert.client_id,
+            SystemAlert.asset_id,
+            SystemAlert.agent_key,
+            SystemAlert.severity,
+            func.count(SystemAlert.id),
+            func.sum(recency),
+        ).filter(SystemAlert.status.in_(ACTIVE_ALERT_STATUSES))
+        if entity_type in RISK_ENTITY_FIELDS and entity_id is not None:
+            query = query.filter(getattr(SystemAlert, RISK_ENTITY_FIELDS[entity_type]) == entity_id)
         # Global includes ALL alerts
-            
-        alerts = query.all()
-        
-        for alert in alerts:
-            if alert.severity == 'critical':
-                base_score += 40
-            elif alert.severity == 'high':
-                base_score += 20
-            elif alert.severity == 'medium':
-                base_score += 10
-            elif alert.severity == 'low':
-                base_score += 2
-                
-        # Cap at 100
-        return min(100.0, base_score)
+        return query.group_by(
+            SystemAlert.client_id, SystemAlert.asset_id, SystemAlert.agent_key, SystemAlert.severity
+        ).all()
+
+    @staticmethod
+    def _entity_matrices(entity_type: str, rows: List[AggregateRow]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """Pivot aggregate rows into (entity ids, counts[n, severity], recency[n, severity])."""
+        if entity_type == "global":
+            keys = ["global"] * len(rows)
+        else:
+            keys = [row[AGGREGATE_KEY_INDEX[entity_type]] for row in rows]
+        kept = [(k, SEVERITIES.index(row[3]), row[4], float(row[5] or 0.0))
+                for k, row in zip(keys, rows) if k is not None and row[3] in SEVERITIES]
+        ids = sorted({k for k, _, _, _ in kept})
+        counts = np.zeros((len(ids), len(SEVERITIES)))
+        recency = np.zeros((len(ids), len(SEVERITIES)))
+        if kept:
+            position = {entity_id: i for i, entity_id in enumerate(ids)}
+            entity_idx = np.array([position[k] for k, _, _, _ in kept])
+            severity_idx = np.array([s for _, s, _, _ in kept])
+            np.add.at(counts, (entity_idx, severity_idx), np.array([c for _, _, c, _ in kept], dtype=float))
+            np.add.at(recency, (entity_idx, severity_idx), np.array([r for _, _, _, r in kept]))
+        return ids, counts, recency
+
+    def _risk_rows(self, entity_type: str, entity_id: str = None) -> Dict[str, RiskScore]:
+        if entity_type == "global":
+            row = self.db.query(RiskScore).filter(RiskScore.id == "global").first()
+            return {"global": row} if row else {}
+        column = getattr(RiskScore, RISK_ENTITY_FIELDS[entity_type])
+        query = self.db.query(RiskScore).filter(column.isnot(None))
+        if entity_id is not None:
+            query = query.filter(column == entity_id)
+        rows: Dict[str, RiskScore] = {}
+        for row in query.order_by(RiskScore.created_at):
+            rows.setdefault(getattr(row, RISK_ENTITY_FIELDS[entity_type]), row)
+        return rows
+
+    def _load_history(self, entity_type: str, entity_ids: List[str], now: datetime) -> Tuple[Dict[str, List[float]], Dict[str, float]]:
+        """
+        Past scores per entity, one value per history step (current step
+        excluded, missing steps carry the previous value), and the latest
+        recorded score of each entity.
+        """
+        step = timedelta(hours=RISK_HISTORY_STEP_HOURS)
+        since = _bucket_start(now) - timedelta(days=RISK_HISTORY_DAYS)
+        query = self.db.query(RiskHistory.entity_id, RiskHistory.score, RiskHistory.bucket_start).filter(
+            RiskHistory.entity_type == entity_type,
+            RiskHistory.bucket_start >= since,
+        )
+        if len(entity_ids) == 1:
+            query = query.filter(RiskHistory.entity_id == entity_ids[0])
+        buckets: Dict[str, Dict[int, float]] = {}
+        for entity_id, score, bucket_start in query.order_by(RiskHistory.bucket_start):
+            if bucket_start.tzinfo is None:
+                bucket_start = bucket_start.replace(tzinfo=timezone.utc)
+            buckets.setdefault(entity_id, {})[(bucket_start - since) // step] = score
+
+        current = (_bucket_start(now) - since) // step
+        history: Dict[str, List[float]] = {}
+        latest: Dict[str, float] = {}
+        for entity_id, values in buckets.items():
+            latest[entity_id] = values[max(values)]
+            series, value = [], None
+            for bucket in range(min(values), current):
+                value = values.get(bucket, value)
+                series.append(value)
+            history[entity_id] = series
+        return history, latest
+
+    def _apply_scores(self, entity_type: str, rows: List[AggregateRow], now: datetime, only: str = None) -> int:
+        """Score one entity type from the aggregates and stage the upserts and history points."""
+        # `rows` is already filtered to `only` when recalculating a single entity
+        ids, counts, recency = self._entity_matrices(entity_type, rows)
+        existing = self._risk_rows(entity_type, only)
+        known = set(ids)
+        # Entities with a score but no active alerts (or a new one asked for explicitly) score zero
+        stale = [entity_id for entity_id in existing if entity_id not in known]
+        if only is not None and only not in known and only not in existing:
+            stale.append(only)
+        if stale:
+            ids = ids + stale
+            counts = np.vstack([counts, np.zeros((len(stale), len(SEVERITIES)))])
+            recency = np.vstack([recency, np.zeros((len(stale), len(SEVERITIES)))])
+        if not ids:
+            return 0
+
+        # Vectorized scoring: severity-weighted sums capped at 100
+        scores = np.minimum(100.0, counts @ SEVERITY_WEIGHTS)
+        recency_scores = np.minimum(100.0, recency @ SEVERITY_WEIGHTS)
+        categories = self.predictor.calculate_risk_categories(scores)
+        history, latest = self._load_history(entity_type, ids, now)
+        bucket_start = _bucket_start(now)
+
+        inserts, updates, points = [], [], []
+        for i, entity_id in enumerate(ids):
+            score = float(scores[i])
+            series = history.get(entity_id, []) + [score]
+            values = {
+                "score_actual": score,
+                "trend": self.predictor.calculate_trend(series),
+                "risk_24h": self.predictor.predict_future_risk(series, 1),
+                "risk_72h": self.predictor.predict_future_risk(series, 3),
+                "risk_7d": self.predictor.predict_future_risk(series, 7),
+                "category": str(categories[i]),
+                "risk_metadata": {
+                    "active_alerts": {sev: int(counts[i, j]) for j, sev in enumerate(SEVERITIES)},
+                    "recency_weighted_score": round(float(recency_scores[i]), 2),
+                    "history_points": len(series) - 1,
+                },
+                "updated_at": now,
+            }
+            row = existing.get(entity_id)
+            if row is not None:
+                updates.append({"id": row.id, **values})
+            elif entity_type == "global":
+                inserts.append({"id": "global", **values})
+            else:
+                inserts.append({"id": str(uuid.uuid4()), RISK_ENTITY_FIELDS[entity_type]: entity_id, **values})
+            if score == 0 and not latest.get(entity_id):
+                # Still at zero: the series carries the last point forward
+                continue
+            points.append({
+                "entity_type": entity_type,
+                "entity_id": entity_id,
+                "score": score,
+                "category": values["category"],
+                "recorded_at": now,
+                "bucket_start": bucket_start,
+            })
+
+        self.db.bulk_update_mappings(RiskScore, updates)
+        self.db.bulk_insert_mappings(RiskScore, inserts)
+        if points:
+            stmt = insert(RiskHistory).values(points)
+            self.db.execute(stmt.on_conflict_do_update(
+                index_elements=["entity_type", "entity_id", "bucket_start"],
+                set_={
+                    "score": stmt.excluded.score,
+                    "category": stmt.excluded.category,
+                    "recorded_at": stmt.excluded.recorded_at,
+                },
+            ))
+        # Make ORM instances loaded in this session see the bulk update
+        for row in existing.values():
+            self.db.expire(row)
+        return len(ids)
+
+    def _purge_history(self, now: datetime):
+        self.db.query(RiskHistory).filter(
+            RiskHistory.recorded_at < now - timedelta(days=RISK_HISTORY_RETENTION_DAYS)
+        ).delete(synchronize_session=False)
+
+    def get_risk_history(self, entity_type: str, entity_id: str, days: int = RISK_HISTORY_DAYS) -> List[Dict]:
+        """Recorded score points for one entity, oldest first."""
+        since = datetime.now(timezone.utc) - timedelta(days=days)
+        points = self.db.query(RiskHistory).filter(
+            RiskHistory.entity_type == entity_type,
+            RiskHistory.entity_id == entity_id,
+            RiskHistory.recorded_at >= since,
+        ).order_by(RiskHistory.recorded_at).all()
+        return [
+            {"score": p.score, "category": p.category, "recorded_at": p.recorded_at}
+            for p in points
+        ]
 
     def get_all_risks(self, limit: int = 100):
         return self.db.query(RiskScore).limit(limit).all()
@@ -48,7 +48,7 @@ MOCK_SERVICES = [
         id="srv_soc", slug="soc-basic", name="SOC-as-a-Service Básico", category="Monitorización", type=ServiceType.MANAGED, level=ActionLevel.INTERMEDIATE,
         description="Monitorización de eventos críticos, detección de anomalías simples, revisión periódica de logs.",
         tags=["soc", "monitoring"],
-        pipeline=[ServiceActionLink(action_id="act_01", order=1, role="discovery"), ServiceActionLink(action_id="act_70", order=2, role="log_collection")]
+        pipeline=[ServiceActionLink(action_id="act_01", order=1, role="discovery"), ServiceActionLink(action_id="act_70", order=2, role="log_collection", depends_on=[])]
     ),
     Service(
         id="srv_mdr", slug="mdr", name="MDR (Managed Detection & Response)", category="Respuesta", type=ServiceType.MANAGED, level=ActionLevel.ADVANCED,
@@ -78,13 +78,13 @@ MOCK_SERVICES = [
         id="srv_hardening", slug="hardening", name="Hardening 360º", category="Infraestructura", type=ServiceType.PENTEST, level=ActionLevel.INTERMEDIATE,
         description="Comprobación de configuraciones inseguras y recomendaciones de hardening.",
         tags=["hardening", "servers"],
-        pipeline=[ServiceActionLink(action_id="act_10", order=1, role="linux_audit"), ServiceActionLink(action_id="act_11", order=2, role="ssh_audit")]
+        pipeline=[ServiceActionLink(action_id="act_10", order=1, role="linux_audit"), ServiceActionLink(action_id="act_11", order=2, role="ssh_audit", depends_on=[])]
     ),
     Service(
         id="srv_wifi", slug="wifi-sec", name="Seguridad Wi-Fi & Redes", category="Redes", type=ServiceType.PENTEST, level=ActionLevel.ADVANCED,
         description="Revisión de redes, cifrados, contraseñas débiles y segmentación.",
         tags=["wifi", "network"],
-        pipeline=[ServiceActionLink(action_id="act_20", order=1, role="spectrum"), ServiceActionLink(action_id="act_21", order=2, role="rogue_scan")]
+        pipeline=[ServiceActionLink(action_id="act_20", order=1, role="spectrum"), ServiceActionLink(action_id="act_21", order=2, role="rogue_scan", depends_on=[])]
     ),
     Service(
         id="srv_ot", slug="ot-sec", name="Seguridad OT/5G", category="Industrial", type=ServiceType.PENTEST, level=ActionLevel.ADVANCED,
@@ -123,7 +123,7 @@ MOCK_SERVICES = [
         pipeline=[
             ServiceActionLink(action_id="act_80", order=1, role="discovery"),
             ServiceActionLink(action_id="act_81", order=2, role="os_detection"),
-            ServiceActionLink(action_id="act_82", order=3, role="vuln_scan"),
+            ServiceActionLink(action_id="act_82", order=3, role="vuln_scan", depends_on=[1]),
             ServiceActionLink(action_id="act_83", order=4, role="exploit_research")
         ]
     ),
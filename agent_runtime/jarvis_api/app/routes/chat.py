@@ -1,18 +1,20 @@
 from datetime import datetime
+import asyncio
 import shutil
 import uuid
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, File, HTTPException, Request, UploadFile
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 
-from app.database import get_db
+from app.database import SessionLocal, get_db
 from app.jarvis_prime.orchestrator import jarvis_prime
 from app.services.chat_persistence import ChatPersistenceService
-from app.services.ollama_client import JarvisOllamaClient
+from app.services.event_stream import EventChannel, sse_response
+from app.services.ollama_client import JarvisOllamaClient, PRIORITY_INTERACTIVE
 
 router = APIRouter()
 
@@ -108,35 +110,57 @@ def _should_generate_title(messages: List[Any]) -> bool:
     return len(user_messages) >= 2
 
 
-def _maybe_generate_auto_title(
+def _title_prompt(conversation, messages: List[Any]) -> Optional[List[Dict[str, str]]]:
+    """Prompt del título automático, o None si no toca generarlo todavía."""
+    if not conversation or conversation.auto_title_generated:
+        return None
+
+    if not _should_generate_title(messages):
+        return None
+
+    context_snippet = "\n".join([f"- {m.role}: {m.content[:140]}" for m in messages[-4:]])
+    return [
+        {
+            "role": "system",
+            "content": "Genera un título corto (máx 8 palabras) para esta conversación de ciberseguridad en español.",
+        },
+        {"role": "user", "content": context_snippet},
+    ]
+
+
+async def _generate_title(prompt: List[Dict[str, str]]) -> Optional[str]:
+    """Título corto con un modelo ligero (async: no bloquea el event loop)."""
+    try:
+        resp = await ollama_client.achat(messages=prompt, model="llama3.1:8b-instruct-q4_K_M")
+        candidate = resp.get("message", {}).get("content", "").split("\n")[0].strip()
+        return candidate[:80] or None
+    except Exception:
+        # Silenciar errores de título para no bloquear el chat
+        return None
+
+
+async def _maybe_generate_auto_title(
     service: ChatPersistenceService,
     conversation,
     messages: List[Any],
 ):
     """Genera título corto en el segundo turno usando un modelo ligero."""
-    if not conversation or conversation.auto_title_generated:
+    prompt = _title_prompt(conversation, messages)
+    if not prompt:
         return
+    title = await _generate_title(prompt)
+    if title:
+        service.update_conversation_title(conversation.id, title, auto_generated=True)
 
-    if not _should_generate_title(messages):
-        return
 
+async def _message_embedding(request: ChatMessageRequest) -> Optional[List[float]]:
+    """Embedding de los mensajes marcados como importantes (None si falla o no aplica)."""
+    if not request.is_important:
+        return None
     try:
-        context_snippet = "\n".join([f"- {m.role}: {m.content[:140]}" for m in messages[-4:]])
-        prompt = [
-            {
-                "role": "system",
-                "content": "Genera un título corto (máx 8 palabras) para esta conversación de ciberseguridad en español.",
-            },
-            {"role": "user", "content": context_snippet},
-        ]
-        resp = ollama_client.chat(messages=prompt, model="llama3.1:8b-instruct-q4_K_M")
-        candidate = resp.get("message", {}).get("content", "").split("\n")[0].strip()
-        if candidate:
-            title = candidate[:80]
-            service.update_conversation_title(conversation.id, title, auto_generated=True)
+        return await ollama_client.agenerate_embedding(request.message)
     except Exception:
-        # Silenciar errores de título para no bloquear el chat
-        pass
+        return None
 
 
 @router.get("/conversations", response_model=List[ConversationSummarySchema])
@@ -248,7 +272,7 @@ async def send_message(
         attachments=request.attachments,
         uses_web_search=request.use_web_search,
         is_important=request.is_important,
-        embedder=ollama_client.generate_embedding if request.is_important else None,
+        embedding=await _message_embedding(request),
     )
 
     # Construir historial limpio para Jarvis Prime
@@ -281,7 +305,7 @@ async def send_message(
     )
 
     # Intentar generar título automático en el segundo turno
-    _maybe_generate_auto_title(service, conversation, history_records + [assistant_message])
+    await _maybe_generate_auto_title(service, conversation, history_records + [assistant_message])
 
     return {
         "assistant_message": _serialize_message(assistant_message),
@@ -289,6 +313,95 @@ async def send_message(
     }
 
 
+@router.post("/conversations/{conversation_id}/message/stream")
+async def stream_message(
+    conversation_id: str,
+    request: ChatMessageRequest,
+    http_request: Request,
+    user: Dict = Depends(get_chat_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Como send_message, pero la respuesta llega en streaming (SSE): tokens de
+    Ollama y eventos de agentes (plan, tool_start, reflect, done). Si el
+    cliente se desconecta se aborta la generación y no se guarda respuesta.
+    """
+    service = ChatPersistenceService(db)
+    user_id = user.get("sub", "guest")
+    conversation = service.get_conversation(conversation_id=conversation_id, user_id=user_id)
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversación no encontrada")
+
+    service.save_message(
+        conversation_id=conversation_id,
+        role="user",
+        content=request.message,
+        attachments=request.attachments,
+        uses_web_search=request.use_web_search,
+        is_important=request.is_important,
+        embedding=await _message_embedding(request),
+    )
+    history_records = service.get_messages(conversation_id=conversation_id, user_id=user_id)
+    history_payload = [{"role": m.role, "content": m.content} for m in history_records]
+    use_web_search = request.use_web_search or conversation.web_search_enabled
+    context = {
+        "user_id": user.get("username", "guest"),
+        "conversation_id": conversation_id,
+        "use_web_search": use_web_search,
+    }
+
+    def persist_reply(content: str):
+        # Sesión propia: la de Depends(get_db) se cierra antes de que termine el stream
+        stream_db = SessionLocal()
+        try:
+            stream_service = ChatPersistenceService(stream_db)
+            assistant_message = stream_service.save_message(
+                conversation_id=conversation_id,
+                role="assistant",
+                content=content,
+                uses_web_search=use_web_search,
+            )
+            stream_conversation = stream_service.get_conversation(conversation_id=conversation_id, user_id=user_id)
+            messages = stream_service.get_messages(conversation_id=conversation_id, user_id=user_id)
+            return _serialize_message(assistant_message), _title_prompt(stream_conversation, messages)
+        finally:
+            stream_db.close()
+
+    def persist_title(title: str):
+        stream_db = SessionLocal()
+        try:
+            ChatPersistenceService(stream_db).update_conversation_title(conversation_id, title, auto_generated=True)
+        finally:
+            stream_db.close()
+
+    async def producer(events: EventChannel):
+        try:
+            result = await jarvis_prime.process_user_request(
+                user_input=request.message,
+                user_id=str(conversation_id),
+                context=context,
+                history=history_payload,
+                use_web_search=use_web_search,
+                events=events,
+            )
+            assistant_content = result.get("message", "No pude generar respuesta.")
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            assistant_content = f"Error procesando solicitud: {exc}"
+            await events.emit("error", message=assistant_content)
+
+        saved, title_prompt = await asyncio.to_thread(persist_reply, assistant_content)
+        await events.emit("saved", assistant_message=saved)
+        # El título se pide con el cliente async, fuera del hilo de persistencia
+        if title_prompt:
+            title = await _generate_title(title_prompt)
+            if title:
+                await asyncio.to_thread(persist_title, title)
+
+    return sse_response(http_request, producer)
+
+
 @router.post("/upload")
 async def upload_file(file: UploadFile = File(...), user: Dict = Depends(get_chat_user)):
     """Sube un archivo para análisis."""
@@ -348,7 +461,8 @@ async def analyze_content(request: AnalyzeRequest, user: Dict = Depends(get_chat
 async def send_simple_message(request: ChatMessageRequest):
     """Endpoint simplificado para testing rápido del chat."""
     try:
-        response = ollama_client.chat(
+        response = await ollama_client.achat(
+            priority=PRIORITY_INTERACTIVE,
             messages=[
                 {
                     "role": "system",
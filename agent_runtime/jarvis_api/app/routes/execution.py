@@ -4,6 +4,7 @@ from typing import Dict, Any, Optional, List
 from datetime import datetime
 from app.services.kali_runner import kali_runner
 from app.services.actions.network_discovery import network_discovery_service
+from app.services.kali_plan import resolve_dependencies, steps_from_service
 from app.routes.catalog import MOCK_ACTIONS, MOCK_SERVICES # Importing mock data for now
 
 router = APIRouter()
@@ -29,6 +30,15 @@ async def get_execution_history(action_id: Optional[str] = None):
         return [e for e in EXECUTIONS_DB if e["action_id"] == action_id]
     return EXECUTIONS_DB
 
+@router.get("/pool", response_model=Dict[str, Any])
+async def get_execution_pool_stats():
+    """Colas por nodo (activas, profundidad, tiempos de espera), conexiones SSH maestras y caché de herramientas."""
+    return {
+        "nodes": kali_runner.node_pool.stats(),
+        "ssh": kali_runner.ssh_pool.stats(),
+        "tool_cache": kali_runner.tool_cache.stats() if kali_runner.tool_cache else None,
+    }
+
 @router.get("/{execution_id}", response_model=Dict[str, Any])
 async def get_execution_details(execution_id: str):
     """Obtiene los detalles de una ejecución específica."""
@@ -115,46 +125,92 @@ async def run_action(action_id: str, request: ExecutionRequest):
     
     return result
 
+def _parse_flag(value: Any) -> bool:
+    """Booleano de params: acepta bool, 0/1 y "true"/"false"/"yes"/"no"/"on"/"off"."""
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ("1", "true", "yes", "on"):
+        return True
+    if text in ("0", "false", "no", "off"):
+        return False
+    raise HTTPException(status_code=400, detail=f"Invalid boolean value: {value!r}")
+
+
 @router.post("/services/{service_id}/run")
 async def run_service(service_id: str, request: ExecutionRequest):
-    """Ejecuta el pipeline de un servicio."""
+    """Ejecuta el pipeline de un servicio (etapas independientes en paralelo)."""
     service = next((s for s in MOCK_SERVICES if s.id == service_id), None)
     if not service:
         raise HTTPException(status_code=404, detail="Service not found")
-    
-    # TODO: Implementar lógica de pipeline secuencial
-    # Por ahora, ejecutamos la primera acción como demo
-    first_action_link = service.pipeline[0] if service.pipeline else None
-    if not first_action_link:
+    if not service.pipeline:
          raise HTTPException(status_code=400, detail="Service has no actions in pipeline")
-         
-    action = next((a for a in MOCK_ACTIONS if a.id == first_action_link.action_id), None)
-    
-    result = await kali_runner.run_action(
-        action_id=action.id,
-        script_path=action.script_path_kali,
+
+    try:
+        steps = steps_from_service(service, MOCK_ACTIONS)
+        resolve_dependencies(steps)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    node_config = None
+    if request.node_id:
+        node = next((n for n in NODES_DB if n.id == request.node_id), None)
+        if not node:
+             raise HTTPException(status_code=404, detail="Selected Node not found")
+        node_config = node.dict()
+
+    tenant_slug = "global"
+    if request.tenant_id:
+        tenant = next((t for t in TENANTS_DB if t.id == request.tenant_id), None)
+        if tenant:
+            tenant_slug = tenant.slug
+
+    params = dict(request.params or {})
+    # use_cache=False fuerza a relanzar todas las herramientas
+    use_cache = _parse_flag(params.pop("use_cache", True))
+
+    result = await kali_runner.run_plan(
+        plan_id=service.id,
+        title=service.name,
+        steps=steps,
         target=request.target,
-        params=request.params
+        params=params,
+        node_config=node_config,
+        tenant_slug=tenant_slug,
+        use_cache=use_cache
     )
-    
-    # Persistir ejecución (parcial)
-    execution_record = {
+
+    # Persistir una ejecución por etapa y la del plan completo
+    timestamp = datetime.now().isoformat()
+    for step in result["steps"]:
+        if step["execution_id"] and not step["cached"]:
+            EXECUTIONS_DB.append({
+                "execution_id": step["execution_id"],
+                "action_id": step["action_id"],
+                "service_id": service_id,
+                "action_name": f"{service.name} - {step['name']}",
+                "target": request.target,
+                "timestamp": timestamp,
+                "status": step["status"],
+                "report_path": step.get("report_path") or ""
+            })
+    EXECUTIONS_DB.append({
         "execution_id": result["execution_id"],
-        "action_id": action.id,
+        "action_id": service_id,
         "service_id": service_id,
-        "action_name": f"{service.name} - {action.name}",
+        "action_name": service.name,
         "target": request.target,
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": timestamp,
         "status": result["status"],
-        "stdout": result.get("stdout", ""),
-        "stderr": result.get("stderr", ""),
+        "stdout": "",
+        "stderr": "",
         "report_path": result.get("report_path", "")
-    }
-    EXECUTIONS_DB.append(execution_record)
-    
+    })
+
     return {
-        "service_execution_id": result["execution_id"], # Placeholder
-        "status": "started",
-        "pipeline_step": 1,
-        "initial_result": result
+        "service_execution_id": result["execution_id"],
+        "status": result["status"],
+        "steps": result["steps"],
+        "report_path": result["report_path"],
+        "duration_seconds": result["duration_seconds"]
     }
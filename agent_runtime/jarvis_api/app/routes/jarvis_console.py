@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.services.intent_classifier import IntentClassifier
-from app.services.ollama_client import JarvisOllamaClient
+from app.services.ollama_client import JarvisOllamaClient, PRIORITY_INTERACTIVE
 from app.risk.risk_service import RiskService
 from app.services.action_service import ActionService
 from app.models.alerts import SystemAlert
@@ -124,7 +124,7 @@ async def chat_with_jarvis(request: ChatRequest, db: Session = Depends(get_db)):
             "Nunca inventes datos técnicos ni acciones. "
             "Si todo está bien, sé relajado ('Todo tranqui en la torre'). Si es grave, sé serio."
         )
-        resp = ollama.chat(messages=[
+        resp = await ollama.achat(priority=PRIORITY_INTERACTIVE, messages=[
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": request.message}
         ], options={"temperature": 0.3})
@@ -220,7 +220,7 @@ async def chat_with_jarvis(request: ChatRequest, db: Session = Depends(get_db)):
         
     else:
         # Fallback
-        resp = ollama.chat(messages=[
+        resp = await ollama.achat(priority=PRIORITY_INTERACTIVE, messages=[
             {"role": "system", "content": "Eres Jarvis, asistente de Nico en Deco-Gravity. Responde breve y profesionalmente en español."},
             {"role": "user", "content": request.message}
         ], options={"temperature": 0.3})
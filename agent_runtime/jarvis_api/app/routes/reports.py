@@ -1,9 +1,10 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 from typing import List, Dict, Any, Optional
 import os
 import json
 from datetime import datetime
 from pathlib import Path
+from app.dependencies import get_current_user
 
 router = APIRouter()
 REPORTS_BASE_PATH = "/opt/deco/reports"
@@ -62,6 +63,22 @@ async def list_reports(action_id: str = None):
         print(f"Error listing reports: {e}")
         return []
 
+@router.get("/live")
+async def list_live_executions(user: Dict = Depends(get_current_user)):
+    """Ejecuciones de Kali en curso cuyas salidas de texto se pueden seguir con /artifact/tail."""
+    from app.services.kali_runner import kali_runner
+
+    return [
+        {
+            "report_id": report_id,
+            "execution_id": live["execution_id"],
+            "action_id": live["action_id"],
+            "started_at": live["started_at"],
+            "artifacts": live["tail"].sizes,
+        }
+        for report_id, live in kali_runner.live_executions.items()
+    ]
+
 @router.get("/{report_id}")
 async def get_report(report_id: str):
     """Obtiene el contenido de un reporte específico."""
@@ -137,6 +154,48 @@ async def get_report_artifact(report_id: str, name: str):
     return {"name": name, "content": content}
 
 
+@router.get("/{report_id}/artifact/tail")
+async def tail_report_artifact(report_id: str, name: str, offset: int = 0, limit: int = 65536,
+                               user: Dict = Depends(get_current_user)):
+    """
+    Lee un artefacto de texto desde `offset`. Mientras la ejecución sigue en
+    curso devuelve lo que el LiveTail ya trajo; después, el fichero final.
+    El cliente repite la llamada con next_offset.
+    """
+    from app.services.artifact_store import is_text_artifact
+    from app.services.kali_runner import kali_runner
+
+    # Solo rutas relativas dentro de la carpeta del reporte
+    if not is_text_artifact(name) or name.startswith(("/", "\\")) or os.path.isabs(name) or ".." in Path(name).parts:
+        raise HTTPException(status_code=400, detail="Artifact no permitido")
+    offset = max(0, offset)
+    limit = max(1, min(limit, 1024 * 1024))
+
+    live = kali_runner.live_executions.get(report_id)
+    if live:
+        data = live["tail"].read(name, offset, limit)
+    else:
+        found_path = _find_report_dir(report_id)
+        if not found_path:
+            raise HTTPException(status_code=404, detail=f"Reporte no encontrado: {report_id}")
+        file_path = (found_path / name).resolve()
+        if not file_path.is_relative_to(found_path.resolve()):
+            raise HTTPException(status_code=400, detail="Artifact no permitido")
+        if not file_path.is_file():
+            raise HTTPException(status_code=404, detail=f"No se encontró el artefacto solicitado: {name}")
+        with open(file_path, "rb") as f:
+            f.seek(offset)
+            data = f.read(limit)
+
+    return {
+        "name": name,
+        "offset": offset,
+        "next_offset": offset + len(data),
+        "content": data.decode(errors="replace"),
+        "live": live is not None,
+    }
+
+
 @router.get("/{report_id}/pdf")
 async def export_report_pdf(report_id: str):
     """Genera y descarga un PDF profesional del reporte."""
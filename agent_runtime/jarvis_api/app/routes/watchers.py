@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Depends, HTTPException
+from typing import Dict, Any, List
+from app.dependencies import get_current_user, require_permission
+from app.watchers.runtime import watcher_runtime
+
+router = APIRouter()
+
+
+def _get_watcher(name: str):
+    watcher = watcher_runtime.watchers.get(name)
+    if not watcher:
+        raise HTTPException(status_code=404, detail="Watcher not found")
+    return watcher
+
+
+@router.get("/watchers", response_model=List[Dict[str, Any]])
+async def list_watchers(user: Dict = Depends(get_current_user)):
+    """Estado y métricas de cada watcher (última ejecución, duración, fallos)."""
+    return watcher_runtime.stats()
+
+
+@router.get("/watchers/{name}", response_model=Dict[str, Any])
+async def get_watcher(name: str, user: Dict = Depends(get_current_user)):
+    return _get_watcher(name).stats()
+
+
+@router.post("/watchers/{name}/pause", response_model=Dict[str, Any])
+async def pause_watcher(name: str, user: Dict = Depends(require_permission("configure_system"))):
+    _get_watcher(name)
+    return watcher_runtime.pause(name).stats()
+
+
+@router.post("/watchers/{name}/resume", response_model=Dict[str, Any])
+async def resume_watcher(name: str, user: Dict = Depends(require_permission("configure_system"))):
+    _get_watcher(name)
+    return watcher_runtime.resume(name).stats()
+
+
+@router.post("/watchers/{name}/trigger")
+async def trigger_watcher(name: str, user: Dict = Depends(require_permission("configure_system"))):
+    """Ejecuta el watcher ahora (también si está en pausa). 409 si ya está en curso."""
+    _get_watcher(name)
+    if not watcher_runtime.trigger(name):
+        raise HTTPException(status_code=409, detail="Watcher is already running")
+    return {"name": name, "triggered": True}
@@ -0,0 +1,250 @@
+"""
+Almacén local de artefactos direccionado por contenido (sha256).
+
+Los artefactos de las ejecuciones de Kali (salidas de nmap, pcaps...) se
+traen en trozos de tamaño fijo desde un stream remoto (QGA o SSH):
+  - cada trozo se añade a un fichero parcial y al sha256 incremental, sin
+    cargar el fichero entero en memoria;
+  - si la transferencia falla, el siguiente intento continúa desde el
+    tamaño del parcial (también tras reiniciar el proceso);
+  - al terminar, el parcial pasa a objects/<ab>/<sha256> (o .zst si se
+    comprime) y se enlaza en la carpeta del reporte.
+
+LiveTail usa el mismo parcial: mientras la herramienta corre va trayendo lo
+nuevo de sus salidas de texto, y la transferencia final solo trae el resto.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+from dataclasses import asdict, dataclass
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_STORE_DIR = os.getenv("ARTIFACT_STORE_DIR", "/opt/deco/artifacts")
+ARTIFACT_CHUNK_SIZE = int(os.getenv("ARTIFACT_CHUNK_SIZE", str(1024 * 1024)))
+ARTIFACT_RETRIES = int(os.getenv("ARTIFACT_RETRIES", "3"))
+# Comprimir con zstd los artefactos binarios (los de texto se leen tal cual desde el reporte)
+ARTIFACT_COMPRESSION = os.getenv("ARTIFACT_COMPRESSION", "zstd").lower() == "zstd" and HAS_ZSTD
+ARTIFACT_TAIL_INTERVAL = float(os.getenv("ARTIFACT_TAIL_INTERVAL", "2"))
+TEXT_ARTIFACT_SUFFIXES = (".txt", ".xml", ".json", ".md", ".log", ".csv", ".html", ".nmap", ".gnmap")
+
+# open_stream(offset) -> trozos del fichero remoto a partir de offset
+StreamOpener = Callable[[int], AsyncIterator[bytes]]
+
+
+def is_text_artifact(name: str) -> bool:
+    return name.lower().endswith(TEXT_ARTIFACT_SUFFIXES)
+
+
+@dataclass
+class ArtifactRef:
+    name: str
+    sha256: str
+    size: int
+    compressed: bool
+    path: str
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+class ArtifactStore:
+    def __init__(self, root: str = ARTIFACT_STORE_DIR, chunk_size: int = ARTIFACT_CHUNK_SIZE):
+        self.root = root
+        self.chunk_size = chunk_size
+        # key -> (bytes hasheados, sha256 en curso) para no re-leer el parcial en cada pasada
+        self._hashers: Dict[str, Tuple[int, "hashlib._Hash"]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def object_path(self, digest: str, compressed: bool = False) -> str:
+        return os.path.join(self.root, "objects", digest[:2], digest + (".zst" if compressed else ""))
+
+    def partial_path(self, key: str) -> str:
+        return os.path.join(self.root, "partial", hashlib.sha1(key.encode()).hexdigest())
+
+    def _lock(self, key: str) -> asyncio.Lock:
+        return self._locks.setdefault(key, asyncio.Lock())
+
+    def _hasher(self, key: str, partial: str):
+        size = os.path.getsize(partial) if os.path.exists(partial) else 0
+        cached = self._hashers.get(key)
+        if cached and cached[0] == size:
+            return cached[1]
+        # Parcial de un proceso anterior (o desincronizado): re-hashear desde disco
+        hasher = hashlib.sha256()
+        if size:
+            with open(partial, "rb") as f:
+                for chunk in iter(lambda: f.read(self.chunk_size), b""):
+                    hasher.update(chunk)
+        self._hashers[key] = (size, hasher)
+        return hasher
+
+    async def append(self, key: str, open_stream: StreamOpener) -> int:
+        """Trae lo que haya a partir del tamaño del parcial. Devuelve el tamaño nuevo."""
+        async with self._lock(key):
+            return await self._append(key, open_stream)
+
+    async def _append(self, key: str, open_stream: StreamOpener) -> int:
+        partial = self.partial_path(key)
+        os.makedirs(os.path.dirname(partial), exist_ok=True)
+        hasher = self._hasher(key, partial)
+        size = self._hashers[key][0]
+        with open(partial, "ab") as f:
+            async for chunk in open_stream(size):
+                f.write(chunk)
+                hasher.update(chunk)
+                size += len(chunk)
+                self._hashers[key] = (size, hasher)
+        return size
+
+    def read_partial(self, key: str, offset: int = 0, limit: int = 65536) -> bytes:
+        partial = self.partial_path(key)
+        if not os.path.exists(partial):
+            return b""
+        with open(partial, "rb") as f:
+            f.seek(offset)
+            return f.read(limit)
+
+    async def ingest(
+        self,
+        key: str,
+        name: str,
+        open_stream: StreamOpener,
+        compress: bool = False,
+        remote_sha256: Optional[Callable[[], Awaitable[Optional[str]]]] = None,
+        retries: int = ARTIFACT_RETRIES,
+    ) -> ArtifactRef:
+        """
+        Transferencia completa y reanudable de un artefacto. Si se puede
+        obtener el sha256 remoto y no coincide (fichero reescrito mientras se
+        seguía con LiveTail), se descarta el parcial y se trae de nuevo.
+        """
+        async with self._lock(key):
+            restarted = False
+            for attempt in range(retries + 1):
+                try:
+                    size = await self._append(key, open_stream)
+                except Exception as e:
+                    if attempt >= retries:
+                        raise
+                    logger.warning(f"[Artifacts] {name}: transfer interrupted at attempt {attempt + 1} ({e}), resuming")
+                    await asyncio.sleep(min(2 ** attempt, 10))
+                    continue
+
+                digest = self._hashers[key][1].hexdigest()
+                expected = await remote_sha256() if remote_sha256 else None
+                if expected and expected != digest and not restarted:
+                    logger.warning(f"[Artifacts] {name}: checksum mismatch after resume, fetching again")
+                    self.discard(key)
+                    restarted = True
+                    continue
+                if expected and expected != digest:
+                    raise ValueError(f"{name}: sha256 mismatch ({digest} != {expected})")
+                return self._finalize(key, name, digest, size, compress)
+            raise ValueError(f"{name}: transfer did not complete")
+
+    def _finalize(self, key: str, name: str, digest: str, size: int, compress: bool) -> ArtifactRef:
+        partial = self.partial_path(key)
+        compress = compress and HAS_ZSTD
+        target = self.object_path(digest, compress)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.exists(target):
+            # Mismo contenido ya almacenado
+            os.remove(partial)
+        elif compress:
+            tmp = target + ".tmp"
+            with open(partial, "rb") as src, open(tmp, "wb") as dst:
+                zstandard.ZstdCompressor().copy_stream(src, dst, read_size=self.chunk_size)
+            os.replace(tmp, target)
+            os.remove(partial)
+        else:
+            os.replace(partial, target)
+        self._hashers.pop(key, None)
+        self._locks.pop(key, None)
+        return ArtifactRef(name=name, sha256=digest, size=size, compressed=compress, path=target)
+
+    def discard(self, key: str):
+        self._hashers.pop(key, None)
+        try:
+            os.remove(self.partial_path(key))
+        except FileNotFoundError:
+            pass
+
+    def link(self, ref: ArtifactRef, dest_dir: str) -> str:
+        """Enlaza el objeto en la carpeta del reporte (copia si están en otro FS)."""
+        dest = os.path.join(dest_dir, ref.name + (".zst" if ref.compressed else ""))
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        if os.path.exists(dest):
+            os.remove(dest)
+        try:
+            os.link(ref.path, dest)
+        except OSError:
+            shutil.copyfile(ref.path, dest)
+        return dest
+
+
+class LiveTail:
+    """
+    Sigue las salidas de texto de una ejecución mientras corre: cada
+    ARTIFACT_TAIL_INTERVAL lista los ficheros remotos y añade lo nuevo a su
+    parcial en el almacén (consultable con read_partial).
+    """
+
+    def __init__(
+        self,
+        store: ArtifactStore,
+        key_prefix: str,
+        list_files: Callable[[], Awaitable[List[str]]],
+        opener: Callable[[str], StreamOpener],
+        interval: float = ARTIFACT_TAIL_INTERVAL,
+    ):
+        self.store = store
+        self.key_prefix = key_prefix
+        self.list_files = list_files
+        self.opener = opener
+        self.interval = interval
+        self.sizes: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def key(self, name: str) -> str:
+        return f"{self.key_prefix}:{name}"
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                names = [n for n in await self.list_files() if is_text_artifact(n)]
+            except Exception as e:
+                logger.debug(f"[Artifacts] tail listing failed: {e}")
+                continue
+            for name in names:
+                try:
+                    self.sizes[name] = await self.store.append(self.key(name), self.opener(name))
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.debug(f"[Artifacts] tail of {name} failed: {e}")
+
+    def read(self, name: str, offset: int = 0, limit: int = 65536) -> bytes:
+        return self.store.read_partial(self.key(name), offset, limit)
+
+
+artifact_store = ArtifactStore()
@@ -56,6 +56,38 @@ class ChatPersistenceService:
             .all()
         )
 
+    def get_recent_messages(self, conversation_id: str, limit: int = 20) -> List[Message]:
+        """Últimos mensajes de una conversación, en orden cronológico."""
+        recent = (
+            self.db.query(Message)
+            .filter(Message.conversation_id == conversation_id)
+            .order_by(Message.created_at.desc())
+            .limit(limit)
+            .all()
+        )
+        return list(reversed(recent))
+
+    def get_or_create_conversation(self, user_id: str, title: str, metadata: Optional[Dict] = None) -> Conversation:
+        """Conversación de un propietario identificada por título (sesiones de Jarvis Prime)."""
+        conversation = (
+            self.db.query(Conversation)
+            .filter(Conversation.user_id == user_id, Conversation.title == title, Conversation.is_archived.is_(False))
+            .order_by(Conversation.updated_at.desc())
+            .first()
+        )
+        if conversation:
+            return conversation
+        return self.create_conversation(user_id=user_id, title=title, metadata=metadata)
+
+    def update_conversation_metadata(self, conversation_id: str, values: Dict) -> Optional[Conversation]:
+        conversation = self.db.query(Conversation).filter(Conversation.id == conversation_id).first()
+        if not conversation:
+            return None
+        # Reasignar el dict para que SQLAlchemy detecte el cambio en JSONB
+        conversation.metadata_ = {**(conversation.metadata_ or {}), **values}
+        self.db.commit()
+        return conversation
+
     def save_message(
         self,
         conversation_id: str,
@@ -66,9 +98,12 @@ class ChatPersistenceService:
         uses_web_search: bool = False,
         is_important: bool = False,
         embedder: Optional[Callable[[str], List[float]]] = None,
+        embedding: Optional[List[float]] = None,
     ) -> Message:
-        embedding = None
-        if is_important and embedder:
+        # `embedding` ya calculado (rutas async); `embedder` para llamadas sync
+        if not is_important:
+            embedding = None
+        elif embedding is None and embedder:
             try:
                 embedding = embedder(content)
             except Exception:
@@ -0,0 +1,429 @@
+"""
+Memoria de conversación de Jarvis Prime.
+
+Sustituye al dict en proceso (crecía sin límite, se perdía al reiniciar y no
+se compartía entre workers de uvicorn):
+- nivel caliente en Redis: una clave por sesión con la ventana de turnos y el
+  resumen, con TTL de inactividad (las sesiones ociosas se expulsan solas);
+  cada cambio es una lectura-modificación-escritura atómica (WATCH/MULTI con
+  reintentos), así dos workers que escriben la misma sesión no pierden turnos;
+  si Redis no está disponible, un dict local acotado con la misma expulsión,
+- nivel frío en las tablas de chat (conversations / messages): los turnos se
+  guardan como mensajes y el resumen en conversations.metadata,
+- resumen acumulado generado por el LLM cada MEMORY_SUMMARY_EVERY turnos con
+  los turnos que salen de la ventana,
+- presupuesto de tokens al construir el prompt: resumen + los turnos más
+  recientes que quepan.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.services.ollama_client import PRIORITY_BACKGROUND
+
+logger = logging.getLogger(__name__)
+
+MEMORY_WINDOW_TURNS = int(os.getenv("MEMORY_WINDOW_TURNS", "8"))
+MEMORY_SUMMARY_EVERY = int(os.getenv("MEMORY_SUMMARY_EVERY", "6"))
+MEMORY_IDLE_TTL = int(os.getenv("MEMORY_IDLE_TTL", "1800"))
+MEMORY_PROMPT_TOKENS = int(os.getenv("MEMORY_PROMPT_TOKENS", "2000"))
+MEMORY_LOCAL_MAX_SESSIONS = int(os.getenv("MEMORY_LOCAL_MAX_SESSIONS", "500"))
+MEMORY_REDIS_PREFIX = "jarvis:memory:"
+# Reintentos de una actualización cuando otro worker cambió la sesión a la vez
+MEMORY_UPDATE_RETRIES = int(os.getenv("MEMORY_UPDATE_RETRIES", "10"))
+
+# Sesiones propias de Jarvis Prime en la tabla conversations
+PRIME_CONVERSATION_TITLE = "Jarvis Prime"
+
+SUMMARY_PROMPT = """Actualiza el resumen de una conversación entre un usuario y Jarvis.
+
+RESUMEN ANTERIOR:
+{summary}
+
+NUEVOS TURNOS:
+{turns}
+
+Escribe un resumen breve (máximo 150 palabras) en español que conserve objetivos,
+objetivos técnicos (IPs, dominios, CVEs), decisiones y tareas pendientes.
+Responde solo con el resumen."""
+
+
+def estimate_tokens(text: str) -> int:
+    """Aproximación barata (~4 caracteres por token) suficiente para presupuestar."""
+    return len(text) // 4 + 1
+
+
+def _empty_state() -> Dict[str, Any]:
+    # turns: [{"role", "content"}] pendientes de resumir + ventana; summary: texto
+    return {"turns": [], "summary": "", "turns_since_summary": 0, "conversation_id": None}
+
+
+# mutate(state) modifica el estado en sitio; load_missing() lo construye si la sesión no está
+StateMutator = Callable[[Dict[str, Any]], None]
+StateLoader = Callable[[], Awaitable[Dict[str, Any]]]
+
+
+class MemoryConflictError(RuntimeError):
+    """Otro worker siguió modificando la sesión durante todos los reintentos."""
+
+
+# ----------------------------------------------------------------------
+# Nivel caliente
+# ----------------------------------------------------------------------
+
+class _RedisHotTier:
+    def __init__(self, url: str, ttl: int):
+        import redis.asyncio as aioredis
+
+        self.redis = aioredis.from_url(url, decode_responses=True)
+        self.ttl = ttl
+
+    async def get(self, session: str) -> Optional[Dict[str, Any]]:
+        raw = await self.redis.get(MEMORY_REDIS_PREFIX + session)
+        if raw is None:
+            return None
+        # Leer renueva el TTL: solo expiran las sesiones sin actividad
+        await self.redis.expire(MEMORY_REDIS_PREFIX + session, self.ttl)
+        return json.loads(raw)
+
+    async def put(self, session: str, state: Dict[str, Any]):
+        await self.redis.set(MEMORY_REDIS_PREFIX + session, json.dumps(state), ex=self.ttl)
+
+    async def update(self, session: str, mutate: StateMutator, load_missing: StateLoader) -> Dict[str, Any]:
+        """
+        Lectura-modificación-escritura atómica: WATCH sobre la clave y SET en
+        MULTI/EXEC. Si otro worker escribe la sesión entre medias, EXEC falla
+        y se reintenta con el estado nuevo (mutate debe poder repetirse).
+        """
+        from redis.exceptions import WatchError
+
+        key = MEMORY_REDIS_PREFIX + session
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for attempt in range(max(1, MEMORY_UPDATE_RETRIES)):
+                if attempt:
+                    await asyncio.sleep(random.uniform(0, 0.01 * attempt))
+                try:
+                    await pipe.watch(key)
+                    raw = await pipe.get(key)
+                    state = json.loads(raw) if raw is not None else await load_missing()
+                    mutate(state)
+                    pipe.multi()
+                    pipe.set(key, json.dumps(state), ex=self.ttl)
+                    await pipe.execute()
+                    return state
+                except WatchError:
+                    continue
+        raise MemoryConflictError(f"session {session} changed concurrently on every retry")
+
+    async def delete(self, session: str):
+        await self.redis.delete(MEMORY_REDIS_PREFIX + session)
+
+
+class _LocalHotTier:
+    """Fallback sin Redis: LRU acotado con expiración por inactividad."""
+
+    def __init__(self, ttl: int, max_sessions: int = MEMORY_LOCAL_MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def _evict(self):
+        cutoff = time.monotonic() - self.ttl
+        for session in [s for s, (seen, _) in self._sessions.items() if seen < cutoff]:
+            del self._sessions[session]
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    async def get(self, session: str) -> Optional[Dict[str, Any]]:
+        self._evict()
+        item = self._sessions.get(session)
+        if item is None:
+            return None
+        self._sessions[session] = (time.monotonic(), item[1])
+        self._sessions.move_to_end(session)
+        return json.loads(json.dumps(item[1]))
+
+    async def put(self, session: str, state: Dict[str, Any]):
+        self._sessions[session] = (time.monotonic(), json.loads(json.dumps(state)))
+        self._sessions.move_to_end(session)
+        self._evict()
+
+    async def update(self, session: str, mutate: StateMutator, load_missing: StateLoader) -> Dict[str, Any]:
+        # Un solo loop: entre get y put solo se cede el control al cargar el nivel frío
+        state = await self.get(session)
+        if state is None:
+            loaded = await load_missing()
+            state = await self.get(session)
+            if state is None:
+                state = loaded
+        mutate(state)
+        await self.put(session, state)
+        return state
+
+    async def delete(self, session: str):
+        self._sessions.pop(session, None)
+
+
+# ----------------------------------------------------------------------
+# Memoria
+# ----------------------------------------------------------------------
+
+class ConversationMemory:
+    """Ventana de turnos + resumen por sesión, en Redis y en la base de datos de chat."""
+
+    def __init__(
+        self,
+        llm,
+        window_turns: int = MEMORY_WINDOW_TURNS,
+        summary_every: int = MEMORY_SUMMARY_EVERY,
+        idle_ttl: int = MEMORY_IDLE_TTL,
+        redis_url: Optional[str] = None,
+        session_factory=None,
+    ):
+        self.llm = llm
+        self.window_turns = window_turns
+        self.summary_every = summary_every
+        self.idle_ttl = idle_ttl
+        self.redis_url = redis_url or os.getenv("REDIS_URL", "redis://localhost:6379")
+        self._session_factory = session_factory
+        self._hot = None
+        self._local = _LocalHotTier(idle_ttl)
+        self._summarizing: Dict[str, asyncio.Task] = {}
+        # Serializa las actualizaciones de una sesión dentro del proceso; WATCH cubre las de otros workers
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    # --- niveles de almacenamiento ---
+
+    def _hot_tier(self):
+        if self._hot is None:
+            try:
+                self._hot = _RedisHotTier(self.redis_url, self.idle_ttl)
+            except Exception as e:
+                logger.warning(f"[Memory] Redis no disponible, memoria local: {e}")
+                self._hot = self._local
+        return self._hot
+
+    async def _hot_get(self, session: str) -> Optional[Dict[str, Any]]:
+        try:
+            return await self._hot_tier().get(session)
+        except Exception as e:
+            logger.warning(f"[Memory] Redis get falló, memoria local: {e}")
+            return await self._local.get(session)
+
+    async def _update(self, session: str, conversation_id: Optional[str], mutate: StateMutator) -> Dict[str, Any]:
+        """Aplica mutate al estado de la sesión de forma atómica y devuelve el estado guardado."""
+        async def load_missing() -> Dict[str, Any]:
+            try:
+                return await asyncio.to_thread(self._load_cold, session, conversation_id)
+            except Exception as e:
+                logger.warning(f"[Memory] Base de datos no disponible para {session}: {e}")
+                return _empty_state()
+
+        lock = self._locks.get(session)
+        if lock is None:
+            lock = self._locks[session] = asyncio.Lock()
+        async with lock:
+            try:
+                return await self._hot_tier().update(session, mutate, load_missing)
+            except MemoryConflictError:
+                # Redis funciona: escribir en local dejaría la sesión dividida entre niveles
+                raise
+            except Exception as e:
+                logger.warning(f"[Memory] Redis update falló, memoria local: {e}")
+                return await self._local.update(session, mutate, load_missing)
+
+    def _db(self):
+        if self._session_factory is None:
+            from app.database import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+    def _load_cold(self, session: str, conversation_id: Optional[str]) -> Dict[str, Any]:
+        """Reconstruye el estado desde conversations/messages (tras expulsión o reinicio)."""
+        from app.models.chat import Conversation
+        from app.services.chat_persistence import ChatPersistenceService
+
+        state = _empty_state()
+        db = self._db()
+        try:
+            service = ChatPersistenceService(db)
+            if conversation_id:
+                conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+            else:
+                conversation = service.get_or_create_conversation(
+                    user_id=session, title=PRIME_CONVERSATION_TITLE, metadata={"source": "jarvis_prime"}
+                )
+            if conversation is None:
+                return state
+            metadata = conversation.metadata_ or {}
+            messages = service.get_recent_messages(conversation.id, limit=self.window_turns * 2)
+            state.update(
+                turns=[{"role": m.role, "content": m.content} for m in messages if m.role in ("user", "assistant")],
+                summary=metadata.get("memory_summary", ""),
+                conversation_id=str(conversation.id),
+            )
+        finally:
+            db.close()
+        return state
+
+    def _persist_turn(self, conversation_id: str, user_input: str, reply: str):
+        from app.services.chat_persistence import ChatPersistenceService
+
+        db = self._db()
+        try:
+            service = ChatPersistenceService(db)
+            service.save_message(conversation_id=conversation_id, role="user", content=user_input)
+            service.save_message(conversation_id=conversation_id, role="assistant", content=reply)
+        finally:
+            db.close()
+
+    def _persist_summary(self, conversation_id: str, summary: str):
+        from app.services.chat_persistence import ChatPersistenceService
+
+        db = self._db()
+        try:
+            ChatPersistenceService(db).update_conversation_metadata(
+                conversation_id, {"memory_summary": summary, "memory_summary_at": time.time()}
+            )
+        finally:
+            db.close()
+
+    async def _state(self, session: str, conversation_id: Optional[str] = None) -> Dict[str, Any]:
+        state = await self._hot_get(session)
+        if state is not None:
+            return state
+        # Carga desde el nivel frío sin pisar un estado que otro worker haya escrito mientras
+        return await self._update(session, conversation_id, lambda state: None)
+
+    # --- API ---
+
+    async def recent(self, session: str, conversation_id: Optional[str] = None) -> List[Dict[str, str]]:
+        """Ventana de turnos recientes (user/assistant) de la sesión."""
+        state = await self._state(session, conversation_id)
+        return state["turns"][-self.window_turns * 2:]
+
+    async def summary(self, session: str, conversation_id: Optional[str] = None) -> str:
+        return (await self._state(session, conversation_id))["summary"]
+
+    async def append(
+        self,
+        session: str,
+        user_input: str,
+        reply: str,
+        conversation_id: Optional[str] = None,
+        persist: bool = True,
+    ):
+        """
+        Añade un turno. persist=False cuando el llamador ya guardó los mensajes
+        (rutas de chat); el resumen se guarda igualmente en la conversación.
+        """
+        def add_turn(state: Dict[str, Any]):
+            if not persist and state["turns"] and state["turns"][-1] == {"role": "user", "content": user_input}:
+                # Recargado desde la base de datos después de que la ruta guardara el mensaje
+                state["turns"].pop()
+            state["turns"].extend([
+                {"role": "user", "content": user_input},
+                {"role": "assistant", "content": reply},
+            ])
+            state["turns_since_summary"] += 1
+            # Tope duro por si el resumen falla repetidamente
+            state["turns"] = state["turns"][-(self.window_turns + 2 * self.summary_every) * 2:]
+
+        state = await self._update(session, conversation_id, add_turn)
+
+        if persist and state.get("conversation_id"):
+            try:
+                await asyncio.to_thread(self._persist_turn, state["conversation_id"], user_input, reply)
+            except Exception as e:
+                logger.warning(f"[Memory] No se pudo persistir el turno de {session}: {e}")
+
+        overflow = len(state["turns"]) - self.window_turns * 2
+        if state["turns_since_summary"] >= self.summary_every and overflow > 0 and session not in self._summarizing:
+            # En segundo plano: no retrasa la respuesta al usuario
+            task = asyncio.create_task(self._refresh_summary(session, conversation_id))
+            self._summarizing[session] = task
+            task.add_done_callback(lambda _: self._summarizing.pop(session, None))
+
+    async def _refresh_summary(self, session: str, conversation_id: Optional[str]):
+        state = await self._state(session, conversation_id)
+        overflow = len(state["turns"]) - self.window_turns * 2
+        if overflow <= 0:
+            return
+        older = state["turns"][:overflow]
+        transcript = "\n".join(f"{t['role']}: {t['content'][:800]}" for t in older)
+        try:
+            response = await self.llm.achat(
+                priority=PRIORITY_BACKGROUND,
+                messages=[{"role": "user", "content": SUMMARY_PROMPT.format(
+                    summary=state["summary"] or "(vacío)", turns=transcript
+                )}],
+                options={"temperature": 0.1},
+            )
+            summary = response["message"]["content"].strip()
+        except Exception as e:
+            logger.warning(f"[Memory] No se pudo resumir {session}: {e}")
+            return
+
+        # Sobre el estado actual: pudo haber turnos nuevos mientras el LLM resumía
+        def apply_summary(current: Dict[str, Any]):
+            current["summary"] = summary
+            if current["turns"][:len(older)] == older:
+                current["turns"] = current["turns"][len(older):]
+            current["turns_since_summary"] = 0
+
+        try:
+            current = await self._update(session, conversation_id, apply_summary)
+        except MemoryConflictError as e:
+            # Tarea en segundo plano: nadie recogería la excepción. Se resumirá en el próximo turno
+            logger.warning(f"[Memory] No se pudo guardar el resumen de {session}: {e}")
+            return
+        if current.get("conversation_id"):
+            try:
+                await asyncio.to_thread(self._persist_summary, current["conversation_id"], summary)
+            except Exception as e:
+                logger.warning(f"[Memory] No se pudo guardar el resumen de {session}: {e}")
+        logger.info(f"[Memory] Resumen actualizado para {session} ({len(older)} mensajes condensados)")
+
+    async def build_context(
+        self,
+        session: str,
+        history: Optional[List[Dict[str, str]]] = None,
+        budget_tokens: int = MEMORY_PROMPT_TOKENS,
+        conversation_id: Optional[str] = None,
+    ) -> List[Dict[str, str]]:
+        """
+        Mensajes para el prompt dentro del presupuesto: el resumen (si hay) y
+        los turnos más recientes que quepan. history sustituye a la ventana
+        almacenada cuando el llamador trae su propio historial.
+        """
+        state = await self._state(session, conversation_id)
+        turns = history if history is not None else state["turns"]
+        messages: List[Dict[str, str]] = []
+        remaining = budget_tokens
+        if state["summary"]:
+            summary_message = {"role": "system", "content": f"Resumen de la conversación hasta ahora:\n{state['summary']}"}
+            remaining -= estimate_tokens(summary_message["content"])
+            messages.append(summary_message)
+
+        recent: List[Dict[str, str]] = []
+        for turn in reversed(turns):
+            cost = estimate_tokens(turn["content"])
+            if cost > remaining:
+                break
+            recent.append(turn)
+            remaining -= cost
+        return messages + list(reversed(recent))
+
+    async def forget(self, session: str):
+        try:
+            await self._hot_tier().delete(session)
+        except Exception:
+            pass
+        await self._local.delete(session)
@@ -1,5 +1,9 @@
+import asyncio
+import copy
 import logging
+from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
+from typing import List, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -99,95 +103,126 @@ class DecoSupervisor:
         return {"status": status, "severity": severity, "analysis": analysis}
 
     @staticmethod
-    async def run_auto_remediation_cycle(db_session):
+    async def run_auto_remediation_cycle():
         """
         Periodic task to find and execute pending auto-remediations.
+        Runs on the event loop (kali_runner is async); every DB step runs in a
+        worker thread with its own session.
         """
-        from app.models.alerts import SystemAlert
-        import copy
-        
         logger.info("Running Auto-Remediation Cycle...")
-        
-        alerts = db_session.query(SystemAlert).filter(SystemAlert.status == "open").all()
-        
-        for alert in alerts:
-            if not alert.alert_metadata:
-                continue
-                
-            # We need to work on a copy to ensure we don't modify the DB object in place
-            # until we are ready, and to ensure SQLAlchemy detects the change.
-            meta_copy = copy.deepcopy(alert.alert_metadata)
-            sup_analysis = meta_copy.get("supervisor_analysis", {})
-            remediation = sup_analysis.get("remediation", {})
-            
-            if remediation.get("auto_action_level") == "auto" and remediation.get("auto_status") == "pending":
+
+        for alert_id in await asyncio.to_thread(DecoSupervisor._claim_auto_remediations):
+            logger.info(f"Auto-remediating Alert {alert_id}")
+            try:
+                result = await DecoSupervisor.execute_remediation(alert_id, "deco_supervisor")
+
+                if result["status"] == "success" or result["status"] == "completed":
+                    status = "success"
+                    message = f"Auto-remediation successful. Job ID: {result.get('execution_id')}"
+                else:
+                    status = "failed"
+                    message = f"Execution failed: {result.get('status')}"
+
+            except Exception as e:
+                logger.error(f"Auto-remediation failed for {alert_id}: {e}")
+                status = "failed"
+                message = f"Error: {str(e)}"
+
+            await asyncio.to_thread(DecoSupervisor._finish_auto_remediation, alert_id, status, message)
+
+    @staticmethod
+    def _claim_auto_remediations() -> List[str]:
+        """
+        Sync: marks the attempt on every open alert with a pending auto
+        remediation out of cooldown, and returns their ids.
+        """
+        from app.database import SessionLocal
+        from app.models.alerts import SystemAlert
+
+        db_session = SessionLocal()
+        try:
+            claimed = []
+            alerts = db_session.query(SystemAlert).filter(SystemAlert.status == "open").all()
+
+            for alert in alerts:
+                if not alert.alert_metadata:
+                    continue
+
+                # We need to work on a copy to ensure we don't modify the DB object in place
+                # until we are ready, and to ensure SQLAlchemy detects the change.
+                meta_copy = copy.deepcopy(alert.alert_metadata)
+                sup_analysis = meta_copy.get("supervisor_analysis", {})
+                remediation = sup_analysis.get("remediation", {})
+
+                if remediation.get("auto_action_level") != "auto" or remediation.get("auto_status") != "pending":
+                    continue
+
                 # Check cooldown and attempts
                 attempts = remediation.get("auto_attempts_count", 0)
                 last_attempt = remediation.get("auto_last_attempt_at")
-                
+
                 if attempts >= 2:
                     logger.info(f"Alert {alert.id}: Max auto attempts reached.")
                     remediation["auto_status"] = "failed"
                     remediation["auto_last_message"] = "Max attempts reached (2). Manual intervention required."
-                    
                     alert.alert_metadata = meta_copy
-                    db_session.commit()
                     continue
-                
+
                 if last_attempt:
                     last_dt = datetime.fromisoformat(last_attempt)
                     if (datetime.now() - last_dt).total_seconds() < 900: # 15 min cooldown
                         continue
 
-                # Execute!
-                logger.info(f"Auto-remediating Alert {alert.id} (Attempt {attempts + 1})")
-                try:
-                    # Mark as attempting
-                    remediation["auto_attempts_count"] = attempts + 1
-                    remediation["auto_last_attempt_at"] = datetime.now().isoformat()
-                    
-                    # Execute
-                    result = await DecoSupervisor.execute_remediation(alert.id, "deco_supervisor", db_session)
-                    
-                    if result["status"] == "success" or result["status"] == "completed":
-                        remediation["auto_status"] = "success"
-                        remediation["auto_last_message"] = f"Auto-remediation successful. Job ID: {result.get('execution_id')}"
-                    else:
-                        remediation["auto_status"] = "failed"
-                        remediation["auto_last_message"] = f"Execution failed: {result.get('status')}"
-                        
-                except Exception as e:
-                    logger.error(f"Auto-remediation failed for {alert.id}: {e}")
-                    remediation["auto_status"] = "failed"
-                    remediation["auto_last_message"] = f"Error: {str(e)}"
-                
-                # Update DB
+                # Mark as attempting
+                remediation["auto_attempts_count"] = attempts + 1
+                remediation["auto_last_attempt_at"] = datetime.now().isoformat()
                 alert.alert_metadata = meta_copy
-                db_session.commit()
+                claimed.append(alert.id)
+
+            db_session.commit()
+            return claimed
+        finally:
+            db_session.close()
+
+    @staticmethod
+    def _finish_auto_remediation(alert_id: str, status: str, message: str):
+        """Sync: records the outcome of an auto-remediation attempt on the alert."""
+        from app.database import SessionLocal
+        from app.models.alerts import SystemAlert
+
+        db_session = SessionLocal()
+        try:
+            alert = db_session.query(SystemAlert).filter(SystemAlert.id == alert_id).first()
+            if not alert or not alert.alert_metadata:
+                return
+            # Re-read: execute_remediation appended to remediation_history meanwhile
+            meta_copy = copy.deepcopy(alert.alert_metadata)
+            remediation = meta_copy.get("supervisor_analysis", {}).get("remediation", {})
+            remediation["auto_status"] = status
+            remediation["auto_last_message"] = message
+            alert.alert_metadata = meta_copy
+            db_session.commit()
+        finally:
+            db_session.close()
 
     @staticmethod
-    async def execute_remediation(alert_id: str, user_id: str, db_session) -> dict:
+    async def execute_remediation(alert_id: str, user_id: str, db_session=None) -> dict:
         """
         Executes the remediation action for a given alert.
+        DB reads and writes run in a worker thread; without db_session each
+        one uses its own session.
         """
-        from app.models.alerts import SystemAlert
         from app.services.kali_runner import kali_runner
         from app.routes.catalog import MOCK_ACTIONS
-        
-        alert = db_session.query(SystemAlert).filter(SystemAlert.id == alert_id).first()
-        if not alert:
-            raise ValueError("Alert not found")
-            
-        if not alert.alert_metadata or not alert.alert_metadata.get("supervisor_analysis", {}).get("remediation", {}).get("available"):
-            raise ValueError("No remediation available for this alert")
-            
-        remediation_config = alert.alert_metadata["supervisor_analysis"]["remediation"]
+
+        remediation_config, target = await asyncio.to_thread(
+            DecoSupervisor._load_remediation, alert_id, db_session
+        )
         action_id = remediation_config["action_id"]
-        
+
         # Special case for Qdrant restart (mock)
         if action_id == "act_restart_qdrant":
              # Mock restart logic
-             import asyncio
              await asyncio.sleep(2)
              return {"status": "success", "execution_id": "mock_restart_qdrant"}
 
@@ -197,12 +232,6 @@ class DecoSupervisor:
             raise ValueError(f"Action definition {action_id} not found")
 
         # Execute
-        # We need a target. Usually alerts have metadata['agent_key'] or similar.
-        # For recon/vuln, target is usually the network or asset.
-        # If missing, we default to a safe target or fail.
-        # For now, let's assume a default target or try to find it in alert metadata.
-        target = alert.alert_metadata.get("target", "192.168.1.0/24") # Default fallback
-        
         try:
             result = await kali_runner.run_action(
                 action_id=action_id,
@@ -210,40 +239,74 @@ class DecoSupervisor:
                 target=target,
                 params={}
             )
-            
-            # Update Alert Metadata with History
-            new_metadata = dict(alert.alert_metadata) # Copy
-            if "remediation_history" not in new_metadata:
-                new_metadata["remediation_history"] = []
-                
-            new_metadata["remediation_history"].append({
+
+            await asyncio.to_thread(DecoSupervisor._record_remediation, alert_id, {
                 "timestamp": datetime.now().isoformat(),
                 "user": user_id,
                 "action_id": action_id,
                 "status": result["status"],
                 "execution_id": result["execution_id"]
-            })
-            
-            alert.alert_metadata = new_metadata
-            db_session.commit()
-            
+            }, db_session)
+
             return {"status": "success", "execution_id": result["execution_id"]}
-            
+
         except Exception as e:
             logger.error(f"Remediation failed: {e}")
             # Log failure
-            new_metadata = dict(alert.alert_metadata)
-            if "remediation_history" not in new_metadata:
-                new_metadata["remediation_history"] = []
-                
-            new_metadata["remediation_history"].append({
+            await asyncio.to_thread(DecoSupervisor._record_remediation, alert_id, {
                 "timestamp": datetime.now().isoformat(),
                 "user": user_id,
                 "action_id": action_id,
                 "status": "failed",
                 "error": str(e)
-            })
-            alert.alert_metadata = new_metadata
-            db_session.commit()
+            }, db_session)
             raise e
 
+    @staticmethod
+    @contextmanager
+    def _session(db_session):
+        """The caller's session, or a new one closed on exit."""
+        if db_session is not None:
+            yield db_session
+            return
+        from app.database import SessionLocal
+        own = SessionLocal()
+        try:
+            yield own
+        finally:
+            own.close()
+
+    @staticmethod
+    def _load_remediation(alert_id: str, db_session=None) -> Tuple[dict, str]:
+        """Sync: remediation config and target of the alert."""
+        from app.models.alerts import SystemAlert
+
+        with DecoSupervisor._session(db_session) as db:
+            alert = db.query(SystemAlert).filter(SystemAlert.id == alert_id).first()
+            if not alert:
+                raise ValueError("Alert not found")
+
+            if not alert.alert_metadata or not alert.alert_metadata.get("supervisor_analysis", {}).get("remediation", {}).get("available"):
+                raise ValueError("No remediation available for this alert")
+
+            # We need a target. Usually alerts have metadata['agent_key'] or similar.
+            # For recon/vuln, target is usually the network or asset.
+            # If missing, we default to a safe target or fail.
+            # For now, let's assume a default target or try to find it in alert metadata.
+            target = alert.alert_metadata.get("target", "192.168.1.0/24") # Default fallback
+            return dict(alert.alert_metadata["supervisor_analysis"]["remediation"]), target
+
+    @staticmethod
+    def _record_remediation(alert_id: str, entry: dict, db_session=None):
+        """Sync: appends entry to the alert's remediation_history."""
+        from app.models.alerts import SystemAlert
+
+        with DecoSupervisor._session(db_session) as db:
+            alert = db.query(SystemAlert).filter(SystemAlert.id == alert_id).first()
+            if not alert:
+                return
+            # Update Alert Metadata with History
+            new_metadata = dict(alert.alert_metadata) # Copy
+            new_metadata["remediation_history"] = list(new_metadata.get("remediation_history", [])) + [entry]
+            alert.alert_metadata = new_metadata
+            db.commit()
@@ -0,0 +1,128 @@
+"""
+Almacén local de documentos referenciados desde Qdrant.
+
+El texto completo (chunks RAG, contenido CLE, mensajes de chat) no viaja en el
+payload de Qdrant: se guarda aquí (SQLite, JSON comprimido con zlib) bajo el id
+del punto, y el payload conserva solo doc_id y una vista previa corta.
+"""
+
+import json
+import logging
+import os
+import time
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.services.sqlite_store import SQLiteStore, shared_store
+from app.services.vector_schema import base_collection
+
+logger = logging.getLogger(__name__)
+
+DOC_STORE_PATH = os.getenv("DOC_STORE_PATH", "/opt/deco/agent_runtime/data/vector_documents.sqlite3")
+PREVIEW_CHARS = 200
+
+# Campos de texto que salen del payload de cada colección
+SLIM_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "jarvis_knowledge_base": ("text",),
+    "jarvis_chat_memory": ("user", "assistant"),
+    "cle_articles": ("content",),
+    "cle_github": ("readme_content",),
+    "cle_youtube": ("transcript",),
+}
+
+
+class DocumentStore(SQLiteStore):
+    """Clave id de punto -> dict de campos de texto."""
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS documents (
+            id TEXT PRIMARY KEY,
+            collection TEXT NOT NULL,
+            body BLOB NOT NULL,
+            created_at REAL NOT NULL
+        )
+        """,
+    )
+    SYNCHRONOUS = "NORMAL"
+
+    def __init__(self, path: str = DOC_STORE_PATH):
+        super().__init__(path)
+
+    def put_many(self, collection: str, documents: Dict[str, Dict[str, Any]]):
+        if not documents:
+            return
+        now = time.time()
+        rows = [
+            (str(doc_id), base_collection(collection), zlib.compress(json.dumps(doc, ensure_ascii=False).encode("utf-8")), now)
+            for doc_id, doc in documents.items()
+        ]
+        with self._lock, self._transaction():
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO documents (id, collection, body, created_at) VALUES (?, ?, ?, ?)", rows
+            )
+
+    def get_many(self, ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        unique = list(dict.fromkeys(str(i) for i in ids if i))
+        found: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            for start in range(0, len(unique), 500):
+                block = unique[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT id, body FROM documents WHERE id IN ({','.join('?' * len(block))})", block
+                ).fetchall()
+                for doc_id, body in rows:
+                    found[doc_id] = json.loads(zlib.decompress(body).decode("utf-8"))
+        return found
+
+    def delete_many(self, ids: Iterable[str]):
+        ids = [(str(i),) for i in ids]
+        with self._lock:
+            self._conn.executemany("DELETE FROM documents WHERE id = ?", ids)
+
+    def count(self, collection: Optional[str] = None) -> int:
+        with self._lock:
+            if collection:
+                return self._conn.execute(
+                    "SELECT COUNT(*) FROM documents WHERE collection = ?", (base_collection(collection),)
+                ).fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+
+def slim_payload(collection: str, point_id: str, payload: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """
+    Separa los campos de texto largos del payload.
+    Devuelve (payload reducido, documento a guardar o None si no hay nada que mover).
+    """
+    fields = SLIM_FIELDS.get(base_collection(collection), ())
+    moved = {f: payload[f] for f in fields if payload.get(f) is not None}
+    if not moved:
+        return payload, None
+    slim = {k: v for k, v in payload.items() if k not in moved}
+    slim["doc_id"] = str(point_id)
+    slim["preview"] = str(next(iter(moved.values())))[:PREVIEW_CHARS]
+    return slim, moved
+
+
+def hydrate_payloads(store: Optional["DocumentStore"], payloads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Devuelve los payloads con los campos de texto recuperados del almacén.
+    Los puntos antiguos (texto aún en el payload) se devuelven tal cual.
+    """
+    ids = [p.get("doc_id") for p in payloads if p.get("doc_id")]
+    documents: Dict[str, Dict[str, Any]] = {}
+    if ids and store is not None:
+        try:
+            documents = store.get_many(ids)
+        except Exception as e:
+            logger.error(f"[DocumentStore] Error leyendo documentos: {e}")
+    hydrated = []
+    for payload in payloads:
+        doc = documents.get(payload.get("doc_id") or "")
+        hydrated.append({**payload, **doc} if doc else payload)
+    return hydrated
+
+
+def get_document_store(path: str = DOC_STORE_PATH) -> Optional[DocumentStore]:
+    """Almacén compartido del proceso (None si no se puede abrir el fichero)."""
+    return shared_store(DocumentStore, path, f"[DocumentStore] No se pudo abrir {path}")
@@ -0,0 +1,240 @@
+"""
+Servicio de embeddings por lotes con cache persistente.
+
+- embed_many(): deduplica el lote, resuelve lo que ya está en cache y envía el
+  resto a Ollama en paralelo (EMBED_CONCURRENCY peticiones a la vez, además del
+  límite global del cliente Ollama).
+- Cache SQLite local: clave (modelo, md5(texto)), vector como blob float32,
+  acotada en tamaño (EMBED_CACHE_MAX_MB) con expulsión LRU.
+
+Reingestar contenido sin cambios no hace ninguna llamada al modelo.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import sys
+import time
+from array import array
+from typing import Dict, List, Optional, Sequence
+
+from app.services.ollama_async import PRIORITY_NORMAL
+from app.services.ollama_client import JarvisOllamaClient
+from app.services.sqlite_store import SQLiteStore, shared_store
+
+logger = logging.getLogger(__name__)
+
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "/opt/deco/agent_runtime/data/embedding_cache.sqlite3")
+EMBED_CACHE_MAX_MB = float(os.getenv("EMBED_CACHE_MAX_MB", "512"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+DEFAULT_EMBED_MODEL = "jarvis-core"
+
+# Al superar el límite se expulsa hasta quedar en este porcentaje
+_EVICT_TARGET = 0.9
+
+
+def text_hash(text: str) -> str:
+    """md5 del texto (mismo valor que chunk_hash en el RAG)."""
+    return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+
+def _pack(vector: Sequence[float]) -> bytes:
+    data = array("f", vector)
+    if sys.byteorder != "little":
+        data.byteswap()
+    return data.tobytes()
+
+
+def _unpack(blob: bytes) -> List[float]:
+    data = array("f")
+    data.frombytes(blob)
+    if sys.byteorder != "little":
+        data.byteswap()
+    return data.tolist()
+
+
+class EmbeddingCache(SQLiteStore):
+    """Cache de vectores en SQLite (WAL), segura entre hilos."""
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS embeddings (
+            model TEXT NOT NULL,
+            text_hash TEXT NOT NULL,
+            dim INTEGER NOT NULL,
+            vector BLOB NOT NULL,
+            last_used REAL NOT NULL,
+            PRIMARY KEY (model, text_hash)
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used)",
+    )
+    SYNCHRONOUS = "NORMAL"
+
+    def __init__(self, path: str = EMBED_CACHE_PATH, max_bytes: int = int(EMBED_CACHE_MAX_MB * 1024 * 1024)):
+        self.max_bytes = max_bytes
+        super().__init__(path)
+        self.total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+
+    def get_many(self, model: str, hashes: Sequence[str]) -> Dict[str, List[float]]:
+        if not hashes:
+            return {}
+        found: Dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            # SQLite limita los parámetros por sentencia: consultamos por bloques
+            for start in range(0, len(unique), 500):
+                block = unique[start:start + 500]
+                marks = ",".join("?" * len(block))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({marks})",
+                    [model, *block],
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = _unpack(blob)
+            if found:
+                now = time.time()
+                with self._transaction():
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                        [(now, model, h) for h in found],
+                    )
+        return found
+
+    def put_many(self, model: str, vectors: Dict[str, Sequence[float]]):
+        if not vectors:
+            return
+        now = time.time()
+        rows = [(model, h, len(v), _pack(v), now) for h, v in vectors.items() if v]
+        with self._lock:
+            added = 0
+            with self._transaction():
+                for model_, h, dim, blob, ts in rows:
+                    previous = self._conn.execute(
+                        "SELECT LENGTH(vector) FROM embeddings WHERE model = ? AND text_hash = ?", (model_, h)
+                    ).fetchone()
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO embeddings (model, text_hash, dim, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+                        (model_, h, dim, blob, ts),
+                    )
+                    added += len(blob) - (previous[0] if previous else 0)
+            self.total_bytes += added
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Expulsa los menos usados recientemente hasta _EVICT_TARGET del límite."""
+        target = int(self.max_bytes * _EVICT_TARGET)
+        removed = 0
+        while self.total_bytes > target:
+            rows = self._conn.execute(
+                "SELECT model, text_hash, LENGTH(vector) FROM embeddings ORDER BY last_used LIMIT 500"
+            ).fetchall()
+            if not rows:
+                self.total_bytes = 0
+                break
+            cut = []
+            for model, h, size in rows:
+                cut.append((model, h))
+                self.total_bytes -= size
+                if self.total_bytes <= target:
+                    break
+            with self._transaction():
+                self._conn.executemany("DELETE FROM embeddings WHERE model = ? AND text_hash = ?", cut)
+            removed += len(cut)
+        logger.info(f"[EmbeddingCache] Expulsados {removed} vectores ({self.total_bytes / 1024 / 1024:.1f} MB en cache)")
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {
+            "entries": count,
+            "size_mb": round(self.total_bytes / 1024 / 1024, 2),
+            "max_mb": round(self.max_bytes / 1024 / 1024, 2),
+        }
+
+
+class EmbeddingService:
+    """Embeddings por lotes: cache primero, Ollama en paralelo para el resto."""
+
+    def __init__(
+        self,
+        ollama_client: Optional[JarvisOllamaClient] = None,
+        cache: Optional[EmbeddingCache] = None,
+        concurrency: int = EMBED_CONCURRENCY,
+    ):
+        self.ollama = ollama_client or JarvisOllamaClient()
+        self.cache = cache if cache is not None else _open_default_cache()
+        self.concurrency = max(1, concurrency)
+        self.counters = {"cache_hits": 0, "model_calls": 0, "failures": 0}
+
+    async def embed_many(
+        self,
+        texts: Sequence[str],
+        model: str = DEFAULT_EMBED_MODEL,
+        priority: int = PRIORITY_NORMAL,
+    ) -> List[Optional[List[float]]]:
+        """
+        Devuelve un vector por texto, en el mismo orden (None si falló).
+        """
+        hashes = [text_hash(t) for t in texts]
+        by_hash: Dict[str, str] = dict(zip(hashes, texts))
+
+        vectors: Dict[str, List[float]] = {}
+        if self.cache is not None:
+            try:
+                vectors = await asyncio.to_thread(self.cache.get_many, model, list(by_hash))
+            except Exception as e:
+                logger.error(f"[Embeddings] Error leyendo cache: {e}")
+        self.counters["cache_hits"] += len(vectors)
+
+        missing = [h for h in by_hash if h not in vectors]
+        if missing:
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def _embed(h: str):
+                async with semaphore:
+                    return h, await self.ollama.agenerate_embedding(by_hash[h], model=model, priority=priority)
+
+            self.counters["model_calls"] += len(missing)
+            fresh = {h: v for h, v in await asyncio.gather(*(_embed(h) for h in missing)) if v}
+            self.counters["failures"] += len(missing) - len(fresh)
+            vectors.update(fresh)
+            if fresh and self.cache is not None:
+                try:
+                    await asyncio.to_thread(self.cache.put_many, model, fresh)
+                except Exception as e:
+                    logger.error(f"[Embeddings] Error escribiendo cache: {e}")
+
+        if missing or vectors:
+            logger.debug(f"[Embeddings] lote={len(texts)} únicos={len(by_hash)} cache={len(by_hash) - len(missing)} modelo={len(missing)}")
+        return [vectors.get(h) for h in hashes]
+
+    async def embed(self, text: str, model: str = DEFAULT_EMBED_MODEL, priority: int = PRIORITY_NORMAL) -> Optional[List[float]]:
+        return (await self.embed_many([text], model=model, priority=priority))[0]
+
+    def embed_many_sync(
+        self,
+        texts: Sequence[str],
+        model: str = DEFAULT_EMBED_MODEL,
+        priority: int = PRIORITY_NORMAL,
+    ) -> List[Optional[List[float]]]:
+        """Versión bloqueante para código sync (p. ej. JarvisRAGPipeline)."""
+        return self.ollama.client.run_sync(self.embed_many(texts, model=model, priority=priority))
+
+    def embed_sync(self, text: str, model: str = DEFAULT_EMBED_MODEL, priority: int = PRIORITY_NORMAL) -> Optional[List[float]]:
+        return self.embed_many_sync([text], model=model, priority=priority)[0]
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            **self.counters,
+            "cache": self.cache.stats() if self.cache is not None else None,
+        }
+
+
+def _open_default_cache() -> Optional[EmbeddingCache]:
+    """Cache compartida del proceso; sin cache si el disco no es usable."""
+    return shared_store(EmbeddingCache, EMBED_CACHE_PATH, f"[EmbeddingCache] No se pudo abrir {EMBED_CACHE_PATH}, continuando sin cache")
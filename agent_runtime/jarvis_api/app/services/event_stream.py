@@ -0,0 +1,194 @@
+"""
+Streaming de eventos (SSE y WebSocket) para chat y ejecuciones de agentes.
+
+Un productor (generación de Jarvis Prime, recon, vulnscan) escribe eventos
+estructurados en un EventChannel y el transporte los reenvía al cliente:
+  token        fragmento de texto generado por Ollama
+  plan         intención / fases que se van a ejecutar
+  tool_start   arranca una herramienta (comando) o agente
+  tool_output  fragmento de la salida de la herramienta
+  reflect      resultado intermedio de una fase
+  done         resultado final
+  error        fallo del productor
+
+- Backpressure: la cola es acotada; si el cliente lee despacio, emit() espera
+  y el productor deja de leer de Ollama / del pipe del proceso.
+- Desconexión: el productor se cancela, lo que aborta el stream de Ollama
+  (chat_stream cancela la petición) y mata el proceso de la herramienta.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from fastapi import Request, WebSocket
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "64"))
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+STREAM_DISCONNECT_CHECK_SECONDS = 1.0
+TOOL_OUTPUT_CHUNK = 4096
+
+_END = object()
+
+Producer = Callable[["EventChannel"], Awaitable[Any]]
+
+
+class EventChannel:
+    """Cola acotada de eventos entre el productor y el transporte."""
+
+    def __init__(self, maxsize: int = STREAM_QUEUE_SIZE):
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+    async def emit(self, event: str, **data):
+        await self._queue.put({"event": event, **data})
+
+    async def close(self):
+        await self._queue.put(_END)
+
+    async def get(self):
+        return await self._queue.get()
+
+
+async def _drive(producer: Producer, channel: EventChannel):
+    try:
+        await producer(channel)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"[Stream] Productor falló: {e}")
+        await channel.emit("error", message=str(e))
+    await channel.close()
+
+
+def _format_sse(item: Dict[str, Any]) -> str:
+    payload = {k: v for k, v in item.items() if k != "event"}
+    return f"event: {item['event']}\ndata: {json.dumps(payload, default=str, ensure_ascii=False)}\n\n"
+
+
+def sse_response(request: Request, producer: Producer) -> StreamingResponse:
+    """Ejecuta el productor y reenvía sus eventos como text/event-stream."""
+
+    async def body():
+        channel = EventChannel()
+        task = asyncio.create_task(_drive(producer, channel))
+        last_check = time.monotonic()
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(channel.get(), timeout=STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                if item is _END:
+                    break
+                yield _format_sse(item)
+                if time.monotonic() - last_check > STREAM_DISCONNECT_CHECK_SECONDS:
+                    last_check = time.monotonic()
+                    if await request.is_disconnected():
+                        break
+        finally:
+            # Cliente desconectado o stream terminado: abortar lo que siga corriendo
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def websocket_stream(websocket: WebSocket, producer: Producer):
+    """
+    Variante WebSocket: envía cada evento como JSON. Un mensaje
+    {"type": "cancel"} del cliente o la desconexión cancelan el productor.
+    """
+    channel = EventChannel()
+    task = asyncio.create_task(_drive(producer, channel))
+
+    async def watch_client():
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            try:
+                if json.loads(message.get("text") or "{}").get("type") == "cancel":
+                    return
+            except ValueError:
+                continue
+
+    watcher = asyncio.create_task(watch_client())
+    try:
+        while True:
+            getter = asyncio.ensure_future(channel.get())
+            done, _ = await asyncio.wait({getter, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if getter not in done:
+                getter.cancel()
+                break
+            item = getter.result()
+            if item is _END:
+                break
+            await websocket.send_text(json.dumps(item, default=str, ensure_ascii=False))
+    finally:
+        task.cancel()
+        watcher.cancel()
+        await asyncio.gather(task, watcher, return_exceptions=True)
+
+
+async def run_tool_streamed(
+    cmd: List[str],
+    events: EventChannel,
+    timeout: Optional[float] = None,
+    tool: Optional[str] = None,
+) -> subprocess.CompletedProcess:
+    """
+    Equivalente a subprocess.run(capture_output=True, text=True) que emite
+    tool_start / tool_output mientras el proceso corre. Lanza
+    subprocess.TimeoutExpired como subprocess.run; si se cancela, mata el proceso.
+    """
+    name = tool or cmd[0]
+    await events.emit("tool_start", tool=name, command=" ".join(cmd))
+    process = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    stdout: List[bytes] = []
+
+    async def pump_stdout():
+        while True:
+            chunk = await process.stdout.read(TOOL_OUTPUT_CHUNK)
+            if not chunk:
+                return
+            stdout.append(chunk)
+            # Si el cliente va lento, emit() espera y el pipe se llena: el proceso se frena
+            await events.emit("tool_output", tool=name, chunk=chunk.decode("utf-8", errors="replace"))
+
+    async def collect():
+        # stderr en paralelo para que no se bloquee el proceso con el pipe lleno
+        _, stderr = await asyncio.gather(pump_stdout(), process.stderr.read())
+        await process.wait()
+        return stderr
+
+    try:
+        stderr = await asyncio.wait_for(collect(), timeout=timeout)
+    except asyncio.TimeoutError:
+        raise subprocess.TimeoutExpired(cmd, timeout)
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+
+    return subprocess.CompletedProcess(
+        cmd,
+        process.returncode,
+        b"".join(stdout).decode("utf-8", errors="replace"),
+        stderr.decode("utf-8", errors="replace"),
+    )
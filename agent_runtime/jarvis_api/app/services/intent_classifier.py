@@ -5,7 +5,7 @@ Uses LLM to detect user intent and extract parameters
 
 import logging
 from typing import Dict, Optional, List
-from app.services.ollama_client import JarvisOllamaClient
+from app.services.ollama_client import JarvisOllamaClient, PRIORITY_INTERACTIVE
 
 logger = logging.getLogger(__name__)
 
@@ -115,7 +115,7 @@ RESPONDE SOLO CON EL JSON, sin markdown, sin explicaciones.
         try:
             prompt = self.PARAMS_PROMPT.format(intent=intent, message=message)
             
-            response = self.ollama.chat(messages=[
+            response = await self.ollama.achat(priority=PRIORITY_INTERACTIVE, messages=[
                 {"role": "system", "content": "Eres un extractor de parámetros. Responde solo con JSON válido."},
                 {"role": "user", "content": prompt}
             ])
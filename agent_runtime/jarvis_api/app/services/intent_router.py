@@ -0,0 +1,541 @@
+"""
+Router de intención por niveles para Jarvis Prime.
+
+Antes, cada mensaje (incluso "hola") pagaba una llamada completa al LLM en
+_analyze_intent. Ahora se resuelve en el primer nivel con confianza suficiente:
+1. rules: un único regex compilado con todas las palabras clave (una pasada
+   sobre el texto) más frases completas (saludos, comandos /slash),
+2. classifier: TF-IDF + regresión logística (numpy) entrenada con las
+   intenciones registradas (scripts/train_intent_router.py),
+3. llm: solo los mensajes ambiguos llegan al LLM; su respuesta se registra
+   como dato de entrenamiento.
+
+Las etiquetas son "conversation", "workflow:<nombre>" y "agents:<A-X>+<A-Y>";
+los parámetros (target, cve_id, query, action) se extraen de forma determinista.
+Los niveles baratos solo deciden solos las etiquetas de lectura; escaneos y
+workflows pasan por el LLM salvo que el mensaje sea una orden con objetivo.
+"""
+
+import ipaddress
+import logging
+import os
+import random
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.semantic_cache import normalize_question
+from app.services.sqlite_store import SQLiteStore, open_store
+
+logger = logging.getLogger(__name__)
+
+INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER_ENABLED", "true").lower() in ("1", "true", "yes")
+INTENT_RULES_THRESHOLD = float(os.getenv("INTENT_RULES_THRESHOLD", "0.85"))
+INTENT_CLASSIFIER_THRESHOLD = float(os.getenv("INTENT_CLASSIFIER_THRESHOLD", "0.75"))
+INTENT_LOG_PATH = os.getenv("INTENT_LOG_PATH", "/opt/deco/agent_runtime/data/intent_log.sqlite3")
+INTENT_MODEL_PATH = os.getenv("INTENT_MODEL_PATH", "/opt/deco/agent_runtime/data/intent_model.npz")
+INTENT_MIN_TRAINING_SAMPLES = int(os.getenv("INTENT_MIN_TRAINING_SAMPLES", "20"))
+
+TIER_RULES = "rules"
+TIER_CLASSIFIER = "classifier"
+TIER_LLM = "llm"
+
+# ----------------------------------------------------------------------
+# Extracción de parámetros
+# ----------------------------------------------------------------------
+
+_CIDR_RE = re.compile(r"\b(?:\d{1,3}\.){3}\d{1,3}(?:/\d{1,2})?\b")
+_DOMAIN_RE = re.compile(r"\b(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z]{2,24}\b", re.I)
+_CVE_RE = re.compile(r"\bcve-\d{4}-\d{4,}\b", re.I)
+_QUICK_RE = re.compile(r"\b(rapido|rápido|quick|ligero)\b", re.I)
+
+# Acción por defecto cuando la etiqueta es un único agente
+DEFAULT_ACTIONS = {
+    "A-SCAN": "scan_target",
+    "A-INFRA": "health_check",
+    "A-VULN": "check_cve",
+    "A-WEB": "search",
+    "A-RAG": "query",
+}
+
+
+# Extensiones que el regex de dominios confunde con un TLD ("report.pdf", "config.yaml")
+_FILE_EXTENSIONS = frozenset({
+    "bak", "cfg", "conf", "csv", "doc", "docx", "exe", "gz", "html", "ini", "jar", "jpg", "js",
+    "json", "log", "md", "msi", "pcap", "pdf", "php", "png", "ps1", "py", "rar", "sh", "sql",
+    "tar", "tgz", "txt", "xls", "xlsx", "xml", "yaml", "yml", "zip",
+})
+# "2.4.rc", "1.0.beta": todas las etiquetas salvo la última son números
+_VERSION_RE = re.compile(r"^\d+(?:\.\d+)*\.[a-z]+$", re.I)
+
+
+def _is_ip_target(token: str) -> bool:
+    try:
+        ipaddress.ip_network(token, strict=False)
+        return True
+    except ValueError:
+        return False
+
+
+def _is_host_target(token: str) -> bool:
+    if _CVE_RE.match(token) or _VERSION_RE.match(token):
+        return False
+    return token.rsplit(".", 1)[-1].lower() not in _FILE_EXTENSIONS
+
+
+def extract_params(text: str) -> Dict[str, Any]:
+    params: Dict[str, Any] = {}
+    cve = _CVE_RE.search(text)
+    if cve:
+        params["cve_id"] = cve.group(0).upper()
+    # "10.0.19041.1" encaja con el regex pero no es una IP: se valida cada candidato
+    target = next((m.group(0) for m in _CIDR_RE.finditer(text) if _is_ip_target(m.group(0))), None)
+    if not target:
+        # Los dominios no deben confundirse con nombres de fichero o versiones
+        target = next((m.group(0) for m in _DOMAIN_RE.finditer(text) if _is_host_target(m.group(0))), None)
+    if target:
+        params["target"] = target
+    return params
+
+
+def build_analysis(label: str, text: str) -> Optional[Dict[str, Any]]:
+    """Etiqueta -> el mismo dict que devuelve el análisis por LLM."""
+    if label == "conversation":
+        return {"intent_type": "conversation"}
+    kind, _, value = label.partition(":")
+    params = extract_params(text)
+    if kind == "workflow" and value:
+        return {"intent_type": "workflow", "workflow": value, "params": params}
+    if kind == "agents" and value:
+        agents = value.split("+")
+        if len(agents) == 1 and agents[0] in DEFAULT_ACTIONS:
+            params["action"] = DEFAULT_ACTIONS[agents[0]]
+            if agents[0] == "A-SCAN" and _QUICK_RE.search(text):
+                params["action"] = "quick_scan"
+            if agents[0] in ("A-WEB", "A-RAG"):
+                params["query"] = text
+        return {"intent_type": "agents", "agents": agents, "params": params}
+    return None
+
+
+def label_of(analysis: Dict[str, Any]) -> Optional[str]:
+    """Análisis del LLM -> etiqueta (None si la respuesta no es utilizable)."""
+    if analysis.get("workflow"):
+        return f"workflow:{analysis['workflow']}"
+    agents = analysis.get("agents")
+    if agents:
+        if not all(isinstance(a, str) for a in agents):
+            return None
+        return "agents:" + "+".join(agents)
+    if analysis.get("intent_type") == "conversation":
+        return "conversation"
+    return None
+
+
+# Agentes que solo leen: se pueden lanzar sin confirmación del LLM
+READ_ONLY_AGENTS = frozenset({"A-INFRA", "A-VULN", "A-RAG", "A-WEB"})
+
+# Primera palabra de una orden que lanza escaneos o auditorías
+_COMMAND_VERBS = frozenset({
+    "escanea", "escanee", "escanear", "audita", "audite", "auditar", "lanza", "ejecuta",
+    "haz", "hazme", "realiza", "scan", "audit", "run", "nmap",
+})
+_COMMAND_PREFIXES = ("jarvis", "por", "favor", "please")
+
+
+def is_read_only(label: str) -> bool:
+    """Las etiquetas que no tocan la red ni lanzan workflows."""
+    if label == "conversation":
+        return True
+    kind, _, value = label.partition(":")
+    return kind == "agents" and bool(value) and all(a in READ_ONLY_AGENTS for a in value.split("+"))
+
+
+def is_command(text: str) -> bool:
+    """
+    Orden imperativa con un objetivo de red (IP/CIDR o hostname).
+    Las preguntas ("¿qué es un scan?", "¿debería escanear...?") no lo son.
+    """
+    if "?" in text or "¿" in text:
+        return False
+    words = [w for w in normalize_question(text).split() if w not in _COMMAND_PREFIXES]
+    return bool(words) and words[0] in _COMMAND_VERBS and "target" in extract_params(text)
+
+
+# ----------------------------------------------------------------------
+# Nivel 1: reglas compiladas
+# ----------------------------------------------------------------------
+
+# Mensajes completos (tras normalize_question)
+_WHOLE_MESSAGE_RULES: List[Tuple[re.Pattern, str, float]] = [
+    (re.compile(r"^((hola|buenas|buenos dias|buenas tardes|buenas noches|hey|hi|hello|que tal|como estas|estas) ?)+( jarvis)?$"), "conversation", 0.98),
+    (re.compile(r"^((gracias|muchas gracias|ok|vale|perfecto|genial|entendido|thanks|thank you|adios|hasta luego) ?)+( jarvis)?$"), "conversation", 0.98),
+    (re.compile(r"^/salud\b"), "agents:A-INFRA", 0.99),
+]
+
+# Palabra clave -> (etiqueta, peso). Los pesos de una misma etiqueta se suman.
+_KEYWORDS: Dict[str, Tuple[str, float]] = {
+    # Auditoría completa
+    "auditoria de red": ("workflow:network_audit", 0.95),
+    "auditoria completa": ("workflow:network_audit", 0.95),
+    "audita": ("workflow:network_audit", 0.9),
+    "auditar": ("workflow:network_audit", 0.9),
+    "network audit": ("workflow:network_audit", 0.95),
+    # Escaneo
+    "escanea": ("agents:A-SCAN", 0.9),
+    "escanear": ("agents:A-SCAN", 0.9),
+    "escaneo": ("agents:A-SCAN", 0.85),
+    "scan": ("agents:A-SCAN", 0.85),
+    "nmap": ("agents:A-SCAN", 0.9),
+    "puertos abiertos": ("agents:A-SCAN", 0.85),
+    # Infraestructura
+    "salud del sistema": ("agents:A-INFRA", 0.95),
+    "estado del sistema": ("agents:A-INFRA", 0.95),
+    "estado de la torre": ("agents:A-INFRA", 0.95),
+    "estado de los servicios": ("agents:A-INFRA", 0.9),
+    "health check": ("agents:A-INFRA", 0.95),
+    "system health": ("agents:A-INFRA", 0.95),
+    # CVE
+    "analiza el cve": ("agents:A-VULN", 0.95),
+    "analiza cve": ("agents:A-VULN", 0.95),
+    "informacion del cve": ("agents:A-VULN", 0.9),
+    "detalles del cve": ("agents:A-VULN", 0.9),
+    # Base de conocimiento
+    "base de conocimiento": ("agents:A-RAG", 0.9),
+    "base de conocimientos": ("agents:A-RAG", 0.9),
+    "en los documentos": ("agents:A-RAG", 0.85),
+    "knowledge base": ("agents:A-RAG", 0.9),
+}
+
+# Etiquetas que no tienen sentido sin ciertos parámetros
+_REQUIRED_PARAMS = {
+    "workflow:network_audit": "target",
+    "agents:A-SCAN": "target",
+    "agents:A-VULN": "cve_id",
+}
+
+
+def _compile_keywords(keywords: Sequence[str]) -> re.Pattern:
+    # Alternativas más largas primero: "auditoria de red" gana a "audita"
+    ordered = sorted(keywords, key=len, reverse=True)
+    return re.compile(r"(?<!\w)(?:" + "|".join(re.escape(k) for k in ordered) + r")(?!\w)")
+
+
+class RuleMatcher:
+    """Todas las palabras clave en un único regex: una pasada por mensaje."""
+
+    def __init__(self, keywords: Dict[str, Tuple[str, float]] = _KEYWORDS):
+        self.keywords = keywords
+        self.pattern = _compile_keywords(list(keywords))
+
+    def match(self, text: str) -> Optional[Tuple[str, float]]:
+        normalized = normalize_question(text)
+        for pattern, label, confidence in _WHOLE_MESSAGE_RULES:
+            if pattern.search(normalized):
+                return label, confidence
+
+        scores: Dict[str, float] = {}
+        for found in self.pattern.finditer(normalized):
+            label, weight = self.keywords[found.group(0)]
+            scores[label] = scores.get(label, 0.0) + weight
+        if not scores:
+            return None
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        label, top = ranked[0]
+        confidence = min(0.99, top)
+        if len(ranked) > 1:
+            # Varias intenciones en el mismo mensaje: ambiguo
+            confidence *= top / (top + ranked[1][1])
+        required = _REQUIRED_PARAMS.get(label)
+        if required and required not in extract_params(text):
+            confidence *= 0.5
+        return label, confidence
+
+
+# ----------------------------------------------------------------------
+# Nivel 2: TF-IDF + regresión logística
+# ----------------------------------------------------------------------
+
+_PLACEHOLDERS = [
+    (_CVE_RE, " cveid "),
+    (_CIDR_RE, " ipaddr "),
+    (_DOMAIN_RE, " domainname "),
+]
+
+
+def _features(text: str) -> List[str]:
+    for pattern, token in _PLACEHOLDERS:
+        text = pattern.sub(token, text)
+    words = normalize_question(text).split()
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+@dataclass
+class IntentModel:
+    vocabulary: Dict[str, int]
+    idf: np.ndarray
+    weights: np.ndarray  # (features, labels)
+    bias: np.ndarray
+    labels: List[str]
+
+    def vectorize(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), len(self.vocabulary)), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in _features(text):
+                column = self.vocabulary.get(feature)
+                if column is not None:
+                    matrix[row, column] += 1.0
+        matrix *= self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        probabilities = _softmax(self.vectorize([text]) @ self.weights + self.bias)[0]
+        best = int(np.argmax(probabilities))
+        return self.labels[best], float(probabilities[best])
+
+    def save(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        vocabulary = sorted(self.vocabulary, key=self.vocabulary.get)
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                vocabulary=np.array(vocabulary, dtype=object),
+                idf=self.idf,
+                weights=self.weights,
+                bias=self.bias,
+                labels=np.array(self.labels, dtype=object),
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "IntentModel":
+        with np.load(path, allow_pickle=True) as data:
+            vocabulary = {feature: i for i, feature in enumerate(data["vocabulary"].tolist())}
+            return cls(vocabulary, data["idf"], data["weights"], data["bias"], data["labels"].tolist())
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return shifted / shifted.sum(axis=1, keepdims=True)
+
+
+def train_intent_model(
+    samples: Sequence[Tuple[str, str]],
+    epochs: int = 300,
+    learning_rate: float = 2.0,
+    l2: float = 1e-3,
+    min_df: int = 1,
+) -> IntentModel:
+    """Regresión logística multinomial por descenso de gradiente (batch completo)."""
+    texts = [text for text, _ in samples]
+    labels = sorted({label for _, label in samples})
+    if len(labels) < 2:
+        raise ValueError("Se necesitan al menos dos intenciones distintas para entrenar")
+
+    document_frequency: Dict[str, int] = {}
+    for text in texts:
+        for feature in set(_features(text)):
+            document_frequency[feature] = document_frequency.get(feature, 0) + 1
+    vocabulary = {
+        feature: i
+        for i, feature in enumerate(sorted(f for f, df in document_frequency.items() if df >= min_df))
+    }
+    idf = np.array(
+        [np.log((1 + len(texts)) / (1 + document_frequency[f])) + 1 for f in sorted(vocabulary, key=vocabulary.get)],
+        dtype=np.float32,
+    )
+
+    model = IntentModel(
+        vocabulary,
+        idf,
+        np.zeros((len(vocabulary), len(labels)), dtype=np.float32),
+        np.zeros(len(labels), dtype=np.float32),
+        labels,
+    )
+    x = model.vectorize(texts)
+    y = np.zeros((len(texts), len(labels)), dtype=np.float32)
+    for row, (_, label) in enumerate(samples):
+        y[row, labels.index(label)] = 1.0
+
+    for _ in range(epochs):
+        gradient = (_softmax(x @ model.weights + model.bias) - y) / len(texts)
+        model.weights -= learning_rate * (x.T @ gradient + l2 * model.weights)
+        model.bias -= learning_rate * gradient.sum(axis=0)
+    return model
+
+
+def stratified_folds(labels: Sequence[str], folds: int, seed: int = 0) -> List[Tuple[List[int], List[int]]]:
+    """
+    Índices (entrenamiento, validación) de k folds estratificados por etiqueta:
+    cada mensaje cae en validación exactamente una vez, en un fold cuyo modelo
+    no lo ha visto.
+    """
+    if folds < 2:
+        raise ValueError("La validación cruzada necesita al menos dos folds")
+    by_label: Dict[str, List[int]] = {}
+    for i, label in enumerate(labels):
+        by_label.setdefault(label, []).append(i)
+    rng = random.Random(seed)
+    assignment = [0] * len(labels)
+    position = 0
+    for label in sorted(by_label):
+        indices = by_label[label]
+        rng.shuffle(indices)
+        for i in indices:
+            assignment[i] = position % folds
+            position += 1
+    return [
+        ([i for i, f in enumerate(assignment) if f != fold], [i for i, f in enumerate(assignment) if f == fold])
+        for fold in range(folds)
+    ]
+
+
+# ----------------------------------------------------------------------
+# Registro de intenciones (datos de entrenamiento)
+# ----------------------------------------------------------------------
+
+class IntentLog(SQLiteStore):
+    """Mensajes y la intención decidida, por nivel (SQLite)."""
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS intent_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            message TEXT NOT NULL,
+            label TEXT NOT NULL,
+            tier TEXT NOT NULL,
+            confidence REAL,
+            created_at REAL NOT NULL
+        )
+        """,
+    )
+
+    def __init__(self, path: str = INTENT_LOG_PATH):
+        super().__init__(path)
+
+    def add(self, message: str, label: str, tier: str, confidence: Optional[float] = None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO intent_log (message, label, tier, confidence, created_at) VALUES (?, ?, ?, ?, ?)",
+                (message, label, tier, confidence, time.time()),
+            )
+
+    def samples(self, tiers: Sequence[str] = (TIER_RULES, TIER_LLM)) -> List[Tuple[str, str]]:
+        """Último etiquetado de cada mensaje distinto."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"""
+                SELECT message, label FROM intent_log
+                WHERE id IN (
+                    SELECT MAX(id) FROM intent_log WHERE tier IN ({','.join('?' * len(tiers))}) GROUP BY message
+                )
+                """,
+                list(tiers),
+            ).fetchall()
+        return [(message, label) for message, label in rows]
+
+
+# ----------------------------------------------------------------------
+# Router
+# ----------------------------------------------------------------------
+
+class IntentRouter:
+    """Decide la intención sin LLM cuando un nivel barato tiene confianza suficiente."""
+
+    def __init__(
+        self,
+        model_path: str = INTENT_MODEL_PATH,
+        log: Optional[IntentLog] = None,
+        rules_threshold: float = INTENT_RULES_THRESHOLD,
+        classifier_threshold: float = INTENT_CLASSIFIER_THRESHOLD,
+    ):
+        self.rules = RuleMatcher()
+        self.model_path = model_path
+        self.log = log
+        self.rules_threshold = rules_threshold
+        self.classifier_threshold = classifier_threshold
+        self.model: Optional[IntentModel] = None
+        self._model_mtime: Optional[float] = None
+        self.counters = {TIER_RULES: 0, TIER_CLASSIFIER: 0, TIER_LLM: 0}
+
+    def _refresh_model(self):
+        """Carga el modelo si el fichero cambió (reentrenado por el script)."""
+        try:
+            mtime = os.path.getmtime(self.model_path)
+        except OSError:
+            return
+        if mtime == self._model_mtime:
+            return
+        try:
+            self.model = IntentModel.load(self.model_path)
+            self._model_mtime = mtime
+            logger.info(f"[IntentRouter] Modelo cargado: {len(self.model.labels)} intenciones")
+        except Exception as e:
+            logger.error(f"[IntentRouter] No se pudo cargar {self.model_path}: {e}")
+            self._model_mtime = mtime
+
+    def route(self, text: str) -> Optional[Dict[str, Any]]:
+        """
+        Análisis sin LLM, o None si ningún nivel barato está seguro.
+        El resultado incluye "router_tier" y "confidence".
+        """
+        if not INTENT_ROUTER_ENABLED:
+            return None
+
+        matched = self.rules.match(text)
+        if matched and matched[1] >= self.rules_threshold and self._may_route(matched[0], text):
+            analysis = build_analysis(matched[0], text)
+            if analysis:
+                self._remember(text, matched[0], TIER_RULES, matched[1])
+                return {**analysis, "router_tier": TIER_RULES, "confidence": round(matched[1], 3)}
+
+        self._refresh_model()
+        if self.model is not None:
+            label, probability = self.model.predict(text)
+            if probability >= self.classifier_threshold and self._may_route(label, text):
+                analysis = build_analysis(label, text)
+                if analysis:
+                    self.counters[TIER_CLASSIFIER] += 1
+                    return {**analysis, "router_tier": TIER_CLASSIFIER, "confidence": round(probability, 3)}
+        return None
+
+    @staticmethod
+    def _may_route(label: str, text: str) -> bool:
+        """Escaneos y workflows solo sin LLM si el mensaje es una orden con objetivo."""
+        return is_read_only(label) or is_command(text)
+
+    def record_llm(self, text: str, analysis: Dict[str, Any]):
+        """Respuesta del LLM: cuenta el nivel y la guarda para el próximo entrenamiento."""
+        self.counters[TIER_LLM] += 1
+        label = label_of(analysis)
+        if label and self.log is not None:
+            try:
+                self.log.add(text, label, TIER_LLM)
+            except Exception as e:
+                logger.warning(f"[IntentRouter] No se pudo registrar la intención: {e}")
+
+    def _remember(self, text: str, label: str, tier: str, confidence: float):
+        self.counters[tier] += 1
+        if self.log is not None:
+            try:
+                self.log.add(text, label, tier, confidence)
+            except Exception as e:
+                logger.warning(f"[IntentRouter] No se pudo registrar la intención: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        total = sum(self.counters.values())
+        return {
+            **self.counters,
+            "llm_rate": round(self.counters[TIER_LLM] / total, 3) if total else 0.0,
+            "classifier_loaded": self.model is not None,
+        }
+
+
+def open_intent_log(path: str = INTENT_LOG_PATH) -> Optional[IntentLog]:
+    return open_store(lambda: IntentLog(path), "[IntentRouter] Registro de intenciones no disponible")
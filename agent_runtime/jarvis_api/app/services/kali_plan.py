@@ -0,0 +1,262 @@
+"""
+Ejecución de planes (pipelines de servicio) sobre KaliRunner.
+
+Las etapas forman un DAG a partir de `depends_on` (órdenes de las etapas de
+las que dependen; None = todas las anteriores, el comportamiento secuencial
+de siempre). En cuanto las dependencias de una etapa terminan se lanza, a la
+vez que cualquier otra lista; la cola por nodo (ssh_pool.NodeExecutionPool)
+sigue limitando cuántas corren realmente en cada Kali. Si una etapa falla,
+las que dependen de ella se omiten.
+
+Antes de lanzar una herramienta se consulta la caché de resultados
+(tool_cache). El informe del plan se genera en map-reduce: cada etapa deja
+su resumen en summary.md y al final se sintetiza un único report_ai.md.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from app.services.report_synthesis import REPORT_CHUNK_TOKENS, fit_to_budget, synthesize_plan_report
+from app.services.tool_cache import ToolResultCache
+
+logger = logging.getLogger(__name__)
+
+# True mientras se ejecuta una etapa de un plan: _generate_ai_report solo
+# escribe el resumen de la herramienta y deja el informe al plan
+in_plan_step: ContextVar[bool] = ContextVar("in_plan_step", default=False)
+
+
+@dataclass
+class PlanStep:
+    order: int
+    action_id: str
+    script_path: str
+    role: str = ""
+    name: str = ""
+    depends_on: Optional[List[int]] = None
+
+
+def steps_from_service(service, actions) -> List[PlanStep]:
+    """Convierte el pipeline de un Service del catálogo en etapas de plan."""
+    actions_by_id = {a.id: a for a in actions}
+    steps = []
+    for link in sorted(service.pipeline, key=lambda l: l.order):
+        action = actions_by_id.get(link.action_id)
+        if action is None:
+            raise ValueError(f"Service {service.id} references unknown action {link.action_id}")
+        steps.append(PlanStep(
+            order=link.order,
+            action_id=action.id,
+            script_path=action.script_path_kali,
+            role=link.role,
+            name=action.name,
+            depends_on=link.depends_on,
+        ))
+    return steps
+
+
+def resolve_dependencies(steps: List[PlanStep]) -> Dict[int, Set[int]]:
+    """order -> órdenes de los que depende. ValueError si hay duplicados, huecos o ciclos."""
+    orders = {s.order for s in steps}
+    if len(orders) != len(steps):
+        raise ValueError("Duplicated step order in plan")
+    deps = {}
+    for step in steps:
+        if step.depends_on is None:
+            deps[step.order] = {o for o in orders if o < step.order}
+        else:
+            unknown = set(step.depends_on) - orders
+            if unknown:
+                raise ValueError(f"Step {step.order} depends on unknown steps {sorted(unknown)}")
+            deps[step.order] = set(step.depends_on)
+
+    resolved: Set[int] = set()
+    while len(resolved) < len(deps):
+        ready = {o for o, d in deps.items() if o not in resolved and d <= resolved}
+        if not ready:
+            raise ValueError(f"Dependency cycle between steps {sorted(set(deps) - resolved)}")
+        resolved |= ready
+    return deps
+
+
+class PlanExecutor:
+    def __init__(self, runner, cache: Optional[ToolResultCache] = None):
+        self.runner = runner
+        self.cache = cache
+
+    async def run(
+        self,
+        plan_id: str,
+        title: str,
+        steps: List[PlanStep],
+        target: str,
+        params: Dict[str, Any] = None,
+        node_config: Dict[str, Any] = None,
+        tenant_slug: str = "global",
+        use_cache: bool = True,
+    ) -> Dict[str, Any]:
+        deps = resolve_dependencies(steps)
+        by_order = {s.order: s for s in steps}
+        plan_execution_id = str(uuid.uuid4())
+        started = time.monotonic()
+        logger.info(f"Starting plan {plan_id} ({plan_execution_id}) with {len(steps)} steps on {target}")
+
+        results: Dict[int, Dict[str, Any]] = {}
+        pending = set(by_order)
+        running: Dict[asyncio.Task, int] = {}
+        try:
+            while pending or running:
+                # Lanzar (u omitir) todo lo que ya tiene sus dependencias resueltas
+                launched = True
+                while launched:
+                    launched = False
+                    for order in sorted(pending):
+                        if not deps[order] <= results.keys():
+                            continue
+                        pending.discard(order)
+                        launched = True
+                        failed = sorted(d for d in deps[order] if results[d]["status"] != "completed")
+                        if failed:
+                            logger.warning(f"[Plan {plan_id}] Skipping step {order}: dependencies {failed} did not complete")
+                            results[order] = {"status": "skipped", "reason": f"dependencies {failed} did not complete"}
+                            continue
+                        task = asyncio.create_task(self._run_step(
+                            by_order[order], target, params, node_config, tenant_slug, use_cache
+                        ))
+                        running[task] = order
+                if not running:
+                    break
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    order = running.pop(task)
+                    try:
+                        results[order] = task.result()
+                    except Exception as e:
+                        logger.error(f"[Plan {plan_id}] Step {order} raised: {e}")
+                        results[order] = {"status": "error", "stderr": str(e)}
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+        step_records = []
+        for step in steps:
+            result = results[step.order]
+            step_records.append({
+                **asdict(step),
+                "depends_on": sorted(deps[step.order]),
+                "status": result.get("status"),
+                "execution_id": result.get("execution_id"),
+                "report_path": result.get("report_path"),
+                "cached": result.get("cached", False),
+                "duration_seconds": result.get("duration_seconds"),
+                "reason": result.get("reason"),
+            })
+
+        statuses = {r["status"] for r in step_records}
+        status = "completed" if statuses == {"completed"} else ("failed" if "completed" not in statuses else "partial")
+        report_path = await self._write_plan_report(
+            plan_id, plan_execution_id, title, target, tenant_slug, status, steps, results, step_records,
+            duration=time.monotonic() - started,
+        )
+        logger.info(f"Plan {plan_id} ({plan_execution_id}) finished: {status} in {time.monotonic() - started:.1f}s")
+        return {
+            "execution_id": plan_execution_id,
+            "plan_id": plan_id,
+            "status": status,
+            "target": target,
+            "steps": step_records,
+            "report_path": report_path,
+            "duration_seconds": round(time.monotonic() - started, 2),
+        }
+
+    async def _run_step(self, step: PlanStep, target: str, params: Optional[Dict[str, Any]],
+                        node_config: Optional[Dict[str, Any]], tenant_slug: str, use_cache: bool) -> Dict[str, Any]:
+        # Tenant y nodo forman parte de la clave: un resultado nunca se sirve a otro tenant ni de otro nodo
+        args = {
+            "script": step.script_path,
+            "params": params or {},
+            "tenant": tenant_slug,
+            "node": (node_config or {}).get("id") or (node_config or {}).get("host"),
+        }
+        if use_cache and self.cache:
+            cached = self.cache.get(step.action_id, args, target)
+            if cached:
+                logger.info(f"[Plan] Step {step.order} ({step.action_id}) served from cache ({cached['execution_id']})")
+                cached["cached"] = True
+                return cached
+
+        started = time.monotonic()
+        # La tarea tiene su propia copia del contexto: no afecta a otras ejecuciones
+        in_plan_step.set(True)
+        result = await self.runner.run_action(
+            action_id=step.action_id,
+            script_path=step.script_path,
+            target=target,
+            params=params,
+            node_config=node_config,
+            tenant_slug=tenant_slug,
+        )
+        result["duration_seconds"] = round(time.monotonic() - started, 2)
+        if self.cache:
+            self.cache.put(step.action_id, args, target, result)
+        result["cached"] = False
+        return result
+
+    def _step_summary(self, step: PlanStep, result: Dict[str, Any]) -> str:
+        summary_path = os.path.join(result.get("report_path") or "", "summary.md")
+        if result.get("report_path") and os.path.exists(summary_path):
+            with open(summary_path, "r") as f:
+                return f.read()
+        if result.get("status") == "skipped":
+            return f"Etapa omitida: {result.get('reason')}"
+        output = result.get("stdout") or result.get("stderr") or "Sin salida."
+        return fit_to_budget(output, REPORT_CHUNK_TOKENS)
+
+    async def _write_plan_report(self, plan_id: str, plan_execution_id: str, title: str, target: str,
+                                 tenant_slug: str, status: str, steps: List[PlanStep],
+                                 results: Dict[int, Dict[str, Any]], step_records: List[Dict[str, Any]],
+                                 duration: float) -> str:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        report_path = f"{self.runner.reports_base_path}/{tenant_slug}/{plan_id}/{timestamp}_{plan_execution_id}"
+        os.makedirs(report_path, exist_ok=True)
+
+        with open(f"{report_path}/metadata.json", "w") as f:
+            json.dump({
+                "execution_id": plan_execution_id,
+                "target": target,
+                "timestamp": datetime.now().isoformat(),
+                "status": status,
+                "action_name": title,
+                "plan_id": plan_id,
+                "duration_seconds": round(duration, 2),
+                "steps": step_records,
+            }, f, indent=2)
+
+        summaries = [
+            (f"{step.order}. {step.name or step.action_id} ({step.role})", self._step_summary(step, results[step.order]))
+            for step in steps
+        ]
+        report = None
+        if not self.runner.mock_mode:
+            try:
+                report = await synthesize_plan_report(self.runner._complete, title, target, summaries)
+                await self.runner._ingest_report(plan_execution_id, report)
+            except Exception as e:
+                logger.error(f"Error synthesizing plan report for {plan_execution_id}: {e}. Falling back to step summaries.")
+        if not report:
+            report = f"# {title}\n\n**Target:** {target}\n**Status:** {status}\n\n" + "\n\n".join(
+                f"## {name}\n\n{summary}" for name, summary in summaries
+            )
+        with open(f"{report_path}/report_ai.md", "w") as f:
+            f.write(report)
+        return report_path
@@ -4,15 +4,25 @@ import logging
 import json
 import shlex
 import shutil
-import base64
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, AsyncIterator, List, Optional
 from datetime import datetime
 import uuid
-from app.services.ollama_client import JarvisOllamaClient
+from app.services.ollama_client import JarvisOllamaClient, PRIORITY_BACKGROUND
+from app.services.qga_transport import QGAError, QGATransport, decode_exec_status, get_qga_transport
+from app.services.ssh_pool import node_pool, ssh_pool
+from app.services.artifact_store import (
+    ARTIFACT_CHUNK_SIZE, ARTIFACT_COMPRESSION, LiveTail, artifact_store, is_text_artifact
+)
+from app.services.conversation_memory import estimate_tokens
+from app.services.kali_plan import PlanExecutor, PlanStep, in_plan_step
+from app.services.report_synthesis import REPORT_CHUNK_TOKENS, fit_to_budget, summarize_output
+from app.services.tool_cache import open_tool_cache
 import httpx
 
 logger = logging.getLogger(__name__)
 
+REPORT_MODEL = os.getenv("KALI_REPORT_MODEL", "llama3.1:8b-instruct-q4_K_M")
+
 class KaliRunner:
     """Motor de ejecución para acciones en Kali-2025."""
     
@@ -24,6 +34,13 @@ class KaliRunner:
         self.mock_mode = os.getenv("DECO_MOCK_KALI", "true").lower() == "true"
         self.reports_base_path = "/opt/deco/reports"
         self.ollama_client = JarvisOllamaClient()
+        self.artifact_store = artifact_store
+        self.ssh_pool = ssh_pool
+        self.node_pool = node_pool
+        # report_id -> ejecución en curso con su LiveTail (ver /api/reports/live)
+        self.live_executions: Dict[str, Dict[str, Any]] = {}
+        # Resultados de herramientas reutilizables entre planes (None si no hay SQLite)
+        self.tool_cache = open_tool_cache()
 
     async def run_action(self, action_id: str, script_path: str, target: str, params: Dict[str, Any] = None, node_config: Dict[str, Any] = None, tenant_slug: str = "global") -> Dict[str, Any]:
         """Ejecuta una acción individual."""
@@ -53,25 +70,27 @@ class KaliRunner:
             logger.info(f"Executing locally on {exec_host}")
             return await self._run_local(execution_id, action_id, script_path, target, report_path, output_dir="/tmp/deco_results")
         else:
-            # Si es kali-2025, asegurar que esté encendida
-            if exec_host == "kali-2025":
-                await self._ensure_vm_started("kali-2025")
+            # Cola por nodo: concurrencia limitada y turnos justos entre tenants
+            async with self.node_pool.slot(exec_host, client=tenant_slug):
+                # Si es kali-2025, asegurar que esté encendida
+                if exec_host == "kali-2025":
+                    await self._ensure_vm_started("kali-2025")
 
-                try:
-                    return await self._run_qemu_script(
-                        execution_id=execution_id,
-                        action_id=action_id,
-                        script_path=script_path,
-                        args=[target],
-                        report_path=report_path,
-                        timeout_seconds=3600,
-                        remote_output_dir="/tmp/deco_results"
-                    )
-                except Exception as e:
-                    logger.error(f"QEMU Agent execution failed: {e}. Falling back to SSH.")
+                    try:
+                        return await self._run_qemu_script(
+                            execution_id=execution_id,
+                            action_id=action_id,
+                            script_path=script_path,
+                            args=[target],
+                            report_path=report_path,
+                            timeout_seconds=3600,
+                            remote_output_dir="/tmp/deco_results"
+                        )
+                    except Exception as e:
+                        logger.error(f"QEMU Agent execution failed: {e}. Falling back to SSH.")
 
-            # Ejecución real vía SSH
-            return await self._run_ssh(execution_id, action_id, script_path, target, report_path, host=exec_host, user=exec_user, remote_output_dir="/tmp/deco_results")
+                # Ejecución real vía SSH
+                return await self._run_ssh(execution_id, action_id, script_path, target, report_path, host=exec_host, user=exec_user, remote_output_dir="/tmp/deco_results")
 
     async def run_script(
         self,
@@ -119,32 +138,58 @@ class KaliRunner:
                 output_dir=remote_output_dir
         )
 
-        if exec_host == "kali-2025":
-            await self._ensure_vm_started("kali-2025")
-            # Fallback to QEMU agent if SSH is problematic or as primary method
-            try:
-                return await self._run_qemu_script(
-                    execution_id=execution_id,
-                    action_id=action_id,
-                    script_path=script_path,
-                    args=args,
-                    report_path=report_path,
-                    timeout_seconds=timeout_seconds,
-                    remote_output_dir=remote_output_dir
-                )
-            except Exception as e:
-                logger.error(f"QEMU Agent execution failed: {e}. Falling back to SSH.")
+        # Cola por nodo: concurrencia limitada y turnos justos entre tenants
+        async with self.node_pool.slot(exec_host, client=tenant_slug):
+            if exec_host == "kali-2025":
+                await self._ensure_vm_started("kali-2025")
+                # Fallback to QEMU agent if SSH is problematic or as primary method
+                try:
+                    return await self._run_qemu_script(
+                        execution_id=execution_id,
+                        action_id=action_id,
+                        script_path=script_path,
+                        args=args,
+                        report_path=report_path,
+                        timeout_seconds=timeout_seconds,
+                        remote_output_dir=remote_output_dir
+                    )
+                except Exception as e:
+                    logger.error(f"QEMU Agent execution failed: {e}. Falling back to SSH.")
 
-        return await self._run_ssh_script(
-            execution_id=execution_id,
-            action_id=action_id,
-            script_path=script_path,
-            args=args,
-            report_path=report_path,
-            host=exec_host,
-            user=exec_user,
-            timeout_seconds=timeout_seconds,
-            remote_output_dir=remote_output_dir
+            return await self._run_ssh_script(
+                execution_id=execution_id,
+                action_id=action_id,
+                script_path=script_path,
+                args=args,
+                report_path=report_path,
+                host=exec_host,
+                user=exec_user,
+                timeout_seconds=timeout_seconds,
+                remote_output_dir=remote_output_dir
+            )
+
+    async def run_plan(
+        self,
+        plan_id: str,
+        title: str,
+        steps: List[PlanStep],
+        target: str,
+        params: Dict[str, Any] = None,
+        node_config: Dict[str, Any] = None,
+        tenant_slug: str = "global",
+        use_cache: bool = True
+    ) -> Dict[str, Any]:
+        """Ejecuta un plan: etapas independientes en paralelo, caché de resultados e informe map-reduce."""
+        executor = PlanExecutor(self, cache=self.tool_cache)
+        return await executor.run(
+            plan_id=plan_id,
+            title=title,
+            steps=steps,
+            target=target,
+            params=params,
+            node_config=node_config,
+            tenant_slug=tenant_slug,
+            use_cache=use_cache
         )
 
     async def _run_qemu_script(self, execution_id: str, action_id: str, script_path: str, args: List[str], report_path: str, timeout_seconds: int, remote_output_dir: Optional[str] = None) -> Dict[str, Any]:
@@ -155,58 +200,17 @@ class KaliRunner:
         try:
             vm_name = "kali-2025"
             remote_script_path = f"/tmp/{execution_id}.sh"
+            qga = get_qga_transport(vm_name)
             
             # 1. Leer contenido del script local
             with open(script_path, "rb") as f:
                 script_content = f.read()
                 
             # 2. Escribir script en VM usando guest-file-write
-            # Primero abrir archivo
-            open_cmd = ["virsh", "-c", "qemu:///system", "qemu-agent-command", vm_name, json.dumps({"execute": "guest-file-open", "arguments": {"path": remote_script_path, "mode": "w+"}})]
-            proc = await asyncio.create_subprocess_exec(
-                *open_cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await proc.communicate()
-            
-            if proc.returncode != 0:
-                raise Exception(f"Failed to open remote file via qemu-agent: {stderr.decode()}")
-                
-            try:
-                file_handle = json.loads(stdout.decode())["return"]
-            except Exception as e:
-                logger.error(f"Failed to parse qemu-agent output: {stdout.decode()}")
-                raise e
-            
-            # Escribir contenido (base64)
-            content_b64 = base64.b64encode(script_content).decode()
-            
-            proc = await asyncio.create_subprocess_exec(
-                "virsh", "-c", "qemu:///system", "qemu-agent-command", vm_name,
-                json.dumps({"execute": "guest-file-write", "arguments": {"handle": file_handle, "buf-b64": content_b64}}),
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            await proc.communicate()
-            
-            # Cerrar archivo
-            proc = await asyncio.create_subprocess_exec(
-                "virsh", "-c", "qemu:///system", "qemu-agent-command", vm_name,
-                json.dumps({"execute": "guest-file-close", "arguments": {"handle": file_handle}}),
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            await proc.communicate()
+            await qga.file_write(remote_script_path, script_content)
             
             # 3. Dar permisos +x
-            proc = await asyncio.create_subprocess_exec(
-                "virsh", "-c", "qemu:///system", "qemu-agent-command", vm_name,
-                json.dumps({"execute": "guest-exec", "arguments": {"path": "/usr/bin/chmod", "arg": ["+x", remote_script_path], "capture-output": True}}),
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            await proc.communicate()
+            await qga.run("/usr/bin/chmod", ["+x", remote_script_path])
             
             # 4. Ejecutar script
             # Construir comando con argumentos
@@ -215,106 +219,39 @@ class KaliRunner:
             if remote_output_dir:
                 full_cmd = f"mkdir -p {remote_output_dir} && {full_cmd}"
             
-            # Ejecutar via bash para manejar redirecciones/env si fuera necesario
-            exec_args = {"path": "/bin/bash", "arg": ["-c", full_cmd], "capture-output": True}
-            
             logger.info(f"Executing via QEMU Agent: {full_cmd}")
             
-            proc = await asyncio.create_subprocess_exec(
-                "virsh", "-c", "qemu:///system", "qemu-agent-command", vm_name,
-                json.dumps({"execute": "guest-exec", "arguments": exec_args}),
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await proc.communicate()
+            # Ejecutar via bash para manejar redirecciones/env si fuera necesario
+            pid = await qga.guest_exec("/bin/bash", ["-c", full_cmd])
             
-            if proc.returncode != 0:
-                 raise Exception(f"Failed to execute command via qemu-agent: {stderr.decode()}")
-
-            try:
-                pid_data = json.loads(stdout.decode())
-                pid = pid_data["return"]["pid"]
-            except Exception as e:
-                logger.error(f"Failed to parse PID from qemu-agent: {stdout.decode()}")
-                raise e
+            if remote_output_dir:
+                list_files, opener, remote_sha = self._qga_remote(qga, remote_output_dir)
+                tail = self._start_live_tail(execution_id, action_id, report_path, list_files, opener)
             
-            # 5. Polling de estado
-            start_time = datetime.now()
+            # 5. Polling de estado (backoff exponencial en el transporte)
             exit_code = -1
             stdout_decoded = ""
             stderr_decoded = ""
             
-            while True:
-                if (datetime.now() - start_time).total_seconds() > timeout_seconds:
-                    # Timeout logic here (kill pid not implemented easily via agent without another exec)
-                    stderr_decoded = "Execution timed out"
-                    break
-                    
-                await asyncio.sleep(2)
-                proc = await asyncio.create_subprocess_exec(
-                    "virsh", "-c", "qemu:///system", "qemu-agent-command", vm_name,
-                    json.dumps({"execute": "guest-exec-status", "arguments": {"pid": pid}}),
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
-                )
-                stdout, _ = await proc.communicate()
-                status_data = json.loads(stdout.decode())
-                
-                if status_data["return"]["exited"]:
-                    exit_code = status_data["return"]["exitcode"]
-                    if "out-data" in status_data["return"]:
-                        stdout_decoded = base64.b64decode(status_data["return"]["out-data"]).decode(errors='replace')
-                    if "err-data" in status_data["return"]:
-                        stderr_decoded = base64.b64decode(status_data["return"]["err-data"]).decode(errors='replace')
-                    break
+            try:
+                result = decode_exec_status(await qga.wait_exec(pid, timeout_seconds))
+                exit_code = result["exitcode"]
+                stdout_decoded = result["stdout"]
+                stderr_decoded = result["stderr"]
+            except asyncio.TimeoutError:
+                stderr_decoded = "Execution timed out"
+                try:
+                    await qga.guest_exec("/bin/kill", ["-9", str(pid)], capture_output=False)
+                except QGAError as e:
+                    logger.warning(f"Could not kill timed out guest process {pid}: {e}")
             
             status = "completed" if exit_code == 0 else "failed"
             
-            # 6. Recuperar artefactos (si existen)
-            # Esto es complejo con qemu-agent (leer archivo por archivo). 
-            # Por simplicidad, usaremos un truco: cat de los archivos clave y reconstruirlos localmente.
-            # O mejor, intentar SCP inverso si SSH funcionara... pero no funciona.
-            # Vamos a leer solo los archivos críticos conocidos: scan_results.txt, scan_raw.xml
-            
-            
+            # 6. Recuperar artefactos (si existen): en trozos, reanudando lo que ya trajo el tail
+            artifacts = []
             if remote_output_dir:
-                artifacts_to_fetch = ["scan_results.txt", "scan_raw.xml"]
-                for artifact in artifacts_to_fetch:
-                    try:
-                        remote_file = f"{remote_output_dir}/{artifact}"
-                        proc = await asyncio.create_subprocess_exec(
-                            "virsh", "-c", "qemu:///system", "qemu-agent-command", vm_name,
-                            json.dumps({"execute": "guest-file-open", "arguments": {"path": remote_file, "mode": "r"}}),
-                            stdout=asyncio.subprocess.PIPE,
-                            stderr=asyncio.subprocess.PIPE
-                        )
-                        stdout, _ = await proc.communicate()
-                        res = json.loads(stdout.decode())
-                        if "return" in res:
-                            handle = res["return"]
-                            # Leer (asumiendo que cabe en buffer, si no habría que loop)
-                            proc = await asyncio.create_subprocess_exec(
-                                "virsh", "-c", "qemu:///system", "qemu-agent-command", vm_name,
-                                json.dumps({"execute": "guest-file-read", "arguments": {"handle": handle, "count": 10000000}}),
-                                stdout=asyncio.subprocess.PIPE,
-                                stderr=asyncio.subprocess.PIPE
-                            )
-                            stdout, _ = await proc.communicate()
-                            read_res = json.loads(stdout.decode())
-                            content = base64.b64decode(read_res["return"]["buf-b64"])
-                            
-                            with open(f"{report_path}/{artifact}", "wb") as f:
-                                f.write(content)
-                                
-                            # Cerrar
-                            await asyncio.create_subprocess_exec(
-                                "virsh", "-c", "qemu:///system", "qemu-agent-command", vm_name,
-                                json.dumps({"execute": "guest-file-close", "arguments": {"handle": handle}}),
-                                stdout=asyncio.subprocess.PIPE,
-                                stderr=asyncio.subprocess.PIPE
-                            )
-                    except Exception as e:
-                        logger.warning(f"Could not fetch artifact {artifact}: {e}")
+                await self._stop_live_tail(report_path, tail)
+                artifacts = await self._collect_artifacts(execution_id, report_path, list_files, opener, remote_sha)
 
             metadata = {
                 "execution_id": execution_id,
@@ -323,6 +260,7 @@ class KaliRunner:
                 "timestamp": datetime.now().isoformat(),
                 "status": status,
                 "exit_code": exit_code,
+                "artifacts": artifacts,
             }
             with open(f"{report_path}/metadata.json", "w") as f:
                 json.dump(metadata, f, indent=2)
@@ -349,6 +287,7 @@ class KaliRunner:
 
         except Exception as e:
             logger.error(f"Error executing QEMU script: {e}")
+            await self._stop_live_tail(report_path)
             
             # Generar metadata de error
             metadata = {
@@ -376,6 +315,128 @@ class KaliRunner:
                 "report_id": os.path.basename(report_path)
             }
 
+    def _qga_remote(self, qga: QGATransport, remote_dir: str):
+        """list_files / opener / remote_sha sobre el guest agent."""
+        async def list_files() -> List[str]:
+            result = await qga.run("/usr/bin/find", [remote_dir, "-type", "f"])
+            return [os.path.relpath(p, remote_dir) for p in result["stdout"].splitlines() if p]
+
+        def opener(name: str):
+            return lambda offset: qga.file_stream(f"{remote_dir}/{name}", offset, ARTIFACT_CHUNK_SIZE)
+
+        async def remote_sha(name: str) -> Optional[str]:
+            result = await qga.run("/usr/bin/sha256sum", [f"{remote_dir}/{name}"])
+            return result["stdout"].split()[0] if result["exitcode"] == 0 and result["stdout"] else None
+
+        return list_files, opener, remote_sha
+
+    def _ssh_auth(self, host: str, user: str):
+        """(prefix, options) de autenticación del nodo para ssh/scp."""
+        # Use sshpass for kali-2025 due to SSH key issues
+        if host == "kali-2025" and user == "kali":
+            return ["sshpass", "-p", "leoslo23"], ["-o", "StrictHostKeyChecking=no"]
+        options = ["-o", "BatchMode=yes", "-o", "StrictHostKeyChecking=no"]
+        if self.key_path:
+            options = ["-i", self.key_path] + options
+        return [], options
+
+    def _ssh_command(self, host: str, user: str, remote_cmd: str) -> List[str]:
+        return self.ssh_pool.ssh_command(host, user, remote_cmd, *self._ssh_auth(host, user))
+
+    def _scp_command(self, host: str, user: str, source: str, dest: str) -> List[str]:
+        return self.ssh_pool.scp_command(host, user, source, dest, *self._ssh_auth(host, user))
+
+    async def _ssh_output(self, host: str, user: str, remote_cmd: str) -> str:
+        proc = await asyncio.create_subprocess_exec(
+            *self._ssh_command(host, user, remote_cmd),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        stdout, stderr = await proc.communicate()
+        if proc.returncode != 0:
+            raise Exception(f"ssh {remote_cmd!r} failed: {stderr.decode().strip()}")
+        return stdout.decode()
+
+    async def _ssh_stream(self, host: str, user: str, remote_path: str, offset: int) -> AsyncIterator[bytes]:
+        """Stream del fichero remoto desde offset (tail -c +N), en trozos de ARTIFACT_CHUNK_SIZE."""
+        proc = await asyncio.create_subprocess_exec(
+            *self._ssh_command(host, user, f"tail -c +{offset + 1} {shlex.quote(remote_path)}"),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            while True:
+                chunk = await proc.stdout.read(ARTIFACT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+            stderr = await proc.stderr.read()
+            if await proc.wait() != 0:
+                raise Exception(f"Remote read of {remote_path} failed: {stderr.decode().strip()}")
+        finally:
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+
+    def _ssh_remote(self, host: str, user: str, remote_dir: str):
+        """list_files / opener / remote_sha sobre SSH."""
+        async def list_files() -> List[str]:
+            out = await self._ssh_output(host, user, f"cd {shlex.quote(remote_dir)} && find . -type f")
+            return [os.path.normpath(p) for p in out.splitlines() if p]
+
+        def opener(name: str):
+            return lambda offset: self._ssh_stream(host, user, f"{remote_dir}/{name}", offset)
+
+        async def remote_sha(name: str) -> Optional[str]:
+            out = await self._ssh_output(host, user, f"sha256sum {shlex.quote(f'{remote_dir}/{name}')}")
+            return out.split()[0] if out else None
+
+        return list_files, opener, remote_sha
+
+    def _start_live_tail(self, execution_id: str, action_id: str, report_path: str, list_files, opener) -> LiveTail:
+        tail = LiveTail(self.artifact_store, execution_id, list_files, opener)
+        self.live_executions[os.path.basename(report_path)] = {
+            "execution_id": execution_id,
+            "action_id": action_id,
+            "started_at": datetime.now().isoformat(),
+            "tail": tail,
+        }
+        tail.start()
+        return tail
+
+    async def _stop_live_tail(self, report_path: str, tail: Optional[LiveTail] = None):
+        live = self.live_executions.pop(os.path.basename(report_path), None)
+        tail = tail or (live or {}).get("tail")
+        if tail:
+            await tail.stop()
+
+    async def _collect_artifacts(self, execution_id: str, report_path: str, list_files, opener, remote_sha) -> List[Dict[str, Any]]:
+        """
+        Trae cada fichero del directorio remoto al almacén de artefactos
+        (trozos fijos, sha256 incremental, reanudable) y lo enlaza en report_path.
+        """
+        try:
+            names = await list_files()
+        except Exception as e:
+            logger.warning(f"Could not list remote artifacts: {e}")
+            return []
+
+        artifacts = []
+        for name in names:
+            try:
+                ref = await self.artifact_store.ingest(
+                    key=f"{execution_id}:{name}",
+                    name=name,
+                    open_stream=opener(name),
+                    compress=ARTIFACT_COMPRESSION and not is_text_artifact(name),
+                    remote_sha256=lambda name=name: remote_sha(name),
+                )
+                self.artifact_store.link(ref, report_path)
+                artifacts.append(ref.to_dict())
+            except Exception as e:
+                logger.warning(f"Could not fetch artifact {name}: {e}")
+        return artifacts
+
     async def _ensure_vm_started(self, vm_name: str):
         """Asegura que la VM especificada esté corriendo."""
         try:
@@ -432,11 +493,26 @@ class KaliRunner:
             # 2. Construir Prompt
             if parsed_data and "hosts" in parsed_data:
                 # Usar datos estructurados
-                hosts_summary = json.dumps(parsed_data["hosts"], indent=2)
-                data_context = f"**Datos Estructurados del Escaneo (JSON):**\n```json\n{hosts_summary}\n```"
+                raw_data = json.dumps(parsed_data["hosts"], indent=2)
+                data_label, data_lang = "Datos Estructurados del Escaneo (JSON)", "json"
             else:
                 # Fallback a stdout
-                data_context = f"**Datos técnicos del escaneo (Raw Output):**\n```\n{stdout[:8000]}\n```"
+                raw_data = stdout
+                data_label, data_lang = "Datos técnicos del escaneo (Raw Output)", ""
+
+            if in_plan_step.get():
+                # Etapa de un plan (map): solo el resumen de la herramienta, el informe lo sintetiza el plan
+                summary, _ = await summarize_output(self._complete, action_id, target, raw_data)
+                with open(f"{report_path}/summary.md", "w") as f:
+                    f.write(summary)
+                return
+
+            if estimate_tokens(raw_data) > REPORT_CHUNK_TOKENS:
+                # Salida demasiado grande para un prompt: resumir por trozos antes del informe
+                summary, parts = await summarize_output(self._complete, action_id, target, raw_data)
+                data_context = f"**Resumen técnico del escaneo (consolidado a partir de {parts} fragmentos de la salida):**\n{summary}"
+            else:
+                data_context = f"**{data_label}:**\n```{data_lang}\n{raw_data}\n```"
 
             # Prompt para análisis de seguridad estilo ejecutivo
             prompt = f"""Actúa como un consultor senior de ciberseguridad especializado en informes para directivos no técnicos.
@@ -570,51 +646,22 @@ Información técnica completa disponible para el equipo de IT:
 """
 
             logger.info(f"Generating AI report for {execution_id}...")
-            
-            # Llamar a Ollama (en un executor para no bloquear el event loop)
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: self.ollama_client.chat(
-                    messages=[{"role": "user", "content": prompt}],
-                    model="llama3.1:8b-instruct-q4_K_M"
-                )
-            )
-            
-            if "error" in response:
-                raise Exception(f"Ollama error: {response['error']}")
-            
-            ai_report = response.get("message", {}).get("content", "")
-            
-            if not ai_report:
-                raise Exception("Empty response from LLM")
-            
+            ai_report = await self._complete(prompt)
+
             # Escribir reporte de IA
             with open(f"{report_path}/report_ai.md", "w") as f:
                 f.write(ai_report)
                 
             logger.info(f"AI report generated successfully for {execution_id}")
 
-            # Ingest into Orchestrator
-            try:
-                orchestrator_url = os.getenv("ORCHESTRATOR_URL", "http://orchestrator_api:8000")
-                ingest_data = {
-                    "scan_id": execution_id,
-                    "resumen_tecnico": ai_report,
-                    "riesgos_principales": ["Ver reporte detallado"],
-                    "recomendaciones": ["Ver reporte detallado"]
-                }
-                async with httpx.AsyncClient() as client:
-                    resp = await client.post(f"{orchestrator_url}/reports/ingest-data", json=ingest_data)
-                    if resp.status_code == 200:
-                        logger.info(f"Report ingested into Orchestrator: {resp.json()}")
-                    else:
-                        logger.error(f"Failed to ingest report: {resp.text}")
-            except Exception as e:
-                logger.error(f"Error ingesting report: {e}")
+            await self._ingest_report(execution_id, ai_report)
             
         except Exception as e:
             logger.error(f"Error generating AI report: {e}. Falling back to raw output.")
+            if in_plan_step.get():
+                with open(f"{report_path}/summary.md", "w") as f:
+                    f.write(fit_to_budget(stdout or stderr, REPORT_CHUNK_TOKENS))
+                return
             # Fallback: escribir salida cruda
             with open(f"{report_path}/report_ai.md", "w") as f:
                 f.write(f"# Execution Report: {execution_id}\n\n")
@@ -632,6 +679,39 @@ Información técnica completa disponible para el equipo de IT:
                     f.write(stderr)
                     f.write("\n```\n")
 
+    async def _complete(self, prompt: str) -> str:
+        """Una llamada al LLM de informes; lanza excepción si no hay respuesta."""
+        response = await self.ollama_client.achat(
+            messages=[{"role": "user", "content": prompt}],
+            model=REPORT_MODEL,
+            priority=PRIORITY_BACKGROUND,
+        )
+        if "error" in response:
+            raise Exception(f"Ollama error: {response['error']}")
+        content = response.get("message", {}).get("content", "")
+        if not content:
+            raise Exception("Empty response from LLM")
+        return content
+
+    async def _ingest_report(self, execution_id: str, ai_report: str):
+        """Ingesta del informe en el Orchestrator (errores solo se registran)."""
+        try:
+            orchestrator_url = os.getenv("ORCHESTRATOR_URL", "http://orchestrator_api:8000")
+            ingest_data = {
+                "scan_id": execution_id,
+                "resumen_tecnico": ai_report,
+                "riesgos_principales": ["Ver reporte detallado"],
+                "recomendaciones": ["Ver reporte detallado"]
+            }
+            async with httpx.AsyncClient() as client:
+                resp = await client.post(f"{orchestrator_url}/reports/ingest-data", json=ingest_data)
+                if resp.status_code == 200:
+                    logger.info(f"Report ingested into Orchestrator: {resp.json()}")
+                else:
+                    logger.error(f"Failed to ingest report: {resp.text}")
+        except Exception as e:
+            logger.error(f"Error ingesting report: {e}")
+
     async def _run_local_script(self, execution_id: str, action_id: str, script_path: str, args: List[str], report_path: str, timeout_seconds: int, output_dir: Optional[str] = None) -> Dict[str, Any]:
         """Ejecuta scripts locales con argumentos personalizados."""
         os.chmod(script_path, 0o755)
@@ -745,33 +825,14 @@ Información técnica completa disponible para el equipo de IT:
         """Ejecuta scripts en nodo remoto y sincroniza artefactos."""
         try:
             remote_script_path = f"/tmp/{execution_id}.sh"
-            use_sshpass = (host == "kali-2025" and user == "kali")
-
-            if use_sshpass:
-                scp_cmd = [
-                    "sshpass", "-p", "leoslo23",
-                    "scp",
-                    "-o", "StrictHostKeyChecking=no",
-                    script_path,
-                    f"{user}@{host}:{remote_script_path}"
-                ]
-            else:
-                scp_cmd = [
-                    "scp",
-                    "-o", "BatchMode=yes",
-                    "-o", "StrictHostKeyChecking=no",
-                    script_path,
-                    f"{user}@{host}:{remote_script_path}"
-                ]
-
-                if self.key_path:
-                    scp_cmd.insert(1, "-i")
-                    scp_cmd.insert(2, self.key_path)
+
+            # Conexión maestra compartida: scp, ejecución, tail y artefactos van por el mismo canal
+            await self.ssh_pool.ensure_master(host, user, *self._ssh_auth(host, user))
 
             logger.info(f"Copying script via SCP to {host}")
 
             scp_proc = await asyncio.create_subprocess_exec(
-                *scp_cmd,
+                *self._scp_command(host, user, script_path, f"{user}@{host}:{remote_script_path}"),
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE
             )
@@ -780,72 +841,34 @@ Información técnica completa disponible para el equipo de IT:
             if scp_proc.returncode != 0:
                 raise Exception(f"Failed to copy script: {scp_stderr.decode()}")
 
-            # Dar permisos de ejecución
-            if use_sshpass:
-                chmod_cmd = [
-                    "sshpass", "-p", "leoslo23",
-                    "ssh",
-                    "-o", "StrictHostKeyChecking=no",
-                    f"{user}@{host}",
-                    f"chmod +x {remote_script_path}"
-                ]
-            else:
-                chmod_cmd = [
-                    "ssh",
-                    "-o", "BatchMode=yes",
-                    "-o", "StrictHostKeyChecking=no",
-                    f"{user}@{host}",
-                    f"chmod +x {remote_script_path}"
-                ]
-
-                if self.key_path:
-                    chmod_cmd.insert(1, "-i")
-                    chmod_cmd.insert(2, self.key_path)
-
-            await asyncio.create_subprocess_exec(
-                *chmod_cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-
             quoted_args = " ".join(shlex.quote(arg) for arg in args)
             remote_cmd = f"{remote_script_path} {quoted_args}".strip()
 
+            if timeout_seconds:
+                remote_cmd = f"timeout {timeout_seconds}s {remote_cmd}"
+
             if remote_output_dir:
                 remote_cmd = f"mkdir -p {shlex.quote(remote_output_dir)} && {remote_cmd}"
 
-            if timeout_seconds:
-                remote_cmd = f"timeout {timeout_seconds}s {remote_cmd}"
+            # Dar permisos de ejecución en la misma conexión
+            remote_cmd = f"chmod +x {remote_script_path} && {remote_cmd}"
 
-            if use_sshpass:
-                cmd = [
-                    "sshpass", "-p", "leoslo23",
-                    "ssh",
-                    "-o", "StrictHostKeyChecking=no",
-                    f"{user}@{host}",
-                    remote_cmd
-                ]
-            else:
-                cmd = [
-                    "ssh",
-                    "-o", "BatchMode=yes",
-                    "-o", "StrictHostKeyChecking=no",
-                    f"{user}@{host}",
-                    remote_cmd
-                ]
-
-                if self.key_path:
-                    cmd.insert(1, "-i")
-                    cmd.insert(2, self.key_path)
+            cmd = self._ssh_command(host, user, remote_cmd)
 
             logger.info(f"Executing SSH script: {' '.join(cmd)}")
 
+            os.makedirs(report_path, exist_ok=True)
+
             process = await asyncio.create_subprocess_exec(
                 *cmd,
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE
             )
 
+            if remote_output_dir:
+                list_files, opener, remote_sha = self._ssh_remote(host, user, remote_output_dir)
+                tail = self._start_live_tail(execution_id, action_id, report_path, list_files, opener)
+
             try:
                 stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout_seconds + 30)
                 timed_out = False
@@ -860,41 +883,11 @@ Información técnica completa disponible para el equipo de IT:
             exit_code = -1 if timed_out else process.returncode
             status = "completed" if exit_code == 0 else ("timeout" if timed_out else "failed")
 
-            os.makedirs(report_path, exist_ok=True)
-
+            artifacts = []
             if remote_output_dir:
-                if use_sshpass:
-                    fetch_cmd = [
-                        "sshpass", "-p", "leoslo23",
-                        "scp", "-r",
-                        "-o", "StrictHostKeyChecking=no",
-                        f"{user}@{host}:{remote_output_dir}/",
-                        report_path
-                    ]
-                else:
-                    fetch_cmd = [
-                        "scp", "-r",
-                        "-o", "BatchMode=yes",
-                        "-o", "StrictHostKeyChecking=no",
-                        f"{user}@{host}:{remote_output_dir}/",
-                        report_path
-                    ]
-
-                    if self.key_path:
-                        fetch_cmd.insert(1, "-i")
-                        fetch_cmd.insert(2, self.key_path)
-
-                fetch_proc = await asyncio.create_subprocess_exec(
-                    *fetch_cmd,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
-                )
-                _, fetch_stderr = await fetch_proc.communicate()
-
-                if fetch_proc.returncode != 0:
-                    logger.error(f"Failed to fetch artifacts: {fetch_stderr.decode()}")
-                else:
-                    logger.info(f"Artifacts downloaded to {report_path}")
+                await self._stop_live_tail(report_path, tail)
+                artifacts = await self._collect_artifacts(execution_id, report_path, list_files, opener, remote_sha)
+                logger.info(f"{len(artifacts)} artifacts stored for {report_path}")
 
             metadata = {
                 "execution_id": execution_id,
@@ -903,6 +896,7 @@ Información técnica completa disponible para el equipo de IT:
                 "timestamp": datetime.now().isoformat(),
                 "status": status,
                 "exit_code": exit_code,
+                "artifacts": artifacts,
             }
 
             with open(f"{report_path}/metadata.json", "w") as f:
@@ -930,6 +924,7 @@ Información técnica completa disponible para el equipo de IT:
 
         except Exception as e:
             logger.error(f"Error executing SSH script: {e}")
+            await self._stop_live_tail(report_path)
             return {
                 "execution_id": execution_id,
                 "status": "error",
@@ -1058,34 +1053,12 @@ Información técnica completa disponible para el equipo de IT:
             # Copiar script al remoto
             remote_script_path = f"/tmp/{execution_id}.sh"
             
-            # Use sshpass for kali-2025 due to SSH key issues
-            use_sshpass = (current_host == "kali-2025" and current_user == "kali")
-            
-            if use_sshpass:
-                scp_cmd = [
-                    "sshpass", "-p", "leoslo23",
-                    "scp",
-                    "-o", "StrictHostKeyChecking=no",
-                    script_path,
-                    f"{current_user}@{current_host}:{remote_script_path}"
-                ]
-            else:
-                scp_cmd = [
-                    "scp",
-                    "-o", "BatchMode=yes",
-                    "-o", "StrictHostKeyChecking=no",
-                    script_path,
-                    f"{current_user}@{current_host}:{remote_script_path}"
-                ]
-                
-                if self.key_path:
-                    scp_cmd.insert(1, "-i")
-                    scp_cmd.insert(2, self.key_path)
-                
+            await self.ssh_pool.ensure_master(current_host, current_user, *self._ssh_auth(current_host, current_user))
+
             logger.info(f"Copying script via SCP to {current_host}")
             
             scp_proc = await asyncio.create_subprocess_exec(
-                *scp_cmd,
+                *self._scp_command(current_host, current_user, script_path, f"{current_user}@{current_host}:{remote_script_path}"),
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE
             )
@@ -1094,57 +1067,11 @@ Información técnica completa disponible para el equipo de IT:
             if scp_proc.returncode != 0:
                 raise Exception(f"Failed to copy script: {scp_stderr.decode()}")
 
-
-            # Dar permisos de ejecución
-            if use_sshpass:
-                chmod_cmd = [
-                    "sshpass", "-p", "leoslo23",
-                    "ssh",
-                    "-o", "StrictHostKeyChecking=no",
-                    f"{current_user}@{current_host}",
-                    f"chmod +x {remote_script_path}"
-                ]
-            else:
-                chmod_cmd = [
-                    "ssh",
-                    "-o", "BatchMode=yes",
-                    "-o", "StrictHostKeyChecking=no",
-                    f"{current_user}@{current_host}",
-                    f"chmod +x {remote_script_path}"
-                ]
-                
-                if self.key_path:
-                    chmod_cmd.insert(1, "-i")
-                    chmod_cmd.insert(2, self.key_path)
-                
-            chmod_proc = await asyncio.create_subprocess_exec(
-                *chmod_cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
+            # Dar permisos y ejecutar script remoto (una sola sesión sobre el master)
+            cmd = self._ssh_command(
+                current_host, current_user,
+                f"chmod +x {remote_script_path} && {remote_script_path} '{target_arg}'"
             )
-            await chmod_proc.communicate()
-
-            # Ejecutar script remoto
-            if use_sshpass:
-                cmd = [
-                    "sshpass", "-p", "leoslo23",
-                    "ssh",
-                    "-o", "StrictHostKeyChecking=no",
-                    f"{current_user}@{current_host}",
-                    f"{remote_script_path} '{target_arg}'"
-                ]
-            else:
-                cmd = [
-                    "ssh",
-                    "-o", "BatchMode=yes",
-                    "-o", "StrictHostKeyChecking=no", # Para evitar prompts en primera conexión
-                    f"{current_user}@{current_host}",
-                    f"{remote_script_path} '{target_arg}'"
-                ]
-                
-                if self.key_path:
-                    cmd.insert(1, "-i")
-                    cmd.insert(2, self.key_path)
                 
             logger.info(f"Executing SSH: {' '.join(cmd)}")
             
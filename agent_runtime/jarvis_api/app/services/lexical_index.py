@@ -0,0 +1,201 @@
+"""
+Índice léxico BM25 local para el RAG.
+
+Los embeddings representan mal identificadores exactos (CVE-2024-3400,
+192.168.1.10, nombres de herramientas), así que la ingesta alimenta también un
+índice invertido en SQLite (postings por término) que se consulta junto a
+Qdrant. Las consultas que contienen identificadores exactos se resuelven solo
+con este índice, sin llamada de embedding.
+"""
+
+import logging
+import math
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.services.sqlite_store import SQLiteStore, shared_store
+
+logger = logging.getLogger(__name__)
+
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", "/opt/deco/agent_runtime/data/lexical_index.sqlite3")
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+
+# Tokens con separadores internos (CVE-2024-3400, 10.0.0.1, impacket-smbexec, v1.2.3)
+_TOKEN_RE = re.compile(r"[a-z0-9_]+(?:[.:/-][a-z0-9_]+)*")
+_SPLIT_RE = re.compile(r"[.:/-]")
+
+# Identificadores que el índice léxico resuelve solo
+_EXACT_PATTERNS = [
+    re.compile(r"\bcve-\d{4}-\d{4,}\b", re.I),
+    re.compile(r"\bcwe-\d+\b", re.I),
+    re.compile(r"\bghsa(?:-[a-z0-9]{4}){3}\b", re.I),
+    re.compile(r"\b(?:\d{1,3}\.){3}\d{1,3}\b"),
+    re.compile(r"\b[a-f0-9]{32,64}\b", re.I),
+]
+
+_STOPWORDS = frozenset(
+    "a al como con de del el en es la las lo los para por que qué se su un una y "
+    "the of and or to in on for is are what how which with an be".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Minúsculas; los tokens compuestos se indexan enteros y por partes."""
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        tokens.append(token)
+        if _SPLIT_RE.search(token):
+            tokens.extend(p for p in _SPLIT_RE.split(token) if len(p) > 1 and p not in _STOPWORDS)
+    return tokens
+
+
+def exact_terms(query: str) -> List[str]:
+    """Identificadores exactos presentes en la consulta (en minúsculas)."""
+    found = []
+    for pattern in _EXACT_PATTERNS:
+        found.extend(m.lower() for m in pattern.findall(query))
+    return list(dict.fromkeys(found))
+
+
+class BM25Index(SQLiteStore):
+    """Índice invertido incremental en SQLite."""
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS docs (
+            id TEXT PRIMARY KEY,
+            length INTEGER NOT NULL,
+            source TEXT,
+            page INTEGER,
+            section TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS postings (
+            term TEXT NOT NULL,
+            doc_id TEXT NOT NULL,
+            tf INTEGER NOT NULL,
+            PRIMARY KEY (term, doc_id)
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_postings_doc ON postings (doc_id)",
+    )
+    SYNCHRONOUS = "NORMAL"
+
+    def __init__(self, path: str = LEXICAL_INDEX_PATH):
+        super().__init__(path)
+        self._doc_count, self._total_length = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs"
+        ).fetchone()
+
+    def add_many(self, documents: Iterable[Tuple[str, str, Dict[str, Any]]]):
+        """documents: (doc_id, texto, metadata con source/page/section)."""
+        doc_rows = []
+        posting_rows = []
+        for doc_id, text, metadata in documents:
+            terms = Counter(tokenize(text))
+            if not terms:
+                continue
+            doc_id = str(doc_id)
+            doc_rows.append((doc_id, sum(terms.values()), metadata.get("source"), metadata.get("page"), metadata.get("section")))
+            posting_rows.extend((term, doc_id, tf) for term, tf in terms.items())
+        if not doc_rows:
+            return
+        with self._lock:
+            with self._transaction():
+                ids = [row[0] for row in doc_rows]
+                # Reindexar un id reemplaza su entrada y sus postings
+                previous_count = previous_length = 0
+                for start in range(0, len(ids), 500):
+                    block = ids[start:start + 500]
+                    count, length = self._conn.execute(
+                        f"SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs WHERE id IN ({','.join('?' * len(block))})",
+                        block,
+                    ).fetchone()
+                    previous_count += count
+                    previous_length += length
+                self._conn.executemany("DELETE FROM postings WHERE doc_id = ?", [(i,) for i in ids])
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO docs (id, length, source, page, section) VALUES (?, ?, ?, ?, ?)", doc_rows
+                )
+                self._conn.executemany("INSERT OR REPLACE INTO postings (term, doc_id, tf) VALUES (?, ?, ?)", posting_rows)
+            self._doc_count += len(doc_rows) - previous_count
+            self._total_length += sum(row[1] for row in doc_rows) - previous_length
+
+    def search(self, query: str, limit: int = 10, required: Sequence[str] = ()) -> List[Dict[str, Any]]:
+        """
+        BM25 sobre los términos de la consulta.
+        required: términos que deben aparecer en el documento (p. ej. un CVE).
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self._doc_count:
+            return []
+        avg_length = self._total_length / self._doc_count
+        scores: Dict[str, float] = {}
+        with self._lock:
+            for term in terms:
+                rows = self._conn.execute(
+                    "SELECT p.doc_id, p.tf, d.length FROM postings p JOIN docs d ON d.id = p.doc_id WHERE p.term = ?",
+                    (term,),
+                ).fetchall()
+                if not rows:
+                    continue
+                idf = math.log(1 + (self._doc_count - len(rows) + 0.5) / (len(rows) + 0.5))
+                for doc_id, tf, length in rows:
+                    norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+            if required:
+                for term in required:
+                    having = {
+                        row[0] for row in self._conn.execute("SELECT doc_id FROM postings WHERE term = ?", (term,))
+                    }
+                    scores = {d: s for d, s in scores.items() if d in having}
+            top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+            meta = {}
+            if top:
+                ids = [doc_id for doc_id, _ in top]
+                for doc_id, source, page, section in self._conn.execute(
+                    f"SELECT id, source, page, section FROM docs WHERE id IN ({','.join('?' * len(ids))})", ids
+                ):
+                    meta[doc_id] = {"source": source, "page": page, "section": section}
+        return [{"id": doc_id, "score": score, **meta.get(doc_id, {})} for doc_id, score in top]
+
+    def delete_many(self, ids: Iterable[str]):
+        ids = [(str(i),) for i in ids]
+        with self._lock:
+            with self._transaction():
+                self._conn.executemany("DELETE FROM postings WHERE doc_id = ?", ids)
+                self._conn.executemany("DELETE FROM docs WHERE id = ?", ids)
+            self._doc_count, self._total_length = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs"
+            ).fetchone()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            terms = self._conn.execute("SELECT COUNT(DISTINCT term) FROM postings").fetchone()[0]
+        return {"documents": self._doc_count, "terms": terms}
+
+
+def rrf_fuse(rankings: Sequence[Sequence[Dict[str, Any]]], limit: int, k: int = RRF_K) -> List[Dict[str, Any]]:
+    """
+    Fusión por rango recíproco de varias listas ordenadas de resultados con "id".
+    Conserva el primer dict visto de cada id y añade "rrf_score".
+    """
+    fused: Dict[str, Dict[str, Any]] = {}
+    for ranking in rankings:
+        for rank, hit in enumerate(ranking, start=1):
+            entry = fused.setdefault(hit["id"], {**hit, "rrf_score": 0.0})
+            entry["rrf_score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda hit: hit["rrf_score"], reverse=True)[:limit]
+
+
+def get_lexical_index(path: str = LEXICAL_INDEX_PATH) -> Optional[BM25Index]:
+    """Índice compartido del proceso (None si no se puede abrir el fichero)."""
+    return shared_store(BM25Index, path, f"[LexicalIndex] No se pudo abrir {path}")
@@ -0,0 +1,427 @@
+"""
+Cliente Ollama asíncrono compartido por todo el proceso.
+
+- httpx.AsyncClient con pool de conexiones keep-alive hacia Ollama.
+- Límite global de generaciones simultáneas (OLLAMA_MAX_CONCURRENCY, según la
+  capacidad GPU/CPU del host de Ollama) y límite por modelo, ambos con cola por
+  prioridad: el chat interactivo adelanta al trabajo de fondo del CLE.
+- Peticiones idénticas en vuelo (mismo endpoint y payload) se resuelven con una
+  sola llamada a Ollama.
+- Streaming de tokens (NDJSON de /api/chat).
+
+El cliente vive en un event loop propio (hilo daemon): el pool y los límites son
+únicos aunque haya llamadores en varios loops (FastAPI, asyncio.run del CLE) o
+en hilos sync (JarvisOllamaClient).
+"""
+
+import asyncio
+import concurrent.futures
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Prioridades: menor número = se atiende antes
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 5
+PRIORITY_BACKGROUND = 10
+
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://ollama:11434")
+OLLAMA_MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "2"))
+# 0 = mismo valor que el límite global
+OLLAMA_MODEL_CONCURRENCY = int(os.getenv("OLLAMA_MODEL_CONCURRENCY", "0"))
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "20"))
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "180"))
+OLLAMA_EMBED_TIMEOUT = float(os.getenv("OLLAMA_EMBED_TIMEOUT", "30"))
+# Chunks buffered per stream; when the consumer falls behind, reading from Ollama pauses
+OLLAMA_STREAM_BUFFER = int(os.getenv("OLLAMA_STREAM_BUFFER", "64"))
+
+DEFAULT_CHAT_MODEL = "llama3.1:8b-instruct-q4_K_M"
+DEFAULT_EMBED_MODEL = "jarvis-core"
+
+_STREAM_END = object()
+
+
+class OllamaError(Exception):
+    """Error de transporte o HTTP hablando con Ollama."""
+
+
+class PriorityLimiter:
+    """
+    Semáforo con cola por prioridad (FIFO a igual prioridad).
+    Solo se usa desde el loop del cliente.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self.in_use = 0
+        self._waiters: List[Any] = []
+        self._seq = itertools.count()
+
+    async def acquire(self, priority: int):
+        if self.in_use < self.capacity and not self._waiters:
+            self.in_use += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Si ya se nos había asignado el slot, devolverlo
+            if not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        self.in_use -= 1
+        while self._waiters and self.in_use < self.capacity:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self.in_use += 1
+            future.set_result(None)
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, f in self._waiters if not f.done())
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+def _flight_key(path: str, payload: Dict[str, Any]) -> str:
+    raw = json.dumps({"path": path, "payload": payload}, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class AsyncOllamaClient:
+    """Cliente Ollama asíncrono con pool, prioridades y coalescing."""
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        max_concurrency: int = OLLAMA_MAX_CONCURRENCY,
+        model_concurrency: int = OLLAMA_MODEL_CONCURRENCY,
+        max_connections: int = OLLAMA_MAX_CONNECTIONS,
+    ):
+        self.base_url = (base_url or OLLAMA_BASE_URL).rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.model_concurrency = model_concurrency or max_concurrency
+        self.max_connections = max_connections
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._start_lock = threading.Lock()
+        # Estado del loop del cliente (se crea perezosamente dentro de él)
+        self._http: Optional[httpx.AsyncClient] = None
+        self._global: Optional[PriorityLimiter] = None
+        self._models: Dict[str, PriorityLimiter] = {}
+        self._inflight: Dict[str, _Flight] = {}
+        self.stats = {"requests": 0, "coalesced": 0, "streams": 0, "errors": 0}
+
+    # ------------------------------------------------------------------
+    # Loop propio
+    # ------------------------------------------------------------------
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is not None:
+            return self._loop
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="ollama-client", daemon=True).start()
+                self._loop = loop
+        return self._loop
+
+    def _on_client_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def _submit(self, coro: Awaitable) -> concurrent.futures.Future:
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    async def _run(self, coro: Awaitable):
+        """
+        Ejecuta la corrutina en el loop del cliente y la espera desde el loop
+        llamador. Cancelar al llamador cancela la petición.
+        """
+        self._ensure_loop()
+        if self._on_client_loop():
+            return await coro
+        return await asyncio.wrap_future(self._submit(coro))
+
+    def run_sync(self, coro: Awaitable, timeout: Optional[float] = None):
+        """
+        Bloquea el hilo actual hasta que termine la corrutina (fachada sync).
+        """
+        self._ensure_loop()
+        if self._on_client_loop():
+            raise RuntimeError("run_sync no puede llamarse desde el loop del cliente Ollama")
+        return self._submit(coro).result(timeout)
+
+    # ------------------------------------------------------------------
+    # Internos (siempre en el loop del cliente)
+    # ------------------------------------------------------------------
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(OLLAMA_READ_TIMEOUT, connect=OLLAMA_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+            self._global = PriorityLimiter(self.max_concurrency)
+        return self._http
+
+    @asynccontextmanager
+    async def _slot(self, model: str, priority: int):
+        self._client()
+        limiter = self._models.get(model)
+        if limiter is None:
+            limiter = self._models[model] = PriorityLimiter(self.model_concurrency)
+        # Primero la cola del modelo: un modelo con backlog no acapara slots globales
+        await limiter.acquire(priority)
+        try:
+            await self._global.acquire(priority)
+            try:
+                yield
+            finally:
+                self._global.release()
+        finally:
+            limiter.release()
+
+    async def _post(self, path: str, payload: Dict[str, Any], priority: int, timeout: Optional[float]) -> Dict[str, Any]:
+        self.stats["requests"] += 1
+        async with self._slot(payload["model"], priority):
+            try:
+                response = await self._client().post(
+                    path,
+                    json=payload,
+                    timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+                )
+                response.raise_for_status()
+                return response.json()
+            except httpx.HTTPError as e:
+                self.stats["errors"] += 1
+                raise OllamaError(f"{path}: {e}") from e
+
+    async def _shared(self, key: str, factory: Callable[[], Awaitable]):
+        """
+        Una sola petición por clave en vuelo. La prioridad es la del primero en
+        llegar; si todos los interesados cancelan, se cancela la petición.
+        """
+        flight = self._inflight.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(factory()))
+            self._inflight[key] = flight
+            flight.task.add_done_callback(
+                lambda _t, k=key, f=flight: self._inflight.pop(k, None) if self._inflight.get(k) is f else None
+            )
+        else:
+            self.stats["coalesced"] += 1
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    async def _request(self, path: str, payload: Dict[str, Any], priority: int, timeout: Optional[float] = None):
+        key = _flight_key(path, payload)
+        return await self._shared(key, lambda: self._post(path, payload, priority, timeout))
+
+    # ------------------------------------------------------------------
+    # API pública (awaitable desde cualquier loop)
+    # ------------------------------------------------------------------
+
+    async def chat(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        tools: Optional[List[Dict]] = None,
+        stream: bool = False,
+        options: Optional[Dict[str, Any]] = None,
+        priority: int = PRIORITY_NORMAL,
+    ) -> Dict[str, Any]:
+        """
+        Chat completo. Mismo contrato que la versión sync: en caso de error
+        devuelve {"error": ..., "status": "failed"}.
+        stream=True consume el stream y devuelve la respuesta ensamblada.
+        """
+        try:
+            if stream:
+                return await self._collect_stream(messages, model, tools, options, priority)
+            payload = self._chat_payload(messages, model, tools, False, options)
+            return await self._run(self._request("/api/chat", payload, priority))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return {"error": str(e), "status": "failed"}
+
+    async def chat_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        tools: Optional[List[Dict]] = None,
+        options: Optional[Dict[str, Any]] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Itera los chunks de Ollama ({"message": {"content": ...}, "done": bool}).
+        El slot de concurrencia se mantiene mientras dura el stream. La cola es
+        acotada (OLLAMA_STREAM_BUFFER): si el consumidor va lento, el productor
+        espera hueco y deja de leer de Ollama (backpressure).
+        Lanza OllamaError si falla la conexión o Ollama responde con error.
+        """
+        payload = self._chat_payload(messages, model, tools, True, options)
+        caller_loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, OLLAMA_STREAM_BUFFER))
+
+        async def emit(item):
+            # queue.put corre en el loop del llamador; cancelar pump cancela la espera
+            await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(queue.put(item), caller_loop))
+
+        async def pump():
+            self.stats["streams"] += 1
+            try:
+                async with self._slot(payload["model"], priority):
+                    async with self._client().stream("POST", "/api/chat", json=payload) as response:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if line.strip():
+                                await emit(json.loads(line))
+                await emit(_STREAM_END)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["errors"] += 1
+                await emit(OllamaError(f"/api/chat (stream): {e}"))
+
+        future = self._submit(pump())
+        try:
+            while True:
+                item = await queue.get()
+                if item is _STREAM_END:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            future.cancel()
+
+    async def _collect_stream(self, messages, model, tools, options, priority) -> Dict[str, Any]:
+        parts: List[str] = []
+        last: Dict[str, Any] = {}
+        async for chunk in self.chat_stream(messages, model, tools, options, priority):
+            parts.append(chunk.get("message", {}).get("content", ""))
+            last = chunk
+        result = dict(last)
+        result["message"] = {"role": "assistant", "content": "".join(parts)}
+        return result
+
+    async def generate_embedding(
+        self,
+        text: str,
+        model: str = DEFAULT_EMBED_MODEL,
+        priority: int = PRIORITY_NORMAL,
+    ) -> List[float]:
+        """Genera embedding para RAG ([] si falla)."""
+        try:
+            payload = {"model": model, "prompt": text}
+            data = await self._run(self._request("/api/embeddings", payload, priority, OLLAMA_EMBED_TIMEOUT))
+            return data.get("embedding", [])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"[Ollama] Error generando embedding: {e}")
+            return []
+
+    async def check_health(self) -> bool:
+        """Verifica si Ollama está disponible (no ocupa slot de generación)."""
+
+        async def _probe():
+            response = await self._client().get("/api/tags", timeout=5)
+            return response.status_code == 200
+
+        try:
+            return await self._run(_probe())
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            return False
+
+    def status(self) -> Dict[str, Any]:
+        """Ocupación de los límites y contadores (lectura aproximada, sin locks)."""
+        return {
+            "base_url": self.base_url,
+            "max_concurrency": self.max_concurrency,
+            "model_concurrency": self.model_concurrency,
+            "in_use": self._global.in_use if self._global else 0,
+            "waiting": self._global.waiting if self._global else 0,
+            "models": {
+                name: {"in_use": lim.in_use, "waiting": lim.waiting}
+                for name, lim in list(self._models.items())
+            },
+            "inflight": len(self._inflight),
+            "stats": dict(self.stats),
+        }
+
+    async def aclose(self):
+        async def _close():
+            if self._http is not None:
+                await self._http.aclose()
+                self._http = None
+
+        if self._loop is not None:
+            await self._run(_close())
+
+    def _chat_payload(self, messages, model, tools, stream, options) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {
+            "model": model or DEFAULT_CHAT_MODEL,
+            "messages": messages,
+            "stream": stream,
+        }
+        if tools:
+            payload["tools"] = tools
+        if options:
+            payload["options"] = options
+        return payload
+
+
+_clients: Dict[str, AsyncOllamaClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_async_ollama(base_url: Optional[str] = None) -> AsyncOllamaClient:
+    """
+    Cliente compartido por base_url: todos los llamadores del proceso pasan por
+    los mismos límites de concurrencia.
+    """
+    key = (base_url or OLLAMA_BASE_URL).rstrip("/")
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = AsyncOllamaClient(key)
+        return client
+
+
+async def close_async_ollama():
+    for client in list(_clients.values()):
+        await client.aclose()
@@ -1,65 +1,94 @@
-from typing import Optional, List, Dict, Any
-import requests
-import json
+from typing import Optional, List, Dict, Any, AsyncIterator
+
+from app.services.ollama_async import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_NORMAL,
+    get_async_ollama,
+)
+
+__all__ = ["JarvisOllamaClient", "PRIORITY_BACKGROUND", "PRIORITY_INTERACTIVE", "PRIORITY_NORMAL"]
+
 
 class JarvisOllamaClient:
-    """Cliente Ollama para Jarvis con soporte de herramientas y memoria."""
-    
+    """
+    Cliente Ollama para Jarvis con soporte de herramientas y memoria.
+
+    Fachada sobre el AsyncOllamaClient compartido: los métodos sync (chat,
+    generate_embedding, check_health) bloquean solo el hilo que llama y sirven
+    para el código sync existente; desde código async usar achat,
+    achat_stream y agenerate_embedding.
+    """
+
     def __init__(self, base_url: str = None, default_model: str = "llama3.1:8b-instruct-q4_K_M"):
         import os
         self.base_url = base_url or os.getenv("OLLAMA_BASE_URL", "http://ollama:11434")
         self.default_model = default_model
-    
+        self.client = get_async_ollama(self.base_url)
+
+    # --- async ---
+
+    async def achat(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = None,
+        tools: Optional[List[Dict]] = None,
+        stream: bool = False,
+        options: Optional[Dict[str, Any]] = None,
+        priority: int = PRIORITY_NORMAL,
+    ) -> Dict[str, Any]:
+        """Chat con contexto y herramientas opcionales (no bloquea el event loop)."""
+        return await self.client.chat(
+            messages,
+            model=model or self.default_model,
+            tools=tools,
+            stream=stream,
+            options=options,
+            priority=priority,
+        )
+
+    def achat_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = None,
+        tools: Optional[List[Dict]] = None,
+        options: Optional[Dict[str, Any]] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream de tokens: async for chunk in client.achat_stream(...)."""
+        return self.client.chat_stream(
+            messages,
+            model=model or self.default_model,
+            tools=tools,
+            options=options,
+            priority=priority,
+        )
+
+    async def agenerate_embedding(self, text: str, model: str = "jarvis-core", priority: int = PRIORITY_NORMAL) -> List[float]:
+        """Genera embedding para RAG."""
+        return await self.client.generate_embedding(text, model=model, priority=priority)
+
+    # --- sync (compatibilidad) ---
+
     def chat(
         self,
         messages: List[Dict[str, str]],
         model: str = None, # Will use self.default_model if None
         tools: Optional[List[Dict]] = None,
         stream: bool = False,
-        options: Optional[Dict[str, Any]] = None
+        options: Optional[Dict[str, Any]] = None,
+        priority: int = PRIORITY_NORMAL,
     ) -> Dict[str, Any]:
         """Chat con contexto y herramientas opcionales."""
-        payload = {
-            "model": model or self.default_model,
-            "messages": messages,
-            "stream": stream
-        }
-        
-        if tools:
-            payload["tools"] = tools
-            
-        if options:
-            payload["options"] = options
-        
-        try:
-            response = requests.post(
-                f"{self.base_url}/api/chat",
-                json=payload,
-                timeout=180
-            )
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            return {"error": str(e), "status": "failed"}
-    
-    def generate_embedding(self, text: str, model: str = "jarvis-core") -> List[float]:
+        return self.client.run_sync(self.achat(messages, model, tools, stream, options, priority))
+
+    def generate_embedding(self, text: str, model: str = "jarvis-core", priority: int = PRIORITY_NORMAL) -> List[float]:
         """Genera embedding para RAG."""
-        try:
-            response = requests.post(
-                f"{self.base_url}/api/embeddings",
-                json={"model": model, "prompt": text},
-                timeout=30
-            )
-            response.raise_for_status()
-            return response.json().get("embedding", [])
-        except Exception as e:
-            print(f"[Ollama] Error generando embedding: {e}")
-            return []
-    
+        return self.client.run_sync(self.agenerate_embedding(text, model, priority))
+
     def check_health(self) -> bool:
         """Verifica si Ollama está disponible."""
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
-            return response.status_code == 200
-        except:
+            return self.client.run_sync(self.client.check_health(), timeout=10)
+        except Exception:
             return False
@@ -1,32 +1,41 @@
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
+from qdrant_client.models import FieldCondition, Filter, MatchValue, PointIdsList, PointStruct
 from typing import List, Dict, Any
 import uuid
 from datetime import datetime
 
+from app.services.document_store import hydrate_payloads
+from app.services.vector_schema import search_params
+from app.services.vector_writer import QdrantBulkWriter
+
+# Namespace de los ids deterministas (uuid5): reingestar el mismo contenido
+# sobrescribe el punto en lugar de duplicarlo
+POINT_ID_NAMESPACE = uuid.UUID("6f1d3c2e-5b7a-4e0f-9c1d-2a8b4e6f7d10")
+
+
+def point_id_for(*parts: Any) -> str:
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, "\x1f".join("" if p is None else str(p) for p in parts)))
+
+
 class JarvisQdrantMemory:
     """Memoria vectorial de Jarvis con colecciones separadas."""
     
     def __init__(self, host: str = "localhost", port: int = 6333):
         self.client = QdrantClient(host=host, port=port)
         self.vector_size = 4096  # llama3.1:8b-instruct-q4_K_M
+        self.writer = QdrantBulkWriter(self.client, vector_size=self.vector_size)
     
     def ensure_collection(self, collection_name: str):
-        """Crea colección si no existe."""
+        """Crea colección si no existe (cacheado tras la primera comprobación)."""
         try:
-            collections = self.client.get_collections().collections
-            if not any(c.name == collection_name for c in collections):
-                self.client.create_collection(
-                    collection_name=collection_name,
-                    vectors_config=VectorParams(
-                        size=self.vector_size,
-                        distance=Distance.COSINE
-                    )
-                )
-                print(f"[Qdrant] Colección '{collection_name}' creada")
+            self.writer.ensure_collection(collection_name)
         except Exception as e:
             print(f"[Qdrant] Error creando colección: {e}")
     
+    def flush(self):
+        """Envía los puntos pendientes del buffer."""
+        self.writer.flush()
+    
     def store_chat_memory(
         self,
         user_message: str,
@@ -34,24 +43,24 @@ class JarvisQdrantMemory:
         embedding: List[float],
         metadata: Dict[str, Any] = None
     ):
-        """Almacena memoria conversacional."""
-        self.ensure_collection("jarvis_chat_memory")
-        
+        """
+        Almacena memoria conversacional (encolada, se envía por lotes).
+        Mismo intercambio del mismo usuario/sesión, mismo punto: el de otro usuario no lo pisa.
+        """
+        metadata = metadata or {}
+        owner = (metadata.get("user_id"), metadata.get("session_id"), metadata.get("conversation_id"))
         point = PointStruct(
-            id=str(uuid.uuid4()),
+            id=point_id_for("chat", *owner, user_message, assistant_message),
             vector=embedding,
             payload={
                 "user": user_message,
                 "assistant": assistant_message,
                 "timestamp": datetime.now().isoformat(),
-                **(metadata or {})
+                **metadata
             }
         )
         
-        self.client.upsert(
-            collection_name="jarvis_chat_memory",
-            points=[point]
-        )
+        self.writer.add("jarvis_chat_memory", [point])
     
     def store_knowledge(
         self,
@@ -59,10 +68,16 @@ class JarvisQdrantMemory:
         embedding: List[float],
         metadata: Dict[str, Any]
     ) -> str:
-        """Almacena fragmento de conocimiento (RAG)."""
-        self.ensure_collection("jarvis_knowledge_base")
-        
-        point_id = str(uuid.uuid4())
+        """
+        Almacena fragmento de conocimiento (RAG, encolado: llamar a flush() al terminar un documento).
+        Id determinista por contenido: hash del documento y posición del fragmento (o hash del
+        fragmento si no hay posición). Dos ficheros con el mismo nombre no comparten puntos; solo
+        una ingesta con replace borra los de versiones anteriores (delete_stale_knowledge).
+        """
+        if metadata.get("doc_hash") and metadata.get("chunk_id") is not None:
+            point_id = point_id_for("knowledge", metadata["doc_hash"], metadata.get("page"), metadata["chunk_id"])
+        else:
+            point_id = point_id_for("knowledge", metadata.get("chunk_hash") or text)
         point = PointStruct(
             id=point_id,
             vector=embedding,
@@ -76,13 +91,42 @@ class JarvisQdrantMemory:
             }
         )
         
-        self.client.upsert(
-            collection_name="jarvis_knowledge_base",
-            points=[point]
-        )
+        self.writer.add("jarvis_knowledge_base", [point])
         
         return point_id
     
+    def delete_stale_knowledge(self, source: str, keep_ids: List[str]) -> List[str]:
+        """
+        Borra los puntos de `source` que no están en keep_ids. Solo para reemplazos pedidos
+        explícitamente: `source` es el nombre del fichero y no identifica un documento.
+        Devuelve los ids borrados.
+        """
+        keep = set(keep_ids)
+        stale = []
+        offset = None
+        source_filter = Filter(must=[FieldCondition(key="source", match=MatchValue(value=source))])
+        try:
+            while True:
+                records, offset = self.client.scroll(
+                    collection_name="jarvis_knowledge_base",
+                    scroll_filter=source_filter,
+                    limit=1000,
+                    offset=offset,
+                    with_payload=False,
+                    with_vectors=False,
+                )
+                stale.extend(str(r.id) for r in records if str(r.id) not in keep)
+                if offset is None:
+                    break
+            if stale:
+                self.client.delete(collection_name="jarvis_knowledge_base", points_selector=PointIdsList(points=stale))
+                if self.writer.documents is not None:
+                    self.writer.documents.delete_many(stale)
+        except Exception as e:
+            print(f"[Qdrant] Error borrando fragmentos antiguos de {source}: {e}")
+            return []
+        return stale
+
     def search_knowledge(
         self,
         query_embedding: List[float],
@@ -96,16 +140,36 @@ class JarvisQdrantMemory:
             collection_name="jarvis_knowledge_base",
             query_vector=query_embedding,
             limit=limit,
-            score_threshold=score_threshold
+            score_threshold=score_threshold,
+            search_params=search_params(self.writer.quantization),
         )
         
+        payloads = hydrate_payloads(self.writer.documents, [hit.payload or {} for hit in results])
         return [
             {
-                "text": hit.payload.get("text"),
-                "source": hit.payload.get("source"),
-                "page": hit.payload.get("page"),
-                "section": hit.payload.get("section"),
+                "id": str(hit.id),
+                "text": payload.get("text") or payload.get("preview"),
+                "source": payload.get("source"),
+                "page": payload.get("page"),
+                "section": payload.get("section"),
                 "score": hit.score
             }
-            for hit in results
+            for hit, payload in zip(results, payloads)
         ]
+    
+    def get_knowledge(self, point_ids: List[str]) -> Dict[str, Dict]:
+        """Texto y metadatos de fragmentos por id (almacén local; Qdrant para puntos antiguos)."""
+        found = {}
+        if self.writer.documents is not None and point_ids:
+            for point_id, document in self.writer.documents.get_many(point_ids).items():
+                if document.get("text"):
+                    found[point_id] = {"text": document["text"]}
+        missing = [i for i in point_ids if i not in found]
+        if missing:
+            try:
+                for record in self.client.retrieve(collection_name="jarvis_knowledge_base", ids=missing, with_payload=True):
+                    payload = record.payload or {}
+                    found[str(record.id)] = {"text": payload.get("text") or payload.get("preview")}
+            except Exception as e:
+                print(f"[Qdrant] Error recuperando fragmentos: {e}")
+        return found
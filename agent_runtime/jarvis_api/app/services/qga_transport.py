@@ -0,0 +1,311 @@
+"""
+Transporte para el QEMU guest agent (QGA) usado por KaliRunner.
+
+QGASocketTransport habla el protocolo JSON de QGA directamente sobre el
+socket unix del canal virtio-serial: una conexión persistente por VM, las
+peticiones llevan "id" y se encadenan sin esperar a la anterior (un lector
+en segundo plano reparte las respuestas). VirshQGATransport es el camino
+anterior (un `virsh qemu-agent-command` por llamada) y se usa cuando el
+socket no está disponible.
+
+Nota: si el canal lo gestiona libvirt, libvirtd mantiene el socket abierto
+en exclusiva; para el transporte directo hay que exponer un canal propio
+(p.ej. <channel type='unix'><source mode='bind' path='...'/> con
+target name='org.qemu.guest_agent.1' o -chardev socket,server) y apuntar
+KALI_QGA_SOCKET a él.
+"""
+
+import asyncio
+import base64
+import itertools
+import json
+import logging
+import os
+import random
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# {vm} se sustituye por el nombre de la VM
+QGA_SOCKET_PATH = os.getenv("KALI_QGA_SOCKET", "/var/lib/libvirt/qemu/channel/deco/{vm}.qga.sock")
+# auto: socket si existe, si no virsh | socket | virsh
+QGA_TRANSPORT = os.getenv("KALI_QGA_TRANSPORT", "auto").lower()
+QGA_COMMAND_TIMEOUT = float(os.getenv("KALI_QGA_COMMAND_TIMEOUT", "30"))
+QGA_POLL_INITIAL = float(os.getenv("KALI_QGA_POLL_INITIAL", "0.05"))
+QGA_POLL_MAX = float(os.getenv("KALI_QGA_POLL_MAX", "2.0"))
+QGA_FILE_CHUNK = 1024 * 1024
+# Una respuesta de guest-file-read de QGA_FILE_CHUNK llega en una sola línea en base64
+QGA_LINE_LIMIT = 4 * QGA_FILE_CHUNK
+QGA_DELIMITER = b"\xff"
+
+
+class QGAError(Exception):
+    """El guest agent devolvió un error o no respondió."""
+
+
+class QGAConnectionError(QGAError):
+    """No se pudo hablar con el guest agent (socket caído, virsh falló)."""
+
+
+class QGATransport:
+    """Interfaz común: execute() más los comandos guest-* que usa KaliRunner."""
+
+    async def execute(self, command: str, arguments: Optional[Dict[str, Any]] = None,
+                      timeout: float = QGA_COMMAND_TIMEOUT) -> Any:
+        """Envía un comando QGA y devuelve el campo "return" de la respuesta."""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+    async def guest_exec(self, path: str, args: List[str], capture_output: bool = True) -> int:
+        result = await self.execute("guest-exec", {"path": path, "arg": args, "capture-output": capture_output})
+        return result["pid"]
+
+    async def exec_status(self, pid: int) -> Dict[str, Any]:
+        return await self.execute("guest-exec-status", {"pid": pid})
+
+    async def wait_exec(self, pid: int, timeout: float) -> Dict[str, Any]:
+        """
+        Espera a que termine el proceso con backoff exponencial
+        (QGA_POLL_INITIAL .. QGA_POLL_MAX): las herramientas cortas se
+        recogen en milisegundos y las largas no saturan el canal.
+        Lanza asyncio.TimeoutError si se supera `timeout`.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        delay = QGA_POLL_INITIAL
+        while True:
+            status = await self.exec_status(pid)
+            if status.get("exited"):
+                return status
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError(f"guest-exec pid {pid} did not finish in {timeout}s")
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, QGA_POLL_MAX)
+
+    async def run(self, path: str, args: List[str], timeout: float = QGA_COMMAND_TIMEOUT) -> Dict[str, Any]:
+        """guest-exec + espera; devuelve exitcode y salidas ya decodificadas."""
+        status = await self.wait_exec(await self.guest_exec(path, args), timeout)
+        return decode_exec_status(status)
+
+    async def file_write(self, path: str, data: bytes, mode: str = "w+"):
+        handle = await self.execute("guest-file-open", {"path": path, "mode": mode})
+        try:
+            for offset in range(0, len(data), QGA_FILE_CHUNK):
+                chunk = data[offset:offset + QGA_FILE_CHUNK]
+                await self.execute("guest-file-write", {"handle": handle, "buf-b64": base64.b64encode(chunk).decode()})
+        finally:
+            await self.execute("guest-file-close", {"handle": handle})
+
+    async def file_stream(self, path: str, offset: int = 0, chunk_size: int = QGA_FILE_CHUNK) -> AsyncIterator[bytes]:
+        """Lee el fichero en trozos de chunk_size a partir de offset (hasta el EOF actual)."""
+        handle = await self.execute("guest-file-open", {"path": path, "mode": "r"})
+        try:
+            if offset:
+                await self.execute("guest-file-seek", {"handle": handle, "offset": offset, "whence": "set"})
+            while True:
+                result = await self.execute("guest-file-read", {"handle": handle, "count": chunk_size})
+                if result.get("count"):
+                    yield base64.b64decode(result["buf-b64"])
+                if result.get("eof") or not result.get("count"):
+                    break
+        finally:
+            await self.execute("guest-file-close", {"handle": handle})
+
+    async def file_read(self, path: str) -> bytes:
+        return b"".join([chunk async for chunk in self.file_stream(path)])
+
+
+def decode_exec_status(status: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "exitcode": status.get("exitcode", -1),
+        "stdout": base64.b64decode(status.get("out-data", "")).decode(errors="replace"),
+        "stderr": base64.b64decode(status.get("err-data", "")).decode(errors="replace"),
+    }
+
+
+def _unwrap(command: str, response: Dict[str, Any]) -> Any:
+    if "error" in response:
+        error = response["error"]
+        raise QGAError(f"{command}: {error.get('class', 'GenericError')}: {error.get('desc', '')}")
+    return response.get("return")
+
+
+class QGASocketTransport(QGATransport):
+    """Conexión persistente al socket del guest agent con peticiones encadenadas."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._pending: "OrderedDict[int, asyncio.Future]" = OrderedDict()
+        self._ids = itertools.count(1)
+        self._connect_lock = asyncio.Lock()
+
+    @property
+    def connected(self) -> bool:
+        return self._listener is not None and not self._listener.done()
+
+    async def _connect(self):
+        async with self._connect_lock:
+            if self.connected:
+                return
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_unix_connection(self.path, limit=QGA_LINE_LIMIT), timeout=QGA_COMMAND_TIMEOUT
+                )
+                await asyncio.wait_for(self._sync(reader, writer), timeout=QGA_COMMAND_TIMEOUT)
+            except (OSError, asyncio.TimeoutError, ValueError) as e:
+                raise QGAConnectionError(f"Cannot connect to guest agent at {self.path}: {e}")
+            self._reader, self._writer = reader, writer
+            self._listener = asyncio.create_task(self._listen(reader))
+            logger.info(f"[QGA] Connected to {self.path}")
+
+    async def _sync(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        guest-sync-delimited: descarta respuestas a medias de un cliente
+        anterior. El agente antepone 0xFF a la respuesta; todo lo previo se tira.
+        """
+        token = random.randint(1, 2 ** 31)
+        writer.write(QGA_DELIMITER + json.dumps(
+            {"execute": "guest-sync-delimited", "arguments": {"id": token}}
+        ).encode() + b"\n")
+        await writer.drain()
+        await reader.readuntil(QGA_DELIMITER)
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise ValueError("guest agent closed the connection during sync")
+            try:
+                if json.loads(line.lstrip(QGA_DELIMITER)).get("return") == token:
+                    return
+            except ValueError:
+                continue
+
+    async def _listen(self, reader: asyncio.StreamReader):
+        error: Exception = QGAConnectionError(f"Guest agent connection closed ({self.path})")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.strip().lstrip(QGA_DELIMITER)
+                if not line:
+                    continue
+                try:
+                    response = json.loads(line)
+                except ValueError:
+                    logger.warning(f"[QGA] Discarding malformed response: {line[:200]!r}")
+                    continue
+                if "id" in response:
+                    future = self._pending.pop(response["id"], None)
+                elif self._pending:
+                    # Agentes que no devuelven "id": responden en orden
+                    future = self._pending.popitem(last=False)[1]
+                else:
+                    future = None
+                if future is not None and not future.done():
+                    future.set_result(response)
+        except Exception as e:
+            error = QGAConnectionError(f"Guest agent connection failed ({self.path}): {e}")
+        finally:
+            pending, self._pending = self._pending, OrderedDict()
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            if self._writer is not None:
+                self._writer.close()
+
+    async def execute(self, command: str, arguments: Optional[Dict[str, Any]] = None,
+                      timeout: float = QGA_COMMAND_TIMEOUT) -> Any:
+        if not self.connected:
+            await self._connect()
+        request_id = next(self._ids)
+        request = {"execute": command, "id": request_id}
+        if arguments:
+            request["arguments"] = arguments
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            self._writer.write(json.dumps(request).encode() + b"\n")
+            await self._writer.drain()
+            response = await asyncio.wait_for(future, timeout=timeout)
+        except asyncio.TimeoutError:
+            raise QGAError(f"{command}: no response from guest agent in {timeout}s")
+        except OSError as e:
+            raise QGAConnectionError(f"{command}: {e}")
+        finally:
+            self._pending.pop(request_id, None)
+            if not future.done():
+                future.cancel()
+            elif not future.cancelled():
+                future.exception()  # ya fallada por el lector: no dejarla sin recoger
+        return _unwrap(command, response)
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class VirshQGATransport(QGATransport):
+    """Camino de respaldo: un proceso `virsh qemu-agent-command` por comando."""
+
+    def __init__(self, vm_name: str, uri: str = "qemu:///system"):
+        self.vm_name = vm_name
+        self.uri = uri
+
+    async def execute(self, command: str, arguments: Optional[Dict[str, Any]] = None,
+                      timeout: float = QGA_COMMAND_TIMEOUT) -> Any:
+        request = {"execute": command}
+        if arguments:
+            request["arguments"] = arguments
+        proc = await asyncio.create_subprocess_exec(
+            "virsh", "-c", self.uri, "qemu-agent-command", self.vm_name, json.dumps(request),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            raise QGAError(f"{command}: virsh did not answer in {timeout}s")
+        if proc.returncode != 0:
+            raise QGAConnectionError(f"{command}: {stderr.decode(errors='replace').strip()}")
+        try:
+            response = json.loads(stdout.decode())
+        except ValueError:
+            raise QGAError(f"{command}: unparseable qemu-agent output: {stdout.decode(errors='replace')[:200]}")
+        return _unwrap(command, response)
+
+
+_transports: Dict[str, QGATransport] = {}
+
+
+def get_qga_transport(vm_name: str) -> QGATransport:
+    """Transporte compartido por VM (una sola conexión por guest agent)."""
+    transport = _transports.get(vm_name)
+    if transport is None:
+        socket_path = QGA_SOCKET_PATH.format(vm=vm_name)
+        if QGA_TRANSPORT == "socket" or (QGA_TRANSPORT == "auto" and os.path.exists(socket_path)):
+            transport = QGASocketTransport(socket_path)
+        else:
+            transport = VirshQGATransport(vm_name)
+        logger.info(f"[QGA] {vm_name}: using {type(transport).__name__}")
+        _transports[vm_name] = transport
+    return transport
+
+
+async def close_qga_transports():
+    transports = list(_transports.values())
+    _transports.clear()
+    await asyncio.gather(*(t.close() for t in transports), return_exceptions=True)
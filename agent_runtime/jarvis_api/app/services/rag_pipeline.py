@@ -1,15 +1,33 @@
 import PyPDF2
 import docx
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from pathlib import Path
 import hashlib
+import os
+
+from app.services.embedding_service import EmbeddingService
+from app.services.lexical_index import BM25Index, exact_terms, get_lexical_index, rrf_fuse
+from app.services.semantic_cache import SemanticCache, get_semantic_cache, invalidate_knowledge
+
+RAG_CACHE_TTL = float(os.getenv("RAG_CACHE_TTL", "3600"))
 
 class JarvisRAGPipeline:
     """Pipeline RAG para ingesta y procesamiento de documentos."""
     
-    def __init__(self, ollama_client, qdrant_memory):
+    def __init__(
+        self,
+        ollama_client,
+        qdrant_memory,
+        embedder: EmbeddingService = None,
+        lexical: BM25Index = None,
+        answer_cache: SemanticCache = None,
+    ):
         self.ollama = ollama_client
         self.qdrant = qdrant_memory
+        self.embedder = embedder or EmbeddingService(ollama_client)
+        # Índice BM25 local (None si no se puede abrir: solo búsqueda vectorial)
+        self.lexical = lexical if lexical is not None else get_lexical_index()
+        self.answer_cache = answer_cache or get_semantic_cache("rag", ttl=RAG_CACHE_TTL)
     
     def extract_text_from_pdf(self, file_path: str) -> List[Dict[str, Any]]:
         """Extrae texto de PDF con metadatos de página."""
@@ -69,8 +87,12 @@ class JarvisRAGPipeline:
         
         return chunks
     
-    def ingest_document(self, file_path: str) -> Dict[str, Any]:
-        """Ingesta documento completo."""
+    def ingest_document(self, file_path: str, replace: bool = False) -> Dict[str, Any]:
+        """
+        Ingesta documento completo.
+        Dos ficheros con el mismo nombre conviven; con replace=True el documento
+        sustituye a los anteriores de esa fuente (se borran sus fragmentos).
+        """
         file_ext = Path(file_path).suffix.lower()
         
         # Extracción
@@ -83,57 +105,138 @@ class JarvisRAGPipeline:
         else:
             return {"error": f"Formato no soportado: {file_ext}"}
         
-        # Chunking y embedding
-        stored_ids = []
+        # Hash del fichero: identifica esta versión del documento en los ids de sus puntos
+        doc_hash = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                doc_hash.update(block)
+        doc_hash = doc_hash.hexdigest()
+
+        # Chunking
+        pending = []
         for raw_chunk in raw_chunks:
-            sub_chunks = self.chunk_text(raw_chunk["text"])
+            for idx, chunk_text in enumerate(self.chunk_text(raw_chunk["text"])):
+                pending.append((raw_chunk, idx, chunk_text))
+
+        # Embeddings en lote (cache por chunk_hash + llamadas en paralelo)
+        embeddings = self.embedder.embed_many_sync([chunk_text for _, _, chunk_text in pending])
+
+        stored_ids = []
+        indexed = []
+        for (raw_chunk, idx, chunk_text), embedding in zip(pending, embeddings):
+            if not embedding:
+                continue
+            
+            # Almacenar en Qdrant
+            metadata = {
+                "source": raw_chunk["source"],
+                "page": raw_chunk.get("page"),
+                "chunk_id": idx,
+                "doc_hash": doc_hash,
+                "chunk_hash": hashlib.md5(chunk_text.encode()).hexdigest()
+            }
             
-            for idx, chunk_text in enumerate(sub_chunks):
-                # Generar embedding
-                embedding = self.ollama.generate_embedding(chunk_text)
-                if not embedding:
-                    continue
-                
-                # Almacenar en Qdrant
-                metadata = {
-                    "source": raw_chunk["source"],
-                    "page": raw_chunk.get("page"),
-                    "chunk_id": idx,
-                    "chunk_hash": hashlib.md5(chunk_text.encode()).hexdigest()
-                }
-                
-                point_id = self.qdrant.store_knowledge(
-                    text=chunk_text,
-                    embedding=embedding,
-                    metadata=metadata
-                )
-                stored_ids.append(point_id)
+            point_id = self.qdrant.store_knowledge(
+                text=chunk_text,
+                embedding=embedding,
+                metadata=metadata
+            )
+            stored_ids.append(point_id)
+            indexed.append((point_id, chunk_text, metadata))
+        
+        # Enviar los lotes pendientes del documento
+        self.qdrant.flush()
+        # Reemplazo explícito: fuera los fragmentos de las versiones anteriores
+        stale_ids = []
+        if replace and stored_ids:
+            for source in dict.fromkeys(metadata["source"] for _, _, metadata in indexed):
+                stale_ids.extend(self.qdrant.delete_stale_knowledge(source, stored_ids))
+        if self.lexical is not None:
+            try:
+                if stale_ids:
+                    self.lexical.delete_many(stale_ids)
+                self.lexical.add_many(indexed)
+            except Exception as e:
+                print(f"[RAG] Error actualizando índice léxico: {e}")
+        if stored_ids or stale_ids:
+            # Las respuestas cacheadas pueden haber quedado incompletas
+            invalidate_knowledge()
         
         return {
             "status": "success",
             "document": Path(file_path).name,
             "chunks_stored": len(stored_ids),
+            "chunks_replaced": len(stale_ids),
             "ids": stored_ids[:5]  # Solo primeros 5 IDs
         }
     
-    def query_knowledge(self, question: str, top_k: int = 5) -> Dict[str, Any]:
-        """Consulta base de conocimiento con síntesis."""
-        # Generar embedding de pregunta
-        query_embedding = self.ollama.generate_embedding(question)
+    def retrieve(self, question: str, top_k: int = 5, query_embedding: List[float] = None) -> Tuple[List[Dict[str, Any]], str]:
+        """
+        Recuperación híbrida: BM25 local + Qdrant, fusionados por rango.
+        Si la pregunta contiene identificadores exactos (CVE, IP, hash...) y el
+        índice léxico los encuentra, no se calcula embedding.
+        Devuelve (resultados, modo: lexical | hybrid | vector).
+        """
+        lexical_hits = []
+        if self.lexical is not None:
+            exact = exact_terms(question)
+            try:
+                lexical_hits = self.lexical.search(question, limit=top_k * 2, required=exact)
+            except Exception as e:
+                print(f"[RAG] Error en índice léxico: {e}")
+            if exact and lexical_hits:
+                return self._with_text(lexical_hits[:top_k]), "lexical"
+
+        query_embedding = query_embedding or self.embedder.embed_sync(question)
         if not query_embedding:
-            return {"error": "No se pudo generar embedding de pregunta"}
-        
-        # Buscar contexto relevante
-        results = self.qdrant.search_knowledge(
+            if not lexical_hits:
+                raise ValueError("No se pudo generar embedding de pregunta")
+            return self._with_text(lexical_hits[:top_k]), "lexical"
+
+        vector_hits = self.qdrant.search_knowledge(
             query_embedding=query_embedding,
-            limit=top_k,
+            limit=top_k * 2 if lexical_hits else top_k,
             score_threshold=0.6
         )
+        if not lexical_hits:
+            return vector_hits, "vector"
+        return self._with_text(rrf_fuse([vector_hits, lexical_hits], limit=top_k)), "hybrid"
+
+    def _with_text(self, hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Completa el texto de los resultados léxicos (el índice solo guarda ids)."""
+        missing = [h["id"] for h in hits if not h.get("text")]
+        if missing:
+            texts = self.qdrant.get_knowledge(missing)
+            hits = [{**h, **texts.get(h["id"], {})} if not h.get("text") else h for h in hits]
+        return [h for h in hits if h.get("text")]
+    
+    def query_knowledge(self, question: str, top_k: int = 5, tenant: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Consulta base de conocimiento con síntesis (respuestas recientes desde la cache semántica).
+        Sin tenant no se usa la cache: las respuestas nunca se comparten entre usuarios sin ámbito.
+        """
+        scope = f"{tenant}|{top_k}" if tenant else None
+        question_embedding = None
+        if scope:
+            cached = self.answer_cache.lookup_exact(scope, question)
+            if cached is None:
+                # Con identificadores exactos la recuperación es léxica: no calcular embedding solo para la cache
+                if not exact_terms(question):
+                    question_embedding = self.embedder.embed_sync(question)
+                cached = self.answer_cache.lookup_similar(scope, question, question_embedding)
+            if cached is not None:
+                return {**cached, "cached": True}
+        
+        try:
+            results, retrieval = self.retrieve(question, top_k=top_k, query_embedding=question_embedding)
+        except ValueError as e:
+            return {"error": str(e)}
         
         if not results:
             return {
                 "answer": "No encontré información relevante en mi base de conocimiento.",
-                "sources": []
+                "sources": [],
+                "retrieval": retrieval
             }
         
         # Construir contexto
@@ -157,10 +260,14 @@ class JarvisRAGPipeline:
         llm_response = self.ollama.chat(messages=messages)
         answer = llm_response.get("message", {}).get("content", "Error generando respuesta")
         
-        return {
+        result = {
             "answer": answer,
             "sources": [
-                {"source": r["source"], "page": r.get("page"), "score": round(r["score"], 3)}
+                {"source": r.get("source"), "page": r.get("page"), "score": round(r["score"], 3)}
                 for r in results
-            ]
+            ],
+            "retrieval": retrieval
         }
+        if scope and "message" in llm_response and not llm_response.get("error"):
+            self.answer_cache.store(scope, question, result, question_embedding)
+        return result
@@ -0,0 +1,167 @@
+"""
+Informes de IA en map-reduce para ejecuciones y planes de KaliRunner.
+
+En vez de un único prompt con la salida cruda concatenada (que se cortaba a
+8000 caracteres o desbordaba el contexto del modelo):
+  map     la salida de cada herramienta se trocea a REPORT_CHUNK_TOKENS y se
+          resume cada trozo (hechos verificables: hosts, puertos, servicios...)
+  reduce  los resúmenes se fusionan por grupos que quepan en el presupuesto
+          hasta quedar uno por herramienta; el informe final se sintetiza a
+          partir de los resúmenes por herramienta.
+Ningún prompt supera REPORT_CONTEXT_TOKENS.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, List, Tuple
+
+from app.services.conversation_memory import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Presupuesto total del prompt (contexto del modelo menos margen para la respuesta)
+REPORT_CONTEXT_TOKENS = int(os.getenv("KALI_REPORT_CONTEXT_TOKENS", "6000"))
+# Datos por prompt: deja sitio a la plantilla del informe ejecutivo (~1500 tokens)
+REPORT_CHUNK_TOKENS = int(os.getenv("KALI_REPORT_CHUNK_TOKENS", "3000"))
+REPORT_MAP_CONCURRENCY = int(os.getenv("KALI_REPORT_MAP_CONCURRENCY", "2"))
+
+Complete = Callable[[str], Awaitable[str]]
+
+MAP_PROMPT = """Eres un analista de ciberseguridad. Este es el fragmento {part}/{total} de la salida de la herramienta "{tool}" sobre el objetivo {target}.
+
+Extrae SOLO hechos verificables: hosts, puertos abiertos, servicios y versiones, sistemas operativos, vulnerabilidades o CVE, configuraciones inseguras y errores relevantes de la herramienta.
+Responde en español con viñetas breves. No añadas recomendaciones ni inventes datos.
+
+```
+{chunk}
+```"""
+
+COMBINE_PROMPT = """Fusiona estos resúmenes parciales de {subject} en uno solo.
+Elimina duplicados pero conserva todos los hosts, puertos, servicios, versiones y hallazgos. Viñetas breves en español, sin inventar datos.
+
+{summaries}"""
+
+PLAN_REPORT_PROMPT = """Actúa como un consultor senior de ciberseguridad especializado en informes para directivos no técnicos.
+
+Se ha ejecutado el servicio "{title}" sobre {target}. Estos son los resúmenes técnicos de cada etapa:
+
+{summaries}
+
+Genera un INFORME EJECUTIVO en español, claro y profesional, con esta estructura:
+
+# {title}
+
+**Objetivo Analizado:** {target}
+**Realizado por:** Jarvis Security Platform
+
+## 1. Resumen Ejecutivo
+[8-10 líneas en lenguaje de negocio, hallazgos clave y recomendaciones principales]
+
+## 2. Etapas Ejecutadas
+[Una línea por etapa con lo que aportó]
+
+## 3. Hallazgos y Riesgos Principales
+[3-5 riesgos con descripción e impacto de negocio]
+
+## 4. Recomendaciones Prioritarias
+| Prioridad | Acción | Plazo | Beneficio |
+|-----------|--------|-------|-----------|
+
+## 5. Conclusiones
+
+**IMPORTANTE:** Usa SOLO la información de los resúmenes. Si falta algún dato, indica "No disponible". Tono profesional sin alarmismo."""
+
+
+def split_for_budget(text: str, max_tokens: int) -> List[str]:
+    """Trocea por líneas en bloques de como mucho max_tokens (líneas enormes se cortan)."""
+    max_chars = max_tokens * 4
+    chunks, current, size = [], [], 0
+    for line in text.splitlines(keepends=True):
+        while len(line) > max_chars:
+            if current:
+                chunks.append("".join(current))
+                current, size = [], 0
+            chunks.append(line[:max_chars])
+            line = line[max_chars:]
+        if size + len(line) > max_chars and current:
+            chunks.append("".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line)
+    if current:
+        chunks.append("".join(current))
+    return [c for c in chunks if c.strip()]
+
+
+def fit_to_budget(text: str, max_tokens: int) -> str:
+    """Recorte sin LLM (principio y final) para cuando no se puede resumir."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    half = max_tokens * 2
+    return f"{text[:half]}\n[... {len(text) - 2 * half} caracteres omitidos ...]\n{text[-half:]}"
+
+
+async def reduce_summaries(complete: Complete, summaries: List[str], subject: str,
+                           budget: int = REPORT_CHUNK_TOKENS) -> str:
+    """Fusiona resúmenes por grupos que quepan en `budget` hasta que quede uno."""
+    summaries = [s.strip() for s in summaries if s and s.strip()]
+    while len(summaries) > 1:
+        # Cada resumen cabe en medio presupuesto: cada grupo fusiona al menos dos
+        summaries = [fit_to_budget(s, budget // 2) for s in summaries]
+        groups, current, size = [], [], 0
+        for summary in summaries:
+            tokens = estimate_tokens(summary)
+            if current and size + tokens > budget:
+                groups.append(current)
+                current, size = [], 0
+            current.append(summary)
+            size += tokens
+        groups.append(current)
+        summaries = list(await asyncio.gather(*(
+            complete(COMBINE_PROMPT.format(subject=subject, summaries="\n\n---\n\n".join(group)))
+            if len(group) > 1 else _same(group[0])
+            for group in groups
+        )))
+    return summaries[0] if summaries else ""
+
+
+async def _same(text: str) -> str:
+    return text
+
+
+async def summarize_output(complete: Complete, tool: str, target: str, text: str,
+                           chunk_tokens: int = REPORT_CHUNK_TOKENS) -> Tuple[str, int]:
+    """
+    Resumen por herramienta (map + reduce). Devuelve (resumen, nº de trozos).
+    """
+    chunks = split_for_budget(text, chunk_tokens)
+    if not chunks:
+        return "Sin salida de la herramienta.", 0
+
+    semaphore = asyncio.Semaphore(REPORT_MAP_CONCURRENCY)
+
+    async def map_chunk(part: int, chunk: str) -> str:
+        async with semaphore:
+            return await complete(MAP_PROMPT.format(part=part, total=len(chunks), tool=tool, target=target, chunk=chunk))
+
+    partials = await asyncio.gather(*(map_chunk(i + 1, chunk) for i, chunk in enumerate(chunks)))
+    summary = await reduce_summaries(complete, list(partials), f'la herramienta "{tool}" sobre {target}', chunk_tokens)
+    return summary, len(chunks)
+
+
+async def synthesize_plan_report(complete: Complete, title: str, target: str,
+                                 step_summaries: List[Tuple[str, str]],
+                                 context_tokens: int = REPORT_CONTEXT_TOKENS) -> str:
+    """Reduce final: informe ejecutivo a partir de los resúmenes por herramienta."""
+    overhead = estimate_tokens(PLAN_REPORT_PROMPT.format(title=title, target=target, summaries=""))
+    budget = max(500, context_tokens - overhead)
+    sections = [f"### {name}\n{summary.strip()}" for name, summary in step_summaries]
+    block = "\n\n".join(sections)
+    if estimate_tokens(block) > budget:
+        logger.info(f"[Report] Plan summaries exceed {budget} tokens, merging before synthesis")
+        block = fit_to_budget(
+            await reduce_summaries(complete, sections, f'las etapas del servicio "{title}"', budget),
+            budget,
+        )
+    return await complete(PLAN_REPORT_PROMPT.format(title=title, target=target, summaries=block))
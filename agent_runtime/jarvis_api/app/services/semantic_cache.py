@@ -0,0 +1,227 @@
+"""
+Cache semántica de respuestas (consola Jarvis y RAG).
+
+Las preguntas repetidas ("riesgo global", "alertas críticas", "qué es CVE-X")
+se responden desde aquí en vez de pasar otra vez por intención, recuperación y
+generación con llama3.1:
+- primero coincidencia exacta del texto normalizado (sin embedding),
+- después similitud coseno del embedding contra las respuestas recientes del
+  mismo tenant (umbral SEMANTIC_CACHE_THRESHOLD),
+- las preguntas con identificadores exactos (CVE, IP, hash...) solo casan con
+  entradas que tengan los mismos identificadores,
+- TTL por cache e invalidación completa cuando cambia la base de conocimiento.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.lexical_index import exact_terms
+
+logger = logging.getLogger(__name__)
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "500"))
+
+_SPACES_RE = re.compile(r"\s+")
+_PUNCT_RE = re.compile(r"[¿?¡!.,;:\"'()\[\]]")
+
+
+def normalize_question(text: str) -> str:
+    """Minúsculas, sin tildes, sin puntuación y con espacios colapsados."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = _PUNCT_RE.sub(" ", text)
+    return _SPACES_RE.sub(" ", text).strip()
+
+
+@dataclass
+class _Entry:
+    normalized: str
+    identifiers: Tuple[str, ...]
+    answer: Any
+    created_at: float
+    vector: Optional[np.ndarray] = None
+
+
+@dataclass
+class _TenantCache:
+    entries: List[_Entry] = field(default_factory=list)
+    by_text: Dict[str, _Entry] = field(default_factory=dict)
+    matrix: Optional[np.ndarray] = None
+    with_vector: List[_Entry] = field(default_factory=list)
+
+
+class SemanticCache:
+    """Respuestas recientes por tenant, con búsqueda exacta y por embedding."""
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.threshold = threshold
+        self.max_entries = max(1, max_entries)
+        self._tenants: Dict[str, _TenantCache] = {}
+        self._lock = threading.Lock()
+        self.counters = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "stores": 0, "invalidations": 0}
+
+    # ------------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------------
+
+    def lookup_exact(self, tenant: str, question: str) -> Optional[Any]:
+        """Solo coincidencia exacta normalizada (no necesita embedding)."""
+        if not SEMANTIC_CACHE_ENABLED:
+            return None
+        normalized = normalize_question(question)
+        with self._lock:
+            cache = self._tenants.get(tenant)
+            if cache is None:
+                return None
+            self._expire(cache)
+            entry = cache.by_text.get(normalized)
+            if entry is not None:
+                self.counters["exact_hits"] += 1
+                return entry.answer
+        return None
+
+    def lookup_similar(self, tenant: str, question: str, embedding: Optional[List[float]]) -> Optional[Any]:
+        """Mejor entrada por coseno >= threshold (cuenta como fallo si no hay)."""
+        if not SEMANTIC_CACHE_ENABLED:
+            return None
+        if not embedding:
+            self.counters["misses"] += 1
+            return None
+        query = _unit(embedding)
+        identifiers = tuple(sorted(exact_terms(question)))
+        with self._lock:
+            cache = self._tenants.get(tenant)
+            if cache is not None:
+                self._expire(cache)
+                if cache.matrix is None and cache.with_vector:
+                    cache.matrix = np.vstack([e.vector for e in cache.with_vector])
+                if cache.matrix is not None and cache.matrix.shape[1] == query.shape[0]:
+                    scores = cache.matrix @ query
+                    for index in np.argsort(scores)[::-1]:
+                        if scores[index] < self.threshold:
+                            break
+                        entry = cache.with_vector[index]
+                        if entry.identifiers == identifiers:
+                            self.counters["semantic_hits"] += 1
+                            return entry.answer
+            self.counters["misses"] += 1
+        return None
+
+    # ------------------------------------------------------------------
+    # Escritura / invalidación
+    # ------------------------------------------------------------------
+
+    def store(self, tenant: str, question: str, answer: Any, embedding: Optional[List[float]] = None):
+        if not SEMANTIC_CACHE_ENABLED:
+            return
+        entry = _Entry(
+            normalized=normalize_question(question),
+            identifiers=tuple(sorted(exact_terms(question))),
+            answer=answer,
+            created_at=time.time(),
+            vector=_unit(embedding) if embedding else None,
+        )
+        with self._lock:
+            cache = self._tenants.setdefault(tenant, _TenantCache())
+            previous = cache.by_text.pop(entry.normalized, None)
+            if previous is not None:
+                cache.entries.remove(previous)
+            cache.entries.append(entry)
+            cache.by_text[entry.normalized] = entry
+            if len(cache.entries) > self.max_entries:
+                for old in cache.entries[: len(cache.entries) - self.max_entries]:
+                    cache.by_text.pop(old.normalized, None)
+                cache.entries = cache.entries[-self.max_entries:]
+            self._reindex(cache)
+            self.counters["stores"] += 1
+
+    def invalidate(self, tenant: Optional[str] = None):
+        """Vacía un tenant o toda la cache."""
+        with self._lock:
+            if tenant is None:
+                self._tenants.clear()
+            else:
+                self._tenants.pop(tenant, None)
+            self.counters["invalidations"] += 1
+
+    def _expire(self, cache: _TenantCache):
+        cutoff = time.time() - self.ttl
+        if not cache.entries or cache.entries[0].created_at >= cutoff:
+            return
+        alive = [e for e in cache.entries if e.created_at >= cutoff]
+        for old in cache.entries:
+            if old.created_at < cutoff and cache.by_text.get(old.normalized) is old:
+                del cache.by_text[old.normalized]
+        cache.entries = alive
+        self._reindex(cache)
+
+    @staticmethod
+    def _reindex(cache: _TenantCache):
+        cache.with_vector = [e for e in cache.entries if e.vector is not None]
+        cache.matrix = None
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.counters["exact_hits"] + self.counters["semantic_hits"]
+        lookups = hits + self.counters["misses"]
+        with self._lock:
+            entries = sum(len(c.entries) for c in self._tenants.values())
+        return {
+            **self.counters,
+            "entries": entries,
+            "tenants": len(self._tenants),
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "ttl_seconds": self.ttl,
+            "threshold": self.threshold,
+        }
+
+
+def _unit(vector: List[float]) -> np.ndarray:
+    data = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(data))
+    return data / norm if norm else data
+
+
+_caches: Dict[str, SemanticCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_semantic_cache(name: str, ttl: float) -> SemanticCache:
+    """Cache compartida del proceso por nombre."""
+    with _caches_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            cache = _caches[name] = SemanticCache(name, ttl=ttl)
+        return cache
+
+
+def invalidate_knowledge():
+    """La base de conocimiento cambió: ninguna respuesta cacheada sigue siendo fiable."""
+    with _caches_lock:
+        caches = list(_caches.values())
+    for cache in caches:
+        cache.invalidate()
+    if caches:
+        logger.info(f"[SemanticCache] Invalidadas {len(caches)} caches por cambio en la base de conocimiento")
+
+
+def semantic_cache_stats() -> Dict[str, Dict[str, Any]]:
+    with _caches_lock:
+        return {name: cache.stats() for name, cache in _caches.items()}
@@ -0,0 +1,75 @@
+"""
+Base común de los almacenes SQLite locales (caches, índices y registros).
+
+Cada almacén abre una única conexión compartida entre hilos, serializada con
+self._lock, en autocommit y modo WAL; _transaction() agrupa varias escrituras.
+Estos almacenes son opcionales: open_store() y shared_store() devuelven None
+(y lo registran) si el fichero no se puede abrir, y el llamador sigue sin él.
+"""
+
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SQLiteStore:
+    """Conexión SQLite segura entre hilos; las subclases declaran SCHEMA."""
+
+    # Sentencias CREATE ... IF NOT EXISTS que se ejecutan al abrir
+    SCHEMA: Sequence[str] = ()
+    # "NORMAL" para caches que pueden perder la última transacción tras un corte
+    SYNCHRONOUS: Optional[str] = None
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        if self.SYNCHRONOUS:
+            self._conn.execute(f"PRAGMA synchronous={self.SYNCHRONOUS}")
+        for statement in self.SCHEMA:
+            self._conn.execute(statement)
+
+    @contextmanager
+    def _transaction(self):
+        """BEGIN/COMMIT (ROLLBACK si falla). El llamador ya tiene self._lock."""
+        self._conn.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+
+def open_store(factory: Callable[[], T], unavailable: str) -> Optional[T]:
+    """factory() o None si no se puede abrir; unavailable encabeza el log del error."""
+    try:
+        return factory()
+    except Exception as e:
+        logger.error(f"{unavailable}: {e}")
+        return None
+
+
+_shared: Dict[Tuple[Callable[..., Any], str], Any] = {}
+_shared_lock = threading.Lock()
+
+
+def shared_store(factory: Callable[[str], T], path: str, unavailable: str) -> Optional[T]:
+    """Una instancia por proceso para (factory, path); si falla se reintenta en la próxima llamada."""
+    with _shared_lock:
+        store = _shared.get((factory, path))
+        if store is None:
+            store = open_store(lambda: factory(path), unavailable)
+            if store is not None:
+                _shared[(factory, path)] = store
+        return store
@@ -0,0 +1,268 @@
+"""
+Conexiones SSH reutilizables y cola de ejecución por nodo para KaliRunner.
+
+SSHConnectionPool: un master OpenSSH (ControlMaster) por nodo, arrancado
+explícitamente en segundo plano (-M -N -f, stdio a /dev/null) para que no
+herede los pipes de ningún comando. Los ssh/scp posteriores se enganchan a
+su ControlPath y se ahorran el handshake y la autenticación; si el master
+no existe o murió, ssh conecta directamente como antes.
+
+NodeExecutionPool: limita cuántas ejecuciones corren a la vez en cada nodo
+(KALI_NODE_CONCURRENCY) y reparte los huecos por turnos entre clientes
+(tenants), de modo que uno que encola muchas ejecuciones no deja sin turno
+a los demás. Expone profundidad de cola y tiempos de espera.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SSH_BINARY = os.getenv("KALI_SSH_BINARY", "ssh")
+SCP_BINARY = os.getenv("KALI_SCP_BINARY", "scp")
+SSH_MULTIPLEX = os.getenv("KALI_SSH_MULTIPLEX", "true").lower() == "true"
+# ControlPath tiene que caber en un sun_path (108 bytes): directorio corto + hash
+SSH_CONTROL_DIR = os.getenv("KALI_SSH_CONTROL_DIR", "/tmp/deco-ssh")
+SSH_CONTROL_PERSIST = int(os.getenv("KALI_SSH_CONTROL_PERSIST", "600"))
+SSH_CONNECT_TIMEOUT = int(os.getenv("KALI_SSH_CONNECT_TIMEOUT", "15"))
+NODE_CONCURRENCY_DEFAULT = int(os.getenv("KALI_NODE_CONCURRENCY_DEFAULT", "2"))
+WAIT_SAMPLES = 500
+
+
+def _parse_concurrency(spec: str) -> Dict[str, int]:
+    """"kali-2025=4,10.0.0.5=1" -> {"kali-2025": 4, "10.0.0.5": 1}"""
+    limits = {}
+    for part in spec.split(","):
+        if "=" in part:
+            node, value = part.split("=", 1)
+            try:
+                limits[node.strip()] = max(1, int(value))
+            except ValueError:
+                logger.warning(f"Invalid KALI_NODE_CONCURRENCY entry: {part}")
+    return limits
+
+
+NODE_CONCURRENCY = _parse_concurrency(os.getenv("KALI_NODE_CONCURRENCY", ""))
+
+
+class SSHConnectionPool:
+    """Masters ControlMaster por user@host y construcción de comandos ssh/scp."""
+
+    def __init__(self, control_dir: str = SSH_CONTROL_DIR, persist: int = SSH_CONTROL_PERSIST,
+                 multiplex: bool = SSH_MULTIPLEX):
+        self.control_dir = control_dir
+        self.persist = persist
+        self.multiplex = multiplex
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._masters: Dict[str, Dict[str, Any]] = {}
+
+    def control_path(self, host: str, user: str) -> str:
+        digest = hashlib.sha1(f"{user}@{host}".encode()).hexdigest()[:16]
+        return os.path.join(self.control_dir, f"{digest}.sock")
+
+    def _mux_options(self, host: str, user: str) -> List[str]:
+        if not self.multiplex:
+            return []
+        # ControlMaster=no: los clientes nunca se convierten en master (lo gestiona ensure_master)
+        return ["-o", f"ControlPath={self.control_path(host, user)}", "-o", "ControlMaster=no"]
+
+    def ssh_command(self, host: str, user: str, remote_cmd: str, prefix: List[str] = None,
+                    options: List[str] = None) -> List[str]:
+        """prefix: p.ej. ["sshpass", "-p", ...]; options: -o/-i propios del nodo."""
+        return (prefix or []) + [SSH_BINARY] + (options or []) + self._mux_options(host, user) + [
+            f"{user}@{host}", remote_cmd
+        ]
+
+    def scp_command(self, host: str, user: str, source: str, dest: str, prefix: List[str] = None,
+                    options: List[str] = None, recursive: bool = False) -> List[str]:
+        return (prefix or []) + [SCP_BINARY] + (["-r"] if recursive else []) + (options or []) + \
+            self._mux_options(host, user) + [source, dest]
+
+    async def _run(self, cmd: List[str], timeout: float) -> int:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        try:
+            return await asyncio.wait_for(proc.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            return -1
+
+    async def _master_alive(self, host: str, user: str) -> bool:
+        path = self.control_path(host, user)
+        if not os.path.exists(path):
+            return False
+        cmd = [SSH_BINARY, "-o", f"ControlPath={path}", "-O", "check", f"{user}@{host}"]
+        return await self._run(cmd, SSH_CONNECT_TIMEOUT) == 0
+
+    async def ensure_master(self, host: str, user: str, prefix: List[str] = None,
+                            options: List[str] = None) -> bool:
+        """
+        Arranca (si hace falta) el master del nodo. Devuelve False si no se
+        pudo: los comandos siguen funcionando con conexión directa.
+        """
+        if not self.multiplex:
+            return False
+        key = f"{user}@{host}"
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            master = self._masters.get(key)
+            if master and await self._master_alive(host, user):
+                master["reuses"] += 1
+                return True
+
+            os.makedirs(self.control_dir, mode=0o700, exist_ok=True)
+            path = self.control_path(host, user)
+            if os.path.exists(path) and not await self._master_alive(host, user):
+                os.remove(path)  # socket huérfano de un master muerto
+            elif os.path.exists(path):
+                # Master de un proceso anterior que sigue vivo
+                self._masters[key] = {"control_path": path, "opened_at": time.time(), "reuses": 1}
+                return True
+
+            cmd = (prefix or []) + [SSH_BINARY] + (options or []) + [
+                "-o", f"ControlPath={path}",
+                "-o", "ControlMaster=yes",
+                "-o", f"ControlPersist={self.persist}",
+                "-o", f"ConnectTimeout={SSH_CONNECT_TIMEOUT}",
+                "-M", "-N", "-f",
+                key,
+            ]
+            code = await self._run(cmd, SSH_CONNECT_TIMEOUT * 2)
+            if code != 0 or not os.path.exists(path):
+                logger.warning(f"[SSHPool] Could not open master for {key} (exit {code}); using direct connections")
+                self._masters.pop(key, None)
+                return False
+            logger.info(f"[SSHPool] Master connection opened for {key}")
+            self._masters[key] = {"control_path": path, "opened_at": time.time(), "reuses": 0}
+            return True
+
+    async def close_all(self):
+        for key, master in list(self._masters.items()):
+            await self._run(
+                [SSH_BINARY, "-o", f"ControlPath={master['control_path']}", "-O", "exit", key],
+                SSH_CONNECT_TIMEOUT
+            )
+        self._masters.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "multiplex": self.multiplex,
+            "masters": {
+                key: {"control_path": m["control_path"], "opened_at": m["opened_at"], "reuses": m["reuses"]}
+                for key, m in self._masters.items()
+            },
+        }
+
+
+class NodeQueue:
+    """Semáforo con turnos por cliente: FIFO dentro de cada cliente, round-robin entre clientes."""
+
+    def __init__(self, node: str, limit: int):
+        self.node = node
+        self.limit = limit
+        self.active = 0
+        self.completed = 0
+        self._waiters: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+
+    @property
+    def depth(self) -> int:
+        return sum(len(q) for q in self._waiters.values())
+
+    def _wake_next(self):
+        while self.active < self.limit and self._waiters:
+            client, queue = self._waiters.popitem(last=False)
+            future = queue.popleft()
+            if queue:
+                # El cliente vuelve al final de la rueda
+                self._waiters[client] = queue
+            if future.done():
+                continue
+            self.active += 1
+            future.set_result(None)
+
+    async def acquire(self, client: str):
+        start = time.monotonic()
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.setdefault(client, deque()).append(future)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Se le dio el hueco justo al cancelarse: devolverlo
+                    self.release()
+                else:
+                    queue = self._waiters.get(client)
+                    if queue and future in queue:
+                        queue.remove(future)
+                        if not queue:
+                            del self._waiters[client]
+                raise
+        self._waits.append(time.monotonic() - start)
+
+    def release(self):
+        self.active -= 1
+        self.completed += 1
+        self._wake_next()
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queue_depth": self.depth,
+            "queue_by_client": {client: len(q) for client, q in self._waiters.items()},
+            "completed": self.completed,
+            "wait_seconds": {
+                "samples": len(waits),
+                "avg": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                "p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 3) if waits else 0.0,
+                "max": round(waits[-1], 3) if waits else 0.0,
+            },
+        }
+
+
+class NodeExecutionPool:
+    """Una NodeQueue por nodo Kali (host), creada al primer uso."""
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None, default_limit: int = NODE_CONCURRENCY_DEFAULT):
+        self.limits = NODE_CONCURRENCY if limits is None else limits
+        self.default_limit = default_limit
+        self._queues: Dict[str, NodeQueue] = {}
+
+    def queue(self, node: str) -> NodeQueue:
+        queue = self._queues.get(node)
+        if queue is None:
+            queue = self._queues[node] = NodeQueue(node, self.limits.get(node, self.default_limit))
+        return queue
+
+    @asynccontextmanager
+    async def slot(self, node: str, client: str = "global"):
+        queue = self.queue(node)
+        if queue.active >= queue.limit:
+            logger.info(f"[NodePool] {node} busy ({queue.active}/{queue.limit}), {client} queued (depth {queue.depth + 1})")
+        await queue.acquire(client)
+        try:
+            yield
+        finally:
+            queue.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {node: queue.stats() for node, queue in self._queues.items()}
+
+
+ssh_pool = SSHConnectionPool()
+node_pool = NodeExecutionPool()
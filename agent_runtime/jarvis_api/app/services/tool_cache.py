@@ -0,0 +1,102 @@
+"""
+Caché de resultados de herramientas de Kali (SQLite).
+
+Clave: (herramienta, argumentos, objetivo, cubo de tiempo); los argumentos
+incluyen el tenant y el nodo de ejecución, así que un resultado solo se
+reutiliza para el mismo tenant en el mismo nodo. El cubo es
+floor(ahora / TOOL_CACHE_WINDOW_SECONDS): dentro de la misma ventana de
+frescura, repetir un plan contra un objetivo sin cambios reutiliza la
+salida (y la carpeta del reporte con sus artefactos) en lugar de volver a
+lanzar la herramienta. Solo se guardan ejecuciones completadas.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+from app.services.sqlite_store import SQLiteStore, open_store
+
+logger = logging.getLogger(__name__)
+
+TOOL_CACHE_PATH = os.getenv("TOOL_CACHE_PATH", "/opt/deco/agent_runtime/data/tool_cache.sqlite3")
+TOOL_CACHE_WINDOW_SECONDS = int(os.getenv("TOOL_CACHE_WINDOW_SECONDS", "3600"))
+
+
+def cache_key(tool: str, args: Any, target: str, bucket: int) -> str:
+    payload = json.dumps([tool, args, target, bucket], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ToolResultCache(SQLiteStore):
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS tool_results (
+            key TEXT PRIMARY KEY,
+            tool TEXT NOT NULL,
+            target TEXT NOT NULL,
+            result TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        )
+        """,
+    )
+
+    def __init__(self, path: str = TOOL_CACHE_PATH, window_seconds: int = TOOL_CACHE_WINDOW_SECONDS):
+        self.window_seconds = max(1, window_seconds)
+        self.hits = 0
+        self.misses = 0
+        super().__init__(path)
+
+    def _bucket(self, now: float) -> int:
+        return int(now // self.window_seconds)
+
+    def get(self, tool: str, args: Any, target: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        key = cache_key(tool, args, target, self._bucket(now))
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, created_at FROM tool_results WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        result = json.loads(row[0])
+        # El reporte cacheado tiene que seguir en disco para poder reutilizarlo
+        if result.get("report_path") and not os.path.isdir(result["report_path"]):
+            self.misses += 1
+            return None
+        self.hits += 1
+        result["cached_at"] = row[1]
+        return result
+
+    def put(self, tool: str, args: Any, target: str, result: Dict[str, Any]):
+        if result.get("status") != "completed":
+            return
+        now = time.time()
+        bucket = self._bucket(now)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tool_results (key, tool, target, result, created_at, expires_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    cache_key(tool, args, target, bucket), tool, target,
+                    json.dumps(result, default=str), now, (bucket + 1) * self.window_seconds,
+                ),
+            )
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            return self._conn.execute("DELETE FROM tool_results WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute(
+                "SELECT COUNT(*) FROM tool_results WHERE expires_at > ?", (time.time(),)
+            ).fetchone()[0]
+        return {"entries": entries, "hits": self.hits, "misses": self.misses, "window_seconds": self.window_seconds}
+
+
+def open_tool_cache(path: str = TOOL_CACHE_PATH) -> Optional[ToolResultCache]:
+    return open_store(lambda: ToolResultCache(path), "[ToolCache] Caché de herramientas no disponible")
@@ -0,0 +1,121 @@
+"""
+Configuración de las colecciones Qdrant de 4096 dimensiones.
+
+Con vectores llama3.1 (16 KB por punto en float32) la RAM del host de Qdrant es
+el cuello de botella, así que por defecto:
+- los vectores originales viven en disco (on_disk=True),
+- en RAM solo queda la versión cuantizada: int8 (scalar, ~4x menos) o binaria
+  (~32x menos, peor recall),
+- las búsquedas sobre-muestrean con el índice cuantizado y reordenan con los
+  vectores originales (rescore).
+- índices de payload para filtrar por source / source_type / tags.
+
+QDRANT_QUANTIZATION=none recupera el comportamiento anterior.
+"""
+
+import logging
+import os
+from typing import Any, Dict, Optional
+
+from qdrant_client.models import (
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    Distance,
+    PayloadSchemaType,
+    QuantizationSearchParams,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+    VectorParams,
+)
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATION_MODES = ("scalar", "binary", "none")
+
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "scalar").lower()
+QDRANT_VECTORS_ON_DISK = os.getenv("QDRANT_VECTORS_ON_DISK", "true").lower() in ("1", "true", "yes")
+# Candidatos extra que se recuperan con el índice cuantizado antes de reordenar
+QDRANT_OVERSAMPLING = {
+    "scalar": float(os.getenv("QDRANT_SCALAR_OVERSAMPLING", "1.5")),
+    "binary": float(os.getenv("QDRANT_BINARY_OVERSAMPLING", "3.0")),
+}
+
+# Sufijo de las colecciones reconstruidas por scripts/migrate_qdrant_collections.py
+# (el nombre original pasa a ser un alias).
+REBUILT_SUFFIX = "_v2"
+
+PAYLOAD_INDEXES: Dict[str, Dict[str, PayloadSchemaType]] = {
+    "jarvis_knowledge_base": {"source": PayloadSchemaType.KEYWORD},
+    "jarvis_chat_memory": {},
+    "cle_articles": {"source_type": PayloadSchemaType.KEYWORD, "tags": PayloadSchemaType.KEYWORD},
+    "cle_github": {"source_type": PayloadSchemaType.KEYWORD, "tags": PayloadSchemaType.KEYWORD},
+    "cle_youtube": {"source_type": PayloadSchemaType.KEYWORD, "tags": PayloadSchemaType.KEYWORD},
+}
+
+
+def base_collection(name: str) -> str:
+    """cle_articles_v2 -> cle_articles"""
+    if name.endswith(REBUILT_SUFFIX):
+        return name[: -len(REBUILT_SUFFIX)]
+    return name
+
+
+def _mode(mode: Optional[str]) -> str:
+    mode = (mode or QDRANT_QUANTIZATION).lower()
+    if mode not in QUANTIZATION_MODES:
+        logger.warning(f"[Qdrant] QDRANT_QUANTIZATION='{mode}' no válido, usando 'scalar'")
+        return "scalar"
+    return mode
+
+
+def quantization_config(mode: Optional[str] = None):
+    mode = _mode(mode)
+    if mode == "scalar":
+        return ScalarQuantization(
+            scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    if mode == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+    return None
+
+
+def collection_kwargs(vector_size: int, mode: Optional[str] = None, on_disk: Optional[bool] = None) -> Dict[str, Any]:
+    """Argumentos para client.create_collection()."""
+    mode = _mode(mode)
+    kwargs: Dict[str, Any] = {
+        "vectors_config": VectorParams(
+            size=vector_size,
+            distance=Distance.COSINE,
+            on_disk=QDRANT_VECTORS_ON_DISK if on_disk is None else on_disk,
+        ),
+    }
+    quantization = quantization_config(mode)
+    if quantization is not None:
+        kwargs["quantization_config"] = quantization
+    return kwargs
+
+
+def search_params(mode: Optional[str] = None) -> Optional[SearchParams]:
+    """
+    Parámetros de búsqueda con rescore. En colecciones sin cuantizar Qdrant los ignora.
+    """
+    mode = _mode(mode)
+    if mode == "none":
+        return None
+    return SearchParams(
+        quantization=QuantizationSearchParams(
+            ignore=False,
+            rescore=True,
+            oversampling=QDRANT_OVERSAMPLING[mode],
+        )
+    )
+
+
+def ensure_payload_indexes(client, collection_name: str):
+    for field, schema in PAYLOAD_INDEXES.get(base_collection(collection_name), {}).items():
+        try:
+            client.create_payload_index(collection_name=collection_name, field_name=field, field_schema=schema)
+        except Exception as e:
+            logger.warning(f"[Qdrant] No se pudo crear índice de payload '{field}' en '{collection_name}': {e}")
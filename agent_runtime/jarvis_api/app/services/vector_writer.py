@@ -0,0 +1,211 @@
+"""
+Escritor por lotes para Qdrant.
+
+- Recuerda qué colecciones existen (un solo get_collections por proceso y
+  cliente) en vez de listarlas antes de cada upsert/búsqueda.
+- Acumula puntos por colección y los envía en lotes de QDRANT_BATCH_SIZE con
+  wait=False; lo que quede en el buffer se envía cada QDRANT_FLUSH_INTERVAL
+  segundos, al llamar a flush() y al cerrar el proceso. flush() devuelve los
+  ids cuyo upsert falló desde la llamada anterior (también los de envíos
+  automáticos), para que el llamador no los dé por guardados.
+- Crea las colecciones con la configuración de vector_schema (cuantización,
+  vectores en disco, índices de payload) y saca el texto largo del payload al
+  DocumentStore local antes de encolar.
+
+Ingestar un PDF de 300 páginas pasa de miles de peticiones a unas pocas.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import weakref
+from typing import Dict, List, Optional, Set
+
+from qdrant_client import QdrantClient
+from qdrant_client.models import PointStruct
+
+from app.services.document_store import DocumentStore, get_document_store, slim_payload
+from app.services.vector_schema import collection_kwargs, ensure_payload_indexes
+
+logger = logging.getLogger(__name__)
+
+QDRANT_BATCH_SIZE = int(os.getenv("QDRANT_BATCH_SIZE", "256"))
+QDRANT_FLUSH_INTERVAL = float(os.getenv("QDRANT_FLUSH_INTERVAL", "2"))
+
+# Writers vivos, para vaciarlos al salir
+_writers: "weakref.WeakSet[QdrantBulkWriter]" = weakref.WeakSet()
+
+
+class QdrantBulkWriter:
+    """Buffer de upserts por colección con cache de colecciones existentes."""
+
+    def __init__(
+        self,
+        client: QdrantClient,
+        vector_size: int = 4096,
+        batch_size: int = QDRANT_BATCH_SIZE,
+        flush_interval: float = QDRANT_FLUSH_INTERVAL,
+        documents: Optional[DocumentStore] = None,
+        quantization: Optional[str] = None,
+    ):
+        self.client = client
+        self.vector_size = vector_size
+        # Sin almacén disponible el texto se queda en el payload (comportamiento anterior)
+        self.documents = documents if documents is not None else get_document_store()
+        self.quantization = quantization
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._known: Optional[Set[str]] = None
+        self._collections_lock = threading.Lock()
+        self._buffers: Dict[str, List[PointStruct]] = {}
+        self._buffer_lock = threading.Lock()
+        # Serializa los envíos: flush() garantiza que lo anterior ya salió
+        self._send_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._timer: Optional[threading.Thread] = None
+        self.stats = {"points": 0, "requests": 0, "failed_points": 0}
+        # Ids de puntos rechazados, pendientes de devolver en flush()
+        self._failed: Set[str] = set()
+        _writers.add(self)
+
+    # ------------------------------------------------------------------
+    # Colecciones
+    # ------------------------------------------------------------------
+
+    def ensure_collection(self, collection_name: str, vector_size: Optional[int] = None):
+        """Crea la colección si no existe. Solo consulta a Qdrant la primera vez."""
+        if self._known is not None and collection_name in self._known:
+            return
+        with self._collections_lock:
+            if self._known is None:
+                self._known = self._existing_names()
+            if collection_name in self._known:
+                return
+            self.client.create_collection(
+                collection_name=collection_name,
+                **collection_kwargs(vector_size or self.vector_size, self.quantization),
+            )
+            ensure_payload_indexes(self.client, collection_name)
+            self._known.add(collection_name)
+            logger.info(f"[Qdrant] Colección '{collection_name}' creada")
+
+    def _existing_names(self) -> Set[str]:
+        """Colecciones y alias (las migradas se sirven por alias)."""
+        names = {c.name for c in self.client.get_collections().collections}
+        try:
+            names.update(a.alias_name for a in self.client.get_aliases().aliases)
+        except Exception as e:
+            logger.debug(f"[Qdrant] No se pudieron listar alias: {e}")
+        return names
+
+    def forget_collection(self, collection_name: str):
+        """Olvida la colección (p. ej. tras borrarla o si Qdrant responde 404)."""
+        with self._collections_lock:
+            if self._known is not None:
+                self._known.discard(collection_name)
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+
+    def add(self, collection_name: str, points: List[PointStruct]):
+        """Encola puntos; envía en cuanto la colección llega a batch_size."""
+        if self.documents is not None:
+            documents = {}
+            for point in points:
+                point.payload, document = slim_payload(collection_name, point.id, point.payload or {})
+                if document:
+                    documents[str(point.id)] = document
+            # El texto se guarda antes de que el punto sea visible en Qdrant
+            self.documents.put_many(collection_name, documents)
+        ready = None
+        with self._buffer_lock:
+            buffer = self._buffers.setdefault(collection_name, [])
+            buffer.extend(points)
+            if len(buffer) >= self.batch_size:
+                ready = self._buffers.pop(collection_name)
+        if ready:
+            self._send(collection_name, ready)
+        else:
+            self._ensure_timer()
+
+    def flush(self) -> Set[str]:
+        """
+        Envía todo lo pendiente (wait=False: Qdrant lo indexa en segundo plano).
+        Devuelve los ids de los puntos que no se pudieron enviar desde el último flush().
+        """
+        self._send_pending()
+        with self._buffer_lock:
+            failed, self._failed = self._failed, set()
+        return failed
+
+    def _send_pending(self):
+        with self._buffer_lock:
+            pending = self._buffers
+            self._buffers = {}
+        for collection_name, points in pending.items():
+            self._send(collection_name, points)
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+
+    def _send(self, collection_name: str, points: List[PointStruct]):
+        with self._send_lock:
+            for start in range(0, len(points), self.batch_size):
+                batch = points[start:start + self.batch_size]
+                try:
+                    self._upsert(collection_name, batch)
+                except Exception as e:
+                    self.stats["failed_points"] += len(batch)
+                    with self._buffer_lock:
+                        self._failed.update(str(point.id) for point in batch)
+                    logger.error(f"[Qdrant] Error en upsert por lotes a '{collection_name}' ({len(batch)} puntos): {e}")
+
+    def _upsert(self, collection_name: str, batch: List[PointStruct]):
+        self.ensure_collection(collection_name)
+        try:
+            self.client.upsert(collection_name=collection_name, points=batch, wait=False)
+        except Exception as e:
+            # La colección pudo borrarse por fuera: recrearla y reintentar una vez
+            if "not found" not in str(e).lower() and "404" not in str(e):
+                raise
+            self.forget_collection(collection_name)
+            self.ensure_collection(collection_name)
+            self.client.upsert(collection_name=collection_name, points=batch, wait=False)
+        self.stats["points"] += len(batch)
+        self.stats["requests"] += 1
+
+    def _ensure_timer(self):
+        if self._timer is not None or self.flush_interval <= 0:
+            return
+        with self._buffer_lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Thread(target=self._flush_loop, name="qdrant-writer", daemon=True)
+            self._timer.start()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                # Sin recoger los fallos: son para el próximo flush() del llamador
+                self._send_pending()
+            except Exception as e:
+                logger.error(f"[Qdrant] Error en flush periódico: {e}")
+
+    def pending(self) -> int:
+        with self._buffer_lock:
+            return sum(len(p) for p in self._buffers.values())
+
+
+def flush_all_writers():
+    """Vacía todos los buffers (shutdown de la API y atexit)."""
+    for writer in list(_writers):
+        try:
+            writer.close()
+        except Exception as e:
+            logger.error(f"[Qdrant] Error vaciando buffer al cerrar: {e}")
+
+
+atexit.register(flush_all_writers)
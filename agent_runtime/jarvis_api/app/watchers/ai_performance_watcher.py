@@ -1,4 +1,3 @@
-import asyncio
 import logging
 from datetime import datetime, timedelta, timezone
 from sqlalchemy import select, desc, func
@@ -8,21 +7,8 @@ from app.services.alerts_service import create_alert_from_event, create_or_updat
 
 logger = logging.getLogger(__name__)
 
-async def start_ai_performance_watcher():
-    """
-    Monitor AI Agent Benchmarks for performance degradation.
-    Runs every 60 seconds.
-    """
-    logger.info("Starting AI Performance Watcher...")
-    while True:
-        try:
-            await check_ai_performance()
-        except Exception as e:
-            logger.error(f"Error in AI Performance Watcher: {e}")
-        
-        await asyncio.sleep(60)
-
-async def check_ai_performance():
+def check_ai_performance():
+    """Monitor AI Agent Benchmarks for performance degradation."""
     db = SessionLocal()
     try:
         # 1. Check for High Latency (> 2000ms) in recent benchmarks
@@ -1,24 +1,12 @@
-import asyncio
 import logging
-from app.database import SessionLocal
 from app.services.deco_supervisor import DecoSupervisor
 
 logger = logging.getLogger(__name__)
 
-async def start_auto_remediation_watcher():
+async def run_auto_remediation():
     """
-    Periodically runs the DecoSupervisor auto-remediation cycle.
-    Runs every 5 minutes.
+    Runs one DecoSupervisor auto-remediation cycle.
+    Stays on the loop (kali_runner and its node queues are bound to it); the
+    cycle runs its DB queries and commits in worker threads.
     """
-    logger.info("Starting Auto-Remediation Watcher...")
-    while True:
-        try:
-            db = SessionLocal()
-            try:
-                await DecoSupervisor.run_auto_remediation_cycle(db)
-            finally:
-                db.close()
-        except Exception as e:
-            logger.error(f"Error in Auto-Remediation Watcher: {e}")
-        
-        await asyncio.sleep(300) # 5 minutes
+    await DecoSupervisor.run_auto_remediation_cycle()
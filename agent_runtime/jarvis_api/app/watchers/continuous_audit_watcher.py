@@ -1,4 +1,3 @@
-import asyncio
 import logging
 import os
 from datetime import datetime, timezone
@@ -18,25 +17,9 @@ logger = logging.getLogger(__name__)
 
 REPORT_DIR = "/opt/deco/reports/daily"
 
-async def start_continuous_audit_watcher():
-    """
-    Generates Daily Audit Reports (PDF).
-    Runs every 6 hours.
-    """
-    logger.info("Starting Continuous Audit Watcher...")
-    
-    # Ensure directory exists
+def generate_audit_report():
+    """Generates a Daily Audit Report (PDF)."""
     os.makedirs(REPORT_DIR, exist_ok=True)
-
-    while True:
-        try:
-            await generate_audit_report()
-        except Exception as e:
-            logger.error(f"Error in Continuous Audit Watcher: {e}")
-        
-        await asyncio.sleep(21600) # 6 hours
-
-async def generate_audit_report():
     db = SessionLocal()
     try:
         timestamp = datetime.now(timezone.utc)
@@ -1,4 +1,3 @@
-import asyncio
 import logging
 import time
 import httpx
@@ -15,21 +14,8 @@ MODEL_TO_CHECK = "llama3.1:8b-instruct-q4_K_M"
 failure_count = 0
 MAX_FAILURES = 3
 
-async def start_llm_latency_watcher():
-    """
-    Monitor LLM Latency.
-    Runs every 5 minutes.
-    """
-    logger.info("Starting LLM Latency Watcher...")
-    while True:
-        try:
-            await check_llm_latency()
-        except Exception as e:
-            logger.error(f"Error in LLM Latency Watcher: {e}")
-        
-        await asyncio.sleep(300)
-
 async def check_llm_latency():
+    """Monitor LLM Latency."""
     global failure_count
     db = SessionLocal()
     try:
@@ -1,4 +1,3 @@
-import asyncio
 import logging
 import httpx
 from app.database import SessionLocal
@@ -6,21 +5,8 @@ from app.services.alerts_service import create_alert_from_event
 
 logger = logging.getLogger(__name__)
 
-async def start_orchestrator_monitor_watcher():
-    """
-    Monitor Orchestrator API.
-    Runs every 60 seconds.
-    """
-    logger.info("Starting Orchestrator Monitor Watcher...")
-    while True:
-        try:
-            await check_orchestrator()
-        except Exception as e:
-            logger.error(f"Error in Orchestrator Monitor Watcher: {e}")
-        
-        await asyncio.sleep(60)
-
 async def check_orchestrator():
+    """Monitor Orchestrator API."""
     db = SessionLocal()
     try:
         async with httpx.AsyncClient(timeout=5.0) as client:
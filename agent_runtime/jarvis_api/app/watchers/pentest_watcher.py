@@ -1,4 +1,3 @@
-import asyncio
 import logging
 from datetime import datetime, timedelta
 from sqlalchemy import desc
@@ -30,21 +29,8 @@ logger = logging.getLogger(__name__)
 
 VULN_SERVICE_URL = "http://vuln_service:8083"
 
-async def start_pentest_watcher():
-    """
-    Monitor Pentest Results.
-    Runs every 2 minutes.
-    """
-    logger.info("Starting Pentest Watcher...")
-    while True:
-        try:
-            await check_pentest_results()
-        except Exception as e:
-            logger.error(f"Error in Pentest Watcher: {e}")
-        
-        await asyncio.sleep(120)
-
 async def check_pentest_results():
+    """Monitor Pentest Results."""
     db = SessionLocal()
     try:
         async with httpx.AsyncClient() as client:
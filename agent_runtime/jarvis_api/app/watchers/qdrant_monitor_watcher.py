@@ -1,4 +1,3 @@
-import asyncio
 import logging
 import httpx
 from app.database import SessionLocal
@@ -6,21 +5,8 @@ from app.services.alerts_service import create_alert_from_event
 
 logger = logging.getLogger(__name__)
 
-async def start_qdrant_monitor_watcher():
-    """
-    Monitor Qdrant Vector DB.
-    Runs every 60 seconds.
-    """
-    logger.info("Starting Qdrant Monitor Watcher...")
-    while True:
-        try:
-            await check_qdrant()
-        except Exception as e:
-            logger.error(f"Error in Qdrant Monitor Watcher: {e}")
-        
-        await asyncio.sleep(60)
-
 async def check_qdrant():
+    """Monitor Qdrant Vector DB."""
     db = SessionLocal()
     try:
         async with httpx.AsyncClient(timeout=5.0) as client:
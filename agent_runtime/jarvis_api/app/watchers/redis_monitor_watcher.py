@@ -1,4 +1,3 @@
-import asyncio
 import logging
 import redis.asyncio as aioredis
 from app.database import SessionLocal
@@ -6,21 +5,8 @@ from app.services.alerts_service import create_alert_from_event
 
 logger = logging.getLogger(__name__)
 
-async def start_redis_monitor_watcher():
-    """
-    Monitor Redis.
-    Runs every 60 seconds.
-    """
-    logger.info("Starting Redis Monitor Watcher...")
-    while True:
-        try:
-            await check_redis()
-        except Exception as e:
-            logger.error(f"Error in Redis Monitor Watcher: {e}")
-        
-        await asyncio.sleep(60)
-
 async def check_redis():
+    """Monitor Redis."""
     db = SessionLocal()
     try:
         try:
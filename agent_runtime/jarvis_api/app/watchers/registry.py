@@ -0,0 +1,55 @@
+"""
+Background watchers of jarvis_api and their schedule.
+
+Sync DB work (risk recalculation, benchmark checks, PDF audit) runs in the
+watcher thread pool; watchers that await HTTP/Redis clients run on the loop.
+"""
+
+from app.watchers.runtime import WatcherRuntime
+from app.watchers.ai_performance_watcher import check_ai_performance
+from app.watchers.pentest_watcher import check_pentest_results
+from app.watchers.system_health_watcher import check_system_health
+from app.watchers.llm_latency_watcher import check_llm_latency
+from app.watchers.worker_monitor_watcher import check_workers
+from app.watchers.qdrant_monitor_watcher import check_qdrant
+from app.watchers.redis_monitor_watcher import check_redis
+from app.watchers.orchestrator_monitor_watcher import check_orchestrator
+from app.watchers.risk_global_watcher import recalculate_global_risk
+from app.watchers.continuous_audit_watcher import generate_audit_report
+from app.watchers.client_risk_watcher import recalculate_client_risk
+from app.watchers.asset_risk_watcher import recalculate_asset_risk
+from app.watchers.auto_remediation_watcher import run_auto_remediation
+
+
+def register_default_watchers(runtime: WatcherRuntime):
+    # Monitoring
+    runtime.register("ai_performance", check_ai_performance, interval=60, timeout=30, executor="thread",
+                     description="AI agent benchmark degradation")
+    runtime.register("pentest", check_pentest_results, interval=120, timeout=60,
+                     description="Critical findings from vuln_service")
+    runtime.register("system_health", check_system_health, interval=60, timeout=30,
+                     description="CPU, RAM and service health")
+    runtime.register("llm_latency", check_llm_latency, interval=300, timeout=60,
+                     description="Ollama latency probe")
+    runtime.register("worker_monitor", check_workers, interval=120, timeout=30,
+                     description="Background workers health")
+    runtime.register("qdrant_monitor", check_qdrant, interval=60, timeout=15,
+                     description="Qdrant health")
+    runtime.register("redis_monitor", check_redis, interval=60, timeout=15,
+                     description="Redis health")
+    runtime.register("orchestrator_monitor", check_orchestrator, interval=60, timeout=15,
+                     description="Orchestrator API health")
+
+    # Risk
+    runtime.register("risk_global", recalculate_global_risk, interval=300, timeout=120, executor="thread",
+                     description="Global risk score")
+    runtime.register("continuous_audit", generate_audit_report, interval=21600, timeout=600, executor="thread",
+                     max_backoff=21600, description="Daily audit PDF")
+    runtime.register("client_risk", recalculate_client_risk, interval=600, timeout=300, executor="thread",
+                     description="Per-client risk scores")
+    runtime.register("asset_risk", recalculate_asset_risk, interval=600, timeout=300, executor="thread",
+                     description="Per-asset risk scores")
+
+    # Auto-Remediation
+    runtime.register("auto_remediation", run_auto_remediation, interval=300, timeout=240,
+                     description="DecoSupervisor auto-remediation cycle")
@@ -0,0 +1,273 @@
+"""
+Watcher runtime.
+
+Every background watcher registers one unit of work (a coroutine function,
+or a plain function for blocking/sync DB work that runs in a thread pool)
+and the runtime owns the loop around it:
+  - first runs are spread over WATCHER_STARTUP_SPREAD seconds and every
+    interval gets +/- jitter, so watchers do not fire in lockstep;
+  - each run has a timeout; failures and timeouts back off exponentially
+    (interval * 2^n, capped at max_backoff) and never kill the watcher;
+  - a watcher never overlaps itself: manual triggers while it runs are
+    rejected and a timed-out thread run blocks the next one until the
+    thread actually returns;
+  - per-watcher metrics (last run, duration, failures...) and pause,
+    resume and trigger controls for /ai/watchers.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+WATCHER_STARTUP_SPREAD = float(os.getenv("WATCHER_STARTUP_SPREAD", "30"))
+WATCHER_DEFAULT_JITTER = float(os.getenv("WATCHER_DEFAULT_JITTER", "0.1"))
+WATCHER_THREAD_POOL_SIZE = int(os.getenv("WATCHER_THREAD_POOL_SIZE", "4"))
+EXECUTORS = ("loop", "thread")
+
+
+@dataclass
+class Watcher:
+    name: str
+    func: Callable[[], Any]
+    interval: float
+    jitter: float = WATCHER_DEFAULT_JITTER
+    timeout: Optional[float] = None
+    executor: str = "loop"
+    max_backoff: Optional[float] = None
+    description: str = ""
+    # Runtime state and metrics
+    paused: bool = False
+    running: bool = False
+    runs: int = 0
+    successes: int = 0
+    failures: int = 0
+    timeouts: int = 0
+    consecutive_failures: int = 0
+    overlaps_skipped: int = 0
+    last_run_at: Optional[float] = None
+    last_success_at: Optional[float] = None
+    last_duration: Optional[float] = None
+    total_duration: float = 0.0
+    last_error: Optional[str] = None
+    next_run_at: Optional[float] = None
+    _task: Optional[asyncio.Task] = field(default=None, repr=False)
+    _wakeup: Optional[asyncio.Event] = field(default=None, repr=False)
+    _inflight: Optional[asyncio.Future] = field(default=None, repr=False)
+    _triggered: bool = field(default=False, repr=False)
+
+    def next_delay(self) -> float:
+        if self.consecutive_failures:
+            cap = self.max_backoff or self.interval * 8
+            delay = min(self.interval * 2 ** self.consecutive_failures, cap)
+        else:
+            delay = self.interval
+        return max(0.0, delay * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "description": self.description,
+            "interval": self.interval,
+            "jitter": self.jitter,
+            "timeout": self.timeout,
+            "executor": self.executor,
+            "paused": self.paused,
+            "running": self.running,
+            "alive": bool(self._task and not self._task.done()),
+            "runs": self.runs,
+            "successes": self.successes,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "consecutive_failures": self.consecutive_failures,
+            "overlaps_skipped": self.overlaps_skipped,
+            "last_run_at": self.last_run_at,
+            "last_success_at": self.last_success_at,
+            "last_duration": round(self.last_duration, 3) if self.last_duration is not None else None,
+            "avg_duration": round(self.total_duration / self.runs, 3) if self.runs else None,
+            "last_error": self.last_error,
+            "next_run_at": self.next_run_at,
+        }
+
+
+class WatcherRuntime:
+    def __init__(self, thread_pool_size: int = WATCHER_THREAD_POOL_SIZE,
+                 startup_spread: float = WATCHER_STARTUP_SPREAD):
+        self.watchers: Dict[str, Watcher] = {}
+        self.startup_spread = startup_spread
+        self._thread_pool_size = thread_pool_size
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._started = False
+
+    def register(
+        self,
+        name: str,
+        func: Callable[[], Any],
+        interval: float,
+        jitter: float = WATCHER_DEFAULT_JITTER,
+        timeout: Optional[float] = None,
+        executor: str = "loop",
+        max_backoff: Optional[float] = None,
+        description: str = "",
+    ) -> Watcher:
+        """
+        executor="loop": func is a coroutine function awaited on the event loop.
+        executor="thread": func is a sync function run in the watcher thread pool.
+        timeout defaults to the interval.
+        """
+        if name in self.watchers:
+            raise ValueError(f"Watcher {name} already registered")
+        if executor not in EXECUTORS:
+            raise ValueError(f"Unknown executor {executor} (expected one of {EXECUTORS})")
+        if executor == "loop" and not asyncio.iscoroutinefunction(func):
+            raise ValueError(f"Watcher {name}: loop executor needs a coroutine function")
+        watcher = Watcher(
+            name=name,
+            func=func,
+            interval=interval,
+            jitter=jitter,
+            timeout=timeout if timeout is not None else interval,
+            executor=executor,
+            max_backoff=max_backoff,
+            description=description,
+        )
+        self.watchers[name] = watcher
+        if self._started:
+            self._spawn(watcher)
+        return watcher
+
+    def start(self):
+        if self._started:
+            return
+        self._started = True
+        self._pool = ThreadPoolExecutor(max_workers=self._thread_pool_size, thread_name_prefix="watcher")
+        for watcher in self.watchers.values():
+            self._spawn(watcher)
+        logger.info(f"Watcher runtime started with {len(self.watchers)} watchers")
+
+    def _spawn(self, watcher: Watcher):
+        watcher._wakeup = asyncio.Event()
+        watcher._task = asyncio.create_task(self._loop(watcher), name=f"watcher:{watcher.name}")
+        watcher._task.add_done_callback(lambda task, w=watcher: self._on_loop_exit(w, task))
+
+    def _on_loop_exit(self, watcher: Watcher, task: asyncio.Task):
+        if task.cancelled() or not self._started:
+            return
+        # The loop itself should never die: log and restart it
+        logger.error(f"Watcher {watcher.name} loop exited unexpectedly: {task.exception()!r}; restarting")
+        self._spawn(watcher)
+
+    async def stop(self):
+        self._started = False
+        tasks = [w._task for w in self.watchers.values() if w._task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def _wait(self, watcher: Watcher, due: float) -> bool:
+        """Sleep until `due` (monotonic), a trigger, pause or resume. True if triggered."""
+        remaining = max(0.0, due - time.monotonic())
+        watcher.next_run_at = None if watcher.paused else time.time() + remaining
+        try:
+            if watcher.paused:
+                await watcher._wakeup.wait()
+            else:
+                await asyncio.wait_for(watcher._wakeup.wait(), timeout=remaining)
+        except asyncio.TimeoutError:
+            pass
+        watcher._wakeup.clear()
+        triggered, watcher._triggered = watcher._triggered, False
+        return triggered
+
+    async def _loop(self, watcher: Watcher):
+        due = time.monotonic() + random.uniform(0, min(watcher.interval, self.startup_spread))
+        while True:
+            triggered = await self._wait(watcher, due)
+            if triggered or (not watcher.paused and time.monotonic() >= due):
+                await self._run_once(watcher)
+                due = time.monotonic() + watcher.next_delay()
+
+    async def _run_once(self, watcher: Watcher):
+        if watcher._inflight is not None and not watcher._inflight.done():
+            # A timed-out thread run is still going: do not start another
+            watcher.overlaps_skipped += 1
+            logger.warning(f"Watcher {watcher.name}: previous run still in progress, skipping")
+            return
+        watcher.running = True
+        watcher.runs += 1
+        watcher.last_run_at = time.time()
+        start = time.monotonic()
+        try:
+            if watcher.executor == "thread":
+                watcher._inflight = asyncio.get_running_loop().run_in_executor(self._pool, watcher.func)
+                await asyncio.wait_for(asyncio.shield(watcher._inflight), timeout=watcher.timeout)
+            else:
+                await asyncio.wait_for(watcher.func(), timeout=watcher.timeout)
+            watcher.successes += 1
+            watcher.consecutive_failures = 0
+            watcher.last_success_at = time.time()
+            watcher.last_error = None
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            watcher.timeouts += 1
+            self._record_failure(watcher, f"timed out after {watcher.timeout}s")
+        except Exception as e:
+            self._record_failure(watcher, f"{type(e).__name__}: {e}")
+        finally:
+            watcher.running = False
+            watcher.last_duration = time.monotonic() - start
+            watcher.total_duration += watcher.last_duration
+
+    def _record_failure(self, watcher: Watcher, error: str):
+        watcher.failures += 1
+        watcher.consecutive_failures += 1
+        watcher.last_error = error
+        logger.error(f"Error in watcher {watcher.name} ({watcher.consecutive_failures} in a row): {error}")
+
+    def _get(self, name: str) -> Watcher:
+        watcher = self.watchers.get(name)
+        if watcher is None:
+            raise KeyError(name)
+        return watcher
+
+    def pause(self, name: str) -> Watcher:
+        watcher = self._get(name)
+        watcher.paused = True
+        if watcher._wakeup:
+            watcher._wakeup.set()
+        return watcher
+
+    def resume(self, name: str) -> Watcher:
+        watcher = self._get(name)
+        watcher.paused = False
+        if watcher._wakeup:
+            watcher._wakeup.set()
+        return watcher
+
+    def trigger(self, name: str) -> bool:
+        """Run the watcher now (also when paused). False if it is already running."""
+        watcher = self._get(name)
+        if watcher.running or (watcher._inflight is not None and not watcher._inflight.done()):
+            watcher.overlaps_skipped += 1
+            return False
+        if watcher._wakeup is None:
+            return False
+        watcher._triggered = True
+        watcher._wakeup.set()
+        return True
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [watcher.stats() for watcher in self.watchers.values()]
+
+
+watcher_runtime = WatcherRuntime()
@@ -8,25 +8,13 @@ from app.services.action_service import ActionService
 
 logger = logging.getLogger(__name__)
 
-async def start_system_health_watcher():
-    """
-    Monitor System Health (CPU, RAM, Services).
-    Runs every 60 seconds.
-    """
-    logger.info("Starting System Health Watcher...")
-    while True:
-        try:
-            await check_system_health()
-        except Exception as e:
-            logger.error(f"Error in System Health Watcher: {e}")
-        
-        await asyncio.sleep(60)
-
 async def check_system_health():
+    """Monitor System Health (CPU, RAM, Services)."""
     db = SessionLocal()
     try:
         # 1. CPU & RAM
-        cpu_percent = psutil.cpu_percent(interval=1)
+        # cpu_percent(interval=1) blocks for a second: keep it off the event loop
+        cpu_percent = await asyncio.to_thread(psutil.cpu_percent, 1)
         ram_percent = psutil.virtual_memory().percent
 
         if cpu_percent > 90:
@@ -1,4 +1,3 @@
-import asyncio
 import logging
 import httpx
 from app.database import SessionLocal
@@ -6,21 +5,8 @@ from app.services.alerts_service import create_alert_from_event
 
 logger = logging.getLogger(__name__)
 
-async def start_worker_monitor_watcher():
-    """
-    Monitor Background Workers (Pentest Worker, etc).
-    Runs every 2 minutes.
-    """
-    logger.info("Starting Worker Monitor Watcher...")
-    while True:
-        try:
-            await check_workers()
-        except Exception as e:
-            logger.error(f"Error in Worker Monitor Watcher: {e}")
-        
-        await asyncio.sleep(120)
-
 async def check_workers():
+    """Monitor Background Workers (Pentest Worker, etc)."""
     db = SessionLocal()
     try:
         async with httpx.AsyncClient(timeout=5.0) as client:
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, HTTPException, Depends, BackgroundTasks
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, HTTPException, Depends, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
@@ -14,7 +14,13 @@ from app.logging_config import setup_logging
 setup_logging()
 
 # Importar servicios
-from app.services.ollama_client import JarvisOllamaClient
+from app.services.ollama_client import JarvisOllamaClient, PRIORITY_BACKGROUND
+from app.services.ollama_async import close_async_ollama
+from app.services.qga_transport import close_qga_transports
+from app.services.ssh_pool import ssh_pool
+from app.services.vector_writer import flush_all_writers
+from app.services.semantic_cache import semantic_cache_stats
+from app.services.event_stream import EventChannel, sse_response, websocket_stream
 from app.services.qdrant_memory import JarvisQdrantMemory
 from app.services.redis_bus import JarvisRedisBus
 from app.services.rag_pipeline import JarvisRAGPipeline
@@ -174,7 +180,7 @@ async def health_check():
         "status": "operational",
         "version": "3.0.0",
         "services": {
-            "ollama": ollama_client.check_health(),
+            "ollama": await ollama_client.client.check_health(),
             "redis": redis_bus.ping(),
             "qdrant": "connected"
         }
@@ -202,16 +208,17 @@ async def run_action_background(action: Action, target: str, user: Dict):
             {"role": "user", "content": f"Herramienta: {action.name}\nObjetivo: {target}\n\nSalida:\n{result.get('stdout', '')}"}
         ]
         
-        report_response = ollama_client.chat(messages=report_prompt)
+        report_response = await ollama_client.achat(messages=report_prompt, priority=PRIORITY_BACKGROUND)
         ai_report = report_response.get("message", {}).get("content", "Error generating report.")
         
         # Guardar reporte en memoria (o base de datos futura)
-        embedding = ollama_client.generate_embedding(ai_report)
+        embedding = await ollama_client.agenerate_embedding(ai_report, priority=PRIORITY_BACKGROUND)
         if embedding:
             qdrant_memory.store_chat_memory(
                 user_message=f"System Report: {action.name} on {target}",
                 assistant_message=ai_report,
-                embedding=embedding
+                embedding=embedding,
+                metadata={"user_id": user.get("sub")}
             )
             
         # Guardar reporte en disco para persistencia
@@ -245,15 +252,20 @@ async def run_action_background(action: Action, target: str, user: Dict):
 @app.post("/api/ingest")
 async def ingest_document(
     file: UploadFile = File(...),
+    replace: bool = False,
     user: Dict = Depends(require_permission("write"))
 ):
-    """Ingesta documento en base de conocimiento."""
+    """
+    Ingesta documento en base de conocimiento.
+    replace=true sustituye los documentos ingestados antes con el mismo nombre.
+    """
     try:
         temp_path = f"/tmp/{file.filename}"
         with open(temp_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
         
-        result = rag_pipeline.ingest_document(temp_path)
+        # Chunking y embeddings (sync) en un hilo: no bloquean el event loop
+        result = await asyncio.to_thread(rag_pipeline.ingest_document, temp_path, replace)
         Path(temp_path).unlink(missing_ok=True)
         
         redis_bus.publish_log("info", f"Documento ingestado por {user.get('sub')}: {file.filename}")
@@ -264,6 +276,14 @@ async def ingest_document(
         redis_bus.publish_log("error", f"Error ingesta: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _cache_scope(user: Dict) -> Optional[str]:
+    """Ámbito de la cache de respuestas: tenant del token o, si no lo trae, el usuario (sub)."""
+    if user.get("tenant_id"):
+        return f"tenant:{user['tenant_id']}"
+    if user.get("sub"):
+        return f"user:{user['sub']}"
+    return None
+
 @app.post("/api/rag/query")
 async def rag_query(
     request: RAGQueryRequest,
@@ -271,9 +291,12 @@ async def rag_query(
 ):
     """Consulta base de conocimiento con RAG."""
     try:
-        result = rag_pipeline.query_knowledge(
+        # query_knowledge usa el cliente Ollama sync (embedding + chat): en un hilo aparte
+        result = await asyncio.to_thread(
+            rag_pipeline.query_knowledge,
             question=request.question,
-            top_k=request.top_k
+            top_k=request.top_k,
+            tenant=_cache_scope(user)
         )
         
         redis_bus.publish_log("info", f"RAG query por {user.get('sub')}")
@@ -283,6 +306,20 @@ async def rag_query(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/cache/stats")
+async def cache_stats(user: Dict = Depends(get_current_user)):
+    """Tasa de aciertos de las caches de respuestas y de embeddings."""
+    return {
+        "semantic": semantic_cache_stats(),
+        "embeddings": rag_pipeline.embedder.stats(),
+    }
+
+@app.get("/api/intent/stats")
+async def intent_stats(user: Dict = Depends(get_current_user)):
+    """Qué nivel del router de intención respondió (reglas, clasificador o LLM)."""
+    from app.jarvis_prime import jarvis_prime
+    return jarvis_prime.intent_router.stats()
+
 # ========== RUTAS AGENTES AVANZADOS ==========
 
 @app.post("/api/agents/recon")
@@ -330,26 +367,106 @@ async def run_vuln_scan(
         # Escanear vulnerabilidades
         vulnerabilities = await vuln_scanner.scan_target(request.target, services)
         
-        # Calcular riesgos y rankear
-        ranked_vulns = vuln_ranker.rank_vulnerabilities(vulnerabilities)
-        grouped = vuln_ranker.group_by_risk_level(vulnerabilities)
-        
         redis_bus.publish_agent_state("vuln-scanner", "idle", {})
         redis_bus.publish_log("info", f"VulnScan completado: {len(vulnerabilities)} vulns encontradas")
         
-        return {
-            "target": request.target,
-            "total_vulnerabilities": len(vulnerabilities),
-            "ranked": ranked_vulns[:10],  # Top 10
-            "by_risk_level": {
-                level: len(vulns) for level, vulns in grouped.items()
-            }
-        }
+        return _vulnscan_summary(request.target, vulnerabilities)
     
     except Exception as e:
         redis_bus.publish_agent_state("vuln-scanner", "error", {"error": str(e)})
         raise HTTPException(status_code=500, detail=str(e))
 
+def _vulnscan_summary(target: str, vulnerabilities: List[Dict]) -> Dict:
+    """Calcula riesgos y rankea."""
+    ranked_vulns = vuln_ranker.rank_vulnerabilities(vulnerabilities)
+    grouped = vuln_ranker.group_by_risk_level(vulnerabilities)
+    return {
+        "target": target,
+        "total_vulnerabilities": len(vulnerabilities),
+        "ranked": ranked_vulns[:10],  # Top 10
+        "by_risk_level": {
+            level: len(vulns) for level, vulns in grouped.items()
+        }
+    }
+
+# ========== STREAMING (SSE / WebSocket) ==========
+# Eventos: plan, tool_start, tool_output, reflect, token, done, error.
+# Si el cliente se desconecta se cancela el productor (y con él Ollama y nmap).
+
+def _recon_producer(target: str, options: Dict[str, Any], username: str):
+    async def producer(events: EventChannel):
+        redis_bus.publish_log("warning", f"Recon (stream) iniciado por {username}: {target}")
+        redis_bus.publish_agent_state("recon-advanced", "working", {"target": target})
+        try:
+            results = await recon_agent.run_full_discovery(target=target, options=options, events=events)
+        except asyncio.CancelledError:
+            redis_bus.publish_agent_state("recon-advanced", "idle", {"cancelled": True})
+            raise
+        except Exception as e:
+            redis_bus.publish_agent_state("recon-advanced", "error", {"error": str(e)})
+            raise
+        redis_bus.publish_agent_state("recon-advanced", "idle", {})
+        await events.emit("done", result=results)
+    return producer
+
+def _vulnscan_producer(target: str, username: str):
+    async def producer(events: EventChannel):
+        redis_bus.publish_log("warning", f"VulnScan (stream) iniciado por {username}")
+        redis_bus.publish_agent_state("vuln-scanner", "working", {"target": target})
+        try:
+            recon_results = await recon_agent.run_full_discovery(target, events=events)
+            services = recon_results.get("phases", {}).get("services", {})
+            vulnerabilities = await vuln_scanner.scan_target(target, services, events=events)
+        except asyncio.CancelledError:
+            redis_bus.publish_agent_state("vuln-scanner", "idle", {"cancelled": True})
+            raise
+        except Exception as e:
+            redis_bus.publish_agent_state("vuln-scanner", "error", {"error": str(e)})
+            raise
+        redis_bus.publish_agent_state("vuln-scanner", "idle", {})
+        await events.emit("done", result=_vulnscan_summary(target, vulnerabilities))
+    return producer
+
+def _prime_producer(message: str, user_id: str, use_web_search: bool = False):
+    async def producer(events: EventChannel):
+        from app.jarvis_prime import jarvis_prime
+        await jarvis_prime.process_user_request(
+            user_input=message, user_id=user_id, use_web_search=use_web_search, events=events
+        )
+    return producer
+
+class JarvisStreamRequest(BaseModel):
+    message: str
+    use_web_search: bool = False
+
+@app.post("/api/agents/recon/stream")
+async def run_recon_stream(
+    request: ReconRequest,
+    http_request: Request,
+    user: Dict = Depends(require_permission("execute_agents"))
+):
+    """Recon avanzado con progreso en streaming (SSE)."""
+    options = {"ports": request.ports, "aggressive": request.aggressive, "os_detection": request.os_detection}
+    return sse_response(http_request, _recon_producer(request.target, options, user.get("sub")))
+
+@app.post("/api/agents/vulnscan/stream")
+async def run_vuln_scan_stream(
+    request: ActionRequest,
+    http_request: Request,
+    user: Dict = Depends(require_permission("execute_agents"))
+):
+    """Escaneo de vulnerabilidades con progreso en streaming (SSE)."""
+    return sse_response(http_request, _vulnscan_producer(request.target, user.get("sub")))
+
+@app.post("/api/jarvis/stream")
+async def jarvis_stream(
+    request: JarvisStreamRequest,
+    http_request: Request,
+    user: Dict = Depends(get_current_user)
+):
+    """Jarvis Prime con tokens y eventos de agentes en streaming (SSE)."""
+    return sse_response(http_request, _prime_producer(request.message, user.get("sub", "default"), request.use_web_search))
+
 @app.get("/api/agents/status")
 async def get_agents_status(user: Dict = Depends(get_current_user)):
     """Obtiene estado de todos los agentes."""
@@ -379,6 +496,45 @@ async def action_vulnmap_legacy(request: ActionRequest):
 
 # ========== WEBSOCKETS ==========
 
+@app.websocket("/ws/stream")
+async def websocket_run_stream(websocket: WebSocket, token: str):
+    """
+    Variante WebSocket del streaming. Primer mensaje:
+      {"kind": "prime", "message": "..."} | {"kind": "recon" | "vulnscan", "target": "...", "options": {...}}
+    Después se puede enviar {"type": "cancel"} para abortar.
+    """
+    user = auth_system.verify_token(token, "access")
+    if not user:
+        await websocket.close(code=4401)
+        return
+    await websocket.accept()
+    try:
+        request = await websocket.receive_json()
+    except (WebSocketDisconnect, ValueError):
+        return
+
+    kind = request.get("kind", "prime")
+    if kind in ("recon", "vulnscan") and not rbac_manager.has_permission(user.get("role", "viewer"), "execute_agents"):
+        await websocket.send_json({"event": "error", "message": "Permiso 'execute_agents' requerido"})
+        await websocket.close(code=4403)
+        return
+    if kind in ("recon", "vulnscan") and not request.get("target"):
+        await websocket.send_json({"event": "error", "message": "target requerido"})
+        await websocket.close()
+        return
+    if kind == "recon":
+        producer = _recon_producer(request["target"], request.get("options", {}), user.get("sub"))
+    elif kind == "vulnscan":
+        producer = _vulnscan_producer(request["target"], user.get("sub"))
+    else:
+        producer = _prime_producer(request.get("message", ""), user.get("sub", "default"), request.get("use_web_search", False))
+
+    await websocket_stream(websocket, producer)
+    try:
+        await websocket.close()
+    except Exception:
+        pass
+
 @app.websocket("/ws/logs")
 async def websocket_logs(websocket: WebSocket):
     """Stream de logs en tiempo real."""
@@ -420,19 +576,10 @@ async def websocket_agents(websocket: WebSocket):
         await redis_client.close()
 
 # Import Watchers
-from app.watchers.ai_performance_watcher import start_ai_performance_watcher
-from app.watchers.pentest_watcher import start_pentest_watcher
-from app.watchers.system_health_watcher import start_system_health_watcher
-from app.watchers.llm_latency_watcher import start_llm_latency_watcher
-from app.watchers.worker_monitor_watcher import start_worker_monitor_watcher
-from app.watchers.qdrant_monitor_watcher import start_qdrant_monitor_watcher
-from app.watchers.redis_monitor_watcher import start_redis_monitor_watcher
-from app.watchers.orchestrator_monitor_watcher import start_orchestrator_monitor_watcher
-from app.watchers.risk_global_watcher import start_risk_global_watcher
-from app.watchers.continuous_audit_watcher import start_continuous_audit_watcher
-from app.watchers.client_risk_watcher import start_client_risk_watcher
-from app.watchers.asset_risk_watcher import start_asset_risk_watcher
-from app.watchers.auto_remediation_watcher import start_auto_remediation_watcher
+from app.watchers.runtime import watcher_runtime
+from app.watchers.registry import register_default_watchers
+from app.routes import watchers
+app.include_router(watchers.router, prefix="/ai", tags=["Watchers"])
 
 # Import Risk Controller
 from app.risk import risk_controller
@@ -455,24 +602,18 @@ from app.database import init_db
 async def startup_event():
     """Initialize background watchers and database."""
     init_db()
-    # Start watchers as background tasks
-    asyncio.create_task(start_ai_performance_watcher())
-    asyncio.create_task(start_pentest_watcher())
-    asyncio.create_task(start_system_health_watcher())
-    asyncio.create_task(start_llm_latency_watcher())
-    asyncio.create_task(start_worker_monitor_watcher())
-    asyncio.create_task(start_qdrant_monitor_watcher())
-    asyncio.create_task(start_redis_monitor_watcher())
-    asyncio.create_task(start_orchestrator_monitor_watcher())
-    
-    # Risk Watchers
-    asyncio.create_task(start_risk_global_watcher())
-    asyncio.create_task(start_continuous_audit_watcher())
-    asyncio.create_task(start_client_risk_watcher())
-    asyncio.create_task(start_asset_risk_watcher())
-    
-    # Auto-Remediation Watcher
-    asyncio.create_task(start_auto_remediation_watcher())
+    # Watchers run under one runtime (jitter, timeouts, backoff, metrics in /ai/watchers)
+    register_default_watchers(watcher_runtime)
+    watcher_runtime.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Detiene los watchers, vacía los buffers de Qdrant y cierra el pool HTTP hacia Ollama, los canales QGA y los masters SSH."""
+    await watcher_runtime.stop()
+    flush_all_writers()
+    await close_async_ollama()
+    await close_qga_transports()
+    await ssh_pool.close_all()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,127 @@
+"""
+Benchmark del router de intención sobre un corpus etiquetado.
+
+Para cada mensaje indica qué nivel respondió (rules / classifier / llm),
+si acertó la etiqueta y cuánto tardó. Sin --llm, los mensajes que caen al
+nivel LLM solo se cuentan (no se llama a Ollama).
+
+Por defecto el clasificador se evalúa con validación cruzada estratificada
+(--folds): cada mensaje lo clasifica un modelo entrenado sin él, así que el
+acierto es sobre datos no vistos. Con --folds 0 se usa el modelo de --model
+tal cual; si ese modelo se entrenó con el mismo corpus (train_intent_router.py
+--extra), el acierto del nivel classifier es de entrenamiento.
+
+Uso:
+  python scripts/benchmark_intent_router.py --corpus scripts/intent_corpus.jsonl
+  python scripts/benchmark_intent_router.py --folds 0 --model /tmp/intent_model.npz --llm
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from collections import Counter, defaultdict
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.intent_router import (
+    INTENT_MODEL_PATH,
+    TIER_LLM,
+    IntentRouter,
+    label_of,
+    stratified_folds,
+    train_intent_model,
+)
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_corpus.jsonl")
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def fold_routers(corpus, folds, epochs, seed):
+    """(mensaje, router) con el router de cada fold entrenado sin los mensajes que evalúa."""
+    labels = [item["label"] for item in corpus]
+    pairs = []
+    for train_idx, test_idx in stratified_folds(labels, folds, seed):
+        router = IntentRouter(model_path="")
+        router.model = train_intent_model([(corpus[i]["message"], labels[i]) for i in train_idx], epochs=epochs)
+        pairs.extend((corpus[i], router) for i in test_idx)
+    return pairs
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark del router de intención")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--model", default=INTENT_MODEL_PATH, help="Modelo a evaluar con --folds 0")
+    parser.add_argument("--folds", type=int, default=5, help="Folds de validación cruzada (0 = usar --model)")
+    parser.add_argument("--epochs", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--llm", action="store_true", help="Resolver con el LLM los mensajes de baja confianza")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    with open(args.corpus) as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+
+    if args.folds:
+        pairs = fold_routers(corpus, args.folds, args.epochs, args.seed)
+        evaluation = f"validación cruzada, {args.folds} folds"
+    else:
+        router = IntentRouter(model_path=args.model)
+        pairs = [(item, router) for item in corpus]
+        evaluation = f"modelo {args.model}"
+    prime = None
+    if args.llm:
+        from app.jarvis_prime import jarvis_prime as prime
+
+    tiers = Counter()
+    correct = defaultdict(int)
+    latencies = defaultdict(list)
+    model_hits = 0
+    for item, router in pairs:
+        if router.model is not None:
+            model_hits += router.model.predict(item["message"])[0] == item["label"]
+        start = time.perf_counter()
+        analysis = router.route(item["message"])
+        tier = analysis["router_tier"] if analysis else TIER_LLM
+        if analysis is None and prime is not None:
+            analysis = await prime._llm_intent(item["message"])
+        elapsed = (time.perf_counter() - start) * 1000
+
+        predicted = label_of(analysis) if analysis else None
+        tiers[tier] += 1
+        latencies[tier].append(elapsed)
+        if predicted == item["label"]:
+            correct[tier] += 1
+        if args.verbose or (predicted is not None and predicted != item["label"]):
+            print(f"[{tier:<10}] {item['message'][:60]:<60} esperado={item['label']} obtenido={predicted}")
+
+    has_model = any(router.model for _, router in pairs)
+    print(f"\nCorpus: {len(corpus)} mensajes  Clasificador: {evaluation if has_model else 'no'}\n")
+    print(f"{'Nivel':<12} {'Mensajes':<10} {'Cobertura':<10} {'Acierto':<10} {'p50 ms':<10} {'p95 ms':<10}")
+    print("-" * 64)
+    for tier in ("rules", "classifier", TIER_LLM):
+        count = tiers[tier]
+        if not count:
+            continue
+        accuracy = f"{correct[tier] / count:.3f}" if tier != TIER_LLM or prime else "-"
+        print(
+            f"{tier:<12} {count:<10} {count / len(corpus):<10.3f} {accuracy:<10} "
+            f"{statistics.median(latencies[tier]):<10.2f} {percentile(latencies[tier], 95):<10.2f}"
+        )
+    if has_model:
+        print(f"\nAcierto del clasificador sin umbral ({evaluation}): {model_hits / len(corpus):.3f}")
+    print(f"\nMensajes que evitan el LLM: {1 - tiers[TIER_LLM] / len(corpus):.1%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+"""
+Compara recall y latencia entre una colección original y su versión
+cuantizada (<name>_v2, creada por migrate_qdrant_collections.py).
+
+- Toma N vectores de la colección original como consultas.
+- Verdad de referencia: búsqueda exacta (SearchParams(exact=True)) en la original.
+- Mide recall@k y latencias p50/p95 de:
+    original (HNSW, float32), v2 sin rescore, v2 con rescore + oversampling.
+
+Uso:
+  python scripts/benchmark_qdrant_quantization.py --collection cle_articles --queries 50 --k 10
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qdrant_client import QdrantClient
+from qdrant_client.models import QuantizationSearchParams, SearchParams
+
+from app.services.vector_schema import REBUILT_SUFFIX, search_params
+
+QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
+QDRANT_PORT = int(os.getenv("QDRANT_PORT", "6333"))
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run(client, collection, queries, k, params):
+    latencies = []
+    results = []
+    for vector in queries:
+        started = time.perf_counter()
+        hits = client.search(collection_name=collection, query_vector=vector, limit=k, search_params=params)
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append([h.id for h in hits])
+    return results, latencies
+
+
+def recall(truth, found):
+    scores = []
+    for expected, got in zip(truth, found):
+        if expected:
+            scores.append(len(set(expected) & set(got)) / len(expected))
+    return statistics.mean(scores) if scores else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark recall/latencia de colecciones Qdrant cuantizadas")
+    parser.add_argument("--collection", default="jarvis_knowledge_base",
+                        help="Colección original (ejecutar antes de migrate_qdrant_collections.py --swap)")
+    parser.add_argument("--quantized", default=None, help=f"Por defecto <collection>{REBUILT_SUFFIX}")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--quantization", choices=["scalar", "binary"], default=None)
+    args = parser.parse_args()
+
+    client = QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
+    original = args.collection
+    quantized = args.quantized or f"{original}{REBUILT_SUFFIX}"
+
+    records, _ = client.scroll(collection_name=original, limit=args.queries, with_vectors=True, with_payload=False)
+    queries = [r.vector for r in records if r.vector]
+    if not queries:
+        print(f"'{original}' no tiene puntos con vectores.")
+        sys.exit(1)
+
+    print(f"\n=== Benchmark cuantización: {original} vs {quantized} ===")
+    print(f"Consultas: {len(queries)} | k={args.k}\n")
+
+    truth, exact_lat = run(client, original, queries, args.k, SearchParams(exact=True))
+
+    variants = [
+        ("original (float32)", original, None),
+        ("v2 sin rescore", quantized, SearchParams(quantization=QuantizationSearchParams(ignore=False, rescore=False))),
+        ("v2 rescore+oversampling", quantized, search_params(args.quantization)),
+    ]
+
+    print(f"{'Variante':<28} {'Recall@k':<10} {'p50 ms':<10} {'p95 ms':<10}")
+    print("-" * 60)
+    print(f"{'exacta (referencia)':<28} {1.0:<10.3f} {statistics.median(exact_lat):<10.1f} {percentile(exact_lat, 95):<10.1f}")
+    for label, collection, params in variants:
+        try:
+            found, latencies = run(client, collection, queries, args.k, params)
+        except Exception as e:
+            print(f"{label:<28} ERROR: {e}")
+            continue
+        print(f"{label:<28} {recall(truth, found):<10.3f} {statistics.median(latencies):<10.1f} {percentile(latencies, 95):<10.1f}")
+
+    for name in (original, quantized):
+        try:
+            info = client.get_collection(name)
+            print(f"\n{name}: {info.points_count} puntos, config={info.config.params.vectors}, "
+                  f"quantization={info.config.quantization_config}")
+        except Exception as e:
+            print(f"\n{name}: {e}")
+
+
+if __name__ == "__main__":
+    main()
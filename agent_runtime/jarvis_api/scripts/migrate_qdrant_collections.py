@@ -0,0 +1,163 @@
+"""
+Reconstruye las colecciones Qdrant de 4096 dimensiones con la configuración de
+app/services/vector_schema.py (cuantización, vectores en disco, índices de
+payload) y saca el texto largo de los payloads al DocumentStore local.
+
+Para cada colección <name>:
+  1. crea <name>_v2 con la nueva configuración,
+  2. copia los puntos (vectores incluidos) por lotes, con el payload reducido,
+  3. comprueba que el número de puntos coincide,
+  4. con --swap: borra <name> y crea el alias <name> -> <name>_v2, de modo que
+     el código sigue usando el mismo nombre.
+
+Uso:
+  python scripts/migrate_qdrant_collections.py --dry-run
+  python scripts/migrate_qdrant_collections.py --collections cle_articles --quantization binary
+  python scripts/migrate_qdrant_collections.py --swap
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qdrant_client import QdrantClient
+from qdrant_client.models import CreateAlias, CreateAliasOperation, PointStruct
+
+from app.services.document_store import get_document_store, slim_payload
+from app.services.vector_schema import REBUILT_SUFFIX, collection_kwargs, ensure_payload_indexes
+
+QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
+QDRANT_PORT = int(os.getenv("QDRANT_PORT", "6333"))
+
+DEFAULT_COLLECTIONS = [
+    "jarvis_knowledge_base",
+    "jarvis_chat_memory",
+    "cle_articles",
+    "cle_github",
+    "cle_youtube",
+]
+
+
+def existing_names(client):
+    collections = {c.name for c in client.get_collections().collections}
+    aliases = {a.alias_name: a.collection_name for a in client.get_aliases().aliases}
+    return collections, aliases
+
+
+def vector_size_of(client, name):
+    vectors = client.get_collection(name).config.params.vectors
+    return vectors.size
+
+
+def migrate_collection(client, store, name, quantization, batch, dry_run):
+    target = f"{name}{REBUILT_SUFFIX}"
+    source_info = client.get_collection(name)
+    total = source_info.points_count or 0
+    size = vector_size_of(client, name)
+    print(f"\n=== {name} -> {target} ===")
+    print(f"Puntos: {total} | Dimensión: {size} | Cuantización: {quantization or 'por defecto'}")
+
+    if dry_run:
+        print("[dry-run] No se crea nada.")
+        return True
+
+    collections, _ = existing_names(client)
+    if target in collections:
+        print(f"'{target}' ya existe: se reutiliza (los puntos se sobrescriben por id).")
+    else:
+        client.create_collection(collection_name=target, **collection_kwargs(size, quantization))
+        ensure_payload_indexes(client, target)
+        print(f"Creada '{target}'")
+
+    copied = moved = 0
+    offset = None
+    started = time.time()
+    while True:
+        records, offset = client.scroll(
+            collection_name=name,
+            limit=batch,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        if not records:
+            break
+        points = []
+        documents = {}
+        for record in records:
+            payload, document = slim_payload(name, record.id, record.payload or {})
+            if document:
+                documents[str(record.id)] = document
+            points.append(PointStruct(id=record.id, vector=record.vector, payload=payload))
+        if store is not None:
+            store.put_many(name, documents)
+            moved += len(documents)
+        else:
+            # Sin almacén el texto se queda en el payload
+            points = [PointStruct(id=r.id, vector=r.vector, payload=r.payload) for r in records]
+        client.upsert(collection_name=target, points=points, wait=True)
+        copied += len(points)
+        print(f"  {copied}/{total} puntos copiados ({moved} documentos al almacén local)")
+        if offset is None:
+            break
+
+    final = client.count(collection_name=target, exact=True).count
+    ok = final >= total
+    print(f"Verificación: origen={total} destino={final} -> {'OK' if ok else 'FALLO'} ({time.time() - started:.1f}s)")
+    return ok
+
+
+def swap(client, name):
+    target = f"{name}{REBUILT_SUFFIX}"
+    client.delete_collection(collection_name=name)
+    client.update_collection_aliases(
+        change_aliases_operations=[
+            CreateAliasOperation(create_alias=CreateAlias(collection_name=target, alias_name=name))
+        ]
+    )
+    print(f"Alias '{name}' -> '{target}' creado; colección original eliminada.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migra colecciones Qdrant a vectores cuantizados y payloads reducidos")
+    parser.add_argument("--collections", nargs="+", default=DEFAULT_COLLECTIONS)
+    parser.add_argument("--quantization", choices=["scalar", "binary", "none"], default=None,
+                        help="Por defecto QDRANT_QUANTIZATION (scalar)")
+    parser.add_argument("--batch", type=int, default=256)
+    parser.add_argument("--swap", action="store_true",
+                        help="Tras verificar, borra la colección original y crea el alias")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    client = QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
+    store = get_document_store()
+    if store is None:
+        print("AVISO: no se pudo abrir el almacén de documentos; el texto se mantiene en el payload.")
+
+    collections, aliases = existing_names(client)
+    failed = []
+    for name in args.collections:
+        if name in aliases:
+            print(f"\n'{name}' ya es un alias de '{aliases[name]}': migrada, se omite.")
+            continue
+        if name not in collections:
+            print(f"\n'{name}' no existe, se omite.")
+            continue
+        ok = migrate_collection(client, store, name, args.quantization, args.batch, args.dry_run)
+        if not ok:
+            failed.append(name)
+            continue
+        if args.swap and not args.dry_run:
+            swap(client, name)
+
+    if failed:
+        print(f"\nColecciones con recuento distinto (no se hizo swap): {', '.join(failed)}")
+        sys.exit(1)
+    print("\nMigración completada.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Entrena el clasificador local (TF-IDF + regresión logística) del router de
+intención con las intenciones registradas por Jarvis Prime (INTENT_LOG_PATH).
+
+El router recarga el modelo automáticamente cuando cambia el fichero.
+
+Uso:
+  python scripts/train_intent_router.py
+  python scripts/train_intent_router.py --extra scripts/intent_corpus.jsonl --tiers llm
+"""
+
+import argparse
+import json
+import os
+import sys
+from collections import Counter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.intent_router import (
+    INTENT_LOG_PATH,
+    INTENT_MIN_TRAINING_SAMPLES,
+    INTENT_MODEL_PATH,
+    IntentLog,
+    stratified_folds,
+    train_intent_model,
+)
+
+
+def load_corpus(path):
+    samples = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                samples.append((item["message"], item["label"]))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entrena el clasificador de intención")
+    parser.add_argument("--log", default=INTENT_LOG_PATH, help="Registro de intenciones (SQLite)")
+    parser.add_argument("--tiers", default="rules,llm", help="Niveles cuyas decisiones se usan como etiqueta")
+    parser.add_argument("--extra", action="append", default=[], help="Corpus JSONL etiquetado adicional")
+    parser.add_argument("--output", default=INTENT_MODEL_PATH)
+    parser.add_argument("--epochs", type=int, default=300)
+    parser.add_argument("--folds", type=int, default=5, help="Folds de validación cruzada para el acierto (0 = no evaluar)")
+    args = parser.parse_args()
+
+    samples = []
+    if os.path.exists(args.log):
+        samples.extend(IntentLog(args.log).samples(tuple(args.tiers.split(","))))
+    for path in args.extra:
+        samples.extend(load_corpus(path))
+
+    if len(samples) < INTENT_MIN_TRAINING_SAMPLES:
+        print(f"Solo {len(samples)} ejemplos (mínimo {INTENT_MIN_TRAINING_SAMPLES}); no se entrena.")
+        sys.exit(1)
+
+    # Acierto sobre mensajes no vistos: cada fold se evalúa con un modelo entrenado sin él
+    held_out_hits = 0
+    if args.folds:
+        labels = [label for _, label in samples]
+        for train_idx, test_idx in stratified_folds(labels, args.folds):
+            fold_model = train_intent_model([samples[i] for i in train_idx], epochs=args.epochs)
+            held_out_hits += sum(1 for i in test_idx if fold_model.predict(samples[i][0])[0] == labels[i])
+
+    model = train_intent_model(samples, epochs=args.epochs)
+    hits = sum(1 for text, label in samples if model.predict(text)[0] == label)
+    model.save(args.output)
+
+    print(f"Ejemplos: {len(samples)}  Vocabulario: {len(model.vocabulary)}")
+    for label, count in Counter(label for _, label in samples).most_common():
+        print(f"  {label:<28} {count}")
+    if args.folds:
+        print(f"Acierto en validación cruzada ({args.folds} folds): {held_out_hits / len(samples):.3f}")
+    print(f"Acierto sobre entrenamiento (optimista): {hits / len(samples):.3f}")
+    print(f"Modelo guardado en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Verificación del ejecutor de planes de KaliRunner.
+
+    python scripts/verify_kali_plan.py
+
+Usa un LLM y un run_action de sustitución (sin Kali ni Ollama) sobre el
+servicio srv_network_scan_complete:
+1. Etapas independientes en paralelo y dependientes después.
+2. Informe map-reduce: summary.md por etapa, report_ai.md del plan y ningún
+   prompt por encima del presupuesto.
+3. Caché de herramientas: la segunda ejecución no relanza nada.
+4. Si una etapa falla, las dependientes se omiten.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+WORKDIR = tempfile.mkdtemp(prefix="kaliplan_")
+os.environ["TOOL_CACHE_PATH"] = os.path.join(WORKDIR, "tool_cache.sqlite3")
+os.environ["ARTIFACT_STORE_DIR"] = os.path.join(WORKDIR, "artifacts")
+os.environ["KALI_REPORT_CHUNK_TOKENS"] = "500"
+os.environ["KALI_REPORT_CONTEXT_TOKENS"] = "1500"
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.routes.catalog import MOCK_ACTIONS, MOCK_SERVICES
+from app.services.conversation_memory import estimate_tokens
+from app.services.kali_plan import steps_from_service
+from app.services.kali_runner import KaliRunner
+
+STEP_SECONDS = 0.2
+
+
+def check(condition, message):
+    print(f"  [{'OK' if condition else 'FAIL'}] {message}")
+    if not condition:
+        raise SystemExit(1)
+
+
+class FakeLLM:
+    def __init__(self):
+        self.prompts = []
+
+    async def achat(self, messages, model, priority):
+        prompt = messages[0]["content"]
+        self.prompts.append(prompt)
+        await asyncio.sleep(0.005)
+        return {"message": {"content": f"- resumen de {len(prompt)} caracteres"}}
+
+
+def build_runner():
+    runner = KaliRunner()
+    runner.mock_mode = False
+    runner.reports_base_path = os.path.join(WORKDIR, "reports")
+    runner.ollama_client = FakeLLM()
+    runner.timeline = []
+    runner.failing = set()
+    runner.ingested = []
+
+    async def ingest(execution_id, ai_report):
+        runner.ingested.append(execution_id)
+
+    async def run_action(action_id, script_path, target, params=None, node_config=None, tenant_slug="global"):
+        execution_id = f"{action_id}-{len(runner.timeline)}"
+        report_path = os.path.join(runner.reports_base_path, tenant_slug, action_id, execution_id)
+        os.makedirs(report_path)
+        runner.timeline.append(("start", action_id, time.monotonic()))
+        await asyncio.sleep(STEP_SECONDS)
+        runner.timeline.append(("end", action_id, time.monotonic()))
+        stdout = "\n".join(f"10.0.0.{i} 22/tcp open ssh OpenSSH 8.{i % 10}" for i in range(400))
+        status = "failed" if action_id in runner.failing else "completed"
+        await runner._generate_ai_report(report_path, execution_id, action_id, target, status, stdout, "")
+        return {"execution_id": execution_id, "status": status, "stdout": stdout, "stderr": "", "report_path": report_path}
+
+    runner._ingest_report = ingest
+    runner.run_action = run_action
+    return runner
+
+
+async def verify():
+    runner = build_runner()
+    service = next(s for s in MOCK_SERVICES if s.id == "srv_network_scan_complete")
+    steps = steps_from_service(service, MOCK_ACTIONS)
+
+    print("1. Parallel stages")
+    result = await runner.run_plan(service.id, service.name, steps, "10.0.0.0/24")
+    check(result["status"] == "completed", f"plan completed ({[s['status'] for s in result['steps']]})")
+    starts = {a: t for kind, a, t in runner.timeline if kind == "start"}
+    ends = {a: t for kind, a, t in runner.timeline if kind == "end"}
+    check(starts["act_82"] < ends["act_81"], "OS detection and vuln scan ran concurrently")
+    check(starts["act_81"] >= ends["act_80"], "both waited for discovery")
+    check(starts["act_83"] >= max(ends["act_81"], ends["act_82"]), "exploit research waited for every earlier stage")
+
+    print("2. Map-reduce report")
+    check(all(os.path.exists(os.path.join(s["report_path"], "summary.md")) for s in result["steps"]), "summary.md per stage")
+    check(not any(os.path.exists(os.path.join(s["report_path"], "report_ai.md")) for s in result["steps"]),
+          "no per-stage executive report")
+    check(os.path.exists(os.path.join(result["report_path"], "report_ai.md")), "plan report_ai.md written")
+    with open(os.path.join(result["report_path"], "metadata.json")) as f:
+        metadata = json.load(f)
+    check(metadata["action_name"] == service.name and len(metadata["steps"]) == 4, "plan metadata.json lists the stages")
+    largest = max(estimate_tokens(p) for p in runner.ollama_client.prompts)
+    check(largest <= 1500, f"{len(runner.ollama_client.prompts)} prompts, largest {largest} tokens (budget 1500)")
+    check(runner.ingested == [result["execution_id"]], "only the plan report is ingested")
+
+    print("3. Tool result cache")
+    launched = len(runner.timeline)
+    cached = await runner.run_plan(service.id, service.name, steps, "10.0.0.0/24")
+    check(len(runner.timeline) == launched and all(s["cached"] for s in cached["steps"]), "second run served from cache")
+    await runner.run_plan(service.id, service.name, steps, "10.0.0.0/24", use_cache=False)
+    check(len(runner.timeline) == launched + 8, "use_cache=False runs every tool again")
+    check(runner.tool_cache.stats()["hits"] == 4, f"cache stats ({runner.tool_cache.stats()})")
+    await runner.run_plan(service.id, service.name, steps, "10.0.0.0/24", tenant_slug="acme")
+    check(len(runner.timeline) == launched + 16, "another tenant never gets cached results")
+    await runner.run_plan(service.id, service.name, steps, "10.0.0.0/24", node_config={"id": "node-2", "host": "10.9.9.9"})
+    check(len(runner.timeline) == launched + 24, "another node never gets cached results")
+
+    print("4. Failed dependencies")
+    runner.failing.add("act_80")
+    failed = await runner.run_plan(service.id, service.name, steps, "10.0.0.1", use_cache=False)
+    check([s["status"] for s in failed["steps"]] == ["failed", "skipped", "skipped", "skipped"],
+          f"dependents skipped ({[s['status'] for s in failed['steps']]})")
+    print("Ejecutor de planes verificado.")
+
+
+if __name__ == "__main__":
+    asyncio.run(verify())
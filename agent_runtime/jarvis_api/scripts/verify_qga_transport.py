@@ -0,0 +1,194 @@
+"""
+Verificación del transporte QGA contra un guest agent falso.
+
+FakeGuestAgent escucha en un socket unix y habla el protocolo JSON de QGA
+(guest-sync-delimited, guest-exec/-status, guest-file-*) ejecutando los
+comandos en local. Sirve para probar QGASocketTransport sin VM:
+
+    python scripts/verify_qga_transport.py
+"""
+
+import asyncio
+import base64
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.qga_transport import QGA_LINE_LIMIT, QGAError, QGASocketTransport
+
+
+class FakeGuestAgent:
+    """Guest agent mínimo: un proceso local por guest-exec, ficheros reales."""
+
+    def __init__(self, path: str, reorder: bool = False):
+        self.path = path
+        # reorder: responde las peticiones lentas después que las rápidas (prueba los ids)
+        self.reorder = reorder
+        self.server = None
+        self.requests = 0
+        self.connections = 0
+        self._procs = {}
+        self._files = {}
+        self._next_handle = 1
+        self._writers = []
+
+    async def start(self):
+        self.server = await asyncio.start_unix_server(self._client, path=self.path, limit=QGA_LINE_LIMIT)
+
+    async def stop(self):
+        self.drop_clients()
+        self.server.close()
+        await self.server.wait_closed()
+        await asyncio.sleep(0.05)
+
+    def drop_clients(self):
+        for writer in self._writers:
+            writer.close()
+
+    async def _client(self, reader, writer):
+        self.connections += 1
+        self._writers.append(writer)
+        tasks = []
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.lstrip(b"\xff").strip()
+                if not line:
+                    continue
+                request = json.loads(line)
+                self.requests += 1
+                if request["execute"] == "guest-sync-delimited":
+                    writer.write(b"\xff" + json.dumps({"return": request["arguments"]["id"]}).encode() + b"\n")
+                    continue
+                if self.reorder:
+                    tasks.append(asyncio.create_task(self._answer(request, writer)))
+                else:
+                    await self._answer(request, writer)
+        finally:
+            await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+
+    async def _answer(self, request, writer):
+        try:
+            response = {"return": await self._dispatch(request["execute"], request.get("arguments", {}))}
+        except Exception as e:
+            response = {"error": {"class": "GenericError", "desc": str(e)}}
+        if "id" in request:
+            response["id"] = request["id"]
+        writer.write(json.dumps(response).encode() + b"\n")
+
+    async def _dispatch(self, command, args):
+        if command == "guest-ping":
+            if args.get("delay"):
+                await asyncio.sleep(args["delay"])
+            return {}
+        if command == "guest-exec":
+            proc = subprocess.Popen([args["path"]] + args.get("arg", []), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            self._procs[proc.pid] = proc
+            return {"pid": proc.pid}
+        if command == "guest-exec-status":
+            proc = self._procs[args["pid"]]
+            if proc.poll() is None:
+                return {"exited": False}
+            out, err = proc.communicate()
+            return {
+                "exited": True,
+                "exitcode": proc.returncode,
+                "out-data": base64.b64encode(out).decode(),
+                "err-data": base64.b64encode(err).decode(),
+            }
+        if command == "guest-file-open":
+            handle = self._next_handle
+            self._next_handle += 1
+            mode = args.get("mode", "r")
+            self._files[handle] = open(args["path"], mode + "b" if "b" not in mode else mode)
+            return handle
+        if command == "guest-file-write":
+            data = base64.b64decode(args["buf-b64"])
+            self._files[args["handle"]].write(data)
+            return {"count": len(data), "eof": False}
+        if command == "guest-file-read":
+            data = self._files[args["handle"]].read(args.get("count", 4096))
+            return {"count": len(data), "buf-b64": base64.b64encode(data).decode(), "eof": len(data) == 0}
+        if command == "guest-file-seek":
+            f = self._files[args["handle"]]
+            f.seek(args["offset"], {"set": 0, "cur": 1, "end": 2}.get(args.get("whence"), 0))
+            return {"position": f.tell(), "eof": False}
+        if command == "guest-file-close":
+            self._files.pop(args["handle"]).close()
+            return {}
+        raise ValueError(f"The command {command} has not been found")
+
+
+def check(condition, message):
+    print(f"  [{'OK' if condition else 'FAIL'}] {message}")
+    if not condition:
+        raise SystemExit(1)
+
+
+async def verify():
+    workdir = tempfile.mkdtemp(prefix="qga_")
+    agent = FakeGuestAgent(os.path.join(workdir, "qga.sock"), reorder=True)
+    await agent.start()
+    qga = QGASocketTransport(agent.path)
+
+    print("1. Exec + status polling")
+    start = time.monotonic()
+    result = await qga.run("/bin/sh", ["-c", "echo hola; echo err >&2; exit 3"], timeout=10)
+    elapsed = time.monotonic() - start
+    check(result == {"exitcode": 3, "stdout": "hola\n", "stderr": "err\n"}, f"exit code and output ({result})")
+    check(elapsed < 1.0, f"short tool collected in {elapsed * 1000:.0f} ms (backoff, no 2 s sleep)")
+
+    print("2. Pipelined requests on one connection")
+    start = time.monotonic()
+    slow = asyncio.create_task(qga.execute("guest-ping", {"delay": 0.5}))
+    await asyncio.sleep(0.05)
+    await qga.execute("guest-ping")
+    check(not slow.done(), "fast reply routed by id while the slow one is pending")
+    await slow
+    await asyncio.gather(*(qga.execute("guest-ping") for _ in range(50)))
+    check(agent.connections == 1, f"single connection reused ({agent.connections})")
+    check(time.monotonic() - start < 2.0, "50 concurrent commands without per-call handshake")
+
+    print("3. Files")
+    payload = os.urandom(3 * 1024 * 1024 + 17)
+    remote = os.path.join(workdir, "artifact.bin")
+    await qga.file_write(remote, payload)
+    check(await qga.file_read(remote) == payload, "chunked write/read round trip")
+    tail = b"".join([chunk async for chunk in qga.file_stream(remote, offset=len(payload) - 100, chunk_size=64)])
+    check(tail == payload[-100:], "file_stream resumes from an offset")
+
+    print("4. Errors and timeouts")
+    try:
+        await qga.execute("guest-nope")
+        check(False, "error response raises QGAError")
+    except QGAError as e:
+        check("has not been found" in str(e), f"error response raises QGAError ({e})")
+    pid = await qga.guest_exec("/bin/sleep", ["5"])
+    try:
+        await qga.wait_exec(pid, timeout=0.3)
+        check(False, "wait_exec timeout")
+    except asyncio.TimeoutError:
+        check(True, "wait_exec raises TimeoutError")
+    await qga.guest_exec("/bin/kill", ["-9", str(pid)], capture_output=False)
+
+    print("5. Reconnect after the agent drops the connection")
+    agent.drop_clients()
+    await asyncio.sleep(0.05)
+    check((await qga.run("/bin/true", [], timeout=5))["exitcode"] == 0, "transport reconnects on next command")
+    check(agent.connections == 2, "one new connection after the drop")
+
+    await qga.close()
+    await agent.stop()
+    print("Transporte QGA verificado.")
+
+
+if __name__ == "__main__":
+    asyncio.run(verify())
@@ -0,0 +1,102 @@
+"""
+Verificación del cálculo de riesgo por lotes (RiskService.recalculate_all).
+
+    python scripts/verify_risk_batch.py
+
+Usa una base SQLite temporal (no toca DATABASE_URL real):
+1. Una sola consulta agrupada sobre system_alerts para todas las entidades.
+2. Puntuaciones iguales al cálculo por entidad (pesos por severidad).
+3. Entidades sin alertas activas vuelven a 0; sin filas duplicadas.
+4. Historial real: tendencia y predicciones a partir de risk_history.
+"""
+
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+WORKDIR = tempfile.mkdtemp(prefix="riskbatch_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORKDIR, 'risk.db')}"
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+from app.database import Base, SessionLocal, engine
+from app.models.alerts import SystemAlert
+from app.risk.risk_model import RiskHistory, RiskScore
+from app.risk.risk_service import RiskService
+
+CLIENTS = 500
+SEVERITIES = ["critical", "high", "medium", "low"]
+
+
+def check(condition, message):
+    print(f"  [{'OK' if condition else 'FAIL'}] {message}")
+    if not condition:
+        raise SystemExit(1)
+
+
+def seed(db):
+    now = datetime.now(timezone.utc)
+    alerts = []
+    for c in range(CLIENTS):
+        for k in range(c % 5):
+            alerts.append(SystemAlert(
+                type="PENTEST", severity=SEVERITIES[k], status="open", title="finding",
+                client_id=f"client-{c}", asset_id=f"asset-{c % 40}", created_at=now - timedelta(days=3 * k),
+            ))
+    alerts.append(SystemAlert(type="PENTEST", severity="critical", status="resolved", title="fixed", client_id="client-fixed"))
+    db.add_all(alerts)
+    db.add(RiskScore(client_id="client-fixed", score_actual=80.0))
+    # Rising daily history for client-4
+    for day in range(1, 6):
+        db.add(RiskHistory(entity_type="client", entity_id="client-4", score=10.0 * day, category="low",
+                           recorded_at=now - timedelta(days=6 - day)))
+    db.commit()
+
+
+def verify():
+    Base.metadata.create_all(engine, tables=[SystemAlert.__table__, RiskScore.__table__, RiskHistory.__table__])
+    db = SessionLocal()
+    seed(db)
+    service = RiskService(db)
+
+    print("1. Batch recalculation")
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+    start = time.perf_counter()
+    updated = service.recalculate_all()
+    elapsed = time.perf_counter() - start
+    alert_queries = sum(1 for s in statements if "FROM system_alerts" in s)
+    check(alert_queries == 1, f"one grouped alert query ({alert_queries})")
+    check(updated["client"] == CLIENTS * 4 // 5 + 1, f"all entities scored ({updated}) in {elapsed:.3f}s with {len(statements)} statements")
+
+    print("2. Scores")
+    expected = {1: 40.0, 2: 60.0, 3: 70.0, 4: 72.0}
+    check(all(service.get_risk_score(client_id=f"client-{c}").score_actual == expected[c] for c in expected),
+          "severity-weighted sums match the per-entity formula")
+    risk = service.get_risk_score(client_id="client-4")
+    check(risk.category == "high" and risk.risk_metadata["active_alerts"]["low"] == 1, f"category and aggregates ({risk.risk_metadata})")
+    check(risk.risk_metadata["recency_weighted_score"] < risk.score_actual, "older alerts weigh less in the recency score")
+    check(service.get_risk_score(id="global").score_actual == 100.0, "global risk over all alerts")
+
+    print("3. Upsert")
+    check(service.get_risk_score(client_id="client-fixed").score_actual == 0.0, "entity without active alerts back to 0")
+    service.recalculate_all()
+    check(db.query(RiskScore).filter(RiskScore.client_id == "client-4").count() == 1, "no duplicated risk rows")
+    single = service.calculate_and_save_risk("client", "client-3")
+    check(single.score_actual == 70.0, "single-entity path uses the same engine")
+
+    print("4. History")
+    check(risk.trend == "up" and risk.risk_metadata["history_points"] == 5, f"trend from real history ({risk.trend})")
+    points = service.get_risk_history("client", "client-4")
+    check([p["score"] for p in points][:5] == [10.0, 20.0, 30.0, 40.0, 50.0] and len(points) == 7,
+          f"history points recorded ({len(points)})")
+    db.close()
+    print("Riesgo por lotes verificado.")
+
+
+if __name__ == "__main__":
+    verify()
@@ -0,0 +1,177 @@
+"""
+Verificación del pool SSH y de la cola por nodo de KaliRunner.
+
+    python scripts/verify_ssh_pool.py
+
+1. NodeExecutionPool: turnos justos entre tenants, cancelaciones y métricas.
+2. Multiplexado: si KALI_SSH_TEST_HOST está definido (p.ej. un sshd local con
+   clave en ~/.ssh: KALI_SSH_TEST_HOST=localhost KALI_SSH_TEST_USER=$USER) se
+   usa ssh real; si no, un ssh/scp de sustitución que emula ControlMaster
+   (socket de control = fichero) y ejecuta los comandos en local.
+"""
+
+import asyncio
+import os
+import stat
+import sys
+import tempfile
+import time
+
+WORKDIR = tempfile.mkdtemp(prefix="sshpool_")
+TEST_HOST = os.getenv("KALI_SSH_TEST_HOST")
+TEST_USER = os.getenv("KALI_SSH_TEST_USER", os.getenv("USER", "root"))
+
+FAKE_SSH = r'''#!/usr/bin/env python3
+import os, shutil, subprocess, sys
+args, opts, flags, rest = sys.argv[1:], {}, set(), []
+scp = os.path.basename(sys.argv[0]) == "scp"
+i = 0
+while i < len(args):
+    a = args[i]
+    if a in ("-o", "-i", "-O", "-p"):
+        if a == "-o":
+            k, v = args[i + 1].split("=", 1)
+            opts[k] = v
+        elif a == "-O":
+            opts["_O"] = args[i + 1]
+        i += 2
+        continue
+    if a.startswith("-") and not rest:
+        flags.add(a)
+    else:
+        rest.append(a)
+    i += 1
+path = opts.get("ControlPath")
+if "_O" in opts:
+    if opts["_O"] == "check":
+        sys.exit(0 if path and os.path.exists(path) else 255)
+    if path and os.path.exists(path):
+        os.remove(path)
+    sys.exit(0)
+with open(os.environ["FAKE_SSH_LOG"], "a") as log:
+    if "-M" in flags:
+        open(path, "w").close()
+        log.write("master\n")
+        sys.exit(0)
+    log.write(("mux" if path and os.path.exists(path) else "direct") + "\n")
+if scp:
+    src, dest = (p.split(":", 1)[-1] for p in rest)
+    shutil.copy(src, dest)
+    sys.exit(0)
+sys.exit(subprocess.call(["sh", "-c", rest[1]]))
+'''
+
+if not TEST_HOST:
+    bindir = os.path.join(WORKDIR, "bin")
+    os.makedirs(bindir)
+    for name in ("ssh", "scp"):
+        path = os.path.join(bindir, name)
+        with open(path, "w") as f:
+            f.write(FAKE_SSH)
+        os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    os.environ["KALI_SSH_BINARY"] = os.path.join(bindir, "ssh")
+    os.environ["KALI_SCP_BINARY"] = os.path.join(bindir, "scp")
+    os.environ["FAKE_SSH_LOG"] = os.path.join(WORKDIR, "ssh.log")
+
+os.environ["KALI_SSH_CONTROL_DIR"] = os.path.join(WORKDIR, "ctl")
+os.environ["ARTIFACT_STORE_DIR"] = os.path.join(WORKDIR, "artifacts")
+os.environ["KALI_NODE_CONCURRENCY"] = "node-a=2"
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.kali_runner import KaliRunner
+from app.services.ssh_pool import NodeExecutionPool
+
+
+def check(condition, message):
+    print(f"  [{'OK' if condition else 'FAIL'}] {message}")
+    if not condition:
+        raise SystemExit(1)
+
+
+async def verify_node_pool():
+    print("1. Node execution pool")
+    pool = NodeExecutionPool(limits={"kali": 1})
+    order = []
+
+    async def job(client, n):
+        async with pool.slot("kali", client):
+            order.append(f"{client}{n}")
+            await asyncio.sleep(0.02)
+
+    # tenant-a encola 6 ejecuciones antes de que llegue tenant-b
+    tasks = [asyncio.create_task(job("a", i)) for i in range(6)]
+    await asyncio.sleep(0)
+    tasks += [asyncio.create_task(job("b", i)) for i in range(2)]
+    await asyncio.sleep(0.01)
+    stats = pool.stats()["kali"]
+    check(stats["active"] == 1 and stats["queue_depth"] == 7, f"depth and active reported ({stats['active']}/{stats['queue_depth']})")
+    await asyncio.gather(*tasks)
+    check(order[:5] == ["a0", "a1", "b0", "a2", "b1"], f"round-robin between tenants ({order})")
+    stats = pool.stats()["kali"]
+    check(stats["completed"] == 8 and stats["wait_seconds"]["max"] > 0.1, f"wait-time metrics ({stats['wait_seconds']})")
+
+    blocker = asyncio.create_task(job("a", 9))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(job("b", 9))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await asyncio.gather(blocker, waiter, return_exceptions=True)
+    stats = pool.stats()["kali"]
+    check(stats["active"] == 0 and stats["queue_depth"] == 0, "cancelled waiter leaves no slot or queue entry behind")
+
+
+async def verify_multiplexing():
+    print("2. SSH multiplexing through KaliRunner" + ("" if TEST_HOST else " (stand-in ssh)"))
+    host = TEST_HOST or "node-a"
+    runner = KaliRunner(host=host, user=TEST_USER)
+    runner.mock_mode = False
+    runner.reports_base_path = os.path.join(WORKDIR, "reports")
+
+    async def no_report(**kwargs):
+        pass
+
+    runner._generate_ai_report = no_report
+
+    script = os.path.join(WORKDIR, "scan.sh")
+    with open(script, "w") as f:
+        f.write('#!/bin/sh\nmkdir -p "$2"\necho "scan $1" > "$2/scan_results.txt"\nsleep 0.2\necho done\n')
+
+    node = {"host": host, "user": TEST_USER}
+    start = time.monotonic()
+    results = await asyncio.gather(*(
+        runner.run_script(
+            action_id="verify",
+            script_path=script,
+            args=[f"10.0.0.{i}", f"/tmp/sshpool_out_{os.getpid()}_{i}"],
+            tenant_slug=tenant,
+            node_config=node,
+            timeout_seconds=30,
+            remote_output_dir=f"/tmp/sshpool_out_{os.getpid()}_{i}",
+        )
+        for i, tenant in enumerate(["a", "a", "a", "b"])
+    ))
+    elapsed = time.monotonic() - start
+    check(all(r["status"] == "completed" for r in results), f"all executions completed ({[r['status'] for r in results]})")
+    check(all(r["stdout"] == "done" for r in results), "stdout returned")
+
+    stats = runner.node_pool.stats()[host]
+    check(stats["completed"] == 4 and stats["active"] == 0, f"node queue drained ({stats})")
+    if not TEST_HOST:
+        check(elapsed > 0.4, f"node-a limited to 2 concurrent executions ({elapsed:.2f}s)")
+        with open(os.environ["FAKE_SSH_LOG"]) as f:
+            calls = f.read().split()
+        check(calls.count("master") == 1, f"one master connection for the node ({calls.count('master')})")
+        check("direct" not in calls, f"every ssh/scp reused the master ({len(calls) - 1} multiplexed calls)")
+    check(len(runner.ssh_pool.stats()["masters"]) == 1, f"master tracked ({runner.ssh_pool.stats()['masters']})")
+    await runner.ssh_pool.close_all()
+
+
+async def verify():
+    await verify_node_pool()
+    await verify_multiplexing()
+    print("Pool SSH verificado.")
+
+
+if __name__ == "__main__":
+    asyncio.run(verify())
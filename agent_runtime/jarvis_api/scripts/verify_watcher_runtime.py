@@ -0,0 +1,153 @@
+"""
+Verificación del runtime de watchers.
+
+    python scripts/verify_watcher_runtime.py
+
+Watchers de prueba con intervalos de décimas de segundo:
+1. Arranque escalonado y jitter: no se disparan todos a la vez.
+2. Fallos: el watcher sigue vivo, con backoff exponencial y métricas.
+3. Timeouts en el loop y en el pool de hilos, sin solaparse consigo mismo.
+4. Pausa, reanudación y disparo manual.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.watchers.runtime import WatcherRuntime
+
+
+def check(condition, message):
+    print(f"  [{'OK' if condition else 'FAIL'}] {message}")
+    if not condition:
+        raise SystemExit(1)
+
+
+async def verify_startup_spread():
+    print("1. Startup spread and jitter")
+    runtime = WatcherRuntime(startup_spread=0.5)
+    first_runs = {}
+
+    def make(name):
+        async def work():
+            first_runs.setdefault(name, time.monotonic())
+        return work
+
+    start = time.monotonic()
+    for i in range(10):
+        runtime.register(f"w{i}", make(f"w{i}"), interval=5, jitter=0.2)
+    runtime.start()
+    await asyncio.sleep(0.7)
+    await runtime.stop()
+    offsets = sorted(t - start for t in first_runs.values())
+    check(len(offsets) == 10, "every watcher ran once")
+    check(offsets[-1] - offsets[0] > 0.1, f"first runs spread over {offsets[-1] - offsets[0]:.2f}s")
+    delays = [runtime.watchers["w0"].next_delay() for _ in range(50)]
+    check(min(delays) >= 4.0 and max(delays) <= 6.0 and len(set(delays)) > 1, "interval jittered within +/-20%")
+
+
+async def verify_failures():
+    print("2. Failures and backoff")
+    runtime = WatcherRuntime(startup_spread=0)
+    calls = []
+
+    async def flaky():
+        calls.append(time.monotonic())
+        if len(calls) <= 3:
+            raise RuntimeError("dependency down")
+
+    watcher = runtime.register("flaky", flaky, interval=0.05, jitter=0, max_backoff=0.3)
+    runtime.start()
+    await asyncio.sleep(1.0)
+    await runtime.stop()
+    gaps = [b - a for a, b in zip(calls, calls[1:])]
+    check(len(calls) >= 5, f"watcher survived its failures ({len(calls)} runs)")
+    check(gaps[0] >= 0.09 and gaps[1] >= 0.19 and gaps[2] >= 0.29, f"backoff grows and is capped ({[round(g, 2) for g in gaps[:4]]})")
+    check(gaps[3] < 0.1, "interval back to normal after a success")
+    stats = watcher.stats()
+    check(stats["failures"] == 3 and stats["consecutive_failures"] == 0 and stats["last_error"] is None,
+          f"failure metrics ({stats['failures']} failures, last_success_at set: {stats['last_success_at'] is not None})")
+
+
+async def verify_timeouts():
+    print("3. Timeouts without overlap")
+    runtime = WatcherRuntime(startup_spread=0)
+    running = {"loop": 0, "thread": 0}
+    peak = {"loop": 0, "thread": 0}
+    lock = threading.Lock()
+
+    async def slow_async():
+        running["loop"] += 1
+        peak["loop"] = max(peak["loop"], running["loop"])
+        try:
+            await asyncio.sleep(1)
+        finally:
+            running["loop"] -= 1
+
+    def slow_sync():
+        with lock:
+            running["thread"] += 1
+            peak["thread"] = max(peak["thread"], running["thread"])
+        time.sleep(0.35)
+        with lock:
+            running["thread"] -= 1
+
+    loop_watcher = runtime.register("slow_async", slow_async, interval=0.05, timeout=0.1, jitter=0, max_backoff=0.05)
+    thread_watcher = runtime.register("slow_sync", slow_sync, interval=0.05, timeout=0.1, jitter=0, executor="thread",
+                                      max_backoff=0.05)
+    runtime.start()
+    start = time.monotonic()
+    await asyncio.sleep(0.6)
+    check(time.monotonic() - start < 0.7, "blocking sync watcher does not block the event loop")
+    await runtime.stop()
+    check(loop_watcher.timeouts >= 3, f"loop watcher timed out and was retried ({loop_watcher.timeouts})")
+    check(thread_watcher.timeouts >= 1 and thread_watcher.overlaps_skipped >= 1,
+          f"thread run timed out ({thread_watcher.timeouts}) and later runs waited for it ({thread_watcher.overlaps_skipped} skipped)")
+    check(peak["loop"] == 1 and peak["thread"] == 1, f"never overlapped itself (peaks {peak})")
+
+
+async def verify_controls():
+    print("4. Pause, resume and trigger")
+    runtime = WatcherRuntime(startup_spread=0)
+    calls = []
+    release = asyncio.Event()
+
+    async def work():
+        calls.append(time.monotonic())
+        if len(calls) == 3:
+            await release.wait()
+
+    watcher = runtime.register("ctl", work, interval=0.05, jitter=0)
+    runtime.start()
+    await asyncio.sleep(0.02)
+    runtime.pause("ctl")
+    paused_at = len(calls)
+    await asyncio.sleep(0.3)
+    check(len(calls) == paused_at and watcher.stats()["next_run_at"] is None, f"paused watcher does not run ({paused_at} runs)")
+    check(runtime.trigger("ctl"), "trigger accepted while paused")
+    await asyncio.sleep(0.02)
+    check(len(calls) == paused_at + 1, "triggered run executed once")
+    runtime.resume("ctl")
+    await asyncio.sleep(0.05)
+    check(watcher.running and not runtime.trigger("ctl"), "trigger rejected while the watcher is running")
+    release.set()
+    await asyncio.sleep(0.2)
+    check(len(calls) >= paused_at + 3, f"resumed on its interval ({len(calls)} runs)")
+    await runtime.stop()
+    check(not watcher.stats()["alive"], "stopped")
+
+
+async def verify():
+    await verify_startup_spread()
+    await verify_failures()
+    await verify_timeouts()
+    await verify_controls()
+    print("Runtime de watchers verificado.")
+
+
+if __name__ == "__main__":
+    asyncio.run(verify())
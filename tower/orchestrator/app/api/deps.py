@@ -1,10 +1,11 @@
-from typing import Generator, Optional
+from typing import AsyncGenerator, Generator, Optional
 
 from fastapi import Depends, Header, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, select
 
-from app.db.session import SessionLocal
+from app.db.session import AsyncSessionLocal, SessionLocal
 from app.models.domain import Client
 
 
@@ -19,15 +20,9 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
-def get_client_from_api_key(
-    db: Session = Depends(get_db),
-    api_key: Optional[str] = Header(default=None, alias="x-client-api-key"),
-    authorization: Optional[str] = Header(default=None),
-) -> Client:
+def _agent_key_from_headers(api_key: Optional[str], authorization: Optional[str]) -> str:
     """
-    Obtiene el cliente a partir del header X-Client-API-Key (Agent API Key)
-    O del header Authorization: Bearer <token> (si el agente lo envía).
-    Si no es válido, lanza 401.
+    Extrae la API key del agente de X-Client-API-Key o de Authorization: Bearer <token>.
     """
     token_key = None
     if authorization:
@@ -42,6 +37,38 @@ def get_client_from_api_key(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Falta cabecera X-Client-API-Key o Authorization",
         )
+    return final_key
+
+
+def _auto_registered_client(final_key: str) -> Client:
+    # Auto-Registration Logic (Lab Mode)
+    return Client(
+        name=f"Auto-Client-{final_key[:8]}",
+        agent_api_key=final_key,
+        status="active"
+    )
+
+
+def _ensure_client_active(client: Client) -> Client:
+    if client.status != "active":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Cliente no está activo",
+        )
+    return client
+
+
+def get_client_from_api_key(
+    db: Session = Depends(get_db),
+    api_key: Optional[str] = Header(default=None, alias="x-client-api-key"),
+    authorization: Optional[str] = Header(default=None),
+) -> Client:
+    """
+    Obtiene el cliente a partir del header X-Client-API-Key (Agent API Key)
+    O del header Authorization: Bearer <token> (si el agente lo envía).
+    Si no es válido, lanza 401.
+    """
+    final_key = _agent_key_from_headers(api_key, authorization)
 
     # Check agent_api_key first
     client = db.query(Client).filter(Client.agent_api_key == final_key).first()
@@ -50,26 +77,50 @@ def get_client_from_api_key(
     if not client:
         client = db.query(Client).filter(Client.client_panel_api_key == final_key).first()
 
-    # Auto-Registration Logic (Lab Mode)
     if not client:
         # Create a new client automatically
-        new_client_name = f"Auto-Client-{final_key[:8]}"
-        client = Client(
-            name=new_client_name,
-            agent_api_key=final_key,
-            status="active"
-        )
+        client = _auto_registered_client(final_key)
         db.add(client)
         db.commit()
         db.refresh(client)
         
-    if client.status != "active":
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Cliente no está activo",
-        )
+    return _ensure_client_active(client)
 
-    return client
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependencia para obtener una sesión async (asyncpg) en los routers calientes.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_client_from_api_key_async(
+    db: AsyncSession = Depends(get_async_db),
+    api_key: Optional[str] = Header(default=None, alias="x-client-api-key"),
+    authorization: Optional[str] = Header(default=None),
+) -> Client:
+    """
+    Igual que get_client_from_api_key, sobre la sesión async del request.
+    """
+    final_key = _agent_key_from_headers(api_key, authorization)
+
+    client = (
+        await db.execute(select(Client).where(Client.agent_api_key == final_key))
+    ).scalars().first()
+
+    if not client:
+        client = (
+            await db.execute(select(Client).where(Client.client_panel_api_key == final_key))
+        ).scalars().first()
+
+    if not client:
+        client = _auto_registered_client(final_key)
+        db.add(client)
+        await db.commit()
+        await db.refresh(client)
+
+    return _ensure_client_active(client)
 
 def get_client_from_panel_key(
     db: Session = Depends(get_db),
@@ -361,6 +361,37 @@ def system_health(db: Session = Depends(get_db), _ = Depends(verify_admin_master
         "version": "3.0.0"
     }
 
+@router.get("/system/scheduler")
+def scheduler_status():
+    """
+    Estado del scheduler distribuido: líder, próximos disparos e historial/duración por job.
+    """
+    from app.services.scheduler import get_scheduler
+    return get_scheduler().status()
+
+@router.get("/system/db-pool")
+def db_pool_status():
+    """
+    Estado y métricas de los pools de conexión (sync y async) de este worker.
+    """
+    from app.db import session as db_session
+    from app.services.metrics import registry
+    return {
+        "config": {
+            "pool_size": db_session.DB_POOL_SIZE,
+            "max_overflow": db_session.DB_MAX_OVERFLOW,
+            "async_pool_size": db_session.DB_ASYNC_POOL_SIZE,
+            "async_max_overflow": db_session.DB_ASYNC_MAX_OVERFLOW,
+            "pool_timeout": db_session.DB_POOL_TIMEOUT,
+            "pool_recycle": db_session.DB_POOL_RECYCLE,
+            "pre_ping": db_session.DB_POOL_PRE_PING,
+            "statement_timeout_ms": db_session.DB_STATEMENT_TIMEOUT_MS,
+        },
+        "sync": db_session.engine.pool.status(),
+        "async": db_session.async_engine.sync_engine.pool.status(),
+        "metrics": registry.snapshot(prefix="deco_db_pool"),
+    }
+
 # ============================
 # PARTNER MANAGEMENT
 # ============================
@@ -4,9 +4,11 @@ from typing import List, Dict, Any
 import logging
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.api.deps import get_db, get_client_from_api_key
+from app.api.deps import get_db, get_client_from_api_key, get_async_db, get_client_from_api_key_async
 from app.api.utils import compute_agent_online_status
 from app.models.domain import Agent, Client, ScanJob, Partner
 from app.schemas.contracts import (
@@ -16,6 +18,7 @@ from app.schemas.contracts import (
     HeartbeatResponse,
     AgentJobResult,
 )
+from app.services.instrumentation import HEARTBEAT_PENDING_JOBS
 from app.services.result_dispatcher import persist_result_and_update_job
 
 logger = logging.getLogger("DecoOrchestrator.AgentsAPI")
@@ -272,10 +275,10 @@ def activate_agent(
     "/heartbeat",
     response_model=HeartbeatResponse,
 )
-def agent_heartbeat(
+async def agent_heartbeat(
     payload: HeartbeatRequest,
-    db: Session = Depends(get_db),
-    client: Client = Depends(get_client_from_api_key),
+    db: AsyncSession = Depends(get_async_db),
+    client: Client = Depends(get_client_from_api_key_async),
 ):
     """
     Heartbeat del agente:
@@ -284,13 +287,13 @@ def agent_heartbeat(
     - Devuelve lista de IDs de jobs a ejecutar.
     """
     agent = (
-        db.query(Agent)
-        .filter(
-            Agent.id == payload.agent_id,
-            Agent.client_id == client.id,
+        await db.execute(
+            select(Agent).where(
+                Agent.id == payload.agent_id,
+                Agent.client_id == client.id,
+            )
         )
-        .first()
-    )
+    ).scalars().first()
 
     if not agent:
         raise HTTPException(
@@ -319,10 +322,12 @@ def agent_heartbeat(
     # --- Fleet Guardian V1 ---
     try:
         from app.services.telemetry import AgentTelemetryProcessor
-        processor = AgentTelemetryProcessor(db)
         # Convert Pydantic to dict for processor
         telemetry_payload = payload.dict() 
-        processor.update_agent_status(agent.id, telemetry_payload)
+        # Código ORM sync sobre la misma conexión async (sin bloquear el event loop)
+        await db.run_sync(
+            lambda sync_db: AgentTelemetryProcessor(sync_db).update_agent_status(agent.id, telemetry_payload)
+        )
     except Exception as e:
         logger.error(f"Error processing telemetry: {e}")
     # -------------------------
@@ -332,16 +337,18 @@ def agent_heartbeat(
     # - estén en estado 'pending'
     # - no tengan agente asignado o ya estén asignados a este agente
     pending_jobs = (
-        db.query(ScanJob)
-        .filter(
-            ScanJob.client_id == client.id,
-            ScanJob.status == "pending",
+        await db.execute(
+            select(ScanJob)
+            .where(
+                ScanJob.client_id == client.id,
+                ScanJob.status == "pending",
+            )
+            .order_by(ScanJob.created_at.asc())
         )
-        .order_by(ScanJob.created_at.asc())
-        .all()
-    )
+    ).scalars().all()
 
-    logger.info(f"[HEARTBEAT_DEBUG] client={client.id} pending_jobs_found={len(pending_jobs)}")
+    HEARTBEAT_PENDING_JOBS.observe(len(pending_jobs))
+    logger.debug(f"[HEARTBEAT_DEBUG] client={client.id} pending_jobs_found={len(pending_jobs)}")
 
     now = datetime.now(timezone.utc)
     job_ids: List[str] = []
@@ -362,20 +369,21 @@ def agent_heartbeat(
 
     # Re-exponemos jobs ya en running para que el agente pueda retomarlos
     running_jobs = (
-        db.query(ScanJob)
-        .filter(
-            ScanJob.client_id == client.id,
-            ScanJob.status == "running",
-            ScanJob.agent_id == agent.id,
+        await db.execute(
+            select(ScanJob)
+            .where(
+                ScanJob.client_id == client.id,
+                ScanJob.status == "running",
+                ScanJob.agent_id == agent.id,
+            )
+            .order_by(ScanJob.created_at.asc())
         )
-        .order_by(ScanJob.created_at.asc())
-        .all()
-    )
+    ).scalars().all()
     for job in running_jobs:
         if job.id not in job_ids:
             job_ids.append(job.id)
 
-    db.commit()
+    await db.commit()
 
     logger.info(
         f"[HEARTBEAT] agente={agent.id} status={agent.status} "
@@ -392,10 +400,10 @@ def agent_heartbeat(
     "/jobs",
     summary="Lista jobs asignados para un agente (Protocolo ACK seguro)",
 )
-def list_agent_jobs(
+async def list_agent_jobs(
     agent_id: str,
-    db: Session = Depends(get_db),
-    client: Client = Depends(get_client_from_api_key),
+    db: AsyncSession = Depends(get_async_db),
+    client: Client = Depends(get_client_from_api_key_async),
 ):
     """
     Devuelve los jobs pendientes/running para el agente.
@@ -404,29 +412,29 @@ def list_agent_jobs(
     - El agente DEBE llamar a POST /ack para confirmar inicio.
     """
     agent = (
-        db.query(Agent)
-        .filter(
-            Agent.id == agent_id,
-            Agent.client_id == client.id,
+        await db.execute(
+            select(Agent).where(
+                Agent.id == agent_id,
+                Agent.client_id == client.id,
+            )
         )
-        .first()
-    )
+    ).scalars().first()
     if not agent:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Agente no encontrado para este cliente",
         )
 
-    now = datetime.now(timezone.utc)
     jobs = (
-        db.query(ScanJob)
-        .filter(
-            ScanJob.client_id == client.id,
-            ScanJob.status.in_(["pending", "running"]),
+        await db.execute(
+            select(ScanJob)
+            .where(
+                ScanJob.client_id == client.id,
+                ScanJob.status.in_(["pending", "running"]),
+            )
+            .order_by(ScanJob.created_at.asc())
         )
-        .order_by(ScanJob.created_at.asc())
-        .all()
-    )
+    ).scalars().all()
 
     response_jobs: List[Dict[str, Any]] = []
 
@@ -435,11 +443,9 @@ def list_agent_jobs(
             continue
 
         # Claiming Logic
-        needs_commit = False
         if job.agent_id is None:
             job.agent_id = agent.id
             # DO NOT SET RUNNING HERE
-            needs_commit = True
         
         # If it was assigned to me but still pending, we return it again
         # so the agent can retry (idempotency).
@@ -455,7 +461,7 @@ def list_agent_jobs(
             }
         )
 
-    db.commit()
+    await db.commit()
 
     logger.info(
         f"[AGENT_JOBS] agente={agent.id} jobs_entregados={len(response_jobs)} (Esperando ACK)"
@@ -467,23 +473,23 @@ def list_agent_jobs(
     "/jobs/{job_id}/ack",
     summary="Confirma inicio de ejecución del job (Anti-Zombie)",
 )
-def ack_job_start(
+async def ack_job_start(
     job_id: str,
-    db: Session = Depends(get_db),
-    client: Client = Depends(get_client_from_api_key),
+    db: AsyncSession = Depends(get_async_db),
+    client: Client = Depends(get_client_from_api_key_async),
 ):
     """
     El agente llama a este endpoint justo antes de lanzar el proceso.
     Solo AQUÍ pasamos el job a 'running'.
     """
     job = (
-        db.query(ScanJob)
-        .filter(
-            ScanJob.id == job_id,
-            ScanJob.client_id == client.id
+        await db.execute(
+            select(ScanJob).where(
+                ScanJob.id == job_id,
+                ScanJob.client_id == client.id
+            )
         )
-        .first()
-    )
+    ).scalars().first()
     if not job:
         raise HTTPException(status_code=404, detail="Job no encontrado")
 
@@ -495,7 +501,7 @@ def ack_job_start(
     logger.info(f"[ACK] Job {job.id} confirmado por agente. Iniciando reloj.")
     job.status = "running"
     job.started_at = datetime.now(timezone.utc)
-    db.commit()
+    await db.commit()
     
     return {"status": "ok", "started_at": job.started_at}
 
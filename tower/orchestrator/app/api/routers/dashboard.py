@@ -1,11 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func, select, desc
+from sqlalchemy import func, desc
 from typing import List, Dict, Any
 
 from app.api.deps import get_db, verify_admin_master_key
 from app.models.domain import Client, Agent, Finding, ScanJob, Partner, Asset
+from app.services.cache import cache_service
 from pydantic import BaseModel
 from datetime import datetime
 
@@ -23,6 +23,7 @@ class DashboardSummary(BaseModel):
     findings_by_severity: Dict[str, int]
 
 @router.get("/summary", response_model=DashboardSummary)
+@cache_service.cache(expire=60, stale=120, tags=("dashboard",))
 def get_dashboard_summary(
     db: Session = Depends(get_db),
 ):
@@ -10,7 +10,7 @@ router = APIRouter(
 )
 
 @router.get("/ip/{ip_address}")
-@cache_service.cache(expire=3600) # Cache for 1 hour
+@cache_service.cache(expire=3600, stale=600, tags=("threat_intel",)) # Cache for 1 hour
 def get_ip_reputation(ip_address: str):
     """
     Obtiene la reputación de una IP desde el servicio de Threat Intelligence.
@@ -1,11 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from datetime import datetime
+import asyncio
+from datetime import datetime, timezone
 
-from app.api.deps import get_db
+from app.api.deps import get_db, get_async_db
 from app.models.domain import NetworkAsset, Client, NetworkObservation
 from app.schemas.contracts import ClientNetworkAssetResponse
+from app.services.cache import cache_service
 import logging
 
 logger = logging.getLogger("orchestrator")
@@ -43,20 +46,26 @@ def get_client_network_assets(
     return assets
 
 @router.post("/clients/{client_id}/observations", status_code=202)
-def ingest_network_observations(
+async def ingest_network_observations(
     client_id: str,
     observations: List[NetworkObservationSchema],
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Recibe observaciones crudas del sensor NDR y las fusiona.
     """
-    client = db.query(Client).filter(Client.id == client_id).first()
+    client = await db.get(Client, client_id)
     if not client:
          raise HTTPException(status_code=404, detail="Client not found")
          
     try:
-        fuse_observations(client_id, observations, db)
+        # La fusión es ORM sync: corre sobre la conexión async vía run_sync
+        fused = await db.run_sync(
+            lambda sync_db: fuse_observations(client_id, observations, sync_db, invalidate_cache=False)
+        )
+        # Redis es sync: invalidar fuera de run_sync y en un hilo, sin bloquear el loop
+        if fused:
+            await asyncio.to_thread(cache_service.invalidate_client, client_id)
         return {"status": "ok", "processed": len(observations)}
     except Exception as e:
         logger.error(f"Ingest Error: {e}")
@@ -285,6 +294,7 @@ class NetworkAssetSummary(BaseModel):
     at_risk: int
 
 @router.get("/clients/{client_id}/network-assets/summary", response_model=NetworkAssetSummary)
+@cache_service.cache(expire=60, stale=240, tags=("client:{client_id}",))
 def get_network_assets_summary(
     client_id: str,
     db: Session = Depends(get_db)
@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from app.db.session import get_db
 from app.services.predictive_engine import PredictiveEngine, PredictiveReport
 from app.models.domain import Client, PredictiveSignal
+from app.services.cache import cache_service
 from typing import List, Optional
 from pydantic import BaseModel
 import logging
@@ -23,6 +24,7 @@ class PredictiveResponse(BaseModel):
     signals: List[PredictiveSignalSchema]
 
 @router.get("/clients/{client_id}/predictive", response_model=PredictiveResponse)
+@cache_service.cache(expire=300, stale=300, tags=("client:{client_id}",))
 def get_predictive_report(client_id: str, db: Session = Depends(get_db)):
     """
     Returns the current predictive risk score and active signals.
@@ -1,12 +1,14 @@
 import logging
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.deps import get_db, get_client_from_api_key
+from app.api.deps import get_async_db, get_client_from_api_key_async
 from app.models.domain import ScanJob, Agent, Client
 from app.schemas.contracts import ScanResultUpload, ScanResultResponse
-from app.services.result_dispatcher import persist_result_and_update_job
+from app.services.result_dispatcher import enqueue_processing, persist_result_and_update_job
 
 logger = logging.getLogger("DecoOrchestrator.ResultsAPI")
 logger.setLevel(logging.INFO)
@@ -26,10 +28,10 @@ router = APIRouter()
     response_model=ScanResultResponse,
     status_code=status.HTTP_201_CREATED,
 )
-def upload_scan_result(
+async def upload_scan_result(
     payload: ScanResultUpload,
-    db: Session = Depends(get_db),
-    client: Client = Depends(get_client_from_api_key),
+    db: AsyncSession = Depends(get_async_db),
+    client: Client = Depends(get_client_from_api_key_async),
 ):
     """
     El agente sube el resultado de un ScanJob.
@@ -39,15 +41,16 @@ def upload_scan_result(
     - Verifica que el agente exista y pertenezca al cliente.
     - Crea un ScanResult.
     - Actualiza el estado del job a 'done'.
+    - Procesa el resultado (assets/findings) en el threadpool.
     """
     job = (
-        db.query(ScanJob)
-        .filter(
-            ScanJob.id == payload.scan_job_id,
-            ScanJob.client_id == client.id,
+        await db.execute(
+            select(ScanJob).where(
+                ScanJob.id == payload.scan_job_id,
+                ScanJob.client_id == client.id,
+            )
         )
-        .first()
-    )
+    ).scalars().first()
     if not job:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -55,13 +58,13 @@ def upload_scan_result(
         )
 
     agent = (
-        db.query(Agent)
-        .filter(
-            Agent.id == payload.agent_id,
-            Agent.client_id == client.id,
+        await db.execute(
+            select(Agent).where(
+                Agent.id == payload.agent_id,
+                Agent.client_id == client.id,
+            )
         )
-        .first()
-    )
+    ).scalars().first()
     if not agent:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -79,15 +82,21 @@ def upload_scan_result(
     raw_data.setdefault("job_type", job.type)
     raw_data.setdefault("agent_id", agent.id)
 
-    result = persist_result_and_update_job(
-        db=db,
-        job=job,
-        agent=agent,
-        raw_data=raw_data,
-        summary=payload.summary or {},
-        job_status="done",
+    result = await db.run_sync(
+        lambda sync_db: persist_result_and_update_job(
+            db=sync_db,
+            job=job,
+            agent=agent,
+            raw_data=raw_data,
+            summary=payload.summary or {},
+            job_status="done",
+            enqueue=False,
+        )
     )
 
+    # El procesamiento usa su propia sesión sync: fuera del event loop
+    await run_in_threadpool(enqueue_processing, result.id)
+
     return ScanResultResponse(
         status="accepted",
         received_at=result.created_at,
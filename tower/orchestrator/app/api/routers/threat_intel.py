@@ -5,6 +5,7 @@ from sqlalchemy import desc
 from typing import List, Optional
 from app.db.session import get_db
 from app.models.domain import GlobalThreat, ClientThreatMatch, NetworkAsset
+from app.services.cache import cache_service
 from pydantic import BaseModel
 from datetime import datetime
 
@@ -49,14 +50,17 @@ class ThreatSummary(BaseModel):
 # --- Endpoints ---
 
 @router.get("/global", response_model=List[GlobalThreatRead])
+@cache_service.cache(expire=300, stale=300, tags=("threat_intel",))
 def get_global_threats(limit: int = 50, db: Session = Depends(get_db)):
     """
     Returns latest global threats.
     """
     threats = db.query(GlobalThreat).order_by(desc(GlobalThreat.published_at)).limit(limit).all()
-    return threats
+    # Schemas (not ORM rows) so the result is cacheable
+    return [GlobalThreatRead.model_validate(t) for t in threats]
 
 @router.get("/clients/{client_id}/matches", response_model=List[ClientMatchRead])
+@cache_service.cache(expire=120, stale=120, tags=("threat_intel", "client:{client_id}"))
 def get_client_threat_matches(client_id: str, db: Session = Depends(get_db)):
     """
     Returns threats that match this client's assets.
@@ -86,6 +90,7 @@ def get_client_threat_matches(client_id: str, db: Session = Depends(get_db)):
     return result
 
 @router.get("/clients/{client_id}/summary", response_model=ThreatSummary)
+@cache_service.cache(expire=120, stale=120, tags=("threat_intel", "client:{client_id}"))
 def get_client_threat_summary(client_id: str, db: Session = Depends(get_db)):
     """
     Returns summary for dashboard widgets.
@@ -1,6 +1,13 @@
 import os
-from sqlalchemy import create_engine
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.services.instrumentation import instrument_engine_queries
+from app.services.metrics import registry
 
 # Obtenemos la URL de la base de datos desde las variables de entorno
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -8,11 +15,116 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL no está definido en el entorno. Revisa .env.deco_security y docker-compose.yml")
 
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+def _async_url(url: str) -> str:
+    """
+    postgresql://... -> postgresql+asyncpg://... (mismo host/credenciales).
+    """
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+
+# Pools por proceso. Dimensionar para que
+#   workers_uvicorn * (DB_POOL_SIZE + DB_MAX_OVERFLOW + DB_ASYNC_POOL_SIZE + DB_ASYNC_MAX_OVERFLOW)
+# quede por debajo de max_connections de Postgres.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_ASYNC_POOL_SIZE = int(os.getenv("DB_ASYNC_POOL_SIZE", "10"))
+DB_ASYNC_MAX_OVERFLOW = int(os.getenv("DB_ASYNC_MAX_OVERFLOW", "5"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", "true")
+# 0 = sin límite
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL)
+
+_IS_POSTGRES = DATABASE_URL.startswith(("postgresql", "postgres://"))
+
+# --- Métricas del pool ---
+POOL_WAIT = registry.histogram(
+    "deco_db_pool_wait_seconds",
+    "Tiempo esperando una conexión libre del pool",
+    ["pool"],
+)
+POOL_CHECKOUT = registry.histogram(
+    "deco_db_pool_checkout_seconds",
+    "Tiempo que una conexión permanece fuera del pool",
+    ["pool"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+POOL_TIMEOUTS = registry.counter(
+    "deco_db_pool_timeouts_total",
+    "Peticiones que agotaron DB_POOL_TIMEOUT esperando conexión",
+    ["pool"],
+)
+POOL_IN_USE = registry.gauge("deco_db_pool_checked_out", "Conexiones en uso", ["pool"])
+POOL_OVERFLOW = registry.gauge("deco_db_pool_overflow", "Conexiones de overflow abiertas", ["pool"])
+
+
+class _WaitTimingMixin:
+    metrics_label = "sync"
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            POOL_TIMEOUTS.inc(pool=self.metrics_label)
+            raise
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - t0, pool=self.metrics_label)
+
+
+class InstrumentedQueuePool(_WaitTimingMixin, QueuePool):
+    metrics_label = "sync"
+
+
+class InstrumentedAsyncQueuePool(_WaitTimingMixin, AsyncAdaptedQueuePool):
+    metrics_label = "async"
+
+
+def _instrument_pool(pool, label: str):
+    @event.listens_for(pool, "checkout")
+    def _on_checkout(dbapi_conn, record, proxy):
+        record.info["checkout_at"] = time.perf_counter()
+
+    @event.listens_for(pool, "checkin")
+    def _on_checkin(dbapi_conn, record):
+        started = record.info.pop("checkout_at", None)
+        if started is not None:
+            POOL_CHECKOUT.observe(time.perf_counter() - started, pool=label)
+
+    POOL_IN_USE.set_function(pool.checkedout, pool=label)
+    POOL_OVERFLOW.set_function(lambda: max(0, pool.overflow()), pool=label)
+
+
+_sync_connect_args = {}
+_async_connect_args = {}
+if _IS_POSTGRES and DB_STATEMENT_TIMEOUT_MS > 0:
+    _sync_connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+    _async_connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+
 # future=True → API 2.0 de SQLAlchemy
 engine = create_engine(
     DATABASE_URL,
     future=True,
+    poolclass=InstrumentedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    connect_args=_sync_connect_args,
 )
+_instrument_pool(engine.pool, "sync")
+instrument_engine_queries(engine, "sync")
 
 SessionLocal = sessionmaker(
     autocommit=False,
@@ -20,6 +132,28 @@ SessionLocal = sessionmaker(
     bind=engine,
 )
 
+# Engine async (asyncpg) para los routers calientes: heartbeat, jobs/ack, results, observaciones.
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    poolclass=InstrumentedAsyncQueuePool,
+    pool_size=DB_ASYNC_POOL_SIZE,
+    max_overflow=DB_ASYNC_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    connect_args=_async_connect_args,
+)
+_instrument_pool(async_engine.sync_engine.pool, "async")
+instrument_engine_queries(async_engine.sync_engine, "async")
+
+# expire_on_commit=False: en async no hay lazy-load implícito tras el commit
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
 def get_db():
     db = SessionLocal()
     try:
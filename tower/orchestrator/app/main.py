@@ -1,4 +1,5 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 import os
 
@@ -33,12 +34,16 @@ logging.basicConfig(
 
 app = FastAPI(title="Deco-Security Orchestrator", version="3.0.0")
 
-from app.services.scheduler import start_scheduler
+from app.services.scheduler import start_scheduler, stop_scheduler
 
 @app.on_event("startup")
 def on_startup():
     start_scheduler()
 
+@app.on_event("shutdown")
+def on_shutdown():
+    stop_scheduler()
+
 from fastapi.middleware.cors import CORSMiddleware
 
 # CORS
@@ -69,6 +74,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Métricas por ruta (duración, en curso, queries SQL por petición)
+from app.services.instrumentation import MetricsMiddleware
+app.add_middleware(MetricsMiddleware)
+
 # Static releases for agents (public read-only)
 releases_root = "/opt/deco/releases"
 if os.path.exists(releases_root):
@@ -89,6 +98,14 @@ def health_check():
         "service": "deco-security-orchestrator",
     }
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """
+    Métricas en formato Prometheus (registro en memoria de este worker).
+    """
+    from app.services.metrics import registry
+    return PlainTextResponse(registry.render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/")
 def root():
     return {
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, ForeignKey, DateTime, JSON, Boolean, Text, Float, Enum as SAEnum
+from sqlalchemy import Column, String, Integer, ForeignKey, DateTime, JSON, Boolean, Text, Float, Enum as SAEnum, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import uuid
@@ -68,6 +68,11 @@ class Agent(Base):
     client = relationship("Client", back_populates="agents")
     scan_jobs = relationship("ScanJob", back_populates="agent")
 
+    # Health check: solo se indexan agentes no offline (ver MaintenanceEngine)
+    __table_args__ = (
+        Index("idx_agents_online_last_seen", "last_seen_at", postgresql_where=text("status <> 'offline'")),
+    )
+
 class Asset(Base):
     __tablename__ = "assets"
     
@@ -102,6 +107,11 @@ class ScanJob(Base):
     agent = relationship("Agent", back_populates="scan_jobs")
     results = relationship("ScanResult", back_populates="job", uselist=False, cascade="all, delete-orphan")
 
+    # Zombie cleaner: solo jobs en ejecución
+    __table_args__ = (
+        Index("idx_scan_jobs_running", "started_at", "created_at", postgresql_where=text("status = 'running'")),
+    )
+
 class ScanResult(Base):
     __tablename__ = "scan_results"
     
@@ -506,6 +516,11 @@ class AgentStatus(Base):
     agent = relationship("Agent")
     client = relationship("Client")
 
+    # Fleet Guardian: los agentes ya en 'critical' no se vuelven a recorrer
+    __table_args__ = (
+        Index("idx_agent_status_last_seen_open", "last_seen", postgresql_where=text("health_state IS DISTINCT FROM 'critical'")),
+    )
+
 
 class FleetAlert(Base):
     __tablename__ = "fleet_alerts"
@@ -524,3 +539,8 @@ class FleetAlert(Base):
     agent = relationship("Agent")
     client = relationship("Client")
 
+    # Una sola alerta abierta por (agente, tipo): target del ON CONFLICT en MaintenanceEngine
+    __table_args__ = (
+        Index("uq_fleet_alerts_open", "agent_id", "alert_type", unique=True, postgresql_where=text("resolved = false")),
+    )
+
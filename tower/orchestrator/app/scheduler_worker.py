@@ -0,0 +1,20 @@
+import logging
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv(dotenv_path="../.env.deco_security")
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+)
+
+if __name__ == '__main__':
+    # Standalone scheduler: los workers de la API corren con SCHEDULER_MODE=external
+    # y este proceso ejecuta los jobs periódicos (con elección de líder si hay réplicas).
+    from app.services.scheduler import start_scheduler, stop_scheduler
+
+    try:
+        start_scheduler(force=True)
+    except (KeyboardInterrupt, SystemExit):
+        stop_scheduler()
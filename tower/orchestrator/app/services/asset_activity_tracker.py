@@ -1,5 +1,6 @@
 from sqlalchemy.orm import Session
 from app.models.domain import NetworkAsset, NetworkAssetHistory
+from app.services.cache import cache_service
 from datetime import datetime, timezone, timedelta
 from typing import List, Dict, Any, Optional
 import logging
@@ -56,6 +57,7 @@ class AssetActivityTracker:
                  pass # Present, handled above
 
         self.db.commit()
+        cache_service.invalidate_client(client_id)
 
     def _update_existing_asset(self, asset: NetworkAsset, device: Dict[str, Any], agent_id: str, now: datetime):
         # Update metadata
@@ -1,72 +1,541 @@
 import redis
 import json
 import functools
+import hashlib
+import inspect
+import logging
 import os
-from datetime import datetime, date, timedelta
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, date
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from app.services.metrics import registry
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0")
 REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "1"))
+# Si Redis cae, no lo reintentamos en cada request: esperamos este intervalo.
+REDIS_RETRY_SECONDS = float(os.getenv("REDIS_RETRY_SECONDS", "30"))
+
+# Tier local (por proceso). Con Redis activo el TTL local se acota para que
+# las invalidaciones perdidas (pub/sub caído) no dejen datos viejos mucho tiempo.
+CACHE_LOCAL_MAX_ITEMS = int(os.getenv("CACHE_LOCAL_MAX_ITEMS", "2048"))
+CACHE_LOCAL_TTL = float(os.getenv("CACHE_LOCAL_TTL", "10"))
+
+# Single-flight: cuánto espera un seguidor al líder antes de calcular él mismo.
+CACHE_LOCK_TIMEOUT = float(os.getenv("CACHE_LOCK_TIMEOUT", "30"))
+CACHE_REMOTE_WAIT = float(os.getenv("CACHE_REMOTE_WAIT", "5"))
+# Los sets de tags viven al menos esto, para no perder keys de entradas largas.
+CACHE_TAG_TTL = int(os.getenv("CACHE_TAG_TTL", "86400"))
+
+CACHE_PREFIX = "cache:v2"
+INVALIDATION_CHANNEL = f"{CACHE_PREFIX}:invalidate"
+
+logger = logging.getLogger("DecoOrchestrator.Cache")
+
+_PRIMITIVES = (str, int, float, bool, type(None))
+
 
 class DateTimeEncoder(json.JSONEncoder):
     def default(self, obj):
         if isinstance(obj, (datetime, date)):
             return obj.isoformat()
+        # Pydantic (response models) se cachea como dict
+        if hasattr(obj, "model_dump"):
+            return obj.model_dump()
         return super().default(obj)
 
+
+def _keyable(value: Any) -> bool:
+    """
+    True si el valor puede formar parte de la key (primitivos y contenedores de primitivos).
+    Sessions, Requests, BackgroundTasks u objetos ORM quedan fuera.
+    """
+    if isinstance(value, _PRIMITIVES):
+        return True
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return all(_keyable(v) for v in value)
+    if isinstance(value, dict):
+        return all(isinstance(k, str) and _keyable(v) for k, v in value.items())
+    return False
+
+
+def _canonical(value: Any) -> Any:
+    if isinstance(value, (set, frozenset)):
+        return sorted(_canonical(v) for v in value)
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _canonical(v) for k, v in value.items()}
+    return value
+
+
+def stable_key(namespace: str, arguments: Dict[str, Any]) -> str:
+    """
+    Key estable entre procesos y reinicios: sha256 del JSON canónico de los argumentos
+    (orden de kwargs irrelevante, sin reprs con direcciones de memoria).
+    """
+    payload = {name: _canonical(v) for name, v in arguments.items() if _keyable(v)}
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    digest = hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+    return f"{CACHE_PREFIX}:{namespace}:{digest}"
+
+
+def _tag_key(tag: str) -> str:
+    return f"{CACHE_PREFIX}:tag:{tag}"
+
+
+class LocalLRU:
+    """
+    Tier en memoria del proceso, LRU acotado por número de entradas, con índice de tags.
+    Thread-safe: los endpoints sync corren en el threadpool de FastAPI.
+    """
+
+    def __init__(self, max_items: int = CACHE_LOCAL_MAX_ITEMS):
+        self.max_items = max_items
+        self._data: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._tags: Dict[str, set] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            envelope, expires_at = item
+            if time.time() >= expires_at:
+                self._remove(key)
+                return None
+            self._data.move_to_end(key)
+            return envelope
+
+    def set(self, key: str, envelope: Dict[str, Any], expires_at: float):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (envelope, expires_at)
+            for tag in envelope.get("tags", ()):
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._data) > self.max_items:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._remove(key)
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        removed = 0
+        with self._lock:
+            for tag in tags:
+                for key in self._tags.pop(tag, set()):
+                    if key in self._data:
+                        self._remove(key)
+                        removed += 1
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def _remove(self, key: str):
+        item = self._data.pop(key, None)
+        if item is None:
+            return
+        for tag in item[0].get("tags", ()):
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class _Flight:
+    """Cálculo en curso para una key (single-flight dentro del proceso)."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.ok = False
+
+
 class RedisCache:
+    """
+    Cache de dos niveles: LRU en proceso delante de Redis.
+
+    - Coalescing: misses concurrentes de la misma key calculan una sola vez
+      (lock local + lock NX en Redis entre workers).
+    - Stale-while-revalidate: pasado `expire`, la entrada se sirve `stale` segundos
+      más mientras un único llamante la recalcula.
+    - Invalidación por tags (p.ej. `client:{client_id}`), propagada a los demás
+      workers vía pub/sub.
+    - Si Redis no está disponible se sigue con el tier local y se reintenta la
+      conexión cada REDIS_RETRY_SECONDS, en vez de quedar deshabilitado para siempre.
+    """
+
     def __init__(self):
-        self.redis = None
+        self._redis = None
+        self._next_connect_at = 0.0
+        self._connect_lock = threading.Lock()
+        self._listener_started = False
+        self.local = LocalLRU()
+        self._inflight: Dict[str, _Flight] = {}
+        self._inflight_lock = threading.Lock()
+        self.stats = {
+            "hits_local": 0,
+            "hits_redis": 0,
+            "misses": 0,
+            "stale_served": 0,
+            "coalesced": 0,
+            "invalidations": 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Conexión Redis
+    # ------------------------------------------------------------------
+
+    @property
+    def redis(self):
+        """
+        Cliente Redis o None. Conecta de forma perezosa y con backoff.
+        """
+        if self._redis is not None:
+            return self._redis
+        if time.monotonic() < self._next_connect_at:
+            return None
+        with self._connect_lock:
+            if self._redis is not None:
+                return self._redis
+            try:
+                client = redis.from_url(
+                    REDIS_URL,
+                    decode_responses=True,
+                    socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+                )
+                client.ping()
+                self._redis = client
+                self._start_invalidation_listener()
+            except Exception as exc:
+                # No romper si Redis no está disponible en demo/lab.
+                self._next_connect_at = time.monotonic() + REDIS_RETRY_SECONDS
+                logger.warning("[cache] Redis no disponible, usando solo cache local (%s)", exc)
+        return self._redis
+
+    # Alias usado por algunos routers (health checks, stats globales)
+    @property
+    def redis_client(self):
+        return self.redis
+
+    def _redis_failed(self, exc: Exception):
+        logger.warning("[cache] Error de Redis, reintentando en %ss: %s", REDIS_RETRY_SECONDS, exc)
+        self._redis = None
+        self._next_connect_at = time.monotonic() + REDIS_RETRY_SECONDS
+
+    def _start_invalidation_listener(self):
+        if self._listener_started:
+            return
+        self._listener_started = True
+        thread = threading.Thread(
+            target=self._listen_invalidations,
+            name="cache-invalidation-listener",
+            daemon=True,
+        )
+        thread.start()
+
+    def _listen_invalidations(self):
+        while True:
+            client = self._redis
+            if client is None:
+                time.sleep(REDIS_RETRY_SECONDS)
+                continue
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    tags = json.loads(message["data"])
+                    self.local.invalidate_tags(tags)
+            except Exception as exc:
+                # Sin pub/sub no sabemos qué se invalidó en otros workers: limpiar local.
+                logger.warning("[cache] Listener de invalidación caído: %s", exc)
+                self.local.clear()
+                time.sleep(REDIS_RETRY_SECONDS)
+
+    # ------------------------------------------------------------------
+    # Lectura / escritura de envelopes
+    # ------------------------------------------------------------------
+
+    def _local_expiry(self, envelope: Dict[str, Any]) -> float:
+        if self._redis is None:
+            return envelope["stale_until"]
+        return min(envelope["stale_until"], time.time() + CACHE_LOCAL_TTL)
+
+    def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        envelope = self.local.get(key)
+        if envelope is not None:
+            self.stats["hits_local"] += 1
+            return envelope
+
+        client = self.redis
+        if client is None:
+            return None
         try:
-            client = redis.from_url(
-                REDIS_URL,
-                decode_responses=True,
-                socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
-            )
-            client.ping()
-            self.redis = client
-        except Exception as exc:
-            # No romper si Redis no está disponible en demo/lab.
-            print(f"[cache] Redis no disponible, cache deshabilitado ({exc})")
-
-    def cache(self, expire: int = 60):
+            raw = client.get(key)
+        except redis.RedisError as exc:
+            self._redis_failed(exc)
+            return None
+        if not raw:
+            return None
+        try:
+            envelope = json.loads(raw)
+        except ValueError:
+            return None
+        self.stats["hits_redis"] += 1
+        self.local.set(key, envelope, self._local_expiry(envelope))
+        return envelope
+
+    def _store(self, key: str, value: Any, expire: int, stale: int, tags: Tuple[str, ...]) -> bool:
+        now = time.time()
+        envelope = {
+            "v": value,
+            "fresh_until": now + expire,
+            "stale_until": now + expire + stale,
+            "tags": list(tags),
+        }
+        try:
+            raw = json.dumps(envelope, cls=DateTimeEncoder)
+        except (TypeError, ValueError):
+            # Solo cacheamos resultados JSON-serializables (p.ej. no objetos ORM)
+            return False
+        # El tier local guarda la misma forma que devolvería Redis
+        envelope = json.loads(raw)
+        self.local.set(key, envelope, self._local_expiry(envelope))
+
+        client = self.redis
+        if client is None:
+            return True
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.setex(key, expire + stale, raw)
+            for tag in tags:
+                pipe.sadd(_tag_key(tag), key)
+                pipe.expire(_tag_key(tag), max(expire + stale, CACHE_TAG_TTL))
+            pipe.execute()
+        except redis.RedisError as exc:
+            self._redis_failed(exc)
+        return True
+
+    # ------------------------------------------------------------------
+    # Single-flight
+    # ------------------------------------------------------------------
+
+    def _join_flight(self, key: str) -> Tuple[_Flight, bool]:
+        """
+        Devuelve (flight, is_leader). Solo el líder calcula.
+        """
+        with self._inflight_lock:
+            flight = self._inflight.get(key)
+            if flight is not None:
+                return flight, False
+            flight = _Flight()
+            self._inflight[key] = flight
+            return flight, True
+
+    def _finish_flight(self, key: str, flight: _Flight):
+        with self._inflight_lock:
+            self._inflight.pop(key, None)
+        flight.done.set()
+
+    def _acquire_remote_lock(self, key: str) -> Optional[str]:
+        """
+        Lock NX entre workers. Devuelve el token si lo obtuvimos, "" si Redis no está
+        (cada worker calcula por su cuenta) o None si lo tiene otro worker.
+        """
+        client = self.redis
+        if client is None:
+            return ""
+        token = uuid.uuid4().hex
+        try:
+            acquired = client.set(f"{key}:lock", token, nx=True, px=int(CACHE_LOCK_TIMEOUT * 1000))
+        except redis.RedisError as exc:
+            self._redis_failed(exc)
+            return ""
+        return token if acquired else None
+
+    def _release_remote_lock(self, key: str, token: str):
+        client = self._redis
+        if not token or client is None:
+            return
+        try:
+            if client.get(f"{key}:lock") == token:
+                client.delete(f"{key}:lock")
+        except redis.RedisError as exc:
+            self._redis_failed(exc)
+
+    def _wait_remote_value(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Otro worker está calculando la key: esperamos su resultado un tiempo acotado.
+        """
+        deadline = time.monotonic() + CACHE_REMOTE_WAIT
+        delay = 0.02
+        while time.monotonic() < deadline:
+            time.sleep(delay)
+            delay = min(delay * 2, 0.25)
+            client = self._redis
+            if client is None:
+                return None
+            try:
+                raw = client.get(key)
+            except redis.RedisError as exc:
+                self._redis_failed(exc)
+                return None
+            if raw:
+                envelope = json.loads(raw)
+                if envelope.get("fresh_until", 0) > time.time():
+                    self.local.set(key, envelope, self._local_expiry(envelope))
+                    return envelope
+        return None
+
+    def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Any],
+        expire: int = 60,
+        stale: int = 0,
+        tags: Tuple[str, ...] = (),
+    ) -> Any:
+        """
+        Devuelve el valor cacheado de `key` o lo calcula con `compute()` una sola vez,
+        aunque haya muchos llamantes concurrentes.
+        """
+        envelope = self._lookup(key)
+        if envelope is not None and envelope["fresh_until"] > time.time():
+            return envelope["v"]
+
+        flight, is_leader = self._join_flight(key)
+        if not is_leader:
+            if envelope is not None:
+                # Stale-while-revalidate: otro thread ya está recalculando
+                self.stats["stale_served"] += 1
+                return envelope["v"]
+            self.stats["coalesced"] += 1
+            if flight.done.wait(CACHE_LOCK_TIMEOUT) and flight.ok:
+                return flight.value
+            return compute()
+
+        token = ""
+        try:
+            token = self._acquire_remote_lock(key)
+            if token is None:
+                # Otro worker es el líder
+                if envelope is not None:
+                    self.stats["stale_served"] += 1
+                    flight.value, flight.ok = envelope["v"], True
+                    return envelope["v"]
+                remote = self._wait_remote_value(key)
+                if remote is not None:
+                    self.stats["coalesced"] += 1
+                    flight.value, flight.ok = remote["v"], True
+                    return remote["v"]
+
+            self.stats["misses"] += 1
+            value = compute()
+            flight.value, flight.ok = value, True
+            self._store(key, value, expire, stale, tags)
+            return value
+        finally:
+            self._release_remote_lock(key, token)
+            self._finish_flight(key, flight)
+
+    # ------------------------------------------------------------------
+    # Invalidación
+    # ------------------------------------------------------------------
+
+    def invalidate_tags(self, *tags: str):
+        """
+        Borra todas las entradas marcadas con alguno de los tags, en este worker,
+        en Redis y (vía pub/sub) en el tier local del resto de workers.
+        """
+        tags = tuple(t for t in tags if t)
+        if not tags:
+            return
+        self.stats["invalidations"] += 1
+        self.local.invalidate_tags(tags)
+
+        client = self.redis
+        if client is None:
+            return
+        try:
+            for tag in tags:
+                keys = client.smembers(_tag_key(tag))
+                if keys:
+                    client.delete(*keys)
+                client.delete(_tag_key(tag))
+            client.publish(INVALIDATION_CHANNEL, json.dumps(list(tags)))
+        except redis.RedisError as exc:
+            self._redis_failed(exc)
+
+    def invalidate_client(self, client_id: Any):
+        self.invalidate_tags(f"client:{client_id}")
+
+    # ------------------------------------------------------------------
+    # Decorador
+    # ------------------------------------------------------------------
+
+    def cache(self, expire: int = 60, stale: int = 0, tags: Iterable[str] = ()):
         """
-        Decorator to cache function results in Redis.
-        expire: Expiration time in seconds.
+        Decorator to cache function results (sync functions only).
+        expire: seconds the value is considered fresh.
+        stale: extra seconds the old value may be served while one caller refreshes it.
+        tags: format strings over the function arguments, e.g. "client:{client_id}".
+
+        Dependencies such as the DB Session are not part of the key.
         """
+        tag_templates = tuple(tags)
+
         def decorator(func):
+            if inspect.iscoroutinefunction(func):
+                raise TypeError(f"cache_service.cache no soporta funciones async ({func.__qualname__})")
+            signature = inspect.signature(func)
+            namespace = f"{func.__module__}.{func.__qualname__}"
+
             @functools.wraps(func)
             def wrapper(*args, **kwargs):
-                if not self.redis:
-                    return func(*args, **kwargs)
-
-                # Create a unique key based on function name and arguments
-                # We skip 'db' and 'current_user'/dependencies from args for key generation if possible
-                # For simplicity, we'll use a basic key generation strategy
-                
-                # Filter out complex objects like Session from kwargs for key generation
-                key_kwargs = {k: v for k, v in kwargs.items() if not hasattr(v, 'query')} 
-                key_args = [a for a in args if not hasattr(a, 'query')]
-                
-                key = f"cache:{func.__module__}:{func.__name__}:{str(key_args)}:{str(key_kwargs)}"
-                
                 try:
-                    cached_val = self.redis.get(key)
-                    if cached_val:
-                        return json.loads(cached_val)
-                except Exception as e:
-                    print(f"[cache] Error leyendo cache: {e}")
+                    bound = signature.bind(*args, **kwargs)
+                    bound.apply_defaults()
+                    arguments = dict(bound.arguments)
+                except TypeError:
                     return func(*args, **kwargs)
-                
-                result = func(*args, **kwargs)
-                
-                # Only cache if result is JSON serializable
-                try:
-                    self.redis.setex(key, timedelta(seconds=expire), json.dumps(result, cls=DateTimeEncoder))
-                except Exception as e:
-                    print(f"[cache] Error escribiendo cache: {e}")
-                    
-                return result
+
+                key = stable_key(namespace, arguments)
+                resolved_tags = []
+                for template in tag_templates:
+                    try:
+                        resolved_tags.append(template.format(**arguments))
+                    except (KeyError, IndexError):
+                        logger.warning("[cache] Tag '%s' no aplicable a %s", template, namespace)
+
+                return self.get_or_compute(
+                    key,
+                    lambda: func(*args, **kwargs),
+                    expire=expire,
+                    stale=stale,
+                    tags=tuple(resolved_tags),
+                )
             return wrapper
         return decorator
 
 cache_service = RedisCache()
+
+# Los contadores viven en cache_service.stats; /metrics los lee al exponer.
+_CACHE_EVENTS = registry.counter("deco_cache_events_total", "Eventos de cache_service (hits, misses, coalescing...)", ["event"])
+for _event in cache_service.stats:
+    _CACHE_EVENTS.set_function(lambda e=_event: cache_service.stats[e], event=_event)
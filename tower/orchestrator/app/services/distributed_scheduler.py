@@ -0,0 +1,470 @@
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import redis
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.blocking import BlockingScheduler
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+logger = logging.getLogger("DecoOrchestrator.Scheduler")
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0")
+# redis | postgres
+SCHEDULER_LEADER_BACKEND = os.getenv("SCHEDULER_LEADER_BACKEND", "redis").lower()
+SCHEDULER_LEADER_TTL = float(os.getenv("SCHEDULER_LEADER_TTL", "30"))
+SCHEDULER_HISTORY_SIZE = int(os.getenv("SCHEDULER_HISTORY_SIZE", "100"))
+
+KEY_PREFIX = "scheduler"
+LEADER_KEY = f"{KEY_PREFIX}:leader"
+
+# Renueva el lease solo si sigue siendo nuestro (evita pisar a otro líder).
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def _node_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _advisory_key(name: str) -> int:
+    # pg advisory locks usan bigint; crc32 es estable entre procesos
+    return zlib.crc32(f"deco:{name}".encode("utf-8"))
+
+
+class RedisLeaderElector:
+    """
+    Elección de líder con un lease en Redis (SET NX PX + renovación atómica).
+    Si Redis no responde durante un TTL completo, el nodo deja de considerarse líder.
+    """
+
+    def __init__(self, node_id: str, ttl: float = SCHEDULER_LEADER_TTL):
+        self.node_id = node_id
+        self.ttl = ttl
+        self.redis = redis.from_url(REDIS_URL, decode_responses=True, socket_connect_timeout=2, socket_timeout=5)
+        self._renew = self.redis.register_script(_RENEW_SCRIPT)
+        self._release = self.redis.register_script(_RELEASE_SCRIPT)
+        self._lease_until = 0.0
+
+    @property
+    def is_leader(self) -> bool:
+        return time.monotonic() < self._lease_until
+
+    def tick(self) -> bool:
+        ttl_ms = int(self.ttl * 1000)
+        started = time.monotonic()
+        try:
+            if self.is_leader:
+                ok = bool(self._renew(keys=[LEADER_KEY], args=[self.node_id, ttl_ms]))
+            else:
+                ok = bool(self.redis.set(LEADER_KEY, self.node_id, nx=True, px=ttl_ms))
+        except redis.RedisError as exc:
+            logger.warning("[SCHEDULER] Redis no disponible para elección de líder: %s", exc)
+            return self.is_leader
+        if ok:
+            # Margen de seguridad: el lease local caduca antes que el de Redis
+            self._lease_until = started + self.ttl * 0.8
+        else:
+            self._lease_until = 0.0
+        return ok
+
+    def resign(self):
+        try:
+            self._release(keys=[LEADER_KEY], args=[self.node_id])
+        except redis.RedisError:
+            pass
+        self._lease_until = 0.0
+
+    def acquire_job_lock(self, name: str, ttl: float) -> Optional[str]:
+        token = f"{self.node_id}:{uuid.uuid4().hex[:6]}"
+        try:
+            if self.redis.set(f"{KEY_PREFIX}:job:{name}:lock", token, nx=True, px=int(ttl * 1000)):
+                return token
+        except redis.RedisError as exc:
+            logger.warning("[SCHEDULER] No se pudo tomar lock de %s: %s", name, exc)
+        return None
+
+    def release_job_lock(self, name: str, token: str):
+        try:
+            self._release(keys=[f"{KEY_PREFIX}:job:{name}:lock"], args=[token])
+        except redis.RedisError:
+            pass
+
+
+class PostgresLeaderElector:
+    """
+    Elección de líder con pg_try_advisory_lock sobre una conexión dedicada.
+    El lock es de sesión: si el proceso o la conexión mueren, Postgres lo libera.
+    """
+
+    def __init__(self, node_id: str, engine=None):
+        if engine is None:
+            from app.db.session import engine
+        self.node_id = node_id
+        self.engine = engine
+        self._conn = None
+        self._leader = False
+        self._job_conns: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def is_leader(self) -> bool:
+        return self._leader
+
+    def tick(self) -> bool:
+        with self._lock:
+            try:
+                if self._conn is None:
+                    self._conn = self.engine.connect()
+                if self._leader:
+                    # Comprobar que la sesión (y con ella el lock) sigue viva; sin commit
+                    # la conexión quedaría "idle in transaction" mientras sea líder
+                    self._conn.execute(text("SELECT 1"))
+                    self._conn.commit()
+                else:
+                    self._leader = bool(self._conn.execute(
+                        text("SELECT pg_try_advisory_lock(:k)"), {"k": _advisory_key("scheduler:leader")}
+                    ).scalar())
+                    self._conn.commit()
+            except Exception as exc:
+                logger.warning("[SCHEDULER] Conexión de elección perdida: %s", exc)
+                self._drop_conn()
+            return self._leader
+
+    def _drop_conn(self):
+        self._leader = False
+        if self._conn is not None:
+            try:
+                self._conn.invalidate()
+            except Exception:
+                pass
+        self._conn = None
+
+    def resign(self):
+        with self._lock:
+            if self._conn is not None and self._leader:
+                try:
+                    self._conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": _advisory_key("scheduler:leader")})
+                    self._conn.close()
+                except Exception:
+                    pass
+            self._conn = None
+            self._leader = False
+
+    def acquire_job_lock(self, name: str, ttl: float) -> Optional[str]:
+        conn = self.engine.connect()
+        try:
+            acquired = conn.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": _advisory_key(f"job:{name}")}).scalar()
+            conn.commit()
+        except Exception as exc:
+            logger.warning("[SCHEDULER] No se pudo tomar lock de %s: %s", name, exc)
+            conn.close()
+            return None
+        if not acquired:
+            conn.close()
+            return None
+        token = uuid.uuid4().hex
+        self._job_conns[token] = conn
+        return token
+
+    def release_job_lock(self, name: str, token: str):
+        conn = self._job_conns.pop(token, None)
+        if conn is None:
+            return
+        try:
+            conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": _advisory_key(f"job:{name}")})
+            conn.commit()
+        finally:
+            conn.close()
+
+
+class JobSpec:
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[], Any],
+        interval: timedelta,
+        jitter: int = 0,
+        timeout: Optional[float] = None,
+        run_on_start: Optional[timedelta] = None,
+    ):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        # Duración máxima esperada; acota el lock anti-solapamiento
+        self.timeout = timeout or interval.total_seconds()
+        self.run_on_start = run_on_start
+
+
+class JobHistory:
+    """
+    Historial de ejecuciones y métricas de duración por job.
+    Se guarda en Redis para que sea visible desde la API aunque el scheduler corra
+    en otro proceso; sin Redis queda solo en memoria.
+    """
+
+    def __init__(self, size: int = SCHEDULER_HISTORY_SIZE):
+        self.size = size
+        self._local: Dict[str, List[Dict[str, Any]]] = {}
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        try:
+            self.redis = redis.from_url(REDIS_URL, decode_responses=True, socket_connect_timeout=2, socket_timeout=5)
+        except Exception:
+            self.redis = None
+
+    def record(self, name: str, entry: Dict[str, Any]):
+        runs = self._local.setdefault(name, [])
+        runs.insert(0, entry)
+        del runs[self.size:]
+
+        stats = self._stats.setdefault(name, {"runs": 0, "failures": 0, "skipped": 0, "total_duration_ms": 0.0})
+        if entry["status"] == "skipped":
+            stats["skipped"] += 1
+        else:
+            stats["runs"] += 1
+            stats["total_duration_ms"] += entry["duration_ms"]
+            if entry["status"] == "error":
+                stats["failures"] += 1
+            stats["last_run_at"] = entry["started_at"]
+            stats["last_status"] = entry["status"]
+            stats["last_duration_ms"] = entry["duration_ms"]
+
+        if self.redis is None:
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.lpush(f"{KEY_PREFIX}:history:{name}", json.dumps(entry))
+            pipe.ltrim(f"{KEY_PREFIX}:history:{name}", 0, self.size - 1)
+            stats_key = f"{KEY_PREFIX}:stats:{name}"
+            if entry["status"] == "skipped":
+                pipe.hincrby(stats_key, "skipped", 1)
+            else:
+                pipe.hincrby(stats_key, "runs", 1)
+                pipe.hincrbyfloat(stats_key, "total_duration_ms", entry["duration_ms"])
+                if entry["status"] == "error":
+                    pipe.hincrby(stats_key, "failures", 1)
+                pipe.hset(stats_key, mapping={
+                    "last_run_at": entry["started_at"],
+                    "last_status": entry["status"],
+                    "last_duration_ms": entry["duration_ms"],
+                })
+            pipe.execute()
+        except redis.RedisError as exc:
+            logger.debug("[SCHEDULER] No se pudo guardar historial de %s: %s", name, exc)
+
+    def last_success_at(self, name: str) -> Optional[datetime]:
+        raw = None
+        if self.redis is not None:
+            try:
+                stats = self.redis.hgetall(f"{KEY_PREFIX}:stats:{name}")
+                if stats.get("last_status") == "ok":
+                    raw = stats.get("last_run_at")
+            except redis.RedisError:
+                pass
+        if raw is None and self._stats.get(name, {}).get("last_status") == "ok":
+            raw = self._stats[name]["last_run_at"]
+        return datetime.fromisoformat(raw) if raw else None
+
+    def snapshot(self, name: str, limit: int = 20) -> Dict[str, Any]:
+        if self.redis is not None:
+            try:
+                stats = self.redis.hgetall(f"{KEY_PREFIX}:stats:{name}")
+                history = [json.loads(h) for h in self.redis.lrange(f"{KEY_PREFIX}:history:{name}", 0, limit - 1)]
+                return {"stats": _coerce_stats(stats), "history": history}
+            except redis.RedisError:
+                pass
+        return {"stats": dict(self._stats.get(name, {})), "history": self._local.get(name, [])[:limit]}
+
+
+def _coerce_stats(stats: Dict[str, str]) -> Dict[str, Any]:
+    result: Dict[str, Any] = dict(stats)
+    for field in ("runs", "failures", "skipped"):
+        result[field] = int(stats.get(field, 0))
+    for field in ("total_duration_ms", "last_duration_ms"):
+        if field in stats:
+            result[field] = float(stats[field])
+    if result["runs"]:
+        result["avg_duration_ms"] = round(result.get("total_duration_ms", 0.0) / result["runs"], 2)
+    return result
+
+
+def _log_job_failure(name: str, exc: Exception):
+    """Sin traza cuando la base de datos no está disponible o le faltan tablas."""
+    message = str(exc)
+    if isinstance(exc, ProgrammingError) and "does not exist" in message:
+        logger.warning("[SCHEDULER] Job %s: tabla faltante, omitiendo ciclo: %s", name, message)
+    elif isinstance(exc, OperationalError):
+        logger.warning("[SCHEDULER] Job %s: base de datos no disponible: %s", name, message)
+    else:
+        logger.error("[SCHEDULER] Job %s falló: %s", name, message, exc_info=True)
+
+
+class DistributedScheduler:
+    """
+    Scheduler de jobs periódicos que puede arrancar en todos los workers de uvicorn
+    (o como proceso independiente) pero solo ejecuta jobs en el nodo líder.
+
+    - Elección de líder por Redis (lease) o Postgres (advisory lock).
+    - Sin solapamiento: max_instances=1 local + lock por job en el backend.
+    - Jitter en los intervalos para no disparar todos los jobs a la vez.
+    - Historial de ejecuciones y métricas de duración por job (JobHistory).
+    """
+
+    def __init__(self, backend: str = SCHEDULER_LEADER_BACKEND, blocking: bool = False):
+        self.node_id = _node_id()
+        if backend == "postgres":
+            self.elector = PostgresLeaderElector(self.node_id)
+        else:
+            self.elector = RedisLeaderElector(self.node_id)
+        self.history = JobHistory()
+        self.jobs: Dict[str, JobSpec] = {}
+        self._scheduler = BlockingScheduler() if blocking else BackgroundScheduler()
+        self._started = False
+
+    @property
+    def is_leader(self) -> bool:
+        return self.elector.is_leader
+
+    def add_job(self, spec: JobSpec):
+        self.jobs[spec.name] = spec
+
+    def _run(self, spec: JobSpec):
+        if not self.elector.is_leader:
+            return
+
+        token = self.elector.acquire_job_lock(spec.name, spec.timeout)
+        started_at = datetime.now(timezone.utc)
+        if token is None:
+            logger.info("[SCHEDULER] %s sigue en ejecución en otro nodo, se omite este ciclo.", spec.name)
+            self.history.record(spec.name, {
+                "started_at": started_at.isoformat(),
+                "duration_ms": 0.0,
+                "status": "skipped",
+                "node": self.node_id,
+            })
+            return
+
+        t0 = time.perf_counter()
+        status, error = "ok", None
+        try:
+            spec.func()
+        except Exception as exc:
+            status, error = "error", str(exc)
+            _log_job_failure(spec.name, exc)
+        finally:
+            duration_ms = round((time.perf_counter() - t0) * 1000, 2)
+            self.elector.release_job_lock(spec.name, token)
+            entry = {
+                "started_at": started_at.isoformat(),
+                "duration_ms": duration_ms,
+                "status": status,
+                "node": self.node_id,
+            }
+            if error:
+                entry["error"] = error[:500]
+            self.history.record(spec.name, entry)
+            if duration_ms > spec.timeout * 1000:
+                logger.warning("[SCHEDULER] %s tardó %.0fms (timeout esperado %.0fs).", spec.name, duration_ms, spec.timeout)
+
+    def _first_run_at(self, spec: JobSpec, now: datetime) -> Optional[datetime]:
+        """
+        Ejecución inicial tras arrancar, solo si la última ejecución correcta
+        (de cualquier nodo) es más antigua que el intervalo.
+        """
+        if spec.run_on_start is None:
+            return None
+        last = self.history.last_success_at(spec.name)
+        if last is not None and now - last < spec.interval:
+            return None
+        return now + spec.run_on_start + timedelta(seconds=random.uniform(0, spec.jitter))
+
+    def _elect(self):
+        was_leader = self.elector.is_leader
+        is_leader = self.elector.tick()
+        if is_leader and not was_leader:
+            logger.info("[SCHEDULER] Nodo %s elegido líder.", self.node_id)
+        elif was_leader and not is_leader:
+            logger.warning("[SCHEDULER] Nodo %s perdió el liderazgo.", self.node_id)
+
+    def start(self):
+        if self._started:
+            return
+        self._started = True
+
+        now = datetime.now(timezone.utc)
+        self._elect()
+        self._scheduler.add_job(
+            self._elect,
+            "interval",
+            seconds=max(1.0, SCHEDULER_LEADER_TTL / 3),
+            id="_leader_election",
+            max_instances=1,
+            coalesce=True,
+        )
+        for spec in self.jobs.values():
+            kwargs = {}
+            first_run = self._first_run_at(spec, now)
+            if first_run is not None:
+                kwargs["next_run_time"] = first_run
+            self._scheduler.add_job(
+                self._run,
+                "interval",
+                args=[spec],
+                seconds=spec.interval.total_seconds(),
+                jitter=spec.jitter or None,
+                id=spec.name,
+                max_instances=1,
+                coalesce=True,
+                misfire_grace_time=int(spec.interval.total_seconds()),
+                **kwargs,
+            )
+
+        summary = ", ".join(f"{s.name}({int(s.interval.total_seconds())}s)" for s in self.jobs.values())
+        logger.info("Scheduler iniciado en %s (líder=%s): %s.", self.node_id, self.is_leader, summary)
+        self._scheduler.start()
+
+    def shutdown(self):
+        if not self._started:
+            return
+        try:
+            self._scheduler.shutdown(wait=False)
+        finally:
+            self.elector.resign()
+            self._started = False
+
+    def status(self) -> Dict[str, Any]:
+        jobs = {}
+        for name, spec in self.jobs.items():
+            job = self._scheduler.get_job(name) if self._started else None
+            jobs[name] = {
+                "interval_seconds": int(spec.interval.total_seconds()),
+                "jitter_seconds": spec.jitter,
+                "next_run_at": job.next_run_time.isoformat() if job and job.next_run_time else None,
+                **self.history.snapshot(name),
+            }
+        return {
+            "node": self.node_id,
+            "is_leader": self.is_leader,
+            "backend": type(self.elector).__name__,
+            "jobs": jobs,
+        }
@@ -5,10 +5,13 @@ from typing import List, Dict, Any, Optional
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from app.models.domain import NetworkAsset, NetworkVulnerability
+from app.services.metrics import registry
 from app.services.vuln_providers import NvdVulnProvider
 
 logger = logging.getLogger(__name__)
 
+CVE_CACHE_LOOKUPS = registry.counter("deco_cve_cache_lookups_total", "Consultas a cve_cache por resultado (hit/miss/expired/error)", ["result"])
+
 class CPEClassifier:
     """
     Classifies Assets into CPEs based on Ports, OS, and Banners.
@@ -68,6 +71,7 @@ class CVEEnricher:
                 last_updated = result[1]
                 # Allow generic datetime comparisons (aware vs naive can be tricky, assuming naive or UTC)
                 if last_updated and (datetime.utcnow() - last_updated.replace(tzinfo=None)) < self.cache_ttl:
+                    CVE_CACHE_LOOKUPS.inc(result="hit")
                     logger.info(f"[Enricher] Cache HIT for {cpe}")
                     # Hydrate CPE back into items
                     data = cves_json if isinstance(cves_json, list) else json.loads(cves_json)
@@ -75,8 +79,10 @@ class CVEEnricher:
                         item["cpe"] = cpe
                     return data
             
+            CVE_CACHE_LOOKUPS.inc(result="expired" if result else "miss")
             logger.info(f"[Enricher] Cache MISS/EXPIRED for {cpe}")
         except Exception as e:
+            CVE_CACHE_LOOKUPS.inc(result="error")
             logger.error(f"[Enricher] Cache read error: {e}")
 
         # 2. Fetch from NVD
@@ -0,0 +1,148 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import event
+
+from app.services.metrics import registry
+
+# Rutas sin match (404, scanners) se agrupan para no disparar la cardinalidad
+UNMATCHED_ROUTE = "<unmatched>"
+
+HTTP_REQUEST_DURATION = registry.histogram(
+    "deco_http_request_duration_seconds",
+    "Duración de las peticiones HTTP por ruta (plantilla, no path real)",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_INPROGRESS = registry.gauge(
+    "deco_http_requests_inprogress",
+    "Peticiones HTTP en curso",
+)
+HTTP_REQUEST_DB_QUERIES = registry.histogram(
+    "deco_http_request_db_queries",
+    "Sentencias SQL ejecutadas por petición",
+    ["route"],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+DB_QUERIES = registry.counter(
+    "deco_db_queries_total",
+    "Sentencias SQL ejecutadas",
+    ["engine"],
+)
+
+# Contador de queries de la petición en curso. Es una lista mutable para que
+# los incrementos hechos desde el threadpool (rutas sync, get_db) se vean en
+# el middleware: el contexto se copia, pero el objeto es el mismo.
+_request_queries: ContextVar[Optional[List[int]]] = ContextVar("deco_request_queries", default=None)
+
+
+def instrument_engine_queries(engine, label: str):
+    """
+    Cuenta las sentencias de un Engine (sync o el sync_engine de uno async).
+    """
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count_query(conn, cursor, statement, parameters, context, executemany):
+        DB_QUERIES.inc(engine=label)
+        counter = _request_queries.get()
+        if counter is not None:
+            counter[0] += 1
+
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path_format", None) or getattr(route, "path", None)
+    return path or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI puro (sin BaseHTTPMiddleware, que añade una tarea por
+    petición): duración por ruta, peticiones en curso y queries por petición.
+    """
+
+    def __init__(self, app, exclude_paths=("/metrics",)):
+        self.app = app
+        self.exclude_paths = set(exclude_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path") in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        queries = [0]
+        token = _request_queries.set(queries)
+        HTTP_REQUESTS_INPROGRESS.inc()
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - t0
+            HTTP_REQUESTS_INPROGRESS.dec()
+            _request_queries.reset(token)
+            # El router deja la ruta resuelta en el scope (mismo dict)
+            route = _route_label(scope)
+            HTTP_REQUEST_DURATION.observe(elapsed, method=scope.get("method", ""), route=route, status=str(status["code"]))
+            HTTP_REQUEST_DB_QUERIES.observe(queries[0], route=route)
+
+
+# --- Pipeline de resultados ---
+RESULT_STAGE_DURATION = registry.histogram(
+    "deco_result_stage_duration_seconds",
+    "Duración de cada etapa de process_scan_result",
+    ["stage"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0),
+)
+RESULTS_PROCESSED = registry.counter(
+    "deco_results_processed_total",
+    "Resultados de escaneo procesados por tipo de job y desenlace",
+    ["job_type", "outcome"],
+)
+RESULTS_INFLIGHT = registry.gauge(
+    "deco_result_processing_inflight",
+    "Resultados en procesamiento (cola local del worker)",
+)
+HEARTBEAT_PENDING_JOBS = registry.histogram(
+    "deco_heartbeat_pending_jobs",
+    "Jobs pendientes del cliente vistos en cada heartbeat",
+    buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250),
+)
+
+
+def stage_timer(stage: str):
+    """
+    with stage_timer("correlation"): ...
+    """
+    return RESULT_STAGE_DURATION.time(stage=stage)
+
+
+class StageTimings:
+    """
+    Acumula el tiempo por etapa de un resultado (parse/asset_upsert se ejecutan
+    una vez por host) y publica una observación por etapa al final.
+    """
+
+    def __init__(self):
+        self.totals: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.totals[name] = self.totals.get(name, 0.0) + time.perf_counter() - t0
+
+    def observe(self):
+        for name, elapsed in self.totals.items():
+            RESULT_STAGE_DURATION.observe(elapsed, stage=name)
+
+    def describe(self) -> str:
+        return " ".join(f"{name}={elapsed * 1000:.1f}ms" for name, elapsed in self.totals.items())
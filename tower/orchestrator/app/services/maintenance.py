@@ -0,0 +1,156 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger("DecoOrchestrator.Maintenance")
+
+# Thresholds
+AGENT_OFFLINE_MINUTES = 5
+ZOMBIE_TIMEOUT_MINUTES = 30
+ZOMBIE_ACK_GRACE_MINUTES = 5
+OFFLINE_WARNING_MINUTES = 15
+OFFLINE_CRITICAL_HOURS = 1
+
+# Cuántas filas afectadas se detallan en el log por ciclo
+LOG_SAMPLE = 10
+
+_MARK_AGENTS_OFFLINE = text("""
+    UPDATE agents
+    SET status = 'offline'
+    WHERE status <> 'offline'
+      AND last_seen_at < :threshold
+    RETURNING id, hostname, client_id, last_seen_at
+""")
+
+# params es JSON (no JSONB): se fusiona como jsonb y se vuelve a castear.
+_FAIL_ZOMBIE_JOBS = text("""
+    UPDATE scan_jobs
+    SET status = 'error',
+        finished_at = :now,
+        params = (
+            CASE WHEN params IS NULL OR json_typeof(params) <> 'object'
+                 THEN '{}'::jsonb ELSE params::jsonb END
+            || jsonb_build_object(
+                'error', CASE WHEN started_at IS NULL THEN :ghost_msg ELSE :timeout_msg END,
+                'error_reason', CASE WHEN started_at IS NULL THEN 'ghost_no_ack' ELSE 'timeout_zombie' END
+            )
+        )::json
+    WHERE status = 'running'
+      AND (
+        started_at < :timeout_threshold
+        OR (started_at IS NULL AND created_at < :grace_threshold)
+      )
+    RETURNING id, agent_id, type, created_at, started_at IS NULL AS ghost
+""")
+
+# Crítico + alerta en una sola sentencia. El índice parcial único
+# uq_fleet_alerts_open evita duplicar alertas abiertas.
+_FLAG_CRITICAL_AND_ALERT = text("""
+    WITH flagged AS (
+        UPDATE agent_status
+        SET health_state = 'critical',
+            error_reason = :reason
+        WHERE last_seen < :critical_threshold
+          AND health_state IS DISTINCT FROM 'critical'
+        RETURNING agent_id, client_id
+    ), alerted AS (
+        INSERT INTO fleet_alerts (id, agent_id, client_id, alert_type, severity, message, resolved, timestamp)
+        SELECT gen_random_uuid()::text, agent_id, client_id, 'agent_offline', 'critical', :message, false, now()
+        FROM flagged
+        ON CONFLICT (agent_id, alert_type) WHERE resolved = false DO NOTHING
+        RETURNING agent_id
+    )
+    SELECT (SELECT count(*) FROM flagged) AS flagged,
+           (SELECT count(*) FROM alerted) AS alerted
+""")
+
+_FLAG_WARNING = text("""
+    UPDATE agent_status
+    SET health_state = 'warning',
+        error_reason = :reason
+    WHERE last_seen < :warning_threshold
+      AND last_seen >= :critical_threshold
+      AND health_state IS DISTINCT FROM 'warning'
+      AND health_state IS DISTINCT FROM 'critical'
+""")
+
+
+class MaintenanceEngine:
+    """
+    Mantenimiento periódico con SQL por conjuntos: cada chequeo es un único
+    UPDATE ... WHERE ... RETURNING (más el INSERT de alertas en el mismo statement),
+    así el coste por ciclo depende de las filas que cambian y no del tamaño de la flota.
+    Requiere los índices de migrations/20261019_maintenance_indexes.sql.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def mark_stale_agents_offline(self) -> int:
+        """
+        Agentes sin heartbeat en los últimos AGENT_OFFLINE_MINUTES pasan a 'offline'.
+        """
+        threshold = datetime.now(timezone.utc) - timedelta(minutes=AGENT_OFFLINE_MINUTES)
+        rows = self.db.execute(_MARK_AGENTS_OFFLINE, {"threshold": threshold}).fetchall()
+        self.db.commit()
+
+        if rows:
+            logger.info(f"[HEALTH_CHECK] {len(rows)} agentes marcados como OFFLINE (Inactivos > {AGENT_OFFLINE_MINUTES}m).")
+            for row in rows[:LOG_SAMPLE]:
+                logger.debug(f" -> Agente {row.hostname or row.id[:8]} (Client: {row.client_id[:8]}) offline. Última vez visto: {row.last_seen_at}")
+        return len(rows)
+
+    def fail_zombie_jobs(self) -> List[Dict[str, Any]]:
+        """
+        Jobs 'running' de más de ZOMBIE_TIMEOUT_MINUTES, o sin started_at (sin ACK)
+        pasado el periodo de gracia, se marcan como 'error' con el motivo en params.
+        """
+        now = datetime.now(timezone.utc)
+        rows = self.db.execute(_FAIL_ZOMBIE_JOBS, {
+            "now": now,
+            "timeout_threshold": now - timedelta(minutes=ZOMBIE_TIMEOUT_MINUTES),
+            "grace_threshold": now - timedelta(minutes=ZOMBIE_ACK_GRACE_MINUTES),
+            "timeout_msg": "Tiempo de espera agotado (30m+)",
+            "ghost_msg": "Agente no confirmó inicio (No ACK)",
+        }).fetchall()
+        self.db.commit()
+
+        if rows:
+            ghosts = sum(1 for r in rows if r.ghost)
+            logger.warning(f"[ZOMBIE_CLEANER] {len(rows)} jobs zombie marcados como ERROR ({ghosts} sin ACK).")
+            for row in rows[:LOG_SAMPLE]:
+                logger.warning(f" -> Job {row.id} (Agent: {row.agent_id}). Type: {row.type}. Created: {row.created_at}")
+        return [dict(r._mapping) for r in rows]
+
+    def check_fleet_health(self) -> Dict[str, int]:
+        """
+        Fleet Guardian: agentes sin reporte > OFFLINE_CRITICAL_HOURS pasan a 'critical'
+        con alerta agent_offline; > OFFLINE_WARNING_MINUTES pasan a 'warning'.
+        """
+        now = datetime.now(timezone.utc)
+        warning_threshold = now - timedelta(minutes=OFFLINE_WARNING_MINUTES)
+        critical_threshold = now - timedelta(hours=OFFLINE_CRITICAL_HOURS)
+
+        critical = self.db.execute(_FLAG_CRITICAL_AND_ALERT, {
+            "critical_threshold": critical_threshold,
+            "reason": "Agent Offline (>1h)",
+            "message": "Agent is offline for more than 1 hour",
+        }).one()
+        warning = self.db.execute(_FLAG_WARNING, {
+            "warning_threshold": warning_threshold,
+            "critical_threshold": critical_threshold,
+            "reason": "Agent Unresponsive (>15m)",
+        })
+        self.db.commit()
+
+        result = {
+            "critical": critical.flagged,
+            "alerts_created": critical.alerted,
+            "warning": warning.rowcount,
+        }
+        if any(result.values()):
+            logger.info(f"[FLEET_GUARDIAN] {result}")
+        return result
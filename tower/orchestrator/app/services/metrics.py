@@ -0,0 +1,233 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Buckets por defecto (segundos), pensados para latencias de API y DB
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: se esperaban labels {self.labelnames}, recibidos {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+
+class _ScalarMetric(_Metric):
+    """
+    Valor numérico por serie, mantenido aquí (inc) o calculado al leer
+    (set_function), útil para estados que ya existen en otro objeto, como el
+    pool de conexiones o los contadores de cache_service.
+    """
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._callbacks: Dict[LabelValues, Callable[[], float]] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set_function(self, fn: Callable[[], float], **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._callbacks[key] = fn
+
+    def samples(self) -> List[Tuple[LabelValues, float]]:
+        with self._lock:
+            values = dict(self._values)
+            callbacks = dict(self._callbacks)
+        for key, fn in callbacks.items():
+            try:
+                values[key] = float(fn())
+            except Exception:
+                continue
+        return list(values.items())
+
+
+class Counter(_ScalarMetric):
+    kind = "counter"
+
+
+class Gauge(_ScalarMetric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1.0, **labels: str):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_inprogress(self, **labels: str) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [bucket counts..., count, sum]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += 1
+            state[-1] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """
+        Cronometra el bloque (también si lanza excepción).
+        """
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def samples(self) -> List[Tuple[LabelValues, List[float]]]:
+        with self._lock:
+            return [(k, list(v)) for k, v in self._values.items()]
+
+    def summary(self, **labels: str) -> Optional[Dict[str, float]]:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                return None
+            count, total = state[-2], state[-1]
+        return {"count": count, "sum": round(total, 6), "avg": round(total / count, 6) if count else 0.0}
+
+
+class MetricsRegistry:
+    """
+    Registro de métricas en memoria del proceso (sin dependencias ni red).
+    Con varios workers de uvicorn cada proceso tiene su propio registro.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Métrica {metric.name} ya registrada con otra definición")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def metrics(self) -> List[_Metric]:
+        with self._lock:
+            return list(self._metrics.values())
+
+    def snapshot(self, prefix: str = "") -> Dict[str, Dict[str, object]]:
+        """
+        Vista JSON de las métricas (para endpoints de diagnóstico).
+        """
+        result: Dict[str, Dict[str, object]] = {}
+        for metric in self.metrics():
+            if not metric.name.startswith(prefix):
+                continue
+            series = {}
+            for key, value in metric.samples():
+                label = ",".join(f"{n}={v}" for n, v in zip(metric.labelnames, key)) or "_"
+                if isinstance(metric, Histogram):
+                    count, total = value[-2], value[-1]
+                    series[label] = {"count": count, "sum": round(total, 6), "avg": round(total / count, 6) if count else 0.0}
+                else:
+                    series[label] = value
+            result[metric.name] = series
+        return result
+
+    def render_prometheus(self) -> str:
+        """
+        Formato de exposición de texto de Prometheus (version=0.0.4).
+        """
+        lines: List[str] = []
+        for metric in sorted(self.metrics(), key=lambda m: m.name):
+            lines.append(f"# HELP {metric.name} {_escape_help(metric.help)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for key, value in sorted(metric.samples(), key=lambda s: s[0]):
+                labels = list(zip(metric.labelnames, key))
+                if isinstance(metric, Histogram):
+                    cumulative = 0.0
+                    for bound, bucket_count in zip(metric.buckets, value):
+                        cumulative += bucket_count
+                        lines.append(f"{metric.name}_bucket{_labels(labels + [('le', _fmt(bound))])} {_fmt(cumulative)}")
+                    count, total = value[-2], value[-1]
+                    lines.append(f"{metric.name}_bucket{_labels(labels + [('le', '+Inf')])} {_fmt(count)}")
+                    lines.append(f"{metric.name}_count{_labels(labels)} {_fmt(count)}")
+                    lines.append(f"{metric.name}_sum{_labels(labels)} {_fmt(total)}")
+                else:
+                    lines.append(f"{metric.name}{_labels(labels)} {_fmt(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs: List[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape_label(v)}"' for n, v in pairs) + "}"
+
+
+def _fmt(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+registry = MetricsRegistry()
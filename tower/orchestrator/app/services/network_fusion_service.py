@@ -7,6 +7,7 @@ from datetime import datetime
 
 from app.models.domain import NetworkAsset, NetworkObservation
 from app.schemas.contracts import NetworkObservationSchema
+from app.services.cache import cache_service
 
 logger = logging.getLogger("orchestrator")
 
@@ -97,7 +98,14 @@ class FusionClassifier:
 
 classifier = FusionClassifier()
 
-def fuse_observations(client_id: str, observations: List[NetworkObservationSchema], db: Session):
+def fuse_observations(client_id: str, observations: List[NetworkObservationSchema], db: Session,
+                      invalidate_cache: bool = True) -> bool:
+    """
+    Fusiona las observaciones en NetworkAsset y hace commit. Devuelve True si
+    el commit fue bien. Con invalidate_cache=False la invalidación de la cache
+    del cliente queda para el llamador (p. ej. fuera de AsyncSession.run_sync,
+    donde no se debe bloquear con Redis sync).
+    """
     # Group by potential asset key (prefer MAC, fallback IP)
     
     # 1. Persist Raw & Grouping
@@ -219,3 +227,7 @@ def fuse_observations(client_id: str, observations: List[NetworkObservationSchem
     except Exception as e:
         logger.error(f"Fusion Commit Error: {e}")
         db.rollback()
+        return False
+    if invalidate_cache:
+        cache_service.invalidate_client(client_id)
+    return True
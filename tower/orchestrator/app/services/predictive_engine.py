@@ -1,5 +1,6 @@
 from sqlalchemy.orm import Session
 from app.models.domain import Client, NetworkAsset, NetworkVulnerability, NetworkAssetHistory, PredictiveSignal
+from app.services.cache import cache_service
 from datetime import datetime, timezone, timedelta
 from typing import List, Dict, Any, Optional
 import logging
@@ -115,6 +116,7 @@ class PredictiveEngine:
             client.predictive_risk_score = final_score
             
         self.db.commit()
+        cache_service.invalidate_client(client_id)
         
         logger.info(f"Analysis complete. Score: {final_score}. Signals: {len(generated_signals)}")
         return PredictiveReport(final_score, saved_signals)
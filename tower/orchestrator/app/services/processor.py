@@ -2,6 +2,8 @@ from sqlalchemy.orm import Session
 from app.db.session import SessionLocal
 from app.models.domain import ScanResult, Asset, Finding, ScanJob, Agent, NetworkAsset
 from app.services.parser import FindingsParser
+from app.services.cache import cache_service
+from app.services.instrumentation import RESULTS_INFLIGHT, RESULTS_PROCESSED, StageTimings
 from datetime import datetime, timezone
 from typing import Any, Dict, List
 import logging
@@ -13,33 +15,43 @@ def process_scan_result(result_id: str):
     """
     Background task to process a scan result.
     """
+    timings = StageTimings()
+    outcome, job_type = "error", "unknown"
     db: Session = SessionLocal()
+    RESULTS_INFLIGHT.inc()
     try:
         logger.info(f"[*] Processing ScanResult: {result_id}")
-        result = db.query(ScanResult).filter(ScanResult.id == result_id).first()
-        if not result:
-            print(f"[-] Result {result_id} not found.")
-            return
+        with timings.stage("load"):
+            result = db.query(ScanResult).filter(ScanResult.id == result_id).first()
+            if not result:
+                print(f"[-] Result {result_id} not found.")
+                outcome = "not_found"
+                return
 
-        # Fetch related context
-        job = db.query(ScanJob).filter(ScanJob.id == result.scan_job_id).first()
-        agent = db.query(Agent).filter(Agent.id == job.agent_id).first()
+            # Fetch related context
+            job = db.query(ScanJob).filter(ScanJob.id == result.scan_job_id).first()
+            agent = db.query(Agent).filter(Agent.id == job.agent_id).first()
         
         if not job or not agent:
             logger.info("[-] Missing Job or Agent context.")
+            outcome = "not_found"
             return
 
-        logger.info(f"[DEBUG] Processing Job Type: '{job.type}' for Result: {result_id}")
+        job_type = job.type or "unknown"
+        logger.debug(f"[DEBUG] Processing Job Type: '{job.type}' for Result: {result_id}")
 
         # X-RAY NETWORK SCAN LOGIC
         if job.type == "xray_network_scan":
-            _process_xray_scan(db, job, agent, result.raw_data)
+            _process_xray_scan(db, job, agent, result.raw_data, timings)
+            outcome = "ok"
             return
 
         # SPECIALIZED DEEP SCANS (Task 1.3)
         specialized_types = ["iot_deep_scan", "smb_rdp_audit", "critical_service_fingerprint"]
         if job.type in specialized_types:
-            _process_specialized_scan(db, job, result.raw_data)
+            with timings.stage("specialized"):
+                _process_specialized_scan(db, job, result.raw_data)
+            outcome = "ok"
             return
 
         parser = FindingsParser()
@@ -65,55 +77,65 @@ def process_scan_result(result_id: str):
             if not ip:
                 continue
 
-            asset = (
-                db.query(Asset)
-                .filter(
-                    Asset.client_id == job.client_id,
-                    Asset.ip == ip
+            with timings.stage("asset_upsert"):
+                asset = (
+                    db.query(Asset)
+                    .filter(
+                        Asset.client_id == job.client_id,
+                        Asset.ip == ip
+                    )
+                    .first()
                 )
-                .first()
-            )
 
-            if not asset:
-                asset = Asset(
-                    client_id=job.client_id,
-                    ip=ip,
-                    hostname=host.get("hostname") or raw_data.get("hostname") or ip,
-                    created_at=datetime.now(timezone.utc)
-                )
-                db.add(asset)
-                db.commit()
-                db.refresh(asset)
+                if not asset:
+                    asset = Asset(
+                        client_id=job.client_id,
+                        ip=ip,
+                        hostname=host.get("hostname") or raw_data.get("hostname") or ip,
+                        created_at=datetime.now(timezone.utc)
+                    )
+                    db.add(asset)
+                    db.commit()
+                    db.refresh(asset)
 
             ports = host.get("open_ports") or host.get("ports") or []
             host_raw = dict(raw_data)
             host_raw.update({"ports": ports, "open_ports": ports, "target": ip})
 
-            detected = parser.parse(host_raw)
+            with timings.stage("parse"):
+                detected = parser.parse(host_raw)
             if detected:
-                for f_data in detected:
-                    finding = Finding(
-                        client_id=job.client_id,
-                        asset_id=asset.id,
-                        severity=f_data.severity,
-                        title=f_data.title,
-                        description=f_data.description,
-                        recommendation=f_data.recommendation,
-                        detected_at=datetime.now(timezone.utc)
-                    )
-                    db.add(finding)
-                    _update_global_stats(f_data.title, f_data.severity)
+                with timings.stage("findings"):
+                    for f_data in detected:
+                        finding = Finding(
+                            client_id=job.client_id,
+                            asset_id=asset.id,
+                            severity=f_data.severity,
+                            title=f_data.title,
+                            description=f_data.description,
+                            recommendation=f_data.recommendation,
+                            detected_at=datetime.now(timezone.utc)
+                        )
+                        db.add(finding)
+                        _update_global_stats(f_data.title, f_data.severity)
                 total_findings += len(detected)
 
-        db.commit()
+        with timings.stage("commit"):
+            db.commit()
+        cache_service.invalidate_tags(f"client:{job.client_id}", "dashboard")
+        outcome = "ok"
         print(f"[+] Procesado resultado {result_id}: assets={len(host_entries)}, findings={total_findings}")
 
     except Exception as e:
         logger.error(f"[-] Error processing result {result_id}: {e}", exc_info=True)
     finally:
         db.close()
+        RESULTS_INFLIGHT.dec()
+        timings.observe()
+        RESULTS_PROCESSED.inc(job_type=job_type, outcome=outcome)
+        logger.info(f"[RESULT_TIMINGS] {result_id} type={job_type} outcome={outcome} {timings.describe()}")
 
-def _process_xray_scan(db: Session, job: ScanJob, agent: Agent, raw_data: Dict[str, Any]):
+def _process_xray_scan(db: Session, job: ScanJob, agent: Agent, raw_data: Dict[str, Any], timings: StageTimings):
     """
     Procesa resultados de X-RAY Network Scan y actualiza NetworkAsset.
     V2: Usa AssetActivityTracker.
@@ -133,7 +155,8 @@ def _process_xray_scan(db: Session, job: ScanJob, agent: Agent, raw_data: Dict[s
         return
 
     tracker = AssetActivityTracker(db)
-    tracker.process_scan_batch(job.client_id, agent.id, devices)
+    with timings.stage("asset_upsert"):
+        tracker.process_scan_batch(job.client_id, agent.id, devices)
     
     # 2. TRIGGER VULNERABILITY ENRICHMENT (Task 1.2)
     try:
@@ -147,10 +170,12 @@ def _process_xray_scan(db: Session, job: ScanJob, agent: Agent, raw_data: Dict[s
         ).all()
         
         total_vulns = 0
-        for asset in active_assets:
-            total_vulns += enricher.process_asset(asset)
+        with timings.stage("enrichment"):
+            for asset in active_assets:
+                total_vulns += enricher.process_asset(asset)
             
         logger.info(f"[+] Enrichment Complete: Added {total_vulns} vulnerabilities across {len(active_assets)} assets.")
+        cache_service.invalidate_client(job.client_id)
         
     except Exception as e:
         logger.error(f"[-] Enrichment Failed: {e}", exc_info=True)  
@@ -240,4 +265,5 @@ def _process_specialized_scan(db: Session, job: ScanJob, raw_data: Dict[str, Any
         
     scanner = SpecializedScanner(db)
     scanner.process_result(job.type, asset, raw_data)
+    cache_service.invalidate_client(job.client_id)
     logger.info(f"[+] Specialized scan {job.type} processed for {asset.ip}")
@@ -19,7 +19,7 @@ if not logger.handlers:
     logger.addHandler(handler)
 
 
-def _enqueue_processing(result_id: str):
+def enqueue_processing(result_id: str):
     """
     Encola el procesamiento asíncrono del resultado en Redis.
     Si falla, intenta procesar sincrónicamente para no perder el evento.
@@ -46,12 +46,14 @@ def persist_result_and_update_job(
     raw_data: Dict[str, Any],
     summary: Optional[Dict[str, Any]],
     job_status: str,
+    enqueue: bool = True,
 ) -> ScanResult:
     """
     Guarda/actualiza el ScanResult y deja el job en el estado final indicado.
     - Marca timestamps started/finished si no estaban.
     - Reasigna agent_id si el job venía sin agente (para trazabilidad).
-    - Encola el procesamiento (assets/findings).
+    - Encola el procesamiento (assets/findings), salvo enqueue=False: los routers
+      async lo lanzan ellos mismos fuera del event loop (enqueue_processing).
     """
     now = datetime.now(timezone.utc)
 
@@ -80,6 +82,7 @@ def persist_result_and_update_job(
     db.commit()
     db.refresh(result)
 
-    _enqueue_processing(result.id)
+    if enqueue:
+        enqueue_processing(result.id)
 
     return result
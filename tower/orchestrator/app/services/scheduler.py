@@ -1,52 +1,27 @@
 import logging
-from datetime import datetime, timedelta, timezone
-from apscheduler.schedulers.background import BackgroundScheduler
+import os
+from datetime import timedelta
+from typing import Optional
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import OperationalError, ProgrammingError
 
 from app.db.session import SessionLocal
-from sqlalchemy import or_, desc
-from app.models.domain import Agent, ScanJob
+from app.services.maintenance import MaintenanceEngine
+from app.services.distributed_scheduler import DistributedScheduler, JobSpec
 
 logger = logging.getLogger("DecoOrchestrator.Scheduler")
 
-def _log_db_issue(context: str, exc: Exception):
-    """
-    Downgrade noise when DB is missing tables or unavailable.
-    """
-    message = str(exc)
-    if isinstance(exc, ProgrammingError) and "does not exist" in message:
-        logger.warning("[%s] Tabla faltante, omitiendo ciclo: %s", context, message)
-    elif isinstance(exc, OperationalError):
-        logger.warning("[%s] Base de datos no disponible: %s", context, message)
-    else:
-        logger.error("[%s] Error inesperado: %s", context, message, exc_info=True)
-
 def check_agent_health():
     """
     Revisa agentes que no han enviado heartbeat en los últimos 5 minutos
-    y los marca como 'offline'.
+    y los marca como 'offline' (un único UPDATE, ver MaintenanceEngine).
     """
     db: Session = SessionLocal()
     try:
-        # Threshold: 5 minutos sin heartbeat = offline
-        threshold = datetime.now(timezone.utc) - timedelta(minutes=5)
-        
-        # Find agents that are NOT 'offline' but haven't been seen recently
-        stale_agents = db.query(Agent).filter(
-            Agent.status != "offline",
-            Agent.last_seen_at < threshold
-        ).all()
-        
-        if stale_agents:
-            logger.info(f"[HEALTH_CHECK] Marcando {len(stale_agents)} agentes como OFFLINE (Inactivos > 5m).")
-            for agent in stale_agents:
-                agent.status = "offline"
-                logger.info(f" -> Agente {agent.hostname or agent.id[:8]} (Client: {agent.client_id[:8]}) marcado como offline. Última vez visto: {agent.last_seen_at}")
-            
-            db.commit()
-    except Exception as e:
-        _log_db_issue("HEALTH_CHECK", e)
+        MaintenanceEngine(db).mark_stale_agents_offline()
+    except Exception:
+        # El scheduler registra el fallo (historial, métricas y log)
+        db.rollback()
+        raise
     finally:
         db.close()
 
@@ -54,63 +29,22 @@ def check_zombie_jobs():
     """
     Cleaner de Jobs Zombie:
     - Jobs en 'running' que llevan > 30 mins sin terminar.
-    - Jobs en 'running' con started_at NULL (anomalía).
+    - Jobs en 'running' con started_at NULL (anomalía), tras 5 mins de gracia para el ACK.
     """
     db: Session = SessionLocal()
     try:
-        # Threshold: 30 minutes ago
-        timeout_threshold = datetime.now(timezone.utc) - timedelta(minutes=30)
-        
-        # Query 1: Running jobs started long ago
-        zombies_time = db.query(ScanJob).filter(
-            ScanJob.status == "running",
-            ScanJob.started_at < timeout_threshold
-        ).all()
-
-        # Query 2: Running jobs with NO started_at (Ghost Jobs)
-        # Note: We give a grace period of 5 mins for 'started_at' to be filled by ACK
-        # to avoid race conditions with just-created jobs.
-        grace_period = datetime.now(timezone.utc) - timedelta(minutes=5)
-        zombies_ghost = db.query(ScanJob).filter(
-            ScanJob.status == "running",
-            ScanJob.started_at.is_(None),
-            ScanJob.created_at < grace_period
-        ).all()
-        
-        all_zombies = list(set(zombies_time + zombies_ghost))
-        
-        if all_zombies:
-            logger.warning(f"[ZOMBIE_CLEANER] Detectados {len(all_zombies)} jobs zombie.")
-            for job in all_zombies:
-                logger.warning(f" -> Matando Job {job.id} (Agent: {job.agent_id}). Type: {job.type}. Created: {job.created_at}")
-                job.status = "error"
-                job.finished_at = datetime.now(timezone.utc)
-                if not job.params:
-                    job.params = {}
-                
-                reason = "timeout_zombie" if job.started_at else "ghost_no_ack"
-                msg = "Tiempo de espera agotado (30m+)" if reason == "timeout_zombie" else "Agente no confirmó inicio (No ACK)"
-                
-                # Update params with error info
-                # We need to cast params to dict if it's not
-                if job.params is None: job.params = {}
-                # Create a mutable copy if needed or just assign
-                new_params = dict(job.params)
-                new_params["error"] = msg
-                new_params["error_reason"] = reason
-                job.params = new_params
-                
-            db.commit()
-            logger.info(f"[ZOMBIE_CLEANER] {len(all_zombies)} jobs marcados como ERROR.")
-            
-    except Exception as e:
-        _log_db_issue("ZOMBIE_CLEANER", e)
+        MaintenanceEngine(db).fail_zombie_jobs()
+    except Exception:
+        db.rollback()
+        raise
     finally:
         db.close()
 
 
 from app.services.wti_engine import WTIEngine
 from app.services.threat_correlation import ThreatCorrelationEngine
+from app.services.cache import cache_service
+from app.services.instrumentation import stage_timer
 
 def run_wti_cycle():
     """
@@ -131,41 +65,72 @@ def run_wti_cycle():
             pass
             
         correlation = ThreatCorrelationEngine(db)
-        matches = correlation.correlate_all()
+        with stage_timer("correlation"):
+            matches = correlation.correlate_all()
+        if new_threats or matches:
+            cache_service.invalidate_tags("threat_intel")
         
         logger.info(f"[WTI_CYCLE] Finished. Matches generated: {matches}")
         
-    except Exception as e:
-        _log_db_issue("WTI_CYCLE", e)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def run_fleet_check():
+    """
+    Fleet Guardian: revisa condiciones offline/alerta de la flota.
+    """
+    db: Session = SessionLocal()
+    try:
+        MaintenanceEngine(db).check_fleet_health()
+    except Exception:
+        db.rollback()
+        raise
     finally:
         db.close()
 
-def start_scheduler():
-    scheduler = BackgroundScheduler()
-    scheduler.add_job(check_agent_health, 'interval', minutes=1)
-    scheduler.add_job(check_zombie_jobs, 'interval', minutes=5)
-    
-    
-    # Run WTI every 60 minutes
-    scheduler.add_job(run_wti_cycle, 'interval', minutes=60)
-    
-    # Run once on startup (optional, with slight delay to let app boot)
-    scheduler.add_job(run_wti_cycle, 'date', run_date=datetime.now(timezone.utc) + timedelta(seconds=30))
-    
-    # Fleet Guardian: Check for offline/alert conditions every 10 min
-    from app.services.telemetry import AgentTelemetryProcessor
-    from app.db.session import SessionLocal
-    def run_fleet_check():
-        db = SessionLocal()
-        try:
-             processor = AgentTelemetryProcessor(db)
-             processor.check_fleet_health()
-        except Exception as e:
-             logger.error(f"Error in run_fleet_check: {e}")
-        finally:
-             db.close()
-
-    scheduler.add_job(run_fleet_check, 'interval', minutes=10)
 
+# "embedded": cada worker de uvicorn arranca el scheduler y solo el líder ejecuta.
+# "external": la API no ejecuta jobs; corren en `python -m app.scheduler_worker`.
+SCHEDULER_MODE = os.getenv("SCHEDULER_MODE", "embedded").lower()
+
+_scheduler: Optional[DistributedScheduler] = None
+
+
+def get_scheduler(blocking: bool = False) -> DistributedScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = DistributedScheduler(blocking=blocking)
+        _scheduler.add_job(JobSpec("agent_health", check_agent_health, timedelta(minutes=1), jitter=10))
+        _scheduler.add_job(JobSpec("zombie_jobs", check_zombie_jobs, timedelta(minutes=5), jitter=30))
+        # WTI cada 60 min; al arrancar solo si la última ejecución correcta es más vieja
+        _scheduler.add_job(JobSpec(
+            "wti_cycle",
+            run_wti_cycle,
+            timedelta(minutes=60),
+            jitter=300,
+            timeout=30 * 60,
+            run_on_start=timedelta(seconds=30),
+        ))
+        _scheduler.add_job(JobSpec("fleet_guardian", run_fleet_check, timedelta(minutes=10), jitter=60))
+    return _scheduler
+
+
+def start_scheduler(force: bool = False):
+    """
+    Arranca el scheduler en este proceso. En modo "external" no hace nada
+    salvo que se fuerce (proceso standalone).
+    """
+    if SCHEDULER_MODE != "embedded" and not force:
+        logger.info("Scheduler en modo '%s': jobs periódicos fuera de la API.", SCHEDULER_MODE)
+        return None
+    scheduler = get_scheduler(blocking=force)
     scheduler.start()
-    logger.info("Scheduler iniciado: HealthCheck(1m) + ZombieCleaner(5m) + WTIEngine(60m) + FleetGuardian(10m).")
+    return scheduler
+
+
+def stop_scheduler():
+    if _scheduler is not None:
+        _scheduler.shutdown()
@@ -1,11 +1,8 @@
 
 from sqlalchemy.orm import Session
-from datetime import datetime, timezone, timedelta
-from app.models.domain import AgentStatus, Agent, FleetAlert, AgentVersion
-
-# Thresholds
-OFFLINE_WARNING_MINUTES = 15
-OFFLINE_CRITICAL_HOURS = 1
+from datetime import datetime, timezone
+from app.models.domain import AgentStatus, Agent
+from app.services.maintenance import MaintenanceEngine
 
 class AgentTelemetryProcessor:
     def __init__(self, db: Session):
@@ -71,47 +68,6 @@ class AgentTelemetryProcessor:
     def check_fleet_health(self):
         """
         Periodic worker task: Checks for offline agents.
+        Set-based (UPDATE ... RETURNING + bulk alert insert), see MaintenanceEngine.
         """
-        now = datetime.now(timezone.utc)
-        warning_threshold = now - timedelta(minutes=OFFLINE_WARNING_MINUTES)
-        critical_threshold = now - timedelta(hours=OFFLINE_CRITICAL_HOURS)
-        
-        # Get all statuses
-        statuses = self.db.query(AgentStatus).all()
-        
-        for status in statuses:
-            if not status.last_seen:
-                continue
-                
-            if status.last_seen < critical_threshold:
-                if status.health_state != "critical":
-                    status.health_state = "critical"
-                    status.error_reason = "Agent Offline (>1h)"
-                    self._create_alert(status, "agent_offline", "critical", "Agent is offline for more than 1 hour")
-            
-            elif status.last_seen < warning_threshold:
-                if status.health_state != "warning" and status.health_state != "critical":
-                     status.health_state = "warning"
-                     status.error_reason = "Agent Unresponsive (>15m)"
-        
-        self.db.commit()
-
-    def _create_alert(self, status_record, alert_type, severity, message):
-        # Check if active alert exists
-        existing = self.db.query(FleetAlert).filter(
-            FleetAlert.agent_id == status_record.agent_id,
-            FleetAlert.alert_type == alert_type,
-            FleetAlert.resolved == False
-        ).first()
-        
-        if existing:
-            return # Already alerted
-            
-        alert = FleetAlert(
-            agent_id=status_record.agent_id,
-            client_id=status_record.client_id,
-            alert_type=alert_type,
-            severity=severity,
-            message=message
-        )
-        self.db.add(alert)
+        return MaintenanceEngine(self.db).check_fleet_health()
@@ -6,8 +6,14 @@ import time
 import os
 from datetime import datetime
 
+from app.services.metrics import registry
+
 logger = logging.getLogger(__name__)
 
+NVD_REQUESTS = registry.counter("deco_nvd_requests_total", "Llamadas a la API de NVD por resultado", ["status"])
+NVD_REQUEST_DURATION = registry.histogram("deco_nvd_request_seconds", "Latencia de la API de NVD (sin la espera de rate limit)")
+NVD_RATE_LIMIT_WAIT = registry.counter("deco_nvd_rate_limit_wait_seconds_total", "Tiempo dormido por el rate limit de NVD")
+
 class VulnProvider(ABC):
     @abstractmethod
     def fetch_cves_for_cpe(self, cpe: str) -> List[Dict[str, Any]]:
@@ -37,6 +43,7 @@ class NvdVulnProvider(VulnProvider):
         if elapsed < delay:
             sleep_time = delay - elapsed
             logger.info(f"[NVD] Rate inhibiting: sleeping {sleep_time:.2f}s")
+            NVD_RATE_LIMIT_WAIT.inc(sleep_time)
             time.sleep(sleep_time)
             
         self.last_call = time.time()
@@ -52,7 +59,9 @@ class NvdVulnProvider(VulnProvider):
         
         try:
             logger.info(f"[NVD] Fetching CVEs for {cpe}...")
-            resp = requests.get(self.BASE_URL, params=params, headers=headers, timeout=10)
+            with NVD_REQUEST_DURATION.time():
+                resp = requests.get(self.BASE_URL, params=params, headers=headers, timeout=10)
+            NVD_REQUESTS.inc(status=str(resp.status_code))
             
             logger.info(f"[NVD] Response: {resp.status_code} - len={len(resp.text)}")
             if len(resp.text) < 500:
@@ -68,6 +77,7 @@ class NvdVulnProvider(VulnProvider):
             return self._normalize_nvd_response(data)
             
         except Exception as e:
+            NVD_REQUESTS.inc(status="error")
             logger.error(f"[NVD] Request failed: {e}")
             return []
 
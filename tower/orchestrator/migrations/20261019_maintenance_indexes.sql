@@ -0,0 +1,32 @@
+-- Índices para el mantenimiento set-based (MaintenanceEngine).
+-- El coste por ciclo pasa a depender de las filas que cambian, no del tamaño de la flota.
+
+-- Health check: agentes no offline ordenados por último heartbeat
+CREATE INDEX IF NOT EXISTS idx_agents_online_last_seen
+    ON agents (last_seen_at)
+    WHERE status <> 'offline';
+
+-- Zombie cleaner: solo jobs en ejecución
+CREATE INDEX IF NOT EXISTS idx_scan_jobs_running
+    ON scan_jobs (started_at, created_at)
+    WHERE status = 'running';
+
+-- Fleet Guardian: agentes aún no marcados como críticos
+CREATE INDEX IF NOT EXISTS idx_agent_status_last_seen_open
+    ON agent_status (last_seen)
+    WHERE health_state IS DISTINCT FROM 'critical';
+
+-- Alertas abiertas duplicadas (creadas por la versión anterior): conservar la más antigua
+UPDATE fleet_alerts a
+SET resolved = true
+FROM fleet_alerts b
+WHERE a.resolved = false
+  AND b.resolved = false
+  AND a.agent_id = b.agent_id
+  AND a.alert_type = b.alert_type
+  AND (a.timestamp, a.id) > (b.timestamp, b.id);
+
+-- Target del INSERT ... ON CONFLICT (agent_id, alert_type) WHERE resolved = false
+CREATE UNIQUE INDEX IF NOT EXISTS uq_fleet_alerts_open
+    ON fleet_alerts (agent_id, alert_type)
+    WHERE resolved = false;
@@ -0,0 +1,162 @@
+"""
+Benchmark del mantenimiento periódico: implementación ORM fila a fila (legacy)
+vs MaintenanceEngine (UPDATE ... RETURNING + INSERT ... ON CONFLICT).
+
+Siembra N agentes (con agent_status) y jobs 'running' con generate_series,
+mide un ciclo completo de cada implementación sobre los mismos datos y luego
+un segundo ciclo del engine en estado estable (nada que cambiar).
+
+Los chequeos son globales: ejecutar SOLO contra una base de datos de pruebas.
+
+    DATABASE_URL=postgresql://... python scripts/benchmark_maintenance.py --agents 100000 --yes
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from app.db.session import SessionLocal
+from app.models.domain import Agent, AgentStatus, FleetAlert, ScanJob
+from app.services.maintenance import MaintenanceEngine
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger("BenchMaintenance")
+
+BENCH_PREFIX = "bench-maint-"
+
+
+def seed(db, client_id: str, agents: int, jobs: int):
+    db.execute(text("INSERT INTO clients (id, name, status) VALUES (:cid, 'bench-maintenance', 'active')"), {"cid": client_id})
+    # last_seen repartido en 0..179 minutos: ~97% stale para health, mezcla warning/critical en fleet
+    db.execute(text("""
+        INSERT INTO agents (id, client_id, hostname, status, last_seen_at)
+        SELECT :prefix || g, :cid, 'bench-host-' || g, 'online', now() - (g % 180) * interval '1 minute'
+        FROM generate_series(1, :n) g
+    """), {"cid": client_id, "n": agents, "prefix": BENCH_PREFIX})
+    db.execute(text("""
+        INSERT INTO agent_status (agent_id, client_id, hostname, last_seen, health_state)
+        SELECT id, client_id, hostname, last_seen_at, 'healthy' FROM agents WHERE client_id = :cid
+    """), {"cid": client_id})
+    db.execute(text("""
+        INSERT INTO scan_jobs (id, client_id, agent_id, type, target, status, params, created_at, started_at)
+        SELECT :prefix || 'job-' || g, :cid, :prefix || (1 + g % :n), 'discovery', '10.0.0.1', 'running', '{}'::json,
+               now() - (g % 90) * interval '1 minute',
+               CASE WHEN g % 7 = 0 THEN NULL ELSE now() - (g % 90) * interval '1 minute' END
+        FROM generate_series(1, :jobs) g
+    """), {"cid": client_id, "n": agents, "jobs": jobs, "prefix": BENCH_PREFIX})
+    db.commit()
+    db.execute(text("ANALYZE agents; ANALYZE agent_status; ANALYZE scan_jobs; ANALYZE fleet_alerts"))
+    db.commit()
+
+
+def reset(db, client_id: str):
+    db.execute(text("DELETE FROM fleet_alerts WHERE client_id = :cid"), {"cid": client_id})
+    db.execute(text("UPDATE agents SET status = 'online' WHERE client_id = :cid"), {"cid": client_id})
+    db.execute(text("UPDATE agent_status SET health_state = 'healthy', error_reason = NULL WHERE client_id = :cid"), {"cid": client_id})
+    db.execute(text("UPDATE scan_jobs SET status = 'running', finished_at = NULL, params = '{}'::json WHERE client_id = :cid"), {"cid": client_id})
+    db.commit()
+
+
+def cleanup(db, client_id: str):
+    for table in ("fleet_alerts", "scan_jobs", "agent_status", "agents"):
+        db.execute(text(f"DELETE FROM {table} WHERE client_id = :cid"), {"cid": client_id})
+    db.execute(text("DELETE FROM clients WHERE id = :cid"), {"cid": client_id})
+    db.commit()
+
+
+def legacy_cycle(db):
+    """
+    Réplica de la implementación anterior (ORM, una fila a la vez).
+    """
+    now = datetime.now(timezone.utc)
+
+    for agent in db.query(Agent).filter(Agent.status != "offline", Agent.last_seen_at < now - timedelta(minutes=5)).all():
+        agent.status = "offline"
+    db.commit()
+
+    zombies = db.query(ScanJob).filter(ScanJob.status == "running", ScanJob.started_at < now - timedelta(minutes=30)).all()
+    zombies += db.query(ScanJob).filter(
+        ScanJob.status == "running", ScanJob.started_at.is_(None), ScanJob.created_at < now - timedelta(minutes=5)
+    ).all()
+    for job in set(zombies):
+        job.status = "error"
+        job.finished_at = now
+        params = dict(job.params or {})
+        params["error_reason"] = "timeout_zombie" if job.started_at else "ghost_no_ack"
+        job.params = params
+    db.commit()
+
+    for status in db.query(AgentStatus).all():
+        if not status.last_seen:
+            continue
+        if status.last_seen < now - timedelta(hours=1):
+            if status.health_state != "critical":
+                status.health_state = "critical"
+                exists = db.query(FleetAlert).filter(
+                    FleetAlert.agent_id == status.agent_id,
+                    FleetAlert.alert_type == "agent_offline",
+                    FleetAlert.resolved == False,  # noqa
+                ).first()
+                if not exists:
+                    db.add(FleetAlert(agent_id=status.agent_id, client_id=status.client_id,
+                                      alert_type="agent_offline", severity="critical", message="bench"))
+        elif status.last_seen < now - timedelta(minutes=15):
+            if status.health_state not in ("warning", "critical"):
+                status.health_state = "warning"
+    db.commit()
+
+
+def engine_cycle(db):
+    engine = MaintenanceEngine(db)
+    engine.mark_stale_agents_offline()
+    engine.fail_zombie_jobs()
+    engine.check_fleet_health()
+
+
+def timed(label, fn, db):
+    t0 = time.perf_counter()
+    fn(db)
+    elapsed = time.perf_counter() - t0
+    print(f"  {label:<32} {elapsed * 1000:>10.1f} ms")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, default=100_000)
+    parser.add_argument("--jobs", type=int, default=20_000)
+    parser.add_argument("--skip-legacy", action="store_true", help="No ejecutar la versión ORM (lenta con 100k)")
+    parser.add_argument("--yes", action="store_true", help="Confirmar que DATABASE_URL es una base de pruebas")
+    args = parser.parse_args()
+
+    if not args.yes:
+        print("Este benchmark modifica agentes/jobs de toda la base. Usar --yes en una base de pruebas.")
+        sys.exit(1)
+
+    client_id = f"{BENCH_PREFIX}{uuid.uuid4()}"
+    db = SessionLocal()
+    try:
+        print(f"Sembrando {args.agents} agentes y {args.jobs} jobs...")
+        seed(db, client_id, args.agents, args.jobs)
+
+        print("Ciclo completo (health + zombies + fleet):")
+        if not args.skip_legacy:
+            timed("legacy ORM", legacy_cycle, db)
+            reset(db, client_id)
+        timed("MaintenanceEngine", engine_cycle, db)
+        timed("MaintenanceEngine (estable)", engine_cycle, db)
+    finally:
+        db.rollback()
+        cleanup(db, client_id)
+        db.close()
+
+
+if __name__ == "__main__":
+    main()